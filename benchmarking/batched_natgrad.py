@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the training step time of a :class:`~gpflux.optimization.NatGradModel`
+with the batched natural gradient update of all its natgrad layers, with and
+without XLA compilation of the update (see
+:attr:`~gpflux.optimization.NatGradModel.jit_compile_natgrad`), against the
+previous update, which ran one `gpflow.optimizers.NaturalGradient` step per layer.
+
+The models are deep GPs of increasing depth in which every layer is trained
+with natural gradients. The mean step times (the best of a few repeats,
+excluding tracing and compilation) are written to ``tmp/batched_natgrad.json``.
+
+Run with ``python batched_natgrad.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+from gpflow.optimizers import NaturalGradient
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.optimization import NatGradModel
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 4
+LAYER_WIDTH = 4
+NUM_INDUCING = 32
+NUM_DATA = 512
+BATCH_SIZE = 64
+NUM_EPOCHS = 5
+NUM_REPEATS = 3
+DEPTHS = [2, 4, 8, 16]
+METHODS = ["loop", "batched", "batched_xla"]
+
+
+class LoopNatGradModel(NatGradModel):
+    """The previous update: one NaturalGradient step per natgrad layer."""
+
+    def _natgrad_apply_gradients(self, variational_params_grads, variational_params):
+        for natgrad_optimizer, (q_mu_grad, q_sqrt_grad), (q_mu, q_sqrt) in zip(
+            self.natgrad_optimizers, variational_params_grads, variational_params
+        ):
+            natgrad_optimizer._natgrad_apply_gradients(q_mu_grad, q_sqrt_grad, q_mu, q_sqrt)
+
+
+def build_model(depth, model_class):
+    inputs = tf.keras.Input((INPUT_DIM,))
+    outputs = inputs
+    input_dim = INPUT_DIM
+    for i in range(depth):
+        output_dim = 1 if i == depth - 1 else LAYER_WIDTH
+        layer = GPLayer(
+            construct_basic_kernel(
+                gpflow.kernels.SquaredExponential(), output_dim, share_hyperparams=True
+            ),
+            construct_basic_inducing_variables(
+                NUM_INDUCING,
+                input_dim,
+                output_dim,
+                share_variables=True,
+                z_init=np.random.randn(NUM_INDUCING, input_dim),
+            ),
+            NUM_DATA,
+            mean_function=gpflow.mean_functions.Zero(),
+        )
+        outputs = layer(outputs)
+        input_dim = output_dim
+    model = model_class(inputs, outputs)
+    model.natgrad_layers = True
+    return model
+
+
+def run(method, depth, data):
+    tf.random.set_seed(0)
+    np.random.seed(0)
+    model = build_model(depth, LoopNatGradModel if method == "loop" else NatGradModel)
+    model.jit_compile_natgrad = method == "batched_xla"
+    model.compile(
+        optimizer=[NaturalGradient(0.05) for _ in range(depth)] + [tf.optimizers.Adam(0.01)],
+        loss="mse",
+    )
+    X, Y = data
+    model.fit(X, Y, epochs=1, batch_size=BATCH_SIZE, verbose=0)  # tracing and compilation
+
+    times = []
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        model.fit(X, Y, epochs=NUM_EPOCHS, batch_size=BATCH_SIZE, verbose=0)
+        times.append(time.perf_counter() - start)
+    num_steps = NUM_EPOCHS * NUM_DATA // BATCH_SIZE
+    return 1000 * min(times) / num_steps
+
+
+def main():
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((NUM_DATA, INPUT_DIM))
+    Y = np.sin(X.sum(axis=-1, keepdims=True))
+
+    results = []
+    for depth in DEPTHS:
+        for method in METHODS:
+            step_ms = run(method, depth, (X, Y))
+            results.append(dict(depth=depth, method=method, step_ms=step_ms))
+            print(f"depth={depth} method={method} step={step_ms:.2f} ms")
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "batched_natgrad.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the latency of :class:`~gpflux.prediction.BucketedPredictor` against
+a plain `tf.function` of :meth:`~gpflux.models.DeepGP.predict_f` for a stream
+of requests of mixed sizes. The plain `tf.function` retraces for every new
+request size, which shows up in the tail latency.
+
+The p50, p99 and maximum latencies (in milliseconds) are written to
+``tmp/bucketed_prediction.json``.
+
+Run with ``python bucketed_prediction.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import BucketedPredictor
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 3
+NUM_LAYERS = 2
+NUM_INDUCING = 100
+NUM_REQUESTS = 1000
+MAX_REQUEST_SIZE = 600
+BUCKETS = (1, 8, 64, 512)
+
+
+def build_deep_gp():
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else INPUT_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                # shared inducing variables, as GPflow's conditional for separate ones is not
+                # supported by XLA
+                construct_basic_inducing_variables(
+                    NUM_INDUCING,
+                    INPUT_DIM,
+                    output_dim=output_dim,
+                    share_variables=True,
+                    z_init=np.random.randn(NUM_INDUCING, INPUT_DIM),
+                ),
+                num_data=1000,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian())
+
+
+def latencies(predict, requests):
+    times = []
+    for inputs in requests:
+        start = time.perf_counter()
+        outputs = predict(inputs)
+        _ = [output.numpy() for output in outputs]
+        times.append((time.perf_counter() - start) * 1e3)
+    return dict(
+        p50=float(np.percentile(times, 50)),
+        p99=float(np.percentile(times, 99)),
+        max=float(np.max(times)),
+    )
+
+
+def main():
+    model = build_deep_gp()
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, MAX_REQUEST_SIZE + 1, NUM_REQUESTS)
+    requests = [rng.standard_normal((size, INPUT_DIM)) for size in sizes]
+
+    results = {}
+    plain = tf.function(model.predict_f)
+    plain(requests[0])  # warm up with one size only
+    results["tf.function"] = latencies(plain, requests)
+    print("tf.function", results["tf.function"])
+
+    for jit_compile in [False, True]:
+        name = f"bucketed (jit_compile={jit_compile})"
+        predictor = BucketedPredictor.for_deep_gp(
+            model, INPUT_DIM, buckets=BUCKETS, jit_compile=jit_compile
+        )
+        predictor.precompile()
+        results[name] = latencies(predictor.predict, requests)
+        results[name].update(
+            trace_count=predictor.trace_count, num_buckets_used=predictor.num_buckets_used
+        )
+        print(name, results[name])
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "bucketed_prediction.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
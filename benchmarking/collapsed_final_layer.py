@@ -0,0 +1,148 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the convergence per wall-clock second of a two-layer deep GP whose
+final layer is a :class:`~gpflux.layers.CollapsedGPLayer`, against the same
+model with a :class:`~gpflux.layers.GPLayer` as the final layer, trained either
+with Adam only or with natural gradients for the final ``q(u)`` (as
+:class:`~gpflux.optimization.NatGradModel` does) and Adam for everything else.
+
+All models are trained on minibatches and evaluated with the ELBO per data
+point on the full training set (for the collapsed layer, at the optimal ``q(u)``
+for the full training set). The traces are written to
+``tmp/collapsed_final_layer.json``.
+
+Run with ``python collapsed_final_layer.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+from gpflow.optimizers import NaturalGradient
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import CollapsedGPLayer, GPLayer
+from gpflux.models import DeepGP
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+NUM_DATA = 2000
+NUM_INDUCING = 50
+BATCH_SIZE = 200
+NUM_STEPS = 1500
+EVAL_EVERY = 100
+NATGRAD_GAMMA = 0.1
+METHODS = ["adam", "natgrad", "collapsed"]
+
+
+def make_data(num_data, seed):
+    """A step function, which a single GP layer cannot fit well."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-1, 1, (num_data, 1))
+    Y = np.where(X > 0, 1.0, -1.0) + 0.1 * rng.standard_normal((num_data, 1))
+    return X, Y
+
+
+def build_deep_gp(collapsed):
+    def layer_arguments():
+        Z = np.linspace(-1, 1, NUM_INDUCING)[:, None]
+        return (
+            construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=1),
+            construct_basic_inducing_variables(
+                NUM_INDUCING, 1, output_dim=1, share_variables=True, z_init=Z
+            ),
+            NUM_DATA,
+        )
+
+    likelihood = gpflow.likelihoods.Gaussian(0.1)
+    first_layer = GPLayer(*layer_arguments(), tensor_outputs=True)
+    first_layer.q_sqrt.assign(1e-3 * first_layer.q_sqrt)  # start close to the identity
+    final_layer_class = CollapsedGPLayer if collapsed else GPLayer
+    final_layer_kwargs = dict(likelihood=likelihood) if collapsed else {}
+    final_layer = final_layer_class(
+        *layer_arguments(),
+        mean_function=gpflow.mean_functions.Zero(),
+        tensor_outputs=True,
+        **final_layer_kwargs,
+    )
+    return DeepGP([first_layer, final_layer], likelihood)
+
+
+def run(method, data):
+    tf.random.set_seed(0)
+    model = build_deep_gp(collapsed=method == "collapsed")
+    final_layer = model.f_layers[-1]
+    batches = iter(
+        tf.data.Dataset.from_tensor_slices(data)
+        .shuffle(NUM_DATA, seed=0)
+        .repeat()
+        .batch(BATCH_SIZE)
+    )
+
+    optimizer = tf.optimizers.Adam(0.01)
+    natgrad = NaturalGradient(NATGRAD_GAMMA)
+    q_mu, q_sqrt = final_layer.q_mu, final_layer.q_sqrt
+    variational_vars = [q_mu.unconstrained_variable, q_sqrt.unconstrained_variable]
+    if method == "natgrad":
+        excluded = {id(v) for v in variational_vars}
+        variables = [v for v in model.trainable_variables if id(v) not in excluded]
+    else:
+        variables = model.trainable_variables
+
+    @tf.function
+    def step(batch):
+        # a single backward pass for both optimizers, as in NatGradModel
+        with tf.GradientTape() as tape:
+            loss = -model.elbo(batch)
+        if method == "natgrad":
+            (q_mu_grad, q_sqrt_grad), grads = tape.gradient(loss, (variational_vars, variables))
+            natgrad._natgrad_apply_gradients(q_mu_grad, q_sqrt_grad, q_mu, q_sqrt)
+        else:
+            grads = tape.gradient(loss, variables)
+        optimizer.apply_gradients(zip(grads, variables))
+
+    trace = []
+    elapsed = 0.0
+    for i in range(NUM_STEPS + 1):
+        if i % EVAL_EVERY == 0:
+            elbo = model.elbo(data).numpy() / NUM_DATA
+            trace.append(dict(step=i, seconds=elapsed, elbo=elbo))
+            print(f"{method} step={i} seconds={elapsed:.1f} elbo={elbo:.4f}")
+        batch = next(batches)
+        start = time.perf_counter()
+        step(batch)
+        elapsed += time.perf_counter() - start
+    return trace
+
+
+def main():
+    data = make_data(NUM_DATA, seed=0)
+    results = {method: run(method, data) for method in METHODS}
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "collapsed_final_layer.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
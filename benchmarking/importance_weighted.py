@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the convergence per wall-clock second of the importance-weighted
+bound (``DeepGP(..., num_samples=K, importance_weighted=True)``) against the
+single-sample ELBO, for a latent-variable deep GP on a bimodal conditional
+density estimation problem.
+
+All models are evaluated with the same held-out metric, the importance-weighted
+bound with ``EVAL_NUM_SAMPLES`` samples per test point (a tight estimate of the
+test log-likelihood). The traces are written to ``tmp/importance_weighted.json``.
+
+Run with ``python importance_weighted.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+import gpflow
+
+from gpflux.encoders import DirectlyParameterizedNormalDiag
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer, LatentVariableLayer
+from gpflux.models import DeepGP
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+NUM_DATA = 1000
+NUM_INDUCING = 50
+LATENT_DIM = 1
+NUM_STEPS = 2000
+EVAL_EVERY = 100
+EVAL_NUM_SAMPLES = 100
+# None: the single-sample ELBO; otherwise, the number of importance samples
+OBJECTIVES = [None, 5, 20]
+
+
+def make_data(num_data, seed):
+    """Targets that follow one of two branches at random, y = ±sin(6x) + noise."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(size=(num_data, 1))
+    branch = np.where(rng.uniform(size=(num_data, 1)) < 0.5, 1.0, -1.0)
+    Y = branch * np.sin(6 * X) + 0.1 * rng.standard_normal((num_data, 1))
+    return X, Y
+
+
+def build_latent_variable_layer(num_data):
+    prior = tfp.distributions.MultivariateNormalDiag(np.zeros(LATENT_DIM), np.ones(LATENT_DIM))
+    encoder = DirectlyParameterizedNormalDiag(num_data, LATENT_DIM)
+    return LatentVariableLayer(prior, encoder)
+
+
+def build_gp_layer(num_data):
+    kernel = construct_basic_kernel(
+        gpflow.kernels.SquaredExponential(lengthscales=[0.2] + [1.0] * LATENT_DIM), output_dim=1
+    )
+    inducing_variable = construct_basic_inducing_variables(
+        NUM_INDUCING, 1 + LATENT_DIM, output_dim=1
+    )
+    return GPLayer(kernel, inducing_variable, num_data, mean_function=gpflow.mean_functions.Zero())
+
+
+def held_out_bound(f_layers, likelihood_layer, data):
+    """The importance-weighted bound per data point with EVAL_NUM_SAMPLES samples."""
+    model = DeepGP(
+        f_layers, likelihood_layer, num_samples=EVAL_NUM_SAMPLES, importance_weighted=True
+    )
+    return model.elbo(data).numpy() / model.num_data
+
+
+def run(num_samples, train_data, test_data):
+    objective = dict(num_samples=num_samples, importance_weighted=num_samples is not None)
+    gp_layer = build_gp_layer(len(train_data[0]))
+    likelihood = gpflow.likelihoods.Gaussian(0.01)
+    model = DeepGP(
+        [build_latent_variable_layer(len(train_data[0])), gp_layer], likelihood, **objective
+    )
+    # the test points need their own amortised posteriors over the latent variables,
+    # which are fitted alongside (their gradients do not touch the shared parameters)
+    test_latent_variable_layer = build_latent_variable_layer(len(test_data[0]))
+    test_f_layers = [test_latent_variable_layer, gp_layer]
+    test_model = DeepGP(test_f_layers, model.likelihood_layer, **objective)
+
+    optimizer = tf.optimizers.Adam(0.01)
+    test_optimizer = tf.optimizers.Adam(0.01)
+    test_variables = test_latent_variable_layer.trainable_variables
+
+    @tf.function
+    def step():
+        optimizer.minimize(lambda: -model.elbo(train_data), model.trainable_variables)
+        test_optimizer.minimize(lambda: -test_model.elbo(test_data), test_variables)
+
+    trace = []
+    elapsed = 0.0
+    for i in range(NUM_STEPS + 1):
+        if i % EVAL_EVERY == 0:
+            trace.append(
+                dict(
+                    step=i,
+                    seconds=elapsed,
+                    bound=held_out_bound(test_f_layers, model.likelihood_layer, test_data),
+                )
+            )
+            print(f"K={num_samples} step={i} seconds={elapsed:.1f} bound={trace[-1]['bound']:.4f}")
+        start = time.perf_counter()
+        step()
+        elapsed += time.perf_counter() - start
+    return trace
+
+
+def main():
+    train_data = make_data(NUM_DATA, seed=0)
+    test_data = make_data(NUM_DATA // 5, seed=1)
+
+    results = {}
+    for num_samples in OBJECTIVES:
+        tf.random.set_seed(0)
+        name = "elbo" if num_samples is None else f"iw-{num_samples}"
+        results[name] = run(num_samples, train_data, test_data)
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "importance_weighted.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the accuracy/latency trade-off of compressing the inducing points
+of a trained :class:`~gpflux.layers.GPLayer` with
+:func:`~gpflux.prediction.compress_gp_layer`, for a range of numbers of
+inducing points. The layer has the optimal ``q(u)`` for noisy observations of
+a smooth function, with more inducing points than the function needs.
+
+The :func:`~gpflux.prediction.compression_report` of each number of inducing
+points is written to ``tmp/inducing_point_compression.json``.
+
+Run with ``python inducing_point_compression.py``.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.prediction import compress_gp_layer, compression_report
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 2
+NUM_DATA = 2000
+NUM_INDUCING = 800
+NOISE_VARIANCE = 0.01
+COMPRESSED_NUM_INDUCING = [800, 400, 200, 100, 50]
+NUM_TEST = 1000
+
+
+def build_trained_gp_layer(rng):
+    X = rng.uniform(-1, 1, (NUM_DATA, INPUT_DIM))
+    Y = np.sin(3 * X[:, :1]) * np.cos(2 * X[:, 1:])
+    Y += np.sqrt(NOISE_VARIANCE) * rng.standard_normal(Y.shape)
+    Z = rng.uniform(-1, 1, (NUM_INDUCING, INPUT_DIM))
+    kernel = gpflow.kernels.SquaredExponential(lengthscales=0.5)
+    layer = GPLayer(
+        construct_basic_kernel(kernel, output_dim=1),
+        construct_basic_inducing_variables(
+            NUM_INDUCING, INPUT_DIM, output_dim=1, share_variables=True, z_init=Z
+        ),
+        NUM_DATA,
+        mean_function=gpflow.mean_functions.Zero(),
+        whiten=False,
+    )
+
+    # q(u) = N(Kuu Σ Kuf Y / σ², Kuu Σ Kuu), where Σ = (Kuu + Kuf Kfu / σ²)⁻¹
+    Kuu = kernel(Z).numpy() + gpflow.default_jitter() * np.eye(NUM_INDUCING)
+    Kuf = kernel(Z, X).numpy()
+    Sigma = np.linalg.inv(Kuu + Kuf @ Kuf.T / NOISE_VARIANCE)
+    S = Kuu @ Sigma @ Kuu
+    layer.q_mu.assign(Kuu @ Sigma @ Kuf @ Y / NOISE_VARIANCE)
+    layer.q_sqrt.assign(np.linalg.cholesky(S + 1e-8 * np.eye(NUM_INDUCING))[None])
+    return layer
+
+
+def main():
+    rng = np.random.default_rng(0)
+    layer = build_trained_gp_layer(rng)
+    X_test = rng.uniform(-1, 1, (NUM_TEST, INPUT_DIM))
+
+    results = []
+    for num_inducing in COMPRESSED_NUM_INDUCING:
+        report = compression_report(layer, compress_gp_layer(layer, num_inducing), X_test)
+        results.append(report)
+        print(report)
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "inducing_point_compression.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
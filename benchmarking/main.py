@@ -28,11 +28,14 @@ from scipy.stats import norm
 from utils import ExperimentName, git_version
 
 from gpflux.architectures import Config, build_constant_input_dim_deep_gp
+from gpflux.prediction import StreamingPredictor
 
 tf.keras.backend.set_floatx("float64")
 
 THIS_DIR = Path(__file__).parent
 LOGS = THIS_DIR / "tmp"
+# Number of test points to predict at once, to bound the memory used by `evaluate_model`
+EVAL_CHUNK_SIZE = 10_000
 EXPERIMENT = Experiment("UCI")
 
 
@@ -110,8 +113,12 @@ def train_model(model: tf.keras.models.Model, data_train, batch_size, num_epochs
 
 def evaluate_model(model, data_test):
     XT, YT = data_test
-    out = model(XT)
-    y_mean, y_var = out.y_mean, out.y_var
+
+    def predict_y(X):
+        out = model(X)
+        return out.y_mean, out.y_var
+
+    y_mean, y_var = StreamingPredictor(predict_y, chunk_size=EVAL_CHUNK_SIZE).predict(XT)
     d = YT - y_mean
     l = norm.logpdf(YT, loc=y_mean, scale=y_var ** 0.5)
     mse = np.average(d ** 2)
@@ -0,0 +1,149 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark a prediction server on localhost under load from many concurrent
+clients, each sending requests of a few rows, with and without
+:class:`~gpflux.prediction.MicroBatcher` coalescing the requests.
+
+The server speaks line-delimited JSON over TCP: each request is
+``{"inputs": [[...], ...]}`` and each response is ``{"y_mean": [...],
+"y_var": [...]}``. The server and the load generator run in the same event
+loop.
+
+The throughput (in requests per second), the client-side p50 and p99
+latencies (in milliseconds) and the server metrics are written to
+``tmp/micro_batching.json``.
+
+Run with ``python micro_batching.py``.
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import MicroBatcher
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+HOST = "127.0.0.1"
+INPUT_DIM = 3
+NUM_LAYERS = 2
+NUM_INDUCING = 100
+NUM_CLIENTS = 64
+NUM_REQUESTS_PER_CLIENT = 20
+MAX_REQUEST_SIZE = 4
+CONFIGS = {
+    "per-request": dict(max_batch_size=1, max_wait=0.0),
+    "micro-batched": dict(max_batch_size=256, max_wait=0.002),
+}
+
+
+def build_deep_gp():
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else INPUT_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                construct_basic_inducing_variables(
+                    NUM_INDUCING,
+                    INPUT_DIM,
+                    output_dim=output_dim,
+                    share_variables=True,
+                    z_init=np.random.randn(NUM_INDUCING, INPUT_DIM),
+                ),
+                num_data=1000,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+                tensor_outputs=True,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian(), input_dim=INPUT_DIM)
+
+
+async def serve(batcher, reader, writer):
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        inputs = np.array(json.loads(line)["inputs"])
+        _, _, y_mean, y_var = await batcher.predict(inputs)
+        response = {"y_mean": y_mean.tolist(), "y_var": y_var.tolist()}
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+    writer.close()
+
+
+async def client(port, rng):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    latencies = []
+    for _ in range(NUM_REQUESTS_PER_CLIENT):
+        inputs = rng.standard_normal((rng.integers(1, MAX_REQUEST_SIZE + 1), INPUT_DIM))
+        start = time.perf_counter()
+        writer.write((json.dumps({"inputs": inputs.tolist()}) + "\n").encode())
+        await writer.drain()
+        await reader.readline()
+        latencies.append((time.perf_counter() - start) * 1e3)
+    writer.close()
+    return latencies
+
+
+async def run_load(batcher):
+    server = await asyncio.start_server(lambda r, w: serve(batcher, r, w), HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    rng = np.random.default_rng(0)
+    async with batcher:
+        await batcher.predict(np.zeros((1, INPUT_DIM)))  # warm up
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[client(port, rng) for _ in range(NUM_CLIENTS)])
+        seconds = time.perf_counter() - start
+        metrics = batcher.metrics()
+    server.close()
+    await server.wait_closed()
+    latencies = np.concatenate(latencies)
+    return dict(
+        throughput=len(latencies) / seconds,
+        p50=float(np.percentile(latencies, 50)),
+        p99=float(np.percentile(latencies, 99)),
+        server_metrics=metrics,
+    )
+
+
+def main():
+    model = build_deep_gp()
+    results = {}
+    for name, config in CONFIGS.items():
+        results[name] = asyncio.run(run_load(MicroBatcher.for_deep_gp(model, **config)))
+        print(name, {key: value for key, value in results[name].items() if key != "server_metrics"})
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "micro_batching.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the startup time and peak memory of a serving process that loads
+an exported :class:`~gpflux.models.DeepGP` and answers one request, either
+with the NumPy-only :class:`~gpflux.prediction.NumpyDeepGP` or with the
+TensorFlow SavedModel written by :func:`~gpflux.prediction.export_deep_gp`.
+Each measurement runs in a new Python process.
+
+The startup times (in seconds) and peak resident memory (in MB) are written
+to ``tmp/numpy_runtime.json``.
+
+Run with ``python numpy_runtime.py``.
+"""
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+import gpflux.prediction.numpy_runtime
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import export_deep_gp, export_deep_gp_npz
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 3
+NUM_LAYERS = 2
+NUM_INDUCING = 100
+REQUEST_SIZE = 64
+NUM_REPEATS = 3
+
+NUMPY_SERVER = """
+import importlib.util, sys, time
+start = time.perf_counter()
+import numpy as np
+spec = importlib.util.spec_from_file_location("numpy_runtime", sys.argv[1])
+numpy_runtime = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(numpy_runtime)
+model = numpy_runtime.NumpyDeepGP.load(sys.argv[2])
+model.predict_f(np.zeros(({request_size}, {input_dim})))
+print(time.perf_counter() - start)
+"""
+
+SAVED_MODEL_SERVER = """
+import sys, time
+start = time.perf_counter()
+import numpy as np
+import tensorflow as tf
+model = tf.saved_model.load(sys.argv[2])
+model.signatures["predict_f"](inputs=np.zeros(({request_size}, {input_dim})))
+print(time.perf_counter() - start)
+"""
+
+# ru_maxrss of the children is the maximum over all of them, so measure each server from a
+# new process
+MEASURE = """
+import resource, subprocess, sys
+output = subprocess.run(sys.argv[1:], check=True, capture_output=True, text=True).stdout
+print(output.split()[-1], resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def build_deep_gp():
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else INPUT_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                construct_basic_inducing_variables(
+                    NUM_INDUCING,
+                    INPUT_DIM,
+                    output_dim=output_dim,
+                    share_variables=True,
+                    z_init=np.random.randn(NUM_INDUCING, INPUT_DIM),
+                ),
+                num_data=1000,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian(), input_dim=INPUT_DIM)
+
+
+def startup(server, path):
+    """Return the startup time (in seconds) and peak memory (in MB) of *server*."""
+    script = server.format(request_size=REQUEST_SIZE, input_dim=INPUT_DIM)
+    runtime_path = gpflux.prediction.numpy_runtime.__file__
+    command = [sys.executable, "-c", MEASURE, sys.executable, "-c", script, runtime_path, path]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    seconds, max_rss_kb = output.split()[-2:]
+    return float(seconds), float(max_rss_kb) / 1024
+
+
+def main():
+    model = build_deep_gp()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        npz_path = str(Path(directory) / "model.npz")
+        saved_model_path = str(Path(directory) / "saved_model")
+        export_deep_gp_npz(model, npz_path)
+        export_deep_gp(model, saved_model_path)
+
+        for name, server, path in [
+            ("numpy", NUMPY_SERVER, npz_path),
+            ("saved_model", SAVED_MODEL_SERVER, saved_model_path),
+        ]:
+            measurements = [startup(server, path) for _ in range(NUM_REPEATS)]
+            seconds, megabytes = zip(*measurements)
+            results[name] = dict(seconds=seconds, peak_memory_mb=megabytes)
+            print(f"{name}: {np.median(seconds):.2f}s, {np.median(megabytes):.0f}MB")
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "numpy_runtime.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the prediction throughput of :class:`~gpflux.prediction.ParallelPredictor`
+for 1 to ``os.cpu_count()`` single-threaded worker processes, compared with
+:class:`~gpflux.prediction.StreamingPredictor` in a single process that uses
+all cores.
+
+The throughputs (in rows per second) are written to ``tmp/parallel_prediction.json``.
+
+Run with ``python parallel_prediction.py``.
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import ParallelPredictor, StreamingPredictor
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 5
+NUM_LAYERS = 2
+NUM_INDUCING = 100
+NUM_ROWS = 200_000
+CHUNK_SIZE = 2048
+
+
+def build_deep_gp():
+    """Build the (untrained) model; this is also called in each worker process."""
+    tf.keras.backend.set_floatx("float64")
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else INPUT_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                construct_basic_inducing_variables(
+                    NUM_INDUCING,
+                    INPUT_DIM,
+                    output_dim=output_dim,
+                    share_variables=True,
+                    z_init=np.zeros((NUM_INDUCING, INPUT_DIM)),
+                ),
+                num_data=NUM_ROWS,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+                verbose=False,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian())
+
+
+def main():
+    rng = np.random.default_rng(0)
+    model = build_deep_gp()
+    for variable in model.trainable_variables:  # stands in for a trained model
+        variable.assign(variable + 0.1 * rng.standard_normal(variable.shape))
+    inputs = rng.standard_normal((NUM_ROWS, INPUT_DIM))
+
+    results = {}
+    predictor = StreamingPredictor.for_deep_gp(model, chunk_size=CHUNK_SIZE)
+    predictor.predict(inputs[:CHUNK_SIZE])  # warm up
+    start = time.perf_counter()
+    predictor.predict(inputs)
+    results["single-process"] = NUM_ROWS / (time.perf_counter() - start)
+    print(f"single process: {results['single-process']:.0f} rows/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint_path = tf.train.Checkpoint(model=model).write(os.path.join(directory, "ckpt"))
+        for num_workers in range(1, (os.cpu_count() or 1) + 1):
+            with ParallelPredictor(
+                build_deep_gp, checkpoint_path, num_workers=num_workers, chunk_size=CHUNK_SIZE
+            ) as parallel_predictor:
+                # warm up all workers
+                parallel_predictor.predict(inputs[: num_workers * CHUNK_SIZE])
+                start = time.perf_counter()
+                parallel_predictor.predict(inputs)
+                results[f"workers-{num_workers}"] = NUM_ROWS / (time.perf_counter() - start)
+            print(f"{num_workers} workers: {results[f'workers-{num_workers}']:.0f} rows/s")
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "parallel_prediction.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark :class:`~gpflux.prediction.PredictionCache` on repetitive query
+traffic, against predicting every request. Each request has a few rows,
+drawn from a fixed pool of feature vectors with Zipf-distributed popularity.
+
+The total time (in seconds) and the metrics of the cache are written to
+``tmp/prediction_cache.json``.
+
+Run with ``python prediction_cache.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import PredictionCache
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 3
+NUM_INDUCING = 500
+POOL_SIZE = 10000
+ZIPF_EXPONENT = 1.2
+NUM_REQUESTS = 1000
+MAX_REQUEST_SIZE = 4
+
+
+def build_deep_gp():
+    layer = GPLayer(
+        construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=1),
+        construct_basic_inducing_variables(
+            NUM_INDUCING,
+            INPUT_DIM,
+            output_dim=1,
+            share_variables=True,
+            z_init=np.random.randn(NUM_INDUCING, INPUT_DIM),
+        ),
+        num_data=1000,
+        mean_function=gpflow.mean_functions.Zero(),
+    )
+    return DeepGP([layer], gpflow.likelihoods.Gaussian(), input_dim=INPUT_DIM)
+
+
+def run(predict, requests):
+    start = time.perf_counter()
+    for inputs in requests:
+        _ = [np.asarray(output) for output in predict(inputs)]
+    return time.perf_counter() - start
+
+
+def main():
+    model = build_deep_gp()
+    rng = np.random.default_rng(0)
+    pool = rng.standard_normal((POOL_SIZE, INPUT_DIM))
+    requests = []
+    for _ in range(NUM_REQUESTS):
+        request_size = rng.integers(1, MAX_REQUEST_SIZE + 1)
+        requests.append(pool[(rng.zipf(ZIPF_EXPONENT, request_size) - 1) % POOL_SIZE])
+
+    predict_f = tf.function(
+        model.predict_f, input_signature=[tf.TensorSpec([None, INPUT_DIM], tf.float64)]
+    )
+    predict_f(requests[0])  # trace once, for both runs
+    cache = PredictionCache(predict_f)
+
+    results = {
+        "uncached": dict(seconds=run(predict_f, requests)),
+        "cached": dict(seconds=run(cache.predict, requests), **cache.metrics()),
+    }
+    for name, result in results.items():
+        print(name, result)
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "prediction_cache.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
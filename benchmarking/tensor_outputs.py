@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the per-call overhead of the default distribution outputs of
+:class:`~gpflux.layers.GPLayer` against its lightweight tensor outputs
+(``GPLayer(..., tensor_outputs=True)``), for small prediction batches where the
+construction of a ``tfp.distributions.MultivariateNormalDiag`` per layer is a
+noticeable part of the cost.
+
+Each configuration times :meth:`~gpflux.models.DeepGP.predict_f` of a
+three-layer deep GP, both eagerly and wrapped in a `tf.function`. The timings
+(in milliseconds per call) are written to ``tmp/tensor_outputs.json``.
+
+Run with ``python tensor_outputs.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 2
+HIDDEN_DIM = 2
+NUM_LAYERS = 3
+NUM_INDUCING = 50
+BATCH_SIZES = [1, 10, 100]
+NUM_CALLS = 200
+
+
+def build_deep_gp(tensor_outputs):
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else HIDDEN_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                construct_basic_inducing_variables(NUM_INDUCING, INPUT_DIM, output_dim=output_dim),
+                num_data=1000,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+                tensor_outputs=tensor_outputs,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian())
+
+
+def time_per_call(fn, inputs):
+    fn(inputs)  # warm up (and trace, for a `tf.function`)
+    start = time.perf_counter()
+    for _ in range(NUM_CALLS):
+        fn(inputs)
+    return (time.perf_counter() - start) / NUM_CALLS * 1e3
+
+
+def main():
+    results = {}
+    for tensor_outputs in [False, True]:
+        tf.random.set_seed(0)
+        model = build_deep_gp(tensor_outputs)
+        name = "tensor" if tensor_outputs else "distribution"
+        results[name] = []
+        for batch_size in BATCH_SIZES:
+            inputs = np.random.default_rng(0).standard_normal((batch_size, INPUT_DIM))
+            eager_ms = time_per_call(model.predict_f, inputs)
+            compiled_ms = time_per_call(tf.function(model.predict_f), inputs)
+            results[name].append(dict(batch_size=batch_size, eager=eager_ms, compiled=compiled_ms))
+            print(f"{name} N={batch_size} eager={eager_ms:.2f}ms compiled={compiled_ms:.2f}ms")
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "tensor_outputs.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the startup time of a serving process that obtains its
+:class:`~gpflux.prediction.BucketedPredictor` from a cold (empty) and a warm
+:class:`~gpflux.prediction.WarmStartCache`. Each measurement runs in a new
+Python process, and covers getting the predictor and answering one request
+for each bucket.
+
+The startup times (in seconds) are written to ``tmp/warm_start.json``.
+
+Run with ``python warm_start.py``.
+"""
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import WarmStartCache
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 3
+NUM_LAYERS = 2
+NUM_INDUCING = 100
+BUCKETS = (1, 8, 64, 512)
+NUM_REPEATS = 3
+
+
+def build_deep_gp():
+    tf.keras.backend.set_floatx("float64")
+    rng = np.random.default_rng(0)
+    layers = []
+    for i in range(NUM_LAYERS):
+        last = i == NUM_LAYERS - 1
+        output_dim = 1 if last else INPUT_DIM
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(gpflow.kernels.SquaredExponential(), output_dim=output_dim),
+                construct_basic_inducing_variables(
+                    NUM_INDUCING,
+                    INPUT_DIM,
+                    output_dim=output_dim,
+                    share_variables=True,
+                    z_init=rng.standard_normal((NUM_INDUCING, INPUT_DIM)),
+                ),
+                num_data=1000,
+                mean_function=gpflow.mean_functions.Zero() if last else None,
+                verbose=False,
+            )
+        )
+    return DeepGP(layers, gpflow.likelihoods.Gaussian())
+
+
+def serve(cache_dir, jit_compile):
+    """Start serving, and print the startup time in seconds."""
+    model = build_deep_gp()  # stands in for restoring a trained model
+    start = time.perf_counter()
+    predictor = WarmStartCache(cache_dir).get_predictor(
+        model, INPUT_DIM, buckets=BUCKETS, jit_compile=jit_compile
+    )
+    for bucket in BUCKETS:
+        predictor.predict(np.zeros((bucket, INPUT_DIM)))
+    print(time.perf_counter() - start)
+
+
+def startup_time(cache_dir, jit_compile):
+    command = [sys.executable, __file__, "serve", cache_dir, str(jit_compile)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def main():
+    results = {}
+    for jit_compile in [False, True]:
+        cold, warm = [], []
+        for _ in range(NUM_REPEATS):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cold.append(startup_time(cache_dir, jit_compile))
+                warm.append(startup_time(cache_dir, jit_compile))
+        results[f"jit_compile={jit_compile}"] = dict(cold=cold, warm=warm)
+        print(f"jit_compile={jit_compile}: cold={np.median(cold):.2f}s warm={np.median(warm):.2f}s")
+
+    LOGS.mkdir(exist_ok=True)
+    with open(LOGS / "warm_start.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        serve(sys.argv[2], sys.argv[3] == "True")
+    else:
+        main()
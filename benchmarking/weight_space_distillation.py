@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark the latency and fidelity of a
+:class:`~gpflux.prediction.WeightSpaceSurrogate` distilled from a two-layer
+:class:`~gpflux.models.DeepGP` with :func:`~gpflux.prediction.distil_deep_gp`,
+against the compiled ``predict_f`` of the model and against the NumPy-only
+:class:`~gpflux.prediction.NumpyWeightSpaceModel`.
+
+The median latencies (in seconds) of predicting a batch, and the
+:func:`~gpflux.prediction.distillation_report`, are written to
+``tmp/weight_space_distillation.json``.
+
+Run with ``python weight_space_distillation.py``.
+"""
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import NumpyWeightSpaceModel, distil_deep_gp, distillation_report
+
+tf.keras.backend.set_floatx("float64")
+
+THIS_DIR = Path(__file__).parent
+LOGS = THIS_DIR / "tmp"
+
+INPUT_DIM = 2
+NUM_INDUCING = 200
+NUM_REFERENCE = 5000
+NUM_SAMPLES = 20
+NUM_TEST_SAMPLES = 200
+LENGTHSCALE = 0.15
+BATCH_SIZE = 64
+NUM_REPEATS = 200
+
+
+def build_gp_layer(rng, input_dim, output_dim):
+    layer = GPLayer(
+        construct_basic_kernel(gpflow.kernels.SquaredExponential(lengthscales=0.5), output_dim),
+        construct_basic_inducing_variables(
+            NUM_INDUCING,
+            input_dim,
+            output_dim,
+            share_variables=True,
+            z_init=rng.uniform(-1, 1, (NUM_INDUCING, input_dim)),
+        ),
+        num_data=1000,
+        mean_function=gpflow.mean_functions.Zero(),
+    )
+    layer.q_mu.assign(rng.standard_normal(layer.q_mu.shape))
+    layer.q_sqrt.assign(0.3 * np.stack([np.eye(NUM_INDUCING)] * output_dim))
+    return layer
+
+
+def median_latency(predict, inputs):
+    latencies = []
+    for _ in range(NUM_REPEATS):
+        start = time.perf_counter()
+        _ = [np.asarray(output) for output in predict(inputs)]
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    layers = [build_gp_layer(rng, INPUT_DIM, INPUT_DIM), build_gp_layer(rng, INPUT_DIM, 1)]
+    model = DeepGP(layers, gpflow.likelihoods.Gaussian(), input_dim=INPUT_DIM)
+    reference_inputs = rng.uniform(-1, 1, (NUM_REFERENCE, INPUT_DIM))
+    # the composition of two layers varies faster than the default kernel of `distil_deep_gp`
+    kernel = gpflow.kernels.SquaredExponential(lengthscales=LENGTHSCALE)
+    surrogate = distil_deep_gp(model, reference_inputs, kernel=kernel, num_samples=NUM_SAMPLES)
+
+    LOGS.mkdir(exist_ok=True)
+    surrogate.export_npz(LOGS / "weight_space_surrogate.npz")
+    numpy_model = NumpyWeightSpaceModel.load(LOGS / "weight_space_surrogate.npz")
+
+    signature = [tf.TensorSpec([None, INPUT_DIM], tf.float64)]
+    predictors = {
+        "deep_gp": tf.function(model.predict_f, input_signature=signature),
+        "surrogate": tf.function(surrogate.predict_f, input_signature=signature),
+        "numpy": numpy_model.predict_f,
+    }
+    inputs = rng.uniform(-1, 1, (BATCH_SIZE, INPUT_DIM))
+    results = {name: median_latency(predict, inputs) for name, predict in predictors.items()}
+    test_inputs = rng.uniform(-1, 1, (1000, INPUT_DIM))
+    results.update(distillation_report(model, surrogate, test_inputs, num_samples=NUM_TEST_SAMPLES))
+    print(results)
+
+    with open(LOGS / "weight_space_distillation.json", "w") as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,5 +17,20 @@
 The library root. See :mod:`~gpflux.models.deep_gp.DeepGP` for the core Deep GP model,
 which is built out of different GP :mod:`~gpflux.layers`.
 """
-from gpflux import callbacks, encoders, helpers, layers, losses, models, optimization, sampling
+from gpflux import (
+    callbacks,
+    covariances,
+    encoders,
+    helpers,
+    inducing_variables,
+    kernels,
+    kullback_leiblers,
+    layers,
+    losses,
+    models,
+    optimization,
+    prediction,
+    sampling,
+    state_space,
+)
 from gpflux.version import __version__
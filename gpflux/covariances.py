@@ -0,0 +1,156 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides sparse covariance matrices between inducing points and
+inputs for kernels with compact support (see :mod:`gpflux.kernels`). The
+non-zero entries are found with a cell-list neighbour index over the inducing
+points, so that the memory and cost are linear in the number of non-zeros.
+"""
+import itertools
+from typing import Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow.base import TensorType
+from gpflow.inducing_variables import InducingPoints
+
+from gpflux.kernels import Wendland
+
+
+def _cell_neighbours(Z: tf.Tensor, X: tf.Tensor) -> tf.Tensor:
+    """
+    Find, for each row of *X*, the rows of *Z* in the same or an adjacent
+    unit cell, which includes all rows of *Z* within unit distance.
+
+    :param Z: The scaled inducing points, with the shape ``[M, D]``.
+    :param X: The scaled inputs, with the shape ``[N, D]``.
+    :returns: The indices of the candidate neighbours in *Z* of each input,
+        with the shape ``[N, R]``, padded with ``-1``.
+    """
+    D = Z.shape[-1]
+    Z_cells = tf.cast(tf.floor(Z), tf.int64)  # [M, D]
+    X_cells = tf.cast(tf.floor(X), tf.int64)  # [N, D]
+    lower = tf.reduce_min(Z_cells, axis=0)
+    extent = tf.reduce_max(Z_cells, axis=0) - lower + 1  # [D]
+    strides = tf.math.cumprod(extent, exclusive=True)  # [D]
+
+    def cell_key(cells: tf.Tensor) -> tf.Tensor:
+        return tf.reduce_sum((cells - lower) * strides, axis=-1)
+
+    Z_keys = cell_key(Z_cells)  # [M]
+    order = tf.argsort(Z_keys)
+    sorted_keys = tf.gather(Z_keys, order)
+
+    offsets = np.array(list(itertools.product([-1, 0, 1], repeat=D)))  # [3^D, D]
+    cells = X_cells[:, None, :] + offsets  # [N, 3^D, D]
+    inside = tf.reduce_all((cells >= lower) & (cells < lower + extent), axis=-1)
+    keys = tf.reshape(tf.where(inside, cell_key(cells), -1), [1, -1])  # [1, N 3^D]
+
+    start = tf.searchsorted(sorted_keys[None], keys, side="left")[0]
+    end = tf.searchsorted(sorted_keys[None], keys, side="right")[0]
+    positions = tf.ragged.range(start, end).values  # [∑ counts]
+    counts = tf.reduce_sum(tf.reshape(end - start, [tf.shape(X)[0], -1]), axis=1)  # [N]
+    neighbours = tf.RaggedTensor.from_row_lengths(tf.gather(order, positions), counts)
+    return neighbours.to_tensor(default_value=-1)
+
+
+def neighbour_indices(
+    inducing_variable: InducingPoints, kernel: Wendland, X: TensorType
+) -> tf.Tensor:
+    """
+    Find the inducing points that may lie within the support of *kernel*
+    around each input.
+
+    :param inducing_variable: The inducing points, with ``Z`` of the shape ``[M, D]``.
+    :param kernel: The compactly supported kernel.
+    :param X: The inputs, with the shape ``[N, D]``.
+    :returns: The indices into ``Z`` of the (candidate) neighbours of each
+        input, with the shape ``[N, R]``, padded with ``-1``. This is the
+        padding mask of :func:`neighbour_Kfu`.
+    """
+    Z = tf.convert_to_tensor(inducing_variable.Z)
+    X = tf.convert_to_tensor(X, dtype=Z.dtype)
+    X, _ = kernel.slice(X, None)
+    Z, _ = kernel.slice(Z, None)
+    return _cell_neighbours(kernel.scale(Z), kernel.scale(X))
+
+
+def neighbour_Kfu(
+    inducing_variable: InducingPoints, kernel: Wendland, X: TensorType
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Compute the covariances between each input and the inducing points within
+    the support of *kernel*, in a padded (ELLPACK-like) sparse format.
+
+    :param inducing_variable: The inducing points, with ``Z`` of the shape ``[M, D]``.
+    :param kernel: The compactly supported kernel.
+    :param X: The inputs, with the shape ``[N, D]``.
+    :returns: The indices into ``Z`` of the (candidate) neighbours of each
+        input and the corresponding covariances, both with the shape ``[N, R]``.
+        Padding entries have the index 0 and the covariance 0; they are the
+        entries where :func:`neighbour_indices` is ``-1``.
+    """
+    Z = tf.convert_to_tensor(inducing_variable.Z)
+    X = tf.convert_to_tensor(X, dtype=Z.dtype)
+    indices = neighbour_indices(inducing_variable, kernel, X)  # [N, R]
+    is_neighbour = indices >= 0
+    indices = tf.maximum(indices, 0)
+
+    X, _ = kernel.slice(X, None)
+    Z, _ = kernel.slice(Z, None)
+    differences = kernel.scale(X[:, None, :] - tf.gather(Z, indices))  # [N, R, D]
+    values = kernel.K_r2(tf.reduce_sum(tf.square(differences), axis=-1))  # [N, R]
+    return indices, tf.where(is_neighbour, values, tf.zeros_like(values))
+
+
+def _padded_to_sparse(indices: tf.Tensor, values: tf.Tensor, num_columns: int) -> tf.SparseTensor:
+    """Convert the padded format of :func:`neighbour_Kfu` to a `tf.SparseTensor`."""
+    nonzero = tf.where(values != 0)  # [nnz, 2]
+    columns = tf.gather_nd(indices, nonzero)
+    sparse = tf.SparseTensor(
+        tf.stack([nonzero[:, 0], tf.cast(columns, tf.int64)], axis=1),
+        tf.gather_nd(values, nonzero),
+        dense_shape=tf.cast(tf.stack([tf.shape(values)[0], num_columns]), tf.int64),
+    )
+    return tf.sparse.reorder(sparse)
+
+
+def sparse_Kuf(
+    inducing_variable: InducingPoints, kernel: Wendland, X: TensorType
+) -> tf.SparseTensor:
+    """
+    Compute the covariance matrix between the inducing points and *X* as a
+    `tf.SparseTensor` with the shape ``[M, N]``.
+    """
+    indices, values = neighbour_Kfu(inducing_variable, kernel, X)
+    return tf.sparse.transpose(_padded_to_sparse(indices, values, inducing_variable.Z.shape[0]))
+
+
+def sparse_Kuu(
+    inducing_variable: InducingPoints, kernel: Wendland, *, jitter: float = 0.0
+) -> tf.SparseTensor:
+    """
+    Compute the covariance matrix of the inducing points, with *jitter* added
+    to its diagonal, as a `tf.SparseTensor` with the shape ``[M, M]``.
+    """
+    M = inducing_variable.Z.shape[0]
+    indices, values = neighbour_Kfu(inducing_variable, kernel, inducing_variable.Z)
+    Kuu = _padded_to_sparse(indices, values, M)
+    if jitter:
+        eye = tf.sparse.eye(M, dtype=Kuu.dtype)
+        Kuu = tf.sparse.add(Kuu, tf.sparse.map_values(tf.multiply, eye, jitter))
+    return Kuu
@@ -22,7 +22,7 @@ This module contains helper functions for constructing :class:`~gpflow.kernels.M
 import inspect
 import warnings
 from dataclasses import fields
-from typing import List, Optional, Type, TypeVar, Union
+from typing import List, Optional, Sequence, Type, TypeVar, Union
 
 import numpy as np
 
@@ -36,6 +36,7 @@ from gpflow.inducing_variables import (
 from gpflow.kernels import SeparateIndependent, SharedIndependent
 from gpflow.utilities import deepcopy
 
+from gpflux.inducing_variables import GridInducingPoints
 from gpflux.layers.gp_layer import GPLayer
 
 
@@ -171,6 +172,39 @@ def construct_basic_inducing_variables(
         return SharedIndependentInducingVariables(shared_ip)
 
 
+def construct_grid_inducing_points(
+    X: np.ndarray, num_points_per_dim: Union[int, Sequence[int]]
+) -> GridInducingPoints:
+    """
+    Construct :class:`~gpflux.inducing_variables.GridInducingPoints` that
+    cover the data ``X`` with a margin of two grid cells along each dimension,
+    as required by the cubic interpolation onto the grid.
+
+    :param X: A data array with the shape ``[N, D]``, with ``D`` at most 3 in
+        typical use, as the number of grid points grows exponentially with ``D``.
+    :param num_points_per_dim: The number of grid points along each dimension,
+        or a single number to use for all dimensions. This must be at least 6,
+        so that at least one grid cell spans the data.
+    :raises ValueError: If any entry of ``num_points_per_dim`` is less than 6.
+    """
+    input_dim = X.shape[-1]
+    if isinstance(num_points_per_dim, int):
+        num_points_per_dim = [num_points_per_dim] * input_dim
+    num_points = np.asarray(num_points_per_dim)
+    if np.any(num_points < 6):
+        raise ValueError(
+            "`num_points_per_dim` must be at least 6 to cover the data with a margin of two cells"
+        )
+
+    lower, upper = X.min(axis=0), X.max(axis=0)
+    # Give constant data columns a unit range around their value
+    constant = upper == lower
+    lower, upper = np.where(constant, lower - 0.5, lower), np.where(constant, upper + 0.5, upper)
+    # The data range spans (m - 5) cells, leaving two cells on either side
+    spacing = (upper - lower) / (num_points - 5)
+    return GridInducingPoints(lower - 2 * spacing, upper + 2 * spacing, num_points_per_dim)
+
+
 def construct_mean_function(
     X: np.ndarray, D_in: int, D_out: int
 ) -> gpflow.mean_functions.MeanFunction:
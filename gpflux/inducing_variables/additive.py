@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`AdditiveInducingPoints`, separate sets of
+inducing points for each component of an additive kernel.
+"""
+from typing import Optional, Tuple
+
+from gpflow import Parameter, default_float
+from gpflow.base import TensorData
+from gpflow.inducing_variables import InducingVariables
+
+
+class AdditiveInducingPoints(InducingVariables):
+    """
+    Separate sets of ``m`` inducing points for each of the ``G`` components of
+    an additive kernel, where each component acts on its own (small) group of
+    ``d`` input dimensions, typically ``d = 1``. The inducing points of
+    component ``g`` live in the ``d``-dimensional input space of that component
+    only, and are stored as a single ``[G, m, d]`` parameter so that
+    computations can be batched over the components.
+    """
+
+    def __init__(self, Z: TensorData, name: Optional[str] = None):
+        """
+        :param Z: The initial locations of the inducing points, with the shape ``[G, m, d]``.
+        """
+        super().__init__(name=name)
+        self.Z = Parameter(Z, dtype=default_float())  # [G, m, d]
+
+    @property
+    def num_groups(self) -> int:
+        """The number of additive components ``G``."""
+        return self.Z.shape[0]
+
+    @property
+    def num_inducing_per_group(self) -> int:
+        """The number of inducing points ``m`` for each component."""
+        return self.Z.shape[1]
+
+    @property
+    def num_inducing(self) -> int:
+        """The total number of inducing points ``G m``."""
+        return self.num_groups * self.num_inducing_per_group
+
+    def __len__(self) -> int:
+        return self.num_groups * self.num_inducing_per_group
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (self.num_inducing_per_group, self.Z.shape[-1], self.num_groups)
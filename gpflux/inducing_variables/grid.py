@@ -0,0 +1,256 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+r"""
+This module provides :class:`GridInducingPoints`, inducing points that lie on
+a regular Cartesian grid, together with the structured covariance computations
+they enable for kernels that factorise over the input dimensions
+:cite:p:`wilson2015kernel`:
+
+- ``Kuu`` is a Kronecker product ``K₁ ⊗ … ⊗ K_D`` of small per-dimension
+  matrices (see :func:`grid_kuu_factors`), so that it can be factorised at a
+  cost of :math:`O(\sum_d m_d^3)` instead of :math:`O(M^3)`.
+- ``Kuf`` is approximated by local cubic interpolation, ``Kfu ≈ W Kuu``,
+  where each row of the sparse matrix ``W`` has :math:`4^D` non-zero entries
+  (see :func:`cubic_interpolation_weights`).
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import default_float
+from gpflow.base import TensorType
+from gpflow.inducing_variables import InducingVariables
+from gpflow.kernels import Kernel, Product, SquaredExponential, Stationary
+
+
+class GridInducingPoints(InducingVariables):
+    """
+    Inducing points on a regular Cartesian grid spanning ``[lower, upper]``
+    with ``num_points_per_dim[d]`` points along dimension ``d``. The grid is
+    fixed; it is not optimised during training.
+
+    The total number of inducing points is the product of
+    :attr:`num_points_per_dim`. As the interpolation uses two grid points on
+    either side of an input, the grid should extend at least two grid cells
+    beyond the data (see :func:`~gpflux.helpers.construct_grid_inducing_points`).
+    """
+
+    def __init__(
+        self,
+        lower: Sequence[float],
+        upper: Sequence[float],
+        num_points_per_dim: Sequence[int],
+        name: Optional[str] = None,
+    ):
+        """
+        :param lower: The lower corner of the grid, with one entry per input dimension.
+        :param upper: The upper corner of the grid, with one entry per input dimension.
+        :param num_points_per_dim: The number of grid points along each input dimension.
+            Cubic interpolation requires at least four points per dimension.
+        """
+        super().__init__(name=name)
+        if not len(lower) == len(upper) == len(num_points_per_dim):
+            raise ValueError(
+                "`lower`, `upper` and `num_points_per_dim` must have one entry per input dimension"
+            )
+        if any(m < 4 for m in num_points_per_dim):
+            raise ValueError("Cubic interpolation requires at least 4 grid points per dimension")
+
+        self.lower = np.asarray(lower, dtype=default_float())
+        self.upper = np.asarray(upper, dtype=default_float())
+        self.num_points_per_dim = tuple(int(m) for m in num_points_per_dim)
+        self.grids = [
+            tf.constant(np.linspace(low, up, m), dtype=default_float())
+            for low, up, m in zip(self.lower, self.upper, self.num_points_per_dim)
+        ]  # D tensors of shape [m_d]
+
+    @property
+    def input_dim(self) -> int:
+        """The number of input dimensions ``D``."""
+        return len(self.num_points_per_dim)
+
+    @property
+    def spacing(self) -> np.ndarray:
+        """The distance between neighbouring grid points along each dimension, shape ``[D]``."""
+        return (self.upper - self.lower) / (np.asarray(self.num_points_per_dim) - 1)
+
+    @property
+    def num_inducing(self) -> int:
+        """The total number of inducing points ``M = m₁ ⋯ m_D``."""
+        return int(np.prod(self.num_points_per_dim))
+
+    def __len__(self) -> int:
+        return self.num_inducing
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (self.num_inducing, self.input_dim, 1)
+
+    @property
+    def Z(self) -> tf.Tensor:
+        """
+        The locations of all grid points, with the shape ``[M, D]``, in the
+        same (row-major) order as the rows of the Kronecker product ``Kuu``.
+        """
+        mesh = tf.meshgrid(*self.grids, indexing="ij")  # D tensors of shape [m_1, ..., m_D]
+        return tf.reshape(tf.stack(mesh, axis=-1), [-1, self.input_dim])  # [M, D]
+
+
+def is_separable(kernel: Kernel) -> bool:
+    """
+    Return `True` if *kernel* is known to factorise over the input dimensions,
+    as required for a Kronecker-structured ``Kuu``: a
+    :class:`~gpflow.kernels.SquaredExponential`, or a
+    :class:`~gpflow.kernels.Product` of stationary kernels that each act on a
+    single input dimension.
+    """
+    if isinstance(kernel, SquaredExponential):
+        return True
+    if isinstance(kernel, Product):
+        active_dims = []
+        for factor in kernel.kernels:
+            if not isinstance(factor, Stationary) or isinstance(factor.active_dims, slice):
+                return False
+            if len(factor.active_dims) != 1:
+                return False
+            active_dims.append(int(factor.active_dims[0]))
+        return len(set(active_dims)) == len(active_dims)
+    return False
+
+
+def grid_kuu_factors(
+    inducing_variable: GridInducingPoints, kernel: Kernel, *, jitter: float = 0.0
+) -> List[tf.Tensor]:
+    """
+    Compute the per-dimension factors ``K_d`` of ``Kuu = K₁ ⊗ … ⊗ K_D``.
+
+    For a stationary kernel ``k(x, x') = ∏_d k_d(x_d, x'_d)``, evaluating
+    *kernel* on the grid along dimension ``d`` (with all other coordinates
+    fixed) gives ``k_d`` up to the constant factor ``c = k(x, x)``; the factors
+    for ``d > 0`` are rescaled by ``1/c`` so that the product is exact.
+
+    :param inducing_variable: The grid of inducing points.
+    :param kernel: A kernel for which :func:`is_separable` holds.
+    :param jitter: A constant added to the diagonal of each factor.
+    :returns: A list of ``D`` tensors with the shapes ``[m_d, m_d]``.
+    """
+    D = inducing_variable.input_dim
+    origin = tf.zeros((1, D), dtype=default_float())
+    scale = kernel(origin, full_cov=False)[0]  # k(x, x)
+
+    factors = []
+    for d, grid in enumerate(inducing_variable.grids):
+        points = grid[:, None] * tf.one_hot(d, D, dtype=grid.dtype)  # [m_d, D]
+        factor = kernel(points)  # [m_d, m_d]
+        factor = factor if d == 0 else factor / scale
+        factors.append(tf.linalg.set_diag(factor, tf.linalg.diag_part(factor) + jitter))
+    return factors
+
+
+def _cubic_convolution_kernel(t: tf.Tensor) -> tf.Tensor:
+    """The cubic convolution kernel of Keys (1981) with ``a = -0.5``."""
+    a = -0.5
+    t = tf.abs(t)
+    near = ((a + 2) * t - (a + 3)) * t * t + 1  # |t| <= 1
+    far = ((a * t - 5 * a) * t + 8 * a) * t - 4 * a  # 1 < |t| < 2
+    return tf.where(t <= 1.0, near, tf.where(t < 2.0, far, tf.zeros_like(t)))
+
+
+def cubic_interpolation_weights(
+    inducing_variable: GridInducingPoints, X: TensorType
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Compute the local cubic interpolation weights of the inputs *X* onto the
+    grid, separately for each dimension. Along each dimension, an input is
+    interpolated from the two grid points on either side of it; the weights
+    for all dimensions together form one row of the sparse matrix ``W`` in
+    ``Kfu ≈ W Kuu``, which is the Kronecker product of the per-dimension weights.
+
+    Inputs that lie outside the grid are interpolated from the nearest grid
+    points at its boundary.
+
+    :param inducing_variable: The grid of inducing points.
+    :param X: The inputs, with the shape ``[N, D]``.
+    :returns: The grid indices (``int32``) and the interpolation weights, both
+        with the shape ``[N, D, 4]``.
+    """
+    lower = tf.constant(inducing_variable.lower, dtype=default_float())
+    spacing = tf.constant(inducing_variable.spacing, dtype=default_float())
+    num_points = tf.constant(inducing_variable.num_points_per_dim, dtype=tf.int32)
+
+    position = (tf.convert_to_tensor(X, dtype=default_float()) - lower) / spacing  # [N, D]
+    base = tf.floor(position)[..., None]  # [N, D, 1]
+    neighbours = base + tf.constant([-1.0, 0.0, 1.0, 2.0], dtype=default_float())  # [N, D, 4]
+    weights = _cubic_convolution_kernel(position[..., None] - neighbours)  # [N, D, 4]
+
+    indices = tf.clip_by_value(tf.cast(neighbours, tf.int32), 0, num_points[:, None] - 1)
+    return indices, weights
+
+
+def interpolate(
+    inducing_variable: GridInducingPoints,
+    X: TensorType,
+    grid_values: TensorType,
+) -> tf.Tensor:
+    """
+    Interpolate *grid_values* from the grid to the inputs *X*, i.e. compute
+    ``W u``, by gathering the :math:`4^D` neighbouring grid values of each input.
+
+    :param inducing_variable: The grid of inducing points.
+    :param X: The inputs, with the shape ``[N, D]``.
+    :param grid_values: The values at the grid points, with the shape ``[M, P]``
+        and in the order of :attr:`GridInducingPoints.Z`.
+    :returns: The interpolated values, with the shape ``[N, P]``.
+    """
+    indices, weights = cubic_interpolation_weights(inducing_variable, X)  # [N, D, 4]
+
+    # Row-major flat grid indices and weights of all 4^D neighbours of each input
+    flat_indices = tf.zeros_like(indices[:, 0, :1])  # [N, 1]
+    flat_weights = tf.ones_like(weights[:, 0, :1])  # [N, 1]
+    for d, m in enumerate(inducing_variable.num_points_per_dim):
+        flat_indices = flat_indices[:, :, None] * m + indices[:, d, None, :]  # [N, K, 4]
+        flat_weights = flat_weights[:, :, None] * weights[:, d, None, :]  # [N, K, 4]
+        flat_indices = tf.reshape(flat_indices, [tf.shape(indices)[0], -1])  # [N, 4K]
+        flat_weights = tf.reshape(flat_weights, [tf.shape(weights)[0], -1])  # [N, 4K]
+
+    neighbour_values = tf.gather(grid_values, flat_indices)  # [N, 4^D, P]
+    return tf.reduce_sum(flat_weights[..., None] * neighbour_values, axis=-2)  # [N, P]
+
+
+def interpolated_quadratic_form(
+    indices: TensorType, weights: TensorType, A: TensorType, *, full_cov: bool = False
+) -> tf.Tensor:
+    """
+    Compute ``w A wᵀ`` for the interpolation weights ``w`` along a single
+    input dimension, as returned by :func:`cubic_interpolation_weights`.
+
+    :param indices: The grid indices along the dimension, with the shape ``[N, 4]``.
+    :param weights: The interpolation weights along the dimension, with the shape ``[N, 4]``.
+    :param A: The matrix on the grid of the dimension, with the shape ``[..., m, m]``.
+    :param full_cov: If `True`, return the full ``[..., N, N]`` matrix; otherwise
+        only its diagonal with the shape ``[..., N]``, which only requires gathering
+        16 entries of ``A`` per input.
+    """
+    m = tf.shape(A)[-1]
+    if full_cov:
+        W = tf.reduce_sum(tf.one_hot(indices, m, dtype=A.dtype) * weights[..., None], axis=-2)
+        return tf.matmul(tf.matmul(W, A), W, transpose_b=True)  # [..., N, N]
+
+    pair_indices = indices[:, :, None] * m + indices[:, None, :]  # [N, 4, 4]
+    A_flat = tf.reshape(A, tf.concat([tf.shape(A)[:-2], [-1]], axis=0))  # [..., m * m]
+    A_neighbours = tf.gather(A_flat, pair_indices, axis=-1)  # [..., N, 4, 4]
+    return tf.einsum("ni,...nij,nj->...n", weights, A_neighbours, weights)  # [..., N]
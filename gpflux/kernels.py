@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+r"""
+This module provides kernels with compact support, whose covariance matrices
+are sparse when the inputs are spread over a domain that is large compared to
+the support (see :mod:`gpflux.covariances`).
+"""
+import tensorflow as tf
+
+from gpflow.base import TensorType
+from gpflow.kernels import IsotropicStationary
+
+
+class Wendland(IsotropicStationary):
+    r"""
+    The piecewise-polynomial (Wendland) kernel with compact support
+    :cite:p:`rasmussen` (eq. 4.21):
+
+    .. math::
+        k(r) = σ² (1 - r)_+^{j + q} f_q(r, j), \qquad j = ⌊D / 2⌋ + q + 1,
+
+    where ``r`` is the Euclidean distance between the inputs scaled by the
+    lengthscales ``ℓ``, so that ``k`` vanishes outside the ellipsoid of radii ``ℓ``.
+    It is positive definite on inputs of dimension up to ``D``, and functions
+    drawn from a GP with this kernel are ``q`` times differentiable.
+    """
+
+    def __init__(self, input_dim: int, smoothness: int = 1, **kwargs):  # type: ignore
+        """
+        :param input_dim: The input dimensionality ``D`` up to which the kernel
+            is positive definite.
+        :param smoothness: The smoothness ``q``, one of 0, 1, 2 or 3.
+        :param kwargs: Passed to :class:`~gpflow.kernels.IsotropicStationary`
+            (``variance``, ``lengthscales``, ``active_dims``, ``name``).
+        """
+        if smoothness not in (0, 1, 2, 3):
+            raise ValueError("`smoothness` must be one of 0, 1, 2 or 3")
+        super().__init__(**kwargs)
+        self.input_dim = input_dim
+        self.smoothness = smoothness
+
+    def K_r(self, r: TensorType) -> tf.Tensor:
+        j = self.input_dim // 2 + self.smoothness + 1
+        q = self.smoothness
+        if q == 0:
+            polynomial = 1.0
+        elif q == 1:
+            polynomial = (j + 1) * r + 1
+        elif q == 2:
+            polynomial = ((j ** 2 + 4 * j + 3) * r ** 2 + (3 * j + 6) * r + 3) / 3
+        else:
+            polynomial = (
+                (j ** 3 + 9 * j ** 2 + 23 * j + 15) * r ** 3
+                + (6 * j ** 2 + 36 * j + 45) * r ** 2
+                + (15 * j + 45) * r
+                + 15
+            ) / 15
+        return self.variance * tf.nn.relu(1.0 - r) ** (j + q) * polynomial
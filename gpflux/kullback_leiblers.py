@@ -0,0 +1,178 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+r"""
+This module provides KL divergences ``KL[q(u)∥p(u)]`` that exploit structure
+which :func:`gpflow.kullback_leiblers.prior_kl` cannot:
+
+- :func:`stochastic_prior_kl` estimates the KL divergence for the
+  non-whitened parameterisation without factorising ``Kuu``: the trace term
+  ``tr(Kuu⁻¹ S)`` is estimated with Hutchinson probes, ``log|Kuu|`` with
+  stochastic Lanczos quadrature, and solves against ``Kuu`` use conjugate
+  gradients. The cost is :math:`O(R k M^2)` for ``R`` probes and ``k``
+  iterations rather than :math:`O(M^3)`.
+- :func:`grid_prior_kl` computes the KL divergence exactly for
+  :class:`~gpflux.inducing_variables.GridInducingPoints`, where both ``Kuu``
+  and the variational covariance are Kronecker products.
+"""
+from typing import NamedTuple, Sequence
+
+import tensorflow as tf
+
+from gpflow import default_jitter
+from gpflow.base import TensorType
+from gpflow.covariances import Kuu
+from gpflow.inducing_variables import InducingVariables
+from gpflow.kernels import Kernel
+
+from gpflux.inducing_variables.grid import GridInducingPoints, grid_kuu_factors
+from gpflux.math import conjugate_gradient_solve, rademacher_probes, stochastic_logdet
+
+
+class StochasticKL(NamedTuple):
+    """The result of :func:`stochastic_prior_kl`."""
+
+    kl: tf.Tensor
+    """ The (unbiased up to solver tolerance) estimate of ``KL[q(u)∥p(u)]``. """
+
+    variance: tf.Tensor
+    """
+    The variance of :attr:`kl`, estimated from the spread of the per-probe
+    estimates. This is zero when only a single probe is used.
+    """
+
+
+def stochastic_prior_kl(
+    inducing_variable: InducingVariables,
+    kernel: Kernel,
+    q_mu: TensorType,
+    q_sqrt: TensorType,
+    *,
+    num_probes: int,
+    num_lanczos_iterations: int = 20,
+    max_cg_iterations: int = 100,
+    cg_tolerance: float = 1e-6,
+) -> StochasticKL:
+    """
+    Estimate ``KL[q(u)∥p(u)]`` for the non-whitened parameterisation, where
+    ``p(u) = N(0, Kuu)`` and ``q(u) = N(q_mu, q_sqrt q_sqrtᵀ)``.
+
+    :param inducing_variable: The inducing variables.
+    :param kernel: The kernel.
+    :param q_mu: The mean of ``q(u)``, with the shape ``[M, L]``.
+    :param q_sqrt: The lower-triangular Cholesky factor of the covariance of
+        ``q(u)``, with the shape ``[L, M, M]``.
+    :param num_probes: The number of Hutchinson probes ``R``. This is the knob
+        that trades off the variance of the estimate against its cost.
+    :param num_lanczos_iterations: The number of Lanczos iterations used to
+        estimate ``log|Kuu|``.
+    :param max_cg_iterations: The maximum number of conjugate gradient iterations.
+    :param cg_tolerance: The relative residual tolerance of the conjugate gradient solves.
+
+    :returns: The estimate and its variance; see :class:`StochasticKL`.
+    """
+    L, M = tf.shape(q_sqrt)[0], tf.shape(q_sqrt)[1]
+
+    Kmm = Kuu(inducing_variable, kernel, jitter=default_jitter())  # [M, M] or [L, M, M]
+    Kmm = tf.broadcast_to(Kmm, tf.stack([L, M, M]))  # [L, M, M]
+    probes = rademacher_probes(tf.stack([L, M, num_probes]), dtype=Kmm.dtype)  # [L, M, R]
+
+    Lq = tf.linalg.band_part(q_sqrt, -1, 0)  # [L, M, M]
+    Lq_probes = tf.matmul(Lq, probes)  # [L, M, R]
+    mean = tf.linalg.adjoint(q_mu)[..., None]  # [L, M, 1]
+
+    rhs = tf.concat([Lq_probes, mean], axis=-1)  # [L, M, R + 1]
+    Kmm_inv_rhs = conjugate_gradient_solve(
+        Kmm, rhs, max_iterations=max_cg_iterations, tolerance=cg_tolerance
+    )  # [L, M, R + 1]
+
+    # Trace term: tr(Kmm⁻¹ S) ≈ (Lq z)ᵀ Kmm⁻¹ (Lq z)
+    trace = tf.reduce_sum(Lq_probes * Kmm_inv_rhs[..., :num_probes], axis=-2)  # [L, R]
+    # Mahalanobis term: μᵀ Kmm⁻¹ μ
+    mahalanobis = tf.reduce_sum(mean * Kmm_inv_rhs[..., num_probes:], axis=-2)  # [L, 1]
+    # Log-determinant terms: log|Kmm| - log|S|
+    logdet_p = stochastic_logdet(
+        Kmm,
+        probes,
+        num_iterations=num_lanczos_iterations,
+        max_cg_iterations=max_cg_iterations,
+        cg_tolerance=cg_tolerance,
+    )  # [L, R]
+    logdet_q = tf.reduce_sum(tf.math.log(tf.square(tf.linalg.diag_part(Lq))), axis=-1)  # [L]
+    constant = tf.cast(M, Kmm.dtype)
+
+    two_kl_per_probe = trace + mahalanobis + logdet_p - logdet_q[:, None] - constant  # [L, R]
+    kl_per_probe = 0.5 * tf.reduce_sum(two_kl_per_probe, axis=0)  # [R]
+
+    kl = tf.reduce_mean(kl_per_probe)
+    variance = tf.math.reduce_variance(kl_per_probe) / max(num_probes - 1, 1)
+    return StochasticKL(kl, variance)
+
+
+def grid_prior_kl(
+    inducing_variable: GridInducingPoints,
+    kernel: Kernel,
+    q_mu: TensorType,
+    q_sqrt_factors: Sequence[TensorType],
+    *,
+    whiten: bool = True,
+) -> tf.Tensor:
+    r"""
+    Compute ``KL[q(u)∥p(u)]`` (or ``KL[q(v)∥p(v)]`` if *whiten* is `True`) for
+    inducing points on a grid, where ``p(u) = N(0, K₁ ⊗ … ⊗ K_D)`` and the
+    covariance of ``q`` is ``S₁ ⊗ … ⊗ S_D`` with ``S_d = q_sqrt_d q_sqrt_dᵀ``.
+
+    All terms decompose over the dimensions, e.g. ``log|S| = Σ_d (M / m_d)
+    log|S_d|``, so the cost is :math:`O(\sum_d m_d^3 + M \sum_d m_d)`.
+
+    :param inducing_variable: The grid of inducing points.
+    :param kernel: A kernel that factorises over the input dimensions.
+    :param q_mu: The mean of ``q``, with the shape ``[M, L]``.
+    :param q_sqrt_factors: The lower-triangular Cholesky factors of the
+        per-dimension covariances of ``q``, with the shapes ``[L, m_d, m_d]``.
+    :param whiten: Whether the whitened parameterisation is used.
+    """
+    M = inducing_variable.num_inducing
+    q_mu = tf.convert_to_tensor(q_mu)
+    q_sqrt_factors = [tf.linalg.band_part(q_sqrt, -1, 0) for q_sqrt in q_sqrt_factors]
+
+    trace = 1.0  # [L]
+    logdet_q = 0.0  # [L]
+    for q_sqrt, m in zip(q_sqrt_factors, inducing_variable.num_points_per_dim):
+        logdet_q += (M / m) * tf.reduce_sum(
+            tf.math.log(tf.square(tf.linalg.diag_part(q_sqrt))), axis=-1
+        )
+    if whiten:
+        for q_sqrt in q_sqrt_factors:
+            trace *= tf.reduce_sum(tf.square(q_sqrt), axis=[-2, -1])
+        mahalanobis = tf.reduce_sum(tf.square(q_mu), axis=0)  # [L]
+        logdet_p = 0.0
+    else:
+        Lp_factors = [
+            tf.linalg.cholesky(K)
+            for K in grid_kuu_factors(inducing_variable, kernel, jitter=default_jitter())
+        ]
+        logdet_p = 0.0
+        for Lp, q_sqrt, m in zip(Lp_factors, q_sqrt_factors, inducing_variable.num_points_per_dim):
+            Lp_inv_q_sqrt = tf.linalg.triangular_solve(Lp, q_sqrt)  # [L, m_d, m_d]
+            trace *= tf.reduce_sum(tf.square(Lp_inv_q_sqrt), axis=[-2, -1])
+            logdet_p += (M / m) * tf.reduce_sum(tf.math.log(tf.square(tf.linalg.diag_part(Lp))))
+        Lp = tf.linalg.LinearOperatorKronecker(
+            [tf.linalg.LinearOperatorLowerTriangular(Lp) for Lp in Lp_factors]
+        )
+        mahalanobis = tf.reduce_sum(tf.square(Lp.solve(q_mu)), axis=0)  # [L]
+
+    two_kl = trace + mahalanobis - M + logdet_p - logdet_q  # [L]
+    return 0.5 * tf.reduce_sum(two_kl)
@@ -17,8 +17,13 @@
 Layers
 """
 from gpflux.layers import basis_functions
+from gpflux.layers.additive_gp_layer import AdditiveGPLayer
 from gpflux.layers.bayesian_dense_layer import BayesianDenseLayer
+from gpflux.layers.collapsed_gp_layer import CollapsedGPLayer
+from gpflux.layers.compact_gp_layer import CompactGPLayer
 from gpflux.layers.gp_layer import GPLayer
+from gpflux.layers.grid_gp_layer import GridGPLayer
 from gpflux.layers.latent_variable_layer import LatentVariableLayer, LayerWithObservations
 from gpflux.layers.likelihood_layer import LikelihoodLayer
+from gpflux.layers.temporal_gp_layer import TemporalGPLayer
 from gpflux.layers.trackable_layer import TrackableLayer
@@ -0,0 +1,284 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`AdditiveGPLayer`, a sparse variational GP layer
+with an additive kernel in which each component has its own small set of
+inducing points.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import Parameter, default_float, default_jitter
+from gpflow.base import TensorType
+from gpflow.kernels import Matern12, Matern32, Matern52, SquaredExponential, Sum
+from gpflow.kullback_leiblers import gauss_kl
+from gpflow.mean_functions import MeanFunction
+from gpflow.utilities.bijectors import triangular
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.inducing_variables.additive import AdditiveInducingPoints
+from gpflux.layers.gp_layer import GPLayer
+from gpflux.sampling.sample import Sample, efficient_sample
+
+_BATCHABLE_KERNELS = (SquaredExponential, Matern12, Matern32, Matern52)
+"""
+Stationary kernels whose covariance is ``variance * f(r²)`` with no further
+hyperparameters, so that components of the same type can be evaluated together.
+"""
+
+
+class AdditiveGPLayer(GPLayer):
+    r"""
+    A sparse variational GP layer for an additive kernel ``k(x, x') = Σ_g
+    k_g(x_g, x'_g)``, where each of the ``G`` components acts on its own
+    (small) group of ``d`` input dimensions, specified by its ``active_dims``.
+    Each output is a sum of independent functions ``f_g(x_g)``, and each
+    component has its own set of ``m`` inducing points in its ``d``-dimensional
+    input space (see :class:`~gpflux.inducing_variables.AdditiveInducingPoints`).
+
+    This allows high-dimensional inputs to be covered with ``G m`` inducing
+    points in total, at a cost of :math:`O(G m^3 + G N m^2)` instead of
+    :math:`O(M^3 + N M^2)` for a single set of ``M`` inducing points. All
+    Cholesky factorisations, conditionals and KL divergences are batched over the
+    components. When all components are of the same type, one of
+    :class:`~gpflow.kernels.SquaredExponential` or the Matérn kernels, the
+    covariances of all components are also evaluated in one batched op on the
+    ``[G, N, d]`` tensor of grouped inputs; other components are evaluated one
+    at a time. The outputs are the same as those of :class:`~gpflux.layers.GPLayer`.
+    """
+
+    q_mu: Parameter
+    r"""
+    The means of ``q(v)`` or ``q(u)`` for each component, with the shape ``[G, m, num_latent_gps]``.
+    """
+
+    q_sqrt: Parameter
+    r"""
+    The lower-triangular Cholesky factors of the covariances of ``q(v)`` or
+    ``q(u)`` for each component, with the shape ``[G, num_latent_gps, m, m]``.
+    """
+
+    def __init__(
+        self,
+        kernel: Sum,
+        inducing_variable: AdditiveInducingPoints,
+        num_data: int,
+        mean_function: Optional[MeanFunction] = None,
+        *,
+        num_latent_gps: int = 1,
+        num_samples: Optional[int] = None,
+        full_cov: bool = False,
+        full_output_cov: bool = False,
+        whiten: bool = True,
+        name: Optional[str] = None,
+        verbose: bool = True,
+    ):
+        """
+        :param kernel: The additive kernel shared by all outputs; a
+            :class:`~gpflow.kernels.Sum` of kernels whose ``active_dims`` are
+            lists of the same length ``d``, e.g.
+            ``Sum([SquaredExponential(active_dims=[i]) for i in range(D)])``.
+        :param inducing_variable: The inducing points of each component, with
+            ``Z`` of the shape ``[G, m, d]``.
+        :param num_data: The number of points in the training dataset (see :attr:`num_data`).
+        :param mean_function: The mean function that will be applied to the
+            inputs. Default: :class:`~gpflow.mean_functions.Identity`.
+        :param num_latent_gps: The number of (independent) outputs of this layer.
+
+        See :class:`~gpflux.layers.GPLayer` for the remaining arguments.
+        """
+        if not isinstance(inducing_variable, AdditiveInducingPoints):
+            raise GPLayerIncompatibilityException(
+                "`inducing_variable` must be a `gpflux.inducing_variables.AdditiveInducingPoints`"
+            )
+        if not isinstance(kernel, Sum):
+            raise GPLayerIncompatibilityException("`kernel` must be a `gpflow.kernels.Sum`")
+        group_size = inducing_variable.Z.shape[-1]
+        for component in kernel.kernels:
+            if isinstance(component.active_dims, slice) or len(component.active_dims) != group_size:
+                raise GPLayerIncompatibilityException(
+                    f"Each component of `kernel` must have `active_dims` of length {group_size}, "
+                    "the input dimensionality of the inducing points"
+                )
+        if len(kernel.kernels) != inducing_variable.num_groups:
+            raise GPLayerIncompatibilityException(
+                f"The number of kernel components ({len(kernel.kernels)}) does not match "
+                f"the number of sets of inducing points ({inducing_variable.num_groups})"
+            )
+
+        # GPLayer.__init__ expects a single set of inducing variables, so we bypass it
+        self._initialise_layer(
+            kernel,
+            inducing_variable,
+            num_data,
+            mean_function,
+            num_samples=num_samples,
+            full_cov=full_cov,
+            full_output_cov=full_output_cov,
+            whiten=whiten,
+            name=name,
+            verbose=verbose,
+        )
+        self.num_latent_gps = num_latent_gps
+
+        G, m = inducing_variable.num_groups, inducing_variable.num_inducing_per_group
+        self.q_mu = Parameter(
+            np.zeros((G, m, num_latent_gps)),
+            dtype=default_float(),
+            name=f"{self.name}_q_mu" if self.name else "q_mu",
+        )  # [G, m, num_latent_gps]
+
+        self.q_sqrt = Parameter(
+            np.tile(np.eye(m), (G, num_latent_gps, 1, 1)),
+            transform=triangular(),
+            dtype=default_float(),
+            name=f"{self.name}_q_sqrt" if self.name else "q_sqrt",
+        )  # [G, num_latent_gps, m, m]
+
+    def _group_inputs(self, inputs: TensorType) -> tf.Tensor:
+        """Returns the inputs of each component, with the shape ``[G, N, d]``."""
+        active_dims = np.stack([k.active_dims for k in self.kernel.kernels])  # [G, d]
+        return tf.transpose(tf.gather(inputs, active_dims, axis=-1), [1, 0, 2])  # [G, N, d]
+
+    def _components_K(
+        self, X: tf.Tensor, X2: Optional[tf.Tensor] = None, *, full_cov: bool = True
+    ) -> tf.Tensor:
+        """
+        Evaluate the covariances of all components on their grouped inputs.
+
+        :param X: The inputs of each component, with the shape ``[G, N, d]``.
+        :param X2: The second inputs of each component, with the shape ``[G, N2, d]``.
+            Default: *X*.
+        :param full_cov: If `False`, return only the diagonal of the covariance of *X*.
+        :returns: The covariances, with the shape ``[G, N, N2]``, or ``[G, N]`` if
+            *full_cov* is `False`.
+        """
+        kernels = self.kernel.kernels
+        kernel_type = type(kernels[0])
+        if kernel_type not in _BATCHABLE_KERNELS or any(type(k) != kernel_type for k in kernels):
+            if not full_cov:
+                return tf.stack([k.K_diag(X[g]) for g, k in enumerate(kernels)])
+            X2 = X if X2 is None else X2
+            return tf.stack([k.K(X[g], X2[g]) for g, k in enumerate(kernels)])
+
+        variances = tf.stack([k.variance for k in kernels])  # [G]
+        if not full_cov:
+            return tf.ones(tf.shape(X)[:-1], dtype=X.dtype) * variances[:, None]  # [G, N]
+
+        d = X.shape[-1]
+        lengthscales = tf.stack([tf.broadcast_to(k.lengthscales, [d]) for k in kernels])
+        X = X / lengthscales[:, None, :]  # [G, N, d]
+        X2 = X if X2 is None else X2 / lengthscales[:, None, :]  # [G, N2, d]
+        r2 = (
+            tf.reduce_sum(tf.square(X), axis=-1)[:, :, None]
+            + tf.reduce_sum(tf.square(X2), axis=-1)[:, None, :]
+            - 2 * tf.matmul(X, X2, transpose_b=True)
+        )  # [G, N, N2]
+        # K_r2 scales by the variance of the first component; swap in the variance of each
+        unit_K = kernels[0].K_r2(tf.maximum(r2, 0.0)) / kernels[0].variance
+        return variances[:, None, None] * unit_K
+
+    def _Kuu(self) -> tf.Tensor:
+        """Returns ``Kuu`` of all components, with the shape ``[G, m, m]``."""
+        Kuu = self._components_K(self.inducing_variable.Z)  # [G, m, m]
+        return Kuu + default_jitter() * tf.eye(tf.shape(Kuu)[-1], dtype=Kuu.dtype)
+
+    def predict(
+        self,
+        inputs: TensorType,
+        *,
+        full_cov: bool = False,
+        full_output_cov: bool = False,
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Make a prediction at N test inputs for the Q outputs of this layer,
+        including the mean function contribution. The shapes of the
+        (co)variance are the same as for :meth:`GPLayer.predict`.
+
+        The means and covariances of the independent components are summed.
+        Inputs with leading dimensions, such as ``[S, N, D]``, are flattened
+        (see :meth:`~GPLayer._predict_flattened`), which requires *full_cov* to be `False`.
+        """
+        if full_cov and full_output_cov:
+            raise NotImplementedError(
+                "The combination of both `full_cov` and `full_output_cov` is not permitted."
+            )
+        if tf.convert_to_tensor(inputs).shape.rank > 2:
+            return self._predict_flattened(
+                inputs, full_cov=full_cov, full_output_cov=full_output_cov
+            )
+
+        X = self._group_inputs(inputs)  # [G, N, d]
+        Kuf = self._components_K(self.inducing_variable.Z, X)  # [G, m, N]
+        Kff = self._components_K(X, full_cov=full_cov)  # [G, N, N] or [G, N]
+
+        Lu = tf.linalg.cholesky(self._Kuu())  # [G, m, m]
+        Lu_inv_Kuf = tf.linalg.triangular_solve(Lu, Kuf, lower=True)  # [G, m, N]
+        A = Lu_inv_Kuf
+        if not self.whiten:
+            A = tf.linalg.triangular_solve(tf.linalg.adjoint(Lu), A, lower=False)
+
+        mean = tf.einsum("gmn,gmq->nq", A, self.q_mu)  # [N, Q]
+
+        q_sqrt = tf.linalg.band_part(self.q_sqrt, -1, 0)  # [G, Q, m, m]
+        LtA = tf.matmul(q_sqrt, A[:, None], transpose_a=True)  # [G, Q, m, N]
+        if full_cov:
+            Qff = tf.matmul(Lu_inv_Kuf, Lu_inv_Kuf, transpose_a=True)  # [G, N, N]
+            prior_cov = tf.reduce_sum(Kff - Qff, axis=0)  # [N, N]
+            cov = prior_cov + tf.reduce_sum(tf.matmul(LtA, LtA, transpose_a=True), axis=0)
+        else:
+            Qff = tf.reduce_sum(tf.square(Lu_inv_Kuf), axis=-2)  # [G, N]
+            prior_var = tf.reduce_sum(Kff - Qff, axis=0)  # [N]
+            var = prior_var + tf.reduce_sum(tf.square(LtA), axis=[0, 2])  # [Q, N]
+            cov = tf.linalg.adjoint(var)  # [N, Q]
+            if full_output_cov:
+                cov = tf.linalg.diag(cov)  # [N, Q, Q]
+
+        return mean + self.mean_function(inputs), cov
+
+    def prior_kl(self) -> tf.Tensor:
+        r"""
+        Returns the sum over the components of the KL divergences
+        ``KL[q(u)∥p(u)]`` from the prior ``p(u)`` to the variational
+        distribution ``q(u)``, or of ``KL[q(v)∥p(v)]`` if this layer uses the
+        :attr:`whiten`\ ed representation. This is evaluated in one batched
+        call, treating each (component, output) pair as a separate latent GP.
+        """
+        G, Q = self.inducing_variable.num_groups, self.num_latent_gps
+        m = self.inducing_variable.num_inducing_per_group
+        q_mu = tf.reshape(tf.transpose(self.q_mu, [1, 0, 2]), [m, G * Q])  # [m, G Q]
+        q_sqrt = tf.reshape(self.q_sqrt, [G * Q, m, m])  # [G Q, m, m]
+        K = None if self.whiten else tf.repeat(self._Kuu(), Q, axis=0)  # [G Q, m, m]
+        return gauss_kl(q_mu, q_sqrt, K)
+
+    def sample(self) -> Sample:
+        """
+        Draw a consistent function sample from this layer, see
+        :func:`~gpflux.sampling.sample.efficient_sample`.
+        """
+        return (
+            efficient_sample(
+                self.inducing_variable,
+                self.kernel,
+                self.q_mu,
+                q_sqrt=self.q_sqrt,
+                whiten=self.whiten,
+            )
+            + self.mean_function
+        )
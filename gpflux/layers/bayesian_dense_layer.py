@@ -159,9 +159,8 @@ class BayesianDenseLayer(TrackableLayer):
         else:
             w = self.w_mu[:, None] + self.w_sqrt[:, None] * z  # [dim, S]
 
-        N = tf.shape(inputs)[0]
         inputs_concat_1 = tf.concat(
-            (inputs, tf.ones((N, 1), dtype=default_float())), axis=-1
+            (inputs, tf.ones_like(inputs[..., :1], dtype=default_float())), axis=-1
         )  # [N, D+1]
         samples = tf.tensordot(
             inputs_concat_1,
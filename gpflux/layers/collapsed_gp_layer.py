@@ -0,0 +1,253 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`CollapsedGPLayer`, a final GP layer for Gaussian
+likelihoods whose variational distribution is computed in closed form instead
+of being learned.
+"""
+
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import default_float, default_jitter
+from gpflow.base import TensorType
+from gpflow.covariances import Kuf, Kuu
+from gpflow.inducing_variables import (
+    MultioutputInducingVariables,
+    SeparateIndependentInducingVariables,
+    SharedIndependentInducingVariables,
+)
+from gpflow.kernels import MultioutputKernel, SeparateIndependent, SharedIndependent
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import MeanFunction
+
+from gpflux.layers.gp_layer import GPLayer
+from gpflux.layers.latent_variable_layer import LayerWithObservations
+from gpflux.types import ObservationType
+
+
+class CollapsedGPLayer(GPLayer, LayerWithObservations):
+    r"""
+    A :class:`~gpflux.layers.GPLayer` for the last layer of a
+    :class:`~gpflux.models.DeepGP` with a :class:`~gpflow.likelihoods.Gaussian`
+    likelihood. Given the inputs ``h`` of this layer (the outputs of the
+    previous layers), the optimal ``q(u)`` of the ELBO is Gaussian and
+    available in closed form :cite:p:`titsias2009variational`:
+
+    .. math::
+
+        q(u) = N(σ⁻² Kuu Σ Kuf (y - m(h)), Kuu Σ Kuu), \quad
+        Σ = (Kuu + σ⁻² Kuf Kfu)⁻¹.
+
+    When training, calling this layer computes this ``q(u)`` from the
+    minibatch (and from the samples of ``h`` propagated by
+    :attr:`~gpflux.models.DeepGP.num_samples`), with ``Kuf Kfu`` and ``Kuf (y
+    - m(h))`` scaled up to :attr:`num_data` points, and assigns it to
+    :attr:`q_mu` and :attr:`q_sqrt` before adding the KL divergence to the
+    losses as usual. :attr:`q_mu` and :attr:`q_sqrt` are therefore not
+    trainable, and only the hyperparameters, the inducing variable and the
+    previous layers are trained. As ``q(u)`` maximises the minibatch ELBO,
+    its gradients with respect to all other parameters are the gradients of
+    the collapsed bound, even though no gradients flow through ``q(u)``.
+
+    With a non-zero :attr:`statistics_decay`, ``q(u)`` is instead computed
+    from exponential moving averages of the minibatch statistics ``Kuf Kfu``
+    and ``Kuf (y - m(h))``, which reduces the noise of ``q(u)`` at the cost of
+    a bias from the statistics of previous hyperparameters. After training,
+    :meth:`assign_optimal_q_u` can compute ``q(u)`` from the whole dataset
+    for making predictions.
+
+    This layer is only implemented for
+    :class:`~gpflow.kernels.SharedIndependent` and
+    :class:`~gpflow.kernels.SeparateIndependent` kernels and inducing
+    variables. Do not train its variational distribution with
+    :class:`~gpflux.optimization.NatGradModel`.
+    """
+
+    likelihood: Gaussian
+    """
+    The likelihood of the :class:`~gpflux.models.DeepGP`, whose variance is
+    the noise variance ``σ²`` in ``q(u)``. This should be the same object as
+    the likelihood of the :class:`~gpflux.layers.LikelihoodLayer`.
+    """
+
+    statistics_decay: float
+    """
+    The decay of the exponential moving averages of the statistics from which
+    ``q(u)`` is computed when training. If ``0.0`` (the default), ``q(u)`` is
+    computed from the current minibatch only.
+    """
+
+    # q(u) is assigned in closed form when training, not trained
+    _trainable_q_u = False
+
+    def __init__(
+        self,
+        kernel: MultioutputKernel,
+        inducing_variable: MultioutputInducingVariables,
+        num_data: int,
+        likelihood: Gaussian,
+        mean_function: Optional[MeanFunction] = None,
+        *,
+        statistics_decay: float = 0.0,
+        **kwargs: Any,
+    ):
+        """
+        :param kernel: The multioutput kernel for this layer.
+        :param inducing_variable: The inducing features for this layer.
+        :param num_data: The number of points in the training dataset (see
+            :attr:`~gpflux.layers.GPLayer.num_data`).
+        :param likelihood: The Gaussian likelihood of the model; see the
+            :attr:`likelihood` attribute.
+        :param mean_function: The mean function that will be applied to the
+            inputs; see :class:`~gpflux.layers.GPLayer`.
+        :param statistics_decay: The decay of the moving averages of the
+            statistics, in ``[0, 1)``; see the :attr:`statistics_decay` attribute.
+        :param kwargs: The keyword arguments of :class:`~gpflux.layers.GPLayer`.
+        """
+        if not isinstance(likelihood, Gaussian):
+            raise ValueError("`CollapsedGPLayer` requires a `Gaussian` likelihood")
+        if not (
+            isinstance(kernel, (SharedIndependent, SeparateIndependent))
+            and isinstance(
+                inducing_variable,
+                (SharedIndependentInducingVariables, SeparateIndependentInducingVariables),
+            )
+        ):
+            raise NotImplementedError(
+                "`CollapsedGPLayer` is only implemented for `SharedIndependent` or "
+                "`SeparateIndependent` kernels and inducing variables"
+            )
+        if not 0.0 <= statistics_decay < 1.0:
+            raise ValueError("`statistics_decay` must be in [0, 1)")
+
+        super().__init__(kernel, inducing_variable, num_data, mean_function, **kwargs)
+        self.likelihood = likelihood
+        self.statistics_decay = statistics_decay
+
+        if statistics_decay > 0.0:
+            num_inducing = self.q_mu.shape[0]
+            # Kuu and Kuf are shared by all latent GPs only if both the kernel
+            # and the inducing variable are
+            shared = isinstance(kernel, SharedIndependent) and isinstance(
+                inducing_variable, SharedIndependentInducingVariables
+            )
+            num_kernels = 1 if shared else self.num_latent_gps
+            self._kuf_kfu_average = tf.Variable(
+                np.zeros((num_kernels, num_inducing, num_inducing)),
+                dtype=default_float(),
+                trainable=False,
+            )  # [L or 1, M, M]
+            self._kuf_residuals_average = tf.Variable(
+                np.zeros((self.num_latent_gps, num_inducing, 1)),
+                dtype=default_float(),
+                trainable=False,
+            )  # [L, M, 1]
+            self._num_updates = tf.Variable(0.0, dtype=default_float(), trainable=False)
+
+    def call(
+        self,
+        inputs: TensorType,
+        observations: Optional[ObservationType] = None,
+        training: Optional[bool] = None,
+    ) -> tf.Tensor:
+        """
+        When training (``training=True``) with *observations*, assign the
+        optimal ``q(u)`` given *inputs* and the targets in *observations*
+        before calling :meth:`~gpflux.layers.GPLayer.call`.
+        """
+        if training and observations is not None:
+            inputs = tf.convert_to_tensor(inputs)
+            kuf_kfu, kuf_residuals = self._statistics(inputs, observations[1])
+            if self.statistics_decay > 0.0:
+                kuf_kfu, kuf_residuals = self._update_averages(kuf_kfu, kuf_residuals)
+            self._assign_q_u(kuf_kfu, kuf_residuals)
+        return super().call(inputs, training=training)
+
+    def assign_optimal_q_u(self, inputs: TensorType, targets: TensorType) -> None:
+        """
+        Assign the optimal ``q(u)`` given all :attr:`~gpflux.layers.GPLayer.num_data`
+        *inputs* of this layer and *targets*, e.g. to make predictions after
+        training with minibatches.
+
+        :param inputs: The inputs of this layer, with the shape ``[..., N, D]``.
+        :param targets: The targets, with the shape ``[N, Q]``.
+        """
+        self._assign_q_u(*self._statistics(tf.convert_to_tensor(inputs), targets))
+
+    def _statistics(self, inputs: TensorType, targets: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Return ``Kuf Kfu`` ``[L or 1, M, M]`` and ``Kuf (y - m(h))`` ``[L, M, 1]``
+        for the *inputs* ``h`` ``[..., N, D]`` and *targets* ``y`` ``[N, Q]``,
+        scaled from the number of rows of *inputs* to :attr:`num_data`.
+        """
+        # broadcast the targets over any leading sample dimensions, and flatten both
+        targets_shape = tf.concat([tf.shape(inputs)[:-1], tf.shape(targets)[-1:]], axis=0)
+        targets = tf.reshape(tf.broadcast_to(targets, targets_shape), [-1, targets.shape[-1]])
+        inputs = tf.reshape(inputs, [-1, inputs.shape[-1]])  # [N', D]
+        residuals = tf.linalg.adjoint(targets - self.mean_function(inputs))[..., None]  # [L, N', 1]
+
+        Kuf_ = Kuf(self.inducing_variable, self.kernel, inputs)  # [M, N'] or [L, M, N']
+        if Kuf_.shape.rank == 2:
+            Kuf_ = Kuf_[None]  # [1, M, N']
+        scale = self.num_data / tf.cast(tf.shape(inputs)[0], default_float())
+        kuf_kfu = scale * tf.matmul(Kuf_, Kuf_, transpose_b=True)  # [L or 1, M, M]
+        kuf_residuals = scale * tf.matmul(Kuf_, residuals)  # [L, M, 1]
+        return kuf_kfu, kuf_residuals
+
+    def _update_averages(
+        self, kuf_kfu: TensorType, kuf_residuals: TensorType
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Update the moving averages with the statistics of the current
+        minibatch, and return their bias-corrected values.
+        """
+        decay = self.statistics_decay
+        self._kuf_kfu_average.assign(decay * self._kuf_kfu_average + (1 - decay) * kuf_kfu)
+        self._kuf_residuals_average.assign(
+            decay * self._kuf_residuals_average + (1 - decay) * kuf_residuals
+        )
+        self._num_updates.assign_add(1.0)
+        correction = 1 - decay ** self._num_updates
+        return self._kuf_kfu_average / correction, self._kuf_residuals_average / correction
+
+    def _assign_q_u(self, kuf_kfu: TensorType, kuf_residuals: TensorType) -> None:
+        """
+        Assign the optimal ``q(u)`` (or ``q(v)``, if :attr:`whiten`) for the
+        statistics ``Kuf Kfu`` and ``Kuf (y - m(h))`` to :attr:`q_mu` and :attr:`q_sqrt`.
+        """
+        noise_variance = self.likelihood.variance
+        Lu = tf.linalg.cholesky(Kuu(self.inducing_variable, self.kernel, jitter=default_jitter()))
+        if Lu.shape.rank == 2:
+            Lu = Lu[None]  # [1, M, M]
+        # In terms of v = Lu⁻¹ u, with the prior p(v) = N(0, I), the likelihood
+        # contributes the precision Lu⁻¹ Kuf Kfu Lu⁻ᵀ / σ² to q(v) = N(P⁻¹ Lu⁻¹ Kuf r / σ², P⁻¹).
+        A = tf.linalg.triangular_solve(Lu, kuf_kfu)  # Lu⁻¹ Kuf Kfu
+        A = tf.linalg.triangular_solve(Lu, tf.linalg.adjoint(A))  # Lu⁻¹ Kuf Kfu Lu⁻ᵀ
+        identity = tf.eye(tf.shape(Lu)[-1], dtype=Lu.dtype)
+        L_precision = tf.linalg.cholesky(identity + A / noise_variance)  # [L or 1, M, M]
+        cov = tf.linalg.cholesky_solve(L_precision, identity)  # P⁻¹
+        q_sqrt = tf.linalg.cholesky(cov)  # [L or 1, M, M]
+        q_mu = tf.linalg.triangular_solve(Lu, kuf_residuals) / noise_variance  # [L, M, 1]
+        q_mu = tf.linalg.cholesky_solve(L_precision, q_mu)
+        if not self.whiten:
+            q_mu = tf.matmul(Lu, q_mu)  # u = Lu v
+            q_sqrt = tf.matmul(Lu, q_sqrt)
+
+        self.q_mu.assign(tf.linalg.adjoint(q_mu[..., 0]))  # [M, L]
+        self.q_sqrt.assign(tf.broadcast_to(q_sqrt, self.q_sqrt.shape))  # [L, M, M]
@@ -0,0 +1,181 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`CompactGPLayer`, a sparse variational GP layer for
+kernels with compact support, which computes its covariances between inputs
+and inducing points as sparse matrices.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import Parameter, default_float, default_jitter
+from gpflow.base import TensorType
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kullback_leiblers import gauss_kl
+from gpflow.mean_functions import MeanFunction
+from gpflow.utilities.bijectors import triangular
+
+from gpflux.covariances import neighbour_Kfu, sparse_Kuu
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.kernels import Wendland
+from gpflux.layers.gp_layer import GPLayer
+
+
+class CompactGPLayer(GPLayer):
+    """
+    A sparse variational GP layer with a compactly supported
+    :class:`~gpflux.kernels.Wendland` kernel, shared by all outputs, and
+    inducing points. Each input only interacts with the ``R`` inducing points
+    within the support of the kernel, found with a neighbour index (see
+    :mod:`gpflux.covariances`), so that ``Kuf`` and ``Kuu`` are sparse and the
+    memory and cost of the input-dependent terms of the predictions are
+    :math:`O(N R^2)` rather than :math:`O(N M)`.
+
+    ``Kuu`` is factorised densely (TensorFlow has no differentiable sparse
+    Cholesky decomposition), at the same :math:`O(M^2)` memory as
+    :attr:`q_sqrt`. Only marginal predictions are supported (``full_cov=False``);
+    :meth:`sample` uses the generic (dense) conditional of :class:`GPLayer`.
+    """
+
+    def __init__(
+        self,
+        kernel: Wendland,
+        inducing_variable: InducingPoints,
+        num_data: int,
+        mean_function: Optional[MeanFunction] = None,
+        *,
+        num_latent_gps: int = 1,
+        num_samples: Optional[int] = None,
+        full_output_cov: bool = False,
+        whiten: bool = True,
+        name: Optional[str] = None,
+        verbose: bool = True,
+    ):
+        """
+        :param kernel: The compactly supported kernel shared by all outputs.
+        :param inducing_variable: The inducing points, with ``Z`` of the shape ``[M, D]``.
+        :param num_data: The number of points in the training dataset (see :attr:`num_data`).
+        :param mean_function: The mean function that will be applied to the
+            inputs. Default: :class:`~gpflow.mean_functions.Identity`.
+        :param num_latent_gps: The number of (independent) outputs of this layer.
+
+        See :class:`~gpflux.layers.GPLayer` for the remaining arguments.
+        """
+        if not isinstance(kernel, Wendland):
+            raise GPLayerIncompatibilityException(
+                "`kernel` must be a compactly supported `gpflux.kernels.Wendland` kernel"
+            )
+        if not isinstance(inducing_variable, InducingPoints):
+            raise GPLayerIncompatibilityException(
+                "`inducing_variable` must be a `gpflow.inducing_variables.InducingPoints`"
+            )
+
+        # GPLayer.__init__ requires a multioutput kernel, so we bypass it
+        self._initialise_layer(
+            kernel,
+            inducing_variable,
+            num_data,
+            mean_function,
+            num_samples=num_samples,
+            full_output_cov=full_output_cov,
+            whiten=whiten,
+            name=name,
+            verbose=verbose,
+        )
+        self.num_latent_gps = num_latent_gps
+
+        num_inducing = inducing_variable.Z.shape[0]
+        self.q_mu = Parameter(
+            np.zeros((num_inducing, num_latent_gps)),
+            dtype=default_float(),
+            name=f"{self.name}_q_mu" if self.name else "q_mu",
+        )  # [num_inducing, num_latent_gps]
+
+        self.q_sqrt = Parameter(
+            np.tile(np.eye(num_inducing), (num_latent_gps, 1, 1)),
+            transform=triangular(),
+            dtype=default_float(),
+            name=f"{self.name}_q_sqrt" if self.name else "q_sqrt",
+        )  # [num_latent_gps, num_inducing, num_inducing]
+
+    def _Kuu(self) -> tf.Tensor:
+        """Returns the dense ``Kuu`` (with jitter), assembled from its sparse form."""
+        return tf.sparse.to_dense(
+            sparse_Kuu(self.inducing_variable, self.kernel, jitter=default_jitter())
+        )
+
+    def predict(
+        self,
+        inputs: TensorType,
+        *,
+        full_cov: bool = False,
+        full_output_cov: bool = False,
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Make a prediction at N test inputs for the Q outputs of this layer,
+        including the mean function contribution. The shapes of the variance
+        are the same as for :meth:`GPLayer.predict`; *full_cov* is not supported.
+        Inputs with leading dimensions, such as ``[S, N, D]``, are flattened
+        (see :meth:`~GPLayer._predict_flattened`).
+        """
+        if full_cov:
+            raise NotImplementedError("`CompactGPLayer` only supports marginal predictions")
+        if tf.convert_to_tensor(inputs).shape.rank > 2:
+            return self._predict_flattened(inputs, full_output_cov=full_output_cov)
+
+        indices, Kfu = neighbour_Kfu(self.inducing_variable, self.kernel, inputs)  # [N, R]
+        Lu = tf.linalg.cholesky(self._Kuu())  # [M, M]
+
+        # premultiply the mean and Cholesky factor of q(u) by Kuu⁻¹
+        q_sqrt = tf.linalg.band_part(self.q_sqrt, -1, 0)  # [Q, M, M]
+        if self.whiten:
+            weights = tf.linalg.triangular_solve(tf.linalg.adjoint(Lu), self.q_mu, lower=False)
+            q_sqrt = tf.linalg.triangular_solve(tf.linalg.adjoint(Lu), q_sqrt, lower=False)
+        else:
+            weights = tf.linalg.cholesky_solve(Lu, self.q_mu)  # [M, Q]
+            q_sqrt = tf.linalg.cholesky_solve(Lu, q_sqrt)  # [Q, M, M]
+        mean = tf.einsum("nr,nrq->nq", Kfu, tf.gather(weights, indices))  # [N, Q]
+
+        # var = Kff - Kfu Kuu⁻¹ Kuf + Kfu Kuu⁻¹ S Kuu⁻¹ Kuf, restricted to the neighbours
+        Kuu_inv = tf.linalg.cholesky_solve(Lu, tf.eye(tf.shape(Lu)[0], dtype=Lu.dtype))
+        B = tf.matmul(q_sqrt, q_sqrt, transpose_b=True) - Kuu_inv  # [Q, M, M]
+        R = tf.shape(indices)[1]
+        pairs = tf.stack(
+            [
+                tf.repeat(indices[:, :, None], R, axis=2),
+                tf.repeat(indices[:, None, :], R, axis=1),
+            ],
+            axis=-1,
+        )  # [N, R, R, 2]
+        B_neighbours = tf.gather_nd(tf.transpose(B, [1, 2, 0]), pairs)  # [N, R, R, Q]
+        var = self.kernel.K_diag(inputs)[:, None] + tf.einsum(
+            "nr,nrsq,ns->nq", Kfu, B_neighbours, Kfu
+        )  # [N, Q]
+        if full_output_cov:
+            var = tf.linalg.diag(var)  # [N, Q, Q]
+
+        return mean + self.mean_function(inputs), var
+
+    def prior_kl(self) -> tf.Tensor:
+        r"""
+        Returns the KL divergence ``KL[q(u)∥p(u)]`` from the prior ``p(u)`` to
+        the variational distribution ``q(u)``, or ``KL[q(v)∥p(v)]`` if this
+        layer uses the :attr:`whiten`\ ed representation.
+        """
+        return gauss_kl(self.q_mu, self.q_sqrt, None if self.whiten else self._Kuu())
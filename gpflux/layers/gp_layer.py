@@ -24,18 +24,36 @@ from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 import tensorflow as tf
 import tensorflow_probability as tfp
+from tensorflow_probability.python.util.deferred_tensor import TensorMetaClass
 
-from gpflow import Parameter, default_float
+from gpflow import Parameter, default_float, default_jitter
 from gpflow.base import TensorType
 from gpflow.conditionals import conditional
-from gpflow.inducing_variables import MultioutputInducingVariables
-from gpflow.kernels import MultioutputKernel
+from gpflow.covariances import Kuf, Kuu
+from gpflow.expectations import expectation
+from gpflow.inducing_variables import (
+    InducingPoints,
+    InducingVariables,
+    MultioutputInducingVariables,
+    SeparateIndependentInducingVariables,
+    SharedIndependentInducingVariables,
+)
+from gpflow.kernels import (
+    Kernel,
+    LinearCoregionalization,
+    MultioutputKernel,
+    SeparateIndependent,
+    SharedIndependent,
+    SquaredExponential,
+)
 from gpflow.kullback_leiblers import prior_kl
-from gpflow.mean_functions import Identity, MeanFunction
+from gpflow.mean_functions import Constant, Identity, Linear, MeanFunction
+from gpflow.probability_distributions import DiagonalGaussian
 from gpflow.utilities.bijectors import triangular
 
 from gpflux.exceptions import GPLayerIncompatibilityException
-from gpflux.math import _cholesky_with_jitter
+from gpflux.kullback_leiblers import StochasticKL, stochastic_prior_kl
+from gpflux.math import _cholesky_with_jitter, unique_rows
 from gpflux.runtime_checks import verify_compatibility
 from gpflux.sampling.sample import Sample, efficient_sample
 
@@ -87,6 +105,52 @@ class GPLayer(tfp.layers.DistributionLambda):
     If `True`, predict or sample with the full covariance over the outputs.
     """
 
+    low_rank_cov: bool
+    """
+    If `True`, calling this layer represents the covariance over the inputs as
+    diagonal plus low-rank (see :meth:`predict_low_rank_cov`) instead of a
+    dense matrix, so that no ``[N, N]`` Cholesky factorisation is needed to
+    sample from it. This requires ``full_cov=True`` and ``full_output_cov=False``.
+    """
+
+    tensor_outputs: bool
+    """
+    If `True`, calling this layer returns a lightweight :class:`GPLayerOutputs`
+    structure of tensors (the marginal means, variances and samples) instead of
+    a `tfp.distributions.MultivariateNormalDiag` wrapped by
+    `tfp.layers.DistributionLambda`. This avoids the overhead of constructing
+    distribution objects in every call, e.g. for latency-sensitive
+    prediction with small batches, and requires
+    ``full_cov=full_output_cov=False``.
+    """
+
+    deduplicate_inputs: bool
+    """
+    If `True`, calling this layer evaluates :meth:`predict` only at the
+    distinct rows of its inputs and gathers the means and variances back to
+    all rows, so that the cost of ``Kuf`` and the variances is proportional to
+    the number of distinct rows (for example, for categorical features, or
+    for the inputs broadcast over the Monte Carlo samples by
+    :attr:`~gpflux.models.DeepGP.num_samples`). The samples are still drawn
+    independently for each row. Gradients with respect to the inputs only
+    flow through the first occurrence of each row, which is exact for data
+    inputs. This requires ``full_cov=False``.
+    """
+
+    num_kl_probes: Optional[int]
+    """
+    The number of Hutchinson probes used to estimate the KL divergence in the
+    non-whitened parameterisation (see :meth:`stochastic_prior_kl`). If `None`,
+    the KL divergence is computed exactly, which requires a Cholesky
+    decomposition of ``Kuu``.
+    """
+
+    _mean_weights_cache: Optional["_MeanWeightsCache"] = None
+
+    # whether `q_mu` and `q_sqrt` are created as trainable variables; Keras
+    # collects the weights of a layer by their trainability when they are set
+    _trainable_q_u: bool = True
+
     q_mu: Parameter
     r"""
     The mean of ``q(v)`` or ``q(u)`` (depending on whether :attr:`whiten`\ ed
@@ -109,8 +173,12 @@ class GPLayer(tfp.layers.DistributionLambda):
         num_samples: Optional[int] = None,
         full_cov: bool = False,
         full_output_cov: bool = False,
+        low_rank_cov: bool = False,
+        tensor_outputs: bool = False,
+        deduplicate_inputs: bool = False,
         num_latent_gps: int = None,
         whiten: bool = True,
+        num_kl_probes: Optional[int] = None,
         name: Optional[str] = None,
         verbose: bool = True,
     ):
@@ -144,6 +212,14 @@ class GPLayer(tfp.layers.DistributionLambda):
             If `False` (the default), only predict marginals (diagonal
             of covariance) with respect to outputs.
             If `True`, predict full covariance over outputs.
+        :param low_rank_cov: Whether to use a diagonal-plus-low-rank covariance
+            over the inputs (:attr:`low_rank_cov` attribute). Requires *full_cov*
+            to be `True` and *full_output_cov* to be `False`.
+        :param tensor_outputs: Whether calling this layer returns a
+            :class:`GPLayerOutputs` instead of a distribution (:attr:`tensor_outputs`
+            attribute).
+        :param deduplicate_inputs: Whether calling this layer evaluates only
+            the distinct rows of its inputs (:attr:`deduplicate_inputs` attribute).
         :param num_latent_gps: The number of (latent) GPs in the layer
             (which can be different from the number of outputs, e.g. with a
             :class:`~gpflow.kernels.LinearCoregionalization` kernel).
@@ -152,42 +228,34 @@ class GPLayer(tfp.layers.DistributionLambda):
             If possible, it is inferred from the *kernel* and *inducing_variable*.
         :param whiten: If `True` (the default), uses the whitened parameterisation
             of the inducing variables; see :attr:`whiten`.
+        :param num_kl_probes: If not `None`, estimate the KL divergence
+            stochastically using this many probes instead of computing it
+            exactly; see :attr:`num_kl_probes`. Only supported when *whiten* is `False`.
         :param name: The name of this layer.
         :param verbose: The verbosity mode. Set this parameter to `True`
             to show debug information.
         """
 
-        super().__init__(
-            make_distribution_fn=self._make_distribution_fn,
-            convert_to_tensor_fn=self._convert_to_tensor_fn,
-            dtype=default_float(),
+        self._initialise_layer(
+            kernel,
+            inducing_variable,
+            num_data,
+            mean_function,
+            num_samples=num_samples,
+            full_cov=full_cov,
+            full_output_cov=full_output_cov,
+            low_rank_cov=low_rank_cov,
+            tensor_outputs=tensor_outputs,
+            deduplicate_inputs=deduplicate_inputs,
+            whiten=whiten,
+            num_kl_probes=num_kl_probes,
             name=name,
+            verbose=verbose,
         )
 
-        self.kernel = kernel
-        self.inducing_variable = inducing_variable
-
-        self.num_data = num_data
-
-        if mean_function is None:
-            mean_function = Identity()
-            if verbose:
-                warnings.warn(
-                    "Beware, no mean function was specified in the construction of the `GPLayer` "
-                    "so the default `gpflow.mean_functions.Identity` is being used. "
-                    "This mean function will only work if the input dimensionality "
-                    "matches the number of latent Gaussian processes in the layer."
-                )
-        self.mean_function = mean_function
-
-        self.full_output_cov = full_output_cov
-        self.full_cov = full_cov
-        self.whiten = whiten
-        self.verbose = verbose
-
         try:
             num_inducing, self.num_latent_gps = verify_compatibility(
-                kernel, mean_function, inducing_variable
+                kernel, self.mean_function, inducing_variable
             )
             # TODO: if num_latent_gps is not None, verify it is equal to self.num_latent_gps
         except GPLayerIncompatibilityException as e:
@@ -210,6 +278,7 @@ class GPLayer(tfp.layers.DistributionLambda):
 
         self.q_mu = Parameter(
             np.zeros((num_inducing, self.num_latent_gps)),
+            trainable=self._trainable_q_u,
             dtype=default_float(),
             name=f"{self.name}_q_mu" if self.name else "q_mu",
         )  # [num_inducing, num_latent_gps]
@@ -217,10 +286,81 @@ class GPLayer(tfp.layers.DistributionLambda):
         self.q_sqrt = Parameter(
             np.stack([np.eye(num_inducing) for _ in range(self.num_latent_gps)]),
             transform=triangular(),
+            trainable=self._trainable_q_u,
             dtype=default_float(),
             name=f"{self.name}_q_sqrt" if self.name else "q_sqrt",
         )  # [num_latent_gps, num_inducing, num_inducing]
 
+    def _initialise_layer(
+        self,
+        kernel: Kernel,
+        inducing_variable: InducingVariables,
+        num_data: int,
+        mean_function: Optional[MeanFunction],
+        *,
+        num_samples: Optional[int] = None,
+        full_cov: bool = False,
+        full_output_cov: bool = False,
+        low_rank_cov: bool = False,
+        tensor_outputs: bool = False,
+        deduplicate_inputs: bool = False,
+        whiten: bool = True,
+        num_kl_probes: Optional[int] = None,
+        name: Optional[str] = None,
+        verbose: bool = True,
+    ) -> None:
+        """
+        Initialise the Keras layer and set and validate the attributes shared
+        by this class and its subclasses, everything except the variational
+        parameters. Subclasses whose variational parameters are structured
+        differently call this instead of :meth:`__init__`. See :meth:`__init__`
+        for the arguments.
+        """
+        super().__init__(
+            make_distribution_fn=self._make_distribution_fn,
+            convert_to_tensor_fn=self._convert_to_tensor_fn,
+            dtype=default_float(),
+            name=name,
+        )
+
+        self.kernel = kernel
+        self.inducing_variable = inducing_variable
+
+        self.num_data = num_data
+
+        if mean_function is None:
+            mean_function = Identity()
+            if verbose:
+                warnings.warn(
+                    "Beware, no mean function was specified in the construction of the "
+                    f"`{type(self).__name__}` so the default `gpflow.mean_functions.Identity` "
+                    "is being used. This mean function will only work if the input "
+                    "dimensionality matches the number of latent Gaussian processes in the layer."
+                )
+        self.mean_function = mean_function
+
+        self.full_output_cov = full_output_cov
+        self.full_cov = full_cov
+        if low_rank_cov and not (full_cov and not full_output_cov):
+            raise ValueError("`low_rank_cov` requires `full_cov=True` and `full_output_cov=False`")
+        self.low_rank_cov = low_rank_cov
+        if tensor_outputs and (full_cov or full_output_cov):
+            raise ValueError(
+                "`tensor_outputs` requires `full_cov=False` and `full_output_cov=False`"
+            )
+        self.tensor_outputs = tensor_outputs
+        if deduplicate_inputs and full_cov:
+            raise ValueError("`deduplicate_inputs` requires `full_cov=False`")
+        self.deduplicate_inputs = deduplicate_inputs
+        self.whiten = whiten
+        self.verbose = verbose
+
+        if num_kl_probes is not None and whiten:
+            raise ValueError(
+                "`num_kl_probes` only applies to the non-whitened parameterisation, "
+                "as the whitened KL divergence does not depend on `Kuu`"
+            )
+        self.num_kl_probes = num_kl_probes
         self.num_samples = num_samples
 
     def predict(
@@ -267,6 +407,267 @@ class GPLayer(tfp.layers.DistributionLambda):
 
         return mean_cond + mean_function, cov
 
+    def predict_mean(self, inputs: TensorType) -> tf.Tensor:
+        """
+        Make a prediction of only the mean at N test inputs for the Q outputs
+        of this layer, including the mean function contribution. This is the
+        same as the mean returned by :meth:`predict`, but it skips all the
+        variance computations: it only requires ``Kuf α``, where ``α = Kuu⁻¹ m``
+        (or ``α = Lu⁻ᵀ v`` if whitened), at a cost of :math:`O(N M)` per output.
+
+        When executing eagerly, ``α`` is cached and only recomputed, at a cost
+        of :math:`O(M^3)`, after the variational mean, the kernel or the
+        inducing variable has changed. The cached ``α`` is a constant, so
+        gradients do not flow through this method to the parameters of this
+        layer; use :meth:`predict` for that. Inside a `tf.function`, ``α`` is
+        recomputed in every call; to avoid this for serving, use the
+        precomputed statistics of :func:`~gpflux.prediction.export_deep_gp`.
+
+        :param inputs: The inputs to predict at, with a shape of [N, D], where D is
+            the input dimensionality of this layer.
+        :returns: posterior mean (shape [N, Q]) at test points
+        """
+        if not (
+            isinstance(
+                self.kernel, (SharedIndependent, SeparateIndependent, LinearCoregionalization)
+            )
+            and isinstance(
+                self.inducing_variable,
+                (SharedIndependentInducingVariables, SeparateIndependentInducingVariables),
+            )
+        ):
+            mean, _ = self.predict(inputs)
+            return mean
+
+        alpha = self._mean_weights()
+        Kuf_ = Kuf(self.inducing_variable, self.kernel, inputs)
+        # Kuu and Kuf are either shared by all latent GPs ([M, M] and [M, N])
+        # or batched over them ([L, M, M] and [L, M, N])
+        mean = tf.matmul(Kuf_, alpha, transpose_a=True)  # [N, L] or [L, N, 1]
+        if Kuf_.shape.rank == 3:
+            mean = tf.linalg.adjoint(mean[..., 0])  # [N, L]
+        if isinstance(self.kernel, LinearCoregionalization):
+            mean = tf.matmul(mean, self.kernel.W, transpose_b=True)  # [N, Q]
+
+        return mean + self.mean_function(inputs)
+
+    def _mean_weights(self) -> tf.Tensor:
+        """
+        Returns the weights ``α`` of :meth:`predict_mean`, with the shape
+        ``[M, L]`` if ``Kuu`` is shared by all latent GPs or ``[L, M, 1]``
+        otherwise, from the cache if none of the variables it depends on have
+        changed (see :class:`_MeanWeightsCache`).
+        """
+        if not tf.executing_eagerly():
+            return self._compute_mean_weights()
+        variables = self.q_mu.variables + self.kernel.variables + self.inducing_variable.variables
+        values = [variable.numpy() for variable in variables]
+        cache = self._mean_weights_cache
+        if cache is None or not cache.matches(values):
+            alpha = tf.stop_gradient(self._compute_mean_weights())
+            self._mean_weights_cache = cache = _MeanWeightsCache(values, alpha)
+        return cache.alpha
+
+    def _compute_mean_weights(self) -> tf.Tensor:
+        Lu = tf.linalg.cholesky(Kuu(self.inducing_variable, self.kernel, jitter=default_jitter()))
+        shared = Lu.shape.rank == 2
+        q_mu = self.q_mu if shared else tf.linalg.adjoint(self.q_mu)[..., None]
+        if self.whiten:
+            return tf.linalg.triangular_solve(Lu, q_mu, adjoint=True)
+        return tf.linalg.cholesky_solve(Lu, q_mu)
+
+    def predict_low_rank_cov(
+        self, inputs: TensorType
+    ) -> Tuple[tf.Tensor, tf.linalg.LinearOperatorLowRankUpdate]:
+        """
+        Make a prediction at N test inputs for the Q outputs of this layer,
+        including the mean function contribution, with a structured covariance
+        over the inputs. The posterior covariance of each output is ``Kff -
+        Qff + U Uᵀ``, where ``Qff = Kfu Kuu⁻¹ Kuf`` and ``U`` is ``Kfu Kuu⁻¹
+        q_sqrt`` (or ``Kfu Lu⁻ᵀ q_sqrt`` if whitened), with the shape
+        ``[N, M]``. This approximates ``Kff - Qff`` by its diagonal (as in
+        FITC), which leaves the marginal variances unchanged and gives a
+        diagonal-plus-low-rank covariance ``D + U Uᵀ``. Computing it costs
+        :math:`O(N M^2)` instead of the :math:`O(N^2 M)` of the dense
+        covariance returned by :meth:`predict` with ``full_cov=True``, and
+        correlated samples can be drawn in :math:`O(N M)` without a Cholesky
+        factorisation.
+
+        This is only implemented for :class:`~gpflow.kernels.SharedIndependent`
+        and :class:`~gpflow.kernels.SeparateIndependent` kernels.
+
+        :param inputs: The inputs to predict at, with a shape of [N, D], where D is
+            the input dimensionality of this layer.
+        :returns: posterior mean (shape [N, Q]) and covariance (a linear
+            operator with the shape [Q, N, N]) at test points
+        """
+        if not (
+            isinstance(self.kernel, (SharedIndependent, SeparateIndependent))
+            and isinstance(
+                self.inducing_variable,
+                (SharedIndependentInducingVariables, SeparateIndependentInducingVariables),
+            )
+        ):
+            raise NotImplementedError(
+                "Low-rank covariances are only implemented for `SharedIndependent` or "
+                "`SeparateIndependent` kernels and inducing variables"
+            )
+
+        Lu = tf.linalg.cholesky(Kuu(self.inducing_variable, self.kernel, jitter=default_jitter()))
+        Kuf_ = Kuf(self.inducing_variable, self.kernel, inputs)  # [M, N] or [Q, M, N]
+        A = tf.linalg.triangular_solve(Lu, Kuf_, lower=True)  # Lu⁻¹ Kuf
+        Kff_diag = tf.linalg.adjoint(self.kernel(inputs, full_cov=False, full_output_cov=False))
+        diag = Kff_diag - tf.reduce_sum(tf.square(A), axis=-2)  # [Q, N]
+        diag = tf.maximum(diag, 0.0) + default_jitter()
+
+        if self.whiten:
+            alpha = tf.linalg.triangular_solve(
+                Lu, tf.linalg.adjoint(self.q_mu)[..., None], adjoint=True
+            )
+        else:
+            A = tf.linalg.triangular_solve(Lu, A, adjoint=True)  # Kuu⁻¹ Kuf
+            alpha = tf.linalg.cholesky_solve(Lu, tf.linalg.adjoint(self.q_mu)[..., None])
+        q_sqrt = tf.linalg.band_part(self.q_sqrt, -1, 0)  # [Q, M, M]
+        U = tf.matmul(A, q_sqrt, transpose_a=True)  # [Q, N, M]
+        mean = tf.linalg.adjoint(tf.matmul(Kuf_, alpha, transpose_a=True)[..., 0])  # [N, Q]
+
+        cov = tf.linalg.LinearOperatorLowRankUpdate(
+            tf.linalg.LinearOperatorDiag(diag, is_positive_definite=True),
+            U,
+            is_positive_definite=True,
+        )  # [Q, N, N]
+        return mean + self.mean_function(inputs), cov
+
+    def predict_moment_matched(
+        self, inputs_mean: TensorType, inputs_var: TensorType
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        r"""
+        Compute the exact mean and marginal variance of the Q outputs of this
+        layer, including the mean function contribution, when its N inputs are
+        uncertain, ``x ~ N(inputs_mean, diag(inputs_var))``. This uses the
+        kernel expectations (Ψ-statistics) ``ψ₀ = ⟨k(x, x)⟩``, ``Ψ₁ = ⟨k(x, Z)⟩``
+        and ``Ψ₂ = ⟨k(Z, x) k(x, Z)⟩`` of :cite:t:`girard2003gaussian`, so that
+        the outputs can be approximated by a Gaussian with these moments
+        (moment matching) without sampling.
+
+        This is only implemented for :class:`~gpflow.kernels.SharedIndependent`
+        and :class:`~gpflow.kernels.SeparateIndependent` kernels of
+        :class:`~gpflow.kernels.SquaredExponential`\ s with inducing points, and
+        for :class:`~gpflow.mean_functions.Linear` (including
+        :class:`~gpflow.mean_functions.Identity`) and
+        :class:`~gpflow.mean_functions.Constant` mean functions.
+
+        :param inputs_mean: The means of the inputs, with the shape ``[N, D]``.
+        :param inputs_var: The variances of the inputs, with the shape ``[N, D]``.
+        :returns: The means and the marginal variances of the outputs, both
+            with the shape ``[N, Q]``.
+        """
+        kernels, inducing_variables = self._moment_matching_components()
+        if not isinstance(self.mean_function, (Linear, Constant)):
+            raise NotImplementedError(
+                "Moment matching is only implemented for `Linear`, `Identity` and "
+                "`Constant` mean functions"
+            )
+
+        D = tf.shape(inputs_mean)[-1]
+        if isinstance(self.mean_function, Identity):
+            A = tf.eye(D, dtype=default_float())  # [D, Q]
+            b = tf.zeros([D], dtype=default_float())  # [Q]
+        elif isinstance(self.mean_function, Linear):
+            A, b = self.mean_function.A, self.mean_function.b
+        else:
+            A = None
+
+        p = DiagonalGaussian(inputs_mean, inputs_var)
+        q_mu = tf.linalg.adjoint(self.q_mu)[..., None]  # [Q, M, 1]
+        q_sqrt = tf.linalg.band_part(self.q_sqrt, -1, 0)  # [Q, M, M]
+        # Each (kernel, inducing points) pair is either shared by all outputs or
+        # used by a single output only, in which case we slice out that output.
+        shared = len(kernels) == 1
+        means, variances = [], []
+        for q, (kernel, inducing_variable) in enumerate(zip(kernels, inducing_variables)):
+            outputs = slice(None) if shared else slice(q, q + 1)
+            Lu = tf.linalg.cholesky(Kuu(inducing_variable, kernel, jitter=default_jitter()))
+            if self.whiten:
+                alpha = tf.linalg.triangular_solve(Lu, q_mu[outputs], adjoint=True)
+                B_sqrt = tf.linalg.triangular_solve(Lu, q_sqrt[outputs], adjoint=True)
+            else:
+                alpha = tf.linalg.cholesky_solve(Lu, q_mu[outputs])  # [Q', M, 1]
+                B_sqrt = tf.linalg.cholesky_solve(Lu, q_sqrt[outputs])  # [Q', M, M]
+            alpha = alpha[..., 0]  # [Q', M]
+
+            # The posterior at a fixed x is f(x) = k(x, Z) α + ε(x), with
+            # 𝔼[f(x)²|x] = k(x, x) + k(x, Z) C k(Z, x), where C = B - Kuu⁻¹ + α αᵀ.
+            Kuu_inv = tf.linalg.cholesky_solve(Lu, tf.eye(tf.shape(Lu)[-1], dtype=Lu.dtype))
+            C = tf.matmul(B_sqrt, B_sqrt, transpose_b=True) - Kuu_inv
+            C += alpha[:, :, None] * alpha[:, None, :]  # [Q', M, M]
+
+            psi0 = expectation(p, kernel)  # [N]
+            psi1 = expectation(p, (kernel, inducing_variable))  # [N, M]
+            psi2 = expectation(p, (kernel, inducing_variable), (kernel, inducing_variable))
+            mean = tf.matmul(psi1, alpha, transpose_b=True)  # [N, Q']
+            var = psi0[:, None] + tf.einsum("nmk,qmk->nq", psi2, C) - tf.square(mean)
+
+            if A is not None:
+                # Cov[m(x), f(x)] = Aᵀ (⟨x k(x, Z)⟩ α - ⟨x⟩ ⟨f(x)⟩) for each output
+                exKxz = expectation(p, Identity(D), (kernel, inducing_variable))  # [N, D, M]
+                cov_xf = tf.einsum("ndm,qm->nqd", exKxz, alpha)
+                cov_xf -= inputs_mean[:, None, :] * mean[:, :, None]  # [N, Q', D]
+                var += 2 * tf.einsum("nqd,dq->nq", cov_xf, A[:, outputs])
+            means.append(mean)
+            variances.append(var)
+        mean = tf.concat(means, axis=-1)  # [N, Q]
+        var = tf.concat(variances, axis=-1)  # [N, Q]
+
+        if A is not None:
+            mean += tf.matmul(inputs_mean, A) + b
+            var += tf.matmul(inputs_var, tf.square(A))
+        else:
+            mean += self.mean_function(inputs_mean)
+
+        # guard against small negative values due to round-off
+        return mean, tf.maximum(var, 0.0)
+
+    def _moment_matching_components(self) -> Tuple[List[Kernel], List[InducingPoints]]:
+        """
+        Returns the kernels and inducing points used for moment matching,
+        either a single pair shared by all outputs or one pair per output.
+        """
+        if isinstance(self.kernel, SharedIndependent):
+            kernels = [self.kernel.kernel]
+        elif isinstance(self.kernel, SeparateIndependent):
+            kernels = list(self.kernel.kernels)
+        else:
+            kernels = []
+        if isinstance(self.inducing_variable, SharedIndependentInducingVariables):
+            inducing_variables = [self.inducing_variable.inducing_variable]
+        elif isinstance(self.inducing_variable, SeparateIndependentInducingVariables):
+            inducing_variables = list(self.inducing_variable.inducing_variable_list)
+        else:
+            inducing_variables = []
+
+        if not (
+            kernels
+            and inducing_variables
+            and all(isinstance(k, SquaredExponential) for k in kernels)
+            and all(type(iv) is InducingPoints for iv in inducing_variables)
+        ):
+            raise NotImplementedError(
+                "Moment matching is only implemented for `SharedIndependent` or "
+                "`SeparateIndependent` kernels of `SquaredExponential`s with inducing points"
+            )
+        if len(kernels) != len(inducing_variables):
+            num_outputs = max(len(kernels), len(inducing_variables))
+            kernels = kernels * (num_outputs // len(kernels))
+            inducing_variables = inducing_variables * (num_outputs // len(inducing_variables))
+        return kernels, inducing_variables
+
+    def __call__(self, inputs: TensorType, *args: List[Any], **kwargs: Dict[str, Any]) -> Any:
+        if self.tensor_outputs:
+            # skip `DistributionLambda.__call__`, which expects a distribution from `call`
+            return super(tfp.layers.DistributionLambda, self).__call__(inputs, *args, **kwargs)
+        return super().__call__(inputs, *args, **kwargs)
+
     def call(self, inputs: TensorType, *args: List[Any], **kwargs: Dict[str, Any]) -> tf.Tensor:
         """
         The default behaviour upon calling this layer.
@@ -280,11 +681,24 @@ class GPLayer(tfp.layers.DistributionLambda):
 
         This method also adds a layer-specific loss function, given by the KL divergence between
         this layer and the GP prior (scaled to per-datapoint).
+
+        If :attr:`tensor_outputs` is `True`, this method returns a
+        :class:`GPLayerOutputs` instead (see :meth:`_make_tensor_outputs`).
         """
-        outputs = super().call(inputs, *args, **kwargs)
+        if self.tensor_outputs:
+            outputs = self._make_tensor_outputs(inputs)
+        else:
+            outputs = super().call(inputs, *args, **kwargs)
 
+        # Standard deviation of the stochastic KL estimate (if used), as a diagnostic
+        kl_std_per_datapoint = tf.constant(0.0, dtype=default_float())
         if kwargs.get("training"):
-            loss_per_datapoint = self.prior_kl() / self.num_data
+            if self.num_kl_probes is None:
+                loss_per_datapoint = self.prior_kl() / self.num_data
+            else:
+                kl, kl_variance = self.stochastic_prior_kl()
+                loss_per_datapoint = kl / self.num_data
+                kl_std_per_datapoint = tf.sqrt(kl_variance) / self.num_data
         else:
             # TF quirk: add_loss must always add a tensor to compile
             loss_per_datapoint = tf.constant(0.0, dtype=default_float())
@@ -294,6 +708,8 @@ class GPLayer(tfp.layers.DistributionLambda):
         # have multiple with the same name
         name = f"{self.name}_prior_kl" if self.name else "prior_kl"
         self.add_metric(loss_per_datapoint, name=name, aggregation="mean")
+        if self.num_kl_probes is not None:
+            self.add_metric(kl_std_per_datapoint, name=f"{name}_std", aggregation="mean")
 
         return outputs
 
@@ -302,11 +718,32 @@ class GPLayer(tfp.layers.DistributionLambda):
         Returns the KL divergence ``KL[q(u)∥p(u)]`` from the prior ``p(u)`` to
         the variational distribution ``q(u)``.  If this layer uses the
         :attr:`whiten`\ ed representation, returns ``KL[q(v)∥p(v)]``.
+
+        If :attr:`num_kl_probes` is set, this returns the stochastic estimate
+        of :meth:`stochastic_prior_kl` instead.
         """
+        if self.num_kl_probes is not None:
+            return self.stochastic_prior_kl().kl
         return prior_kl(
             self.inducing_variable, self.kernel, self.q_mu, self.q_sqrt, whiten=self.whiten
         )
 
+    def stochastic_prior_kl(self) -> StochasticKL:
+        """
+        Returns a stochastic estimate of ``KL[q(u)∥p(u)]`` using
+        :attr:`num_kl_probes` Hutchinson probes, together with the variance of
+        the estimate. See :func:`~gpflux.kullback_leiblers.stochastic_prior_kl`.
+        """
+        if self.num_kl_probes is None:
+            raise ValueError("`num_kl_probes` must be set to use the stochastic KL estimator")
+        return stochastic_prior_kl(
+            self.inducing_variable,
+            self.kernel,
+            self.q_mu,
+            self.q_sqrt,
+            num_probes=self.num_kl_probes,
+        )
+
     def _make_distribution_fn(
         self, previous_layer_outputs: TensorType
     ) -> tfp.distributions.Distribution:
@@ -317,11 +754,23 @@ class GPLayer(tfp.layers.DistributionLambda):
         :param previous_layer_outputs: The output from the previous layer,
             which should be coercible to a `tf.Tensor`
         """
-        mean, cov = self.predict(
-            previous_layer_outputs,
-            full_cov=self.full_cov,
-            full_output_cov=self.full_output_cov,
-        )
+        if self.full_cov and self.low_rank_cov and not self.full_output_cov:
+            mean, cov = self.predict_low_rank_cov(previous_layer_outputs)
+            # mean: [N, Q], cov: [Q, N, N] with diag [Q, N] and u [Q, N, M]
+            return tfp.distributions.MultivariateNormalLinearOperator(
+                loc=tf.linalg.adjoint(mean), scale=_diag_plus_low_rank_scale(cov)
+            )  # loc: [Q, N]
+
+        if self.deduplicate_inputs:
+            mean, cov = self._predict_deduplicated(
+                previous_layer_outputs, full_output_cov=self.full_output_cov
+            )
+        else:
+            mean, cov = self.predict(
+                previous_layer_outputs,
+                full_cov=self.full_cov,
+                full_output_cov=self.full_output_cov,
+            )
 
         if self.full_cov and not self.full_output_cov:
             # mean: [N, Q], cov: [Q, N, N]
@@ -341,6 +790,56 @@ class GPLayer(tfp.layers.DistributionLambda):
                 "The combination of both `full_cov` and `full_output_cov` is not permitted."
             )
 
+    def _predict_deduplicated(
+        self, inputs: TensorType, *, full_output_cov: bool = False
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Make the same marginal prediction as :meth:`predict`, evaluating it
+        only at the distinct rows of *inputs* (see :attr:`deduplicate_inputs`).
+
+        :param inputs: The inputs to predict at, with a shape of [..., D].
+        :param full_output_cov: Whether to return full covariance (if `True`)
+            or marginal variance (if `False`, the default) w.r.t. outputs.
+        :returns: posterior mean (shape [..., Q]) and (co)variance (shape
+            [..., Q] or [..., Q, Q]) at the inputs
+        """
+        inputs = tf.convert_to_tensor(inputs)
+        unique_inputs, indices = unique_rows(inputs)  # [U, D], [N]
+        mean, cov = self.predict(unique_inputs, full_output_cov=full_output_cov)
+        # [U, ...] -> [N, ...] -> [..., ...]
+        return (
+            _restore_leading_dims(tf.gather(mean, indices), inputs),
+            _restore_leading_dims(tf.gather(cov, indices), inputs),
+        )
+
+    def _predict_flattened(
+        self, inputs: TensorType, *, full_cov: bool = False, full_output_cov: bool = False
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Make the marginal prediction of :meth:`predict` at *inputs* with
+        leading dimensions, e.g. the ``[S, N, D]`` inputs broadcast over the
+        Monte Carlo samples by :attr:`~gpflux.models.DeepGP.num_samples`, by
+        flattening them into the rows of an ``[S N, D]`` input. Subclasses
+        whose :meth:`predict` only supports ``[N, D]`` inputs call this for
+        inputs of a higher rank.
+
+        :param inputs: The inputs to predict at, with a shape of [..., D].
+        :param full_cov: Not supported; raises a `NotImplementedError` if `True`.
+        :param full_output_cov: Whether to return full covariance (if `True`)
+            or marginal variance (if `False`, the default) w.r.t. outputs.
+        :returns: posterior mean (shape [..., Q]) and (co)variance (shape
+            [..., Q] or [..., Q, Q]) at the inputs
+        """
+        if full_cov:
+            raise NotImplementedError(
+                f"`{type(self).__name__}` only supports `full_cov` for inputs of the shape [N, D]"
+            )
+        inputs = tf.convert_to_tensor(inputs)
+        rows = tf.reshape(inputs, [-1, tf.shape(inputs)[-1]])  # [N, D]
+        rows.set_shape([None, inputs.shape[-1]])
+        mean, cov = self.predict(rows, full_output_cov=full_output_cov)
+        return _restore_leading_dims(mean, inputs), _restore_leading_dims(cov, inputs)
+
     def _convert_to_tensor_fn(self, distribution: tfp.distributions.Distribution) -> tf.Tensor:
         """
         Convert the predictive distributions at the input points (see
@@ -352,7 +851,11 @@ class GPLayer(tfp.layers.DistributionLambda):
         # N input points
         # S = self.num_samples
         # Q = output dimensionality
-        if self.num_samples is not None:
+        scale = getattr(distribution, "scale", None)
+        if isinstance(scale, tf.linalg.LinearOperatorLowRankUpdate):
+            # see `_diag_plus_low_rank_scale`
+            samples = _sample_diag_plus_low_rank(distribution, self.num_samples)  # [S, Q, N]
+        elif self.num_samples is not None:
             samples = distribution.sample(
                 (self.num_samples,)
             )  # [S, Q, N] if full_cov else [S, N, Q]
@@ -364,6 +867,25 @@ class GPLayer(tfp.layers.DistributionLambda):
 
         return samples
 
+    def _make_tensor_outputs(self, previous_layer_outputs: TensorType) -> "GPLayerOutputs":
+        """
+        Compute the marginal means and variances at the output points of the
+        previous layer, and draw :attr:`num_samples` samples from them as in
+        :meth:`_convert_to_tensor_fn`, without constructing a distribution.
+
+        :param previous_layer_outputs: The output from the previous layer,
+            which should be coercible to a `tf.Tensor`
+        """
+        if self.deduplicate_inputs:
+            mean, var = self._predict_deduplicated(previous_layer_outputs)  # [N, Q], [N, Q]
+        else:
+            mean, var = self.predict(tf.convert_to_tensor(previous_layer_outputs))
+        sample_shape = tf.shape(mean)
+        if self.num_samples is not None:
+            sample_shape = tf.concat([[self.num_samples], sample_shape], axis=0)
+        samples = mean + tf.sqrt(var) * tf.random.normal(sample_shape, dtype=mean.dtype)
+        return GPLayerOutputs(mean, var, samples)  # samples: [S, N, Q] or [N, Q]
+
     def sample(self) -> Sample:
         """
         .. todo:: TODO: Document this.
@@ -379,3 +901,112 @@ class GPLayer(tfp.layers.DistributionLambda):
             # Makes use of the magic __add__ of the Sample class
             + self.mean_function
         )
+
+
+class _MeanWeightsCache:
+    """
+    The weights ``α`` of :meth:`GPLayer.predict_mean`, together with the values
+    of the variables they were computed from. Comparing these values costs
+    :math:`O(M (L + D))`, much less than the :math:`O(M^3)` of recomputing ``α``.
+    """
+
+    def __init__(self, values: List[np.ndarray], alpha: tf.Tensor):
+        self.values = values
+        self.alpha = alpha
+
+    def matches(self, values: List[np.ndarray]) -> bool:
+        return len(values) == len(self.values) and all(
+            np.array_equal(new, old) for new, old in zip(values, self.values)
+        )
+
+
+class GPLayerOutputs(tf.Module, metaclass=TensorMetaClass):
+    """
+    This class encapsulates the outputs of a :class:`GPLayer` with
+    :attr:`~GPLayer.tensor_outputs`: the marginal mean and variance of the
+    layer, and samples from it.
+
+    Like the outputs of `tfp.layers.DistributionLambda`, objects of this class
+    behave as a `tf.Tensor` containing the samples, so that they can be passed
+    to the next layer.
+    """
+
+    def __init__(self, mean: TensorType, var: TensorType, samples: TensorType):
+        super().__init__(name="gp_layer_outputs")
+
+        self.mean = mean
+        self.var = var
+        self.samples = samples
+
+    def _value(
+        self, dtype: tf.dtypes.DType = None, name: str = None, as_ref: bool = False
+    ) -> tf.Tensor:
+        return self.samples
+
+    @property
+    def shape(self) -> tf.TensorShape:
+        return self.samples.shape
+
+    @property
+    def dtype(self) -> tf.dtypes.DType:
+        return self.samples.dtype
+
+
+def _restore_leading_dims(outputs: tf.Tensor, inputs: tf.Tensor) -> tf.Tensor:
+    """
+    Reshape the *outputs* ``[N, ...]`` at the flattened rows of the *inputs*
+    ``[..., D]`` to ``[..., ...]``, keeping the static shape for Keras.
+    """
+    outputs_shape = tf.concat([tf.shape(inputs)[:-1], tf.shape(outputs)[1:]], axis=0)
+    restored = tf.reshape(outputs, outputs_shape)
+    restored.set_shape(inputs.shape[:-1].concatenate(outputs.shape[1:]))
+    return restored
+
+
+def _diag_plus_low_rank_scale(
+    cov: tf.linalg.LinearOperatorLowRankUpdate,
+) -> tf.linalg.LinearOperatorLowRankUpdate:
+    """
+    Compute a square root ``S`` of the covariance ``D + U Uᵀ`` (as returned by
+    :meth:`GPLayer.predict_low_rank_cov`), such that ``S Sᵀ = D + U Uᵀ``, in
+    the diagonal-plus-low-rank form ``S = √D (I + V C Vᵀ)`` with ``V = √D⁻¹ U``.
+    With the eigendecomposition ``Vᵀ V = Q Λ Qᵀ``, this holds for ``C = Q
+    diag(1 / (1 + √(1 + λ))) Qᵀ``. This costs :math:`O(N M^2 + M^3)` for ``U``
+    of the shape ``[..., N, M]``, instead of the :math:`O(N^3)` of a dense
+    Cholesky factorisation.
+    """
+    D = cov.base_operator.diag  # [..., N]
+    U = cov.u  # [..., N, M]
+    V = U / tf.sqrt(D)[..., None]  # [..., N, M]
+    eigenvalues, Q = tf.linalg.eigh(tf.matmul(V, V, transpose_a=True))  # [..., M], [..., M, M]
+    c = 1.0 / (1.0 + tf.sqrt(1.0 + tf.maximum(eigenvalues, 0.0)))  # [..., M]
+    C = tf.matmul(Q * c[..., None, :], Q, transpose_b=True)  # [..., M, M]
+    return tf.linalg.LinearOperatorLowRankUpdate(
+        tf.linalg.LinearOperatorDiag(tf.sqrt(D), is_positive_definite=True),
+        U,
+        v=tf.matmul(V, C),
+        is_non_singular=True,
+    )  # √D + U C Vᵀ
+
+
+def _sample_diag_plus_low_rank(
+    distribution: tfp.distributions.MultivariateNormalLinearOperator,
+    num_samples: Optional[int],
+) -> tf.Tensor:
+    """
+    Sample from a Gaussian with covariance ``D + U Uᵀ`` (with the scale
+    computed by :func:`_diag_plus_low_rank_scale`) as ``loc + √D ε₁ + U ε₂``,
+    which costs :math:`O(N M)` for ``U`` of the shape ``[..., N, M]``.
+
+    :returns: samples with the shape ``[S, ..., N]``, or ``[..., N]`` if
+        *num_samples* is `None`.
+    """
+    sqrt_D = distribution.scale.base_operator.diag  # [..., N]
+    U = distribution.scale.u  # [..., N, M]
+    loc = tf.broadcast_to(distribution.loc, tf.shape(U)[:-1])  # [..., N]
+    sample_shape = [] if num_samples is None else [num_samples]
+    eps_diag = tf.random.normal(tf.concat([sample_shape, tf.shape(loc)], 0), dtype=loc.dtype)
+    eps_low_rank = tf.random.normal(
+        tf.concat([sample_shape, tf.shape(U)[:-2], tf.shape(U)[-1:]], 0), dtype=loc.dtype
+    )  # [S, ..., M]
+    return loc + sqrt_D * eps_diag + tf.linalg.matvec(U, eps_low_rank)
@@ -16,7 +16,7 @@
 """ This module implements a latent variable layer for deep GPs. """
 
 import abc
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 
 import tensorflow as tf
 import tensorflow_probability as tfp
@@ -112,7 +112,8 @@ class LatentVariableLayer(LayerWithObservations):
         observations: Optional[ObservationType] = None,
         training: Optional[bool] = None,
         seed: Optional[int] = None,
-    ) -> tf.Tensor:
+        importance_weighted: bool = False,
+    ) -> Union[tf.Tensor, Tuple[tf.Tensor, tf.Tensor]]:
         r"""
         Sample the latent variables and compose them with the layer input.
 
@@ -122,24 +123,42 @@ class LatentVariableLayer(LayerWithObservations):
 
         When not training, draw a sample of the latent variable from the prior.
 
+        If *importance_weighted* is `True`, the KL divergence is not added to
+        the losses. Instead, this layer additionally returns the log importance
+        weights ``log p(w) - log q(w)`` of the samples (zero when not training),
+        for the importance-weighted objective of
+        :attr:`gpflux.models.DeepGP.importance_weighted` :cite:p:`salimbeni2019iwvi`.
+
         :param layer_inputs: The output of the previous layer.
         :param observations: The ``[inputs, targets]``, with the shapes ``[batch size, Din]``
             and ``[batch size, Dout]`` respectively. This parameter should be passed only when in
             training mode.
         :param training: The training mode indicator.
         :param seed: A random seed for the sampling operation.
+        :param importance_weighted: Whether to return the log importance weights
+            instead of adding the KL divergence to the losses.
         :returns: Samples of the latent variable composed with the layer inputs through the
-            :attr:`compositor`
+            :attr:`compositor`, and if *importance_weighted*, the log importance
+            weights with the shape ``[S..., batch size]``.
         """
         if training:
             if observations is None:
                 raise ValueError("LatentVariableLayer requires observations when training")
 
-            samples, loss_per_datapoint = self._inference_latent_samples_and_loss(
-                layer_inputs, observations, seed=seed
-            )
+            if importance_weighted:
+                samples, log_weights = self._inference_latent_samples_and_log_weights(
+                    layer_inputs, observations, seed=seed
+                )
+                # a single-sample estimate of the KL divergence, for monitoring only
+                kl_estimate_per_datapoint = -tf.reduce_mean(log_weights)
+                loss_per_datapoint = tf.constant(0.0, dtype=default_float())
+            else:
+                samples, loss_per_datapoint = self._inference_latent_samples_and_loss(
+                    layer_inputs, observations, seed=seed
+                )
         else:
             samples = self._prediction_latent_samples(layer_inputs, seed=seed)
+            log_weights = tf.zeros(tf.shape(samples)[:-1], dtype=samples.dtype)
             loss_per_datapoint = tf.constant(0.0, dtype=default_float())
 
         self.add_loss(loss_per_datapoint)
@@ -147,9 +166,15 @@ class LatentVariableLayer(LayerWithObservations):
         # Metric names should be unique; otherwise they get overwritten if you
         # have multiple with the same name
         name = f"{self.name}_local_kl" if self.name else "local_kl"
-        self.add_metric(loss_per_datapoint, name=name, aggregation="mean")
+        if importance_weighted and training:
+            self.add_metric(kl_estimate_per_datapoint, name=name, aggregation="mean")
+        else:
+            self.add_metric(loss_per_datapoint, name=name, aggregation="mean")
 
-        return self.compositor([layer_inputs, samples])
+        outputs = self.compositor([layer_inputs, samples])
+        if importance_weighted:
+            return outputs, log_weights
+        return outputs
 
     def _inference_posteriors(
         self,
@@ -184,19 +209,42 @@ class LatentVariableLayer(LayerWithObservations):
         Sample latent variables during the *training* forward pass, hence requiring
         the observations. Also return the KL loss per datapoint.
 
-        :param layer_inputs: The output of the previous layer _(unused)_.
+        :param layer_inputs: The output of the previous layer (for determining
+            any leading sample dimensions ``[S...]`` of the output).
         :param observations: The ``[inputs, targets]``, with the shapes ``[batch size, Din]``
             and ``[batch size, Dout]`` respectively.
         :param seed: A random seed for the sampling operation.
         :returns: The samples and the loss-per-datapoint.
         """
         posteriors = self._inference_posteriors(observations, training=True)
-        samples = posteriors.sample(seed=seed)  # [N, Dw]
+        sample_shape = tf.shape(layer_inputs)[:-2]
+        samples = posteriors.sample(sample_shape, seed=seed)  # [S..., N, Dw]
         # closed-form expectation E_q[log(q/p)] = KL[q∥p]:
         local_kls = self._local_kls(posteriors)
         loss_per_datapoint = tf.reduce_mean(local_kls, name="local_kls")
         return samples, loss_per_datapoint
 
+    def _inference_latent_samples_and_log_weights(
+        self, layer_inputs: TensorType, observations: ObservationType, seed: Optional[int] = None
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        r"""
+        Sample latent variables during the *training* forward pass of the
+        importance-weighted objective, and return their log importance weights
+        ``log p(w) - log q(w)``.
+
+        :param layer_inputs: The output of the previous layer (for determining
+            any leading sample dimensions ``[S...]`` of the output).
+        :param observations: The ``[inputs, targets]``, with the shapes ``[batch size, Din]``
+            and ``[batch size, Dout]`` respectively.
+        :param seed: A random seed for the sampling operation.
+        :returns: The samples ``[S..., N, Dw]`` and their log importance weights ``[S..., N]``.
+        """
+        posteriors = self._inference_posteriors(observations, training=True)
+        sample_shape = tf.shape(layer_inputs)[:-2]
+        samples = posteriors.sample(sample_shape, seed=seed)  # [S..., N, Dw]
+        log_weights = self.prior.log_prob(samples) - posteriors.log_prob(samples)
+        return samples, log_weights
+
     def _prediction_latent_samples(
         self, layer_inputs: TensorType, seed: Optional[int] = None
     ) -> tf.Tensor:
@@ -17,7 +17,7 @@
 A Keras Layer that wraps a likelihood, while containing the necessary operations
 for training.
 """
-from typing import Optional
+from typing import Optional, Union
 
 import tensorflow as tf
 import tensorflow_probability as tfp
@@ -27,6 +27,7 @@ from gpflow import default_float
 from gpflow.base import TensorType
 from gpflow.likelihoods import Likelihood
 
+from gpflux.layers.gp_layer import GPLayerOutputs
 from gpflux.layers.trackable_layer import TrackableLayer
 
 
@@ -53,9 +54,10 @@ class LikelihoodLayer(TrackableLayer):
 
     def call(
         self,
-        inputs: tfp.distributions.MultivariateNormalDiag,
+        inputs: Union[tfp.distributions.MultivariateNormalDiag, GPLayerOutputs],
         targets: Optional[TensorType] = None,
         training: bool = None,
+        log_weights: Optional[TensorType] = None,
     ) -> "LikelihoodOutputs":
         """
         When training (``training=True``), this method computes variational expectations
@@ -65,7 +67,17 @@ class LikelihoodLayer(TrackableLayer):
         :param inputs: The output distribution of the previous layer. This is currently
             expected to be a :class:`~tfp.distributions.MultivariateNormalDiag`;
             that is, the preceding :class:`~gpflux.layers.GPLayer` should have
-            ``full_cov=full_output_cov=False``.
+            ``full_cov=full_output_cov=False``; or the
+            :class:`~gpflux.layers.gp_layer.GPLayerOutputs` of a
+            :class:`~gpflux.layers.GPLayer` with ``tensor_outputs=True``. Its
+            batch shape may have leading sample dimensions ``[S..., N]`` (see
+            :attr:`gpflux.models.DeepGP.num_samples`), in which case the loss is
+            averaged over the samples.
+        :param log_weights: The optional log importance weights of the samples
+            in *inputs*, with the shape ``[S, N]``. If given, the loss is the
+            negative importance-weighted bound ``-log (1/S) Σₛ exp(𝔼[log p(y|f)] +
+            log_weights)`` :cite:p:`salimbeni2019iwvi` instead, which is
+            evaluated with a numerically stable log-sum-exp over the samples.
         :returns: a `LikelihoodOutputs` tuple with the mean and variance of ``f`` and,
             if not training, the mean and variance of ``y``.
 
@@ -74,17 +86,30 @@ class LikelihoodLayer(TrackableLayer):
             correct :class:`~tfp.distributions.Distribution` instead of a tuple
             containing mean and variance only.
         """
-        # TODO: add support for non-distribution inputs? or other distributions?
-        assert isinstance(inputs, tfp.distributions.MultivariateNormalDiag)
-        F_mean = inputs.loc
-        F_var = inputs.scale.diag ** 2
+        if isinstance(inputs, GPLayerOutputs):
+            F_mean, F_var = inputs.mean, inputs.var
+        else:
+            # TODO: add support for other distributions?
+            assert isinstance(inputs, tfp.distributions.MultivariateNormalDiag)
+            F_mean = inputs.loc
+            F_var = inputs.scale.diag ** 2
 
         if training:
             assert targets is not None
+            # broadcast the targets [N, P] over any leading sample dimensions
+            targets_shape = tf.concat([tf.shape(F_mean)[:-1], tf.shape(targets)[-1:]], axis=0)
+            targets = tf.broadcast_to(targets, targets_shape)
             # TODO: re-use LikelihoodLoss to remove code duplication
-            loss_per_datapoint = tf.reduce_mean(
-                -self.likelihood.variational_expectations(F_mean, F_var, targets)
-            )
+            variational_expectations = self.likelihood.variational_expectations(
+                F_mean, F_var, targets
+            )  # [S..., N]
+            if log_weights is None:
+                loss_per_datapoint = tf.reduce_mean(-variational_expectations)
+            else:
+                log_weights = variational_expectations + log_weights  # [S, N]
+                num_samples = tf.cast(tf.shape(log_weights)[0], log_weights.dtype)
+                bound = tf.reduce_logsumexp(log_weights, axis=0) - tf.math.log(num_samples)
+                loss_per_datapoint = -tf.reduce_mean(bound)
             Y_mean = Y_var = None
         else:
             loss_per_datapoint = tf.constant(0.0, dtype=default_float())
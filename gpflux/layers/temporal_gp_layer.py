@@ -0,0 +1,356 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`TemporalGPLayer`, a variational GP layer for
+one-dimensional (temporal) inputs that uses the state-space representation of
+its kernel, so that its cost is linear in the number of inputs and of
+inducing states.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+from gpflow import Parameter, default_float, default_jitter
+from gpflow.base import TensorType
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kernels import Kernel
+from gpflow.mean_functions import MeanFunction
+from gpflow.utilities.bijectors import triangular
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.layers.gp_layer import GPLayer
+from gpflux.sampling.sample import Sample
+from gpflux.state_space import (
+    StateSpaceModel,
+    affine_gaussian_scan,
+    bridge,
+    is_state_space_kernel,
+    state_space_model,
+    transitions,
+)
+
+
+class TemporalGPLayer(GPLayer):
+    r"""
+    A variational GP layer for one-dimensional (temporal) inputs and a kernel
+    with a state-space representation (see :mod:`gpflux.state_space`), in
+    which the inducing variables are the ``S``-dimensional SDE states at the
+    ``M`` sorted inducing times :cite:p:`hartikainen2010kalman`.
+
+    The variational posterior over the inducing states is itself a Gauss–Markov
+    chain ``q(s_k | s_{k-1}) = N(B_k s_{k-1} + b_k, C_k C_kᵀ)``, parameterised
+    relative to the prior transition ``N(A_k s_{k-1}, L_k L_kᵀ)`` as
+    ``B_k = A_k + L_k E_k``, ``b_k = L_k β_k`` and ``C_k = L_k W_k``, so that it
+    equals the prior at initialisation and the KL divergence needs no matrix
+    inversions. Its marginals are computed with a parallel scan, and the
+    predictive distribution at a time ``t`` only depends on the two neighbouring
+    inducing states, through the Gauss–Markov bridge between them. The cost is
+    :math:`O((M + N) S^3)`, instead of :math:`O(M^3 + N M^2)` for :class:`GPLayer`.
+
+    The :attr:`num_latent_gps` outputs are independent and share the kernel.
+    Only marginal predictions are supported (``full_cov=False``).
+    """
+
+    q_offset: Parameter
+    """ The whitened offsets ``β_k``, with the shape ``[num_latent_gps, M, S]``. """
+
+    q_gain: Parameter
+    """ The whitened deviations ``E_k`` of the transition matrices, with the shape
+    ``[num_latent_gps, M, S, S]``. """
+
+    q_sqrt: Parameter
+    """ The whitened lower-triangular Cholesky factors ``W_k`` of the transition
+    noise, with the shape ``[num_latent_gps, M, S, S]``. """
+
+    def __init__(
+        self,
+        kernel: Kernel,
+        inducing_variable: InducingPoints,
+        num_data: int,
+        mean_function: Optional[MeanFunction] = None,
+        *,
+        num_latent_gps: int = 1,
+        num_samples: Optional[int] = None,
+        full_output_cov: bool = False,
+        name: Optional[str] = None,
+        verbose: bool = True,
+    ):
+        """
+        :param kernel: The kernel shared by all outputs, for which
+            :func:`~gpflux.state_space.state_space_model` is implemented, e.g.
+            :class:`~gpflow.kernels.Matern32`.
+        :param inducing_variable: The inducing times, with ``Z`` of the shape
+            ``[M, 1]``, sorted in increasing order and with ``M ≥ 2``. They are
+            not trained.
+        :param num_data: The number of points in the training dataset (see :attr:`num_data`).
+        :param mean_function: The mean function that will be applied to the
+            inputs. Default: :class:`~gpflow.mean_functions.Identity`.
+        :param num_latent_gps: The number of (independent) outputs of this layer.
+
+        See :class:`~gpflux.layers.GPLayer` for the remaining arguments.
+        """
+        if not is_state_space_kernel(kernel):
+            raise GPLayerIncompatibilityException(
+                "`kernel` must have a state-space representation, e.g. `gpflow.kernels.Matern32`"
+            )
+        if not isinstance(inducing_variable, InducingPoints):
+            raise GPLayerIncompatibilityException(
+                "`inducing_variable` must be a `gpflow.inducing_variables.InducingPoints`"
+            )
+        Z = inducing_variable.Z.numpy()
+        if Z.shape[-1] != 1 or len(Z) < 2 or np.any(np.diff(Z[:, 0]) < 0):
+            raise GPLayerIncompatibilityException(
+                "The inducing times must have the shape [M, 1], with M >= 2, and be sorted"
+            )
+        gpflow.set_trainable(inducing_variable, False)
+
+        # GPLayer.__init__ would create a dense [M, M] q_sqrt, so we bypass it
+        self._initialise_layer(
+            kernel,
+            inducing_variable,
+            num_data,
+            mean_function,
+            num_samples=num_samples,
+            full_output_cov=full_output_cov,
+            name=name,
+            verbose=verbose,
+        )
+        self.num_latent_gps = num_latent_gps
+
+        M = len(Z)
+        S = self._state_space_model().F.shape[-1]
+        self.q_offset = Parameter(
+            np.zeros((num_latent_gps, M, S)),
+            dtype=default_float(),
+            name=f"{self.name}_q_offset" if self.name else "q_offset",
+        )  # [num_latent_gps, M, S]
+        self.q_gain = Parameter(
+            np.zeros((num_latent_gps, M, S, S)),
+            dtype=default_float(),
+            name=f"{self.name}_q_gain" if self.name else "q_gain",
+        )  # [num_latent_gps, M, S, S]
+        self.q_sqrt = Parameter(
+            np.tile(np.eye(S), (num_latent_gps, M, 1, 1)),
+            transform=triangular(),
+            dtype=default_float(),
+            name=f"{self.name}_q_sqrt" if self.name else "q_sqrt",
+        )  # [num_latent_gps, M, S, S]
+
+    def _state_space_model(self) -> StateSpaceModel:
+        return state_space_model(self.kernel)
+
+    def _inducing_times(self) -> tf.Tensor:
+        return tf.convert_to_tensor(self.inducing_variable.Z)[:, 0]  # [M]
+
+    def _variational_transitions(
+        self, model: StateSpaceModel
+    ) -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+        """
+        Returns the transition matrices ``B_k``, offsets ``b_k`` and noise
+        Cholesky factors ``C_k`` of the variational chain over the inducing
+        states, with the shapes ``[M, L, S, S]``, ``[M, L, S]`` and ``[M, L, S, S]``.
+        """
+        Z = self._inducing_times()
+        dt = tf.concat([tf.zeros_like(Z[:1]), Z[1:] - Z[:-1]], axis=0)  # [M]
+        first = tf.range(tf.shape(Z)[0]) == 0  # [M]
+        A, Q = transitions(model, dt, from_stationary=first)  # [M, S, S]
+        L = tf.linalg.cholesky(Q + default_jitter() * tf.eye(tf.shape(Q)[-1], dtype=Q.dtype))
+
+        gain = tf.transpose(self.q_gain, [1, 0, 2, 3])  # [M, L, S, S]
+        offset = tf.transpose(self.q_offset, [1, 0, 2])  # [M, L, S]
+        sqrt = tf.transpose(tf.linalg.band_part(self.q_sqrt, -1, 0), [1, 0, 2, 3])
+        L = L[:, None]  # [M, 1, S, S]
+        return A[:, None] + tf.matmul(L, gain), tf.linalg.matvec(L, offset), tf.matmul(L, sqrt)
+
+    def _posterior_marginals(
+        self, model: StateSpaceModel
+    ) -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+        """
+        Returns the marginal means ``[M, L, S]`` and covariances
+        ``[M, L, S, S]`` of the variational chain over the inducing states, and
+        the cross-covariances ``Cov(s_k, s_{k+1})`` with the shape ``[M - 1, L, S, S]``.
+        """
+        B, b, C = self._variational_transitions(model)
+        means, covs = affine_gaussian_scan(B, b, tf.matmul(C, C, transpose_b=True))
+        cross_covs = tf.matmul(covs[:-1], B[1:], transpose_b=True)  # [M - 1, L, S, S]
+        return means, covs, cross_covs
+
+    def _bridges(
+        self, model: StateSpaceModel, inputs: TensorType, times: Optional[TensorType] = None
+    ) -> Tuple[tf.Tensor, tf.Tensor, Tuple[tf.Tensor, tf.Tensor, tf.Tensor]]:
+        """
+        Returns the indices of the left and right neighbouring *times* (by
+        default, the inducing times) of each input (shape ``[N]``) and the
+        Gauss–Markov bridge ``(P, R, T)`` from the neighbouring states to the
+        state at the input (see :func:`~gpflux.state_space.bridge`).
+        """
+        Z = self._inducing_times() if times is None else times
+        M = tf.shape(Z)[0]
+        t = tf.convert_to_tensor(inputs, dtype=Z.dtype)[:, 0]  # [N]
+
+        k = tf.searchsorted(Z[None], t[None], side="right")[0] - 1  # [N]
+        has_left, has_right = k >= 0, k + 1 < M
+        left, right = tf.maximum(k, 0), tf.minimum(k + 1, M - 1)
+
+        A1, Q1 = transitions(model, t - tf.gather(Z, left), from_stationary=~has_left)
+        A2, Q2 = transitions(model, tf.maximum(tf.gather(Z, right) - t, 0.0))
+        A2 = tf.where(has_right[:, None, None], A2, tf.zeros_like(A2))
+        Q2 = tf.where(has_right[:, None, None], Q2, tf.eye(tf.shape(Q2)[-1], dtype=Q2.dtype))
+        return left, right, bridge(A1, Q1, A2, Q2, jitter=default_jitter())
+
+    def predict(
+        self,
+        inputs: TensorType,
+        *,
+        full_cov: bool = False,
+        full_output_cov: bool = False,
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Make a prediction at N test inputs (times, with the shape ``[N, 1]``)
+        for the Q outputs of this layer, including the mean function
+        contribution. The shapes of the (co)variance are the same as for
+        :meth:`GPLayer.predict`; *full_cov* is not supported. Inputs with
+        leading dimensions, such as ``[S, N, 1]``, are flattened (see
+        :meth:`~GPLayer._predict_flattened`).
+        """
+        if full_cov:
+            raise NotImplementedError("`TemporalGPLayer` only supports marginal predictions")
+        if tf.convert_to_tensor(inputs).shape.rank > 2:
+            return self._predict_flattened(inputs, full_output_cov=full_output_cov)
+
+        model = self._state_space_model()
+        means, covs, cross_covs = self._posterior_marginals(model)
+        left, right, (P, R, T) = self._bridges(model, inputs)
+        cross = tf.gather(cross_covs, tf.minimum(left, tf.shape(cross_covs)[0] - 1))
+
+        P, R, T = P[:, None], R[:, None], T[:, None]  # [N, 1, S, S]
+        mean = tf.linalg.matvec(P, tf.gather(means, left)) + tf.linalg.matvec(
+            R, tf.gather(means, right)
+        )  # [N, L, S]
+        P_cross_Rt = tf.matmul(P, tf.matmul(cross, R, transpose_b=True))  # [N, L, S, S]
+        cov = (
+            T
+            + tf.matmul(P, tf.matmul(tf.gather(covs, left), P, transpose_b=True))
+            + tf.matmul(R, tf.matmul(tf.gather(covs, right), R, transpose_b=True))
+            + P_cross_Rt
+            + tf.linalg.adjoint(P_cross_Rt)
+        )  # [N, L, S, S]
+
+        f_mean = tf.linalg.matvec(model.H, mean)[..., 0]  # [N, L]
+        f_var = tf.matmul(model.H, tf.matmul(cov, model.H, transpose_b=True))[..., 0, 0]
+        if full_output_cov:
+            f_var = tf.linalg.diag(f_var)  # [N, L, L]
+
+        return f_mean + self.mean_function(inputs), f_var
+
+    def prior_kl(self) -> tf.Tensor:
+        """
+        Returns the KL divergence between the variational and the prior
+        Gauss–Markov chains over the inducing states, as a sum over the
+        transitions of the expected KL divergences between their conditionals.
+        """
+        model = self._state_space_model()
+        means, covs, _ = self._posterior_marginals(model)
+        previous_means = tf.concat([tf.zeros_like(means[:1]), means[:-1]], axis=0)
+        previous_covs = tf.concat([tf.zeros_like(covs[:1]), covs[:-1]], axis=0)
+
+        gain = tf.transpose(self.q_gain, [1, 0, 2, 3])  # [M, L, S, S]
+        offset = tf.transpose(self.q_offset, [1, 0, 2])  # [M, L, S]
+        sqrt = tf.linalg.band_part(self.q_sqrt, -1, 0)  # [L, M, S, S]
+
+        mismatch = tf.linalg.matvec(gain, previous_means) + offset  # [M, L, S]
+        trace_gain = tf.linalg.trace(
+            tf.matmul(gain, tf.matmul(previous_covs, gain, transpose_b=True))
+        )  # [M, L]
+        S = tf.cast(tf.shape(sqrt)[-1], sqrt.dtype)
+        logdet = tf.reduce_sum(tf.math.log(tf.square(tf.linalg.diag_part(sqrt))), axis=-1)
+
+        two_kl = (
+            tf.reduce_sum(tf.square(sqrt))
+            + tf.reduce_sum(tf.square(mismatch))
+            + tf.reduce_sum(trace_gain)
+            - S * tf.cast(tf.size(logdet), sqrt.dtype)
+            - tf.reduce_sum(logdet)
+        )
+        return 0.5 * two_kl
+
+    def sample(self) -> Sample:
+        """
+        Draw a consistent sample path from this layer. The inducing states are
+        sampled once from the variational chain; at each evaluation, a joint
+        prior path is sampled over the new and all previously evaluated times
+        with a parallel scan, and conditioned on the states at the previously
+        evaluated times with Matheron's rule, which only involves the two
+        neighbouring states of each new time. The cost is linear in the number
+        of evaluated times.
+        """
+        model = self._state_space_model()
+        layer = self
+
+        B, b, C = self._variational_transitions(model)
+        noise = tf.random.normal(tf.shape(b), dtype=default_float())
+        inducing_states, _ = affine_gaussian_scan(B, b + tf.linalg.matvec(C, noise))
+
+        class TemporalSample(Sample):
+            times = layer._inducing_times()  # [K]
+            states = inducing_states  # [K, L, S]
+
+            def __call__(self, X: TensorType) -> tf.Tensor:
+                """
+                :param X: evaluation times [N, 1]
+                :return: function value of sample [N, L]
+                """
+                t = tf.convert_to_tensor(X, dtype=default_float())[:, 0]  # [N]
+                K = tf.shape(self.times)[0]
+
+                # Joint prior path over the known and the new times
+                all_times = tf.concat([self.times, t], axis=0)  # [K + N]
+                order = tf.argsort(all_times, stable=True)
+                sorted_times = tf.gather(all_times, order)
+                dt = tf.concat([tf.zeros_like(t[:1]), sorted_times[1:] - sorted_times[:-1]], 0)
+                first = tf.range(tf.shape(dt)[0]) == 0
+                A, Q = transitions(model, dt, from_stationary=first)  # [K + N, S, S]
+                Q += default_jitter() * tf.eye(tf.shape(Q)[-1], dtype=Q.dtype)
+                noise = tf.random.normal(
+                    tf.concat([tf.shape(all_times), tf.shape(self.states)[1:]], 0),
+                    dtype=default_float(),
+                )  # [K + N, L, S]
+                # repeated times must get identical states, despite the jitter
+                noise = tf.where((first | (dt > 0))[:, None, None], noise, tf.zeros_like(noise))
+                prior, _ = affine_gaussian_scan(
+                    A[:, None], tf.linalg.matvec(tf.linalg.cholesky(Q)[:, None], noise)
+                )
+                prior = tf.gather(prior, tf.argsort(order))  # [K + N, L, S]
+
+                # Matheron's rule: condition on the states at the known times
+                left, right, (P, R, _) = layer._bridges(model, t[:, None], self.times)
+                residual = self.states - prior[:K]  # [K, L, S]
+                new_states = (
+                    prior[K:]
+                    + tf.linalg.matvec(P[:, None], tf.gather(residual, left))
+                    + tf.linalg.matvec(R[:, None], tf.gather(residual, right))
+                )  # [N, L, S]
+
+                order = tf.argsort(all_times, stable=True)
+                self.times = tf.gather(all_times, order)
+                self.states = tf.gather(tf.concat([self.states, new_states], 0), order)
+
+                return tf.linalg.matvec(model.H, new_states)[..., 0]  # [N, L]
+
+        return TemporalSample() + self.mean_function
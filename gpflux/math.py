@@ -16,6 +16,8 @@
 """
 Math utilities
 """
+from typing import Tuple
+
 import tensorflow as tf
 
 from gpflow import default_jitter
@@ -60,3 +62,191 @@ def compute_A_inv_b(A: TensorType, b: TensorType) -> tf.Tensor:
     L_inv_b = tf.linalg.triangular_solve(L, b)
     A_inv_b = tf.linalg.triangular_solve(L, L_inv_b, adjoint=True)  # adjoint = transpose
     return A_inv_b
+
+
+def rademacher_probes(shape: TensorType, dtype: tf.DType) -> tf.Tensor:
+    r"""
+    Draw random probe vectors with independent Rademacher (:math:`\pm 1`) entries,
+    as used by Hutchinson's trace estimator :math:`\operatorname{tr}(A) \approx
+    \mathbb{E}[z^\top A z]`.
+
+    :param shape: The shape of the probes, typically ``[..., M, R]`` for ``R``
+        probe vectors of length ``M``.
+    :param dtype: The dtype of the returned tensor.
+    """
+    signs = tf.random.uniform(shape, minval=0, maxval=2, dtype=tf.int32)
+    return tf.cast(2 * signs - 1, dtype)
+
+
+def _conjugate_gradient(
+    A: TensorType, B: TensorType, max_iterations: int, tolerance: float
+) -> tf.Tensor:
+    """
+    Batched conjugate gradients for ``A X = B``, running until all columns
+    have converged (relative residual norm below *tolerance*) or
+    *max_iterations* have been carried out.
+    """
+    X = tf.zeros_like(B)  # [..., M, R]
+    residual = B  # [..., M, R]
+    direction = residual  # [..., M, R]
+    residual_sq = tf.reduce_sum(tf.square(residual), axis=-2, keepdims=True)  # [..., 1, R]
+    threshold = tolerance ** 2 * residual_sq  # [..., 1, R]
+
+    def cond(i, X, residual, direction, residual_sq):  # type: ignore
+        return tf.logical_and(i < max_iterations, tf.reduce_any(residual_sq > threshold))
+
+    def body(i, X, residual, direction, residual_sq):  # type: ignore
+        A_direction = tf.matmul(A, direction)  # [..., M, R]
+        curvature = tf.reduce_sum(direction * A_direction, axis=-2, keepdims=True)
+        step = tf.math.divide_no_nan(residual_sq, curvature)  # [..., 1, R]
+        X = X + step * direction
+        residual = residual - step * A_direction
+        new_residual_sq = tf.reduce_sum(tf.square(residual), axis=-2, keepdims=True)
+        direction = residual + tf.math.divide_no_nan(new_residual_sq, residual_sq) * direction
+        return i + 1, X, residual, direction, new_residual_sq
+
+    _, X, _, _, _ = tf.while_loop(cond, body, [tf.constant(0), X, residual, direction, residual_sq])
+    return X
+
+
+def conjugate_gradient_solve(
+    A: TensorType, B: TensorType, *, max_iterations: int = 100, tolerance: float = 1e-6
+) -> tf.Tensor:
+    r"""
+    Computes :math:`A^{-1} B` by the method of conjugate gradients, which only
+    requires matrix-vector products with ``A`` and therefore scales as
+    :math:`O(M^2)` per iteration instead of the :math:`O(M^3)` of a Cholesky
+    decomposition.
+
+    The gradient is defined implicitly, by a second conjugate gradient solve in
+    the backwards pass, rather than by differentiating through the iterations.
+
+    :param A: A symmetric positive-definite matrix with shape ``[..., M, M]``;
+        its leading dimensions must be the same as those of ``B``.
+    :param B: Tensor with shape ``[..., M, R]``.
+    :param max_iterations: The maximum number of conjugate gradient iterations.
+    :param tolerance: The relative residual norm at which a column is considered converged.
+
+    :returns: Tensor with shape ``[..., M, R]``.
+    """
+
+    @tf.custom_gradient
+    def _solve(A: tf.Tensor, B: tf.Tensor) -> tf.Tensor:
+        X = _conjugate_gradient(A, B, max_iterations, tolerance)
+
+        def grad(dX: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor]:
+            dB = _conjugate_gradient(A, dX, max_iterations, tolerance)  # A is symmetric
+            dA = -tf.matmul(dB, X, transpose_b=True)
+            return dA, dB
+
+        return X, grad
+
+    return _solve(A, B)
+
+
+def _lanczos_quadrature_logdet(A: TensorType, probes: TensorType, num_iterations: int) -> tf.Tensor:
+    """
+    Runs *num_iterations* steps of the Lanczos algorithm on ``A``, starting from
+    each of the *probes*, and evaluates ``zᵀ log(A) z`` by Gauss quadrature on
+    the resulting tridiagonal matrices.
+    """
+    probe_norms = tf.norm(probes, axis=-2, keepdims=True)  # [..., 1, R]
+    q = probes / probe_norms  # [..., M, R]
+    q_previous = tf.zeros_like(q)
+    beta = tf.zeros_like(probe_norms)
+    tiny = tf.constant(1e-30, dtype=q.dtype)
+
+    alphas, betas = [], []
+    for _ in range(num_iterations):
+        w = tf.matmul(A, q) - beta * q_previous
+        alpha = tf.reduce_sum(q * w, axis=-2, keepdims=True)  # [..., 1, R]
+        w = w - alpha * q
+        beta = tf.norm(w, axis=-2, keepdims=True)  # [..., 1, R]
+        alphas.append(alpha)
+        betas.append(beta)
+        q_previous, q = q, w / tf.maximum(beta, tiny)
+
+    alphas = tf.linalg.matrix_transpose(tf.concat(alphas, axis=-2))  # [..., R, k]
+    betas = tf.linalg.matrix_transpose(tf.concat(betas[:-1], axis=-2))  # [..., R, k-1]
+    T = tf.linalg.diag(alphas)
+    if num_iterations > 1:
+        T += tf.linalg.diag(betas, k=1) + tf.linalg.diag(betas, k=-1)  # [..., R, k, k]
+
+    eigenvalues, eigenvectors = tf.linalg.eigh(T)  # [..., R, k], [..., R, k, k]
+    weights = tf.square(eigenvectors[..., 0, :])  # [..., R, k]
+    log_eigenvalues = tf.math.log(tf.maximum(eigenvalues, tiny))
+    quadrature = tf.reduce_sum(weights * log_eigenvalues, axis=-1)  # [..., R]
+    return tf.square(probe_norms[..., 0, :]) * quadrature  # [..., R]
+
+
+def stochastic_logdet(
+    A: TensorType,
+    probes: TensorType,
+    *,
+    num_iterations: int = 20,
+    max_cg_iterations: int = 100,
+    cg_tolerance: float = 1e-6,
+) -> tf.Tensor:
+    r"""
+    Estimates :math:`\log|A|` by stochastic Lanczos quadrature
+    :cite:p:`ubaru2017fast`, returning one estimate per probe vector; their
+    mean is the estimate of the log-determinant, and their spread can be used
+    to assess its variance.
+
+    The gradient :math:`\partial \log|A| / \partial A = A^{-1}` is estimated
+    with the same probes by Hutchinson's estimator, :math:`A^{-1} \approx
+    \frac{1}{2}(A^{-1} z z^\top + z z^\top A^{-1})` for each probe ``z``, using
+    :func:`conjugate_gradient_solve`.
+
+    :param A: A symmetric positive-definite matrix with shape ``[..., M, M]``;
+        its leading dimensions must be the same as those of *probes*.
+    :param probes: Probe vectors with shape ``[..., M, R]`` and
+        :math:`\mathbb{E}[z z^\top] = I`, e.g. from :func:`rademacher_probes`.
+    :param num_iterations: The number of Lanczos iterations; the accuracy of
+        the quadrature for each probe increases with this number.
+    :param max_cg_iterations: The maximum number of conjugate gradient
+        iterations used in the backwards pass.
+    :param cg_tolerance: The conjugate gradient tolerance used in the backwards pass.
+
+    :returns: Tensor with shape ``[..., R]``.
+    """
+    num_iterations = min(num_iterations, A.shape[-1] or num_iterations)
+
+    @tf.custom_gradient
+    def _logdet(A: tf.Tensor) -> tf.Tensor:
+        estimates = _lanczos_quadrature_logdet(A, probes, num_iterations)  # [..., R]
+
+        def grad(d_estimates: tf.Tensor) -> tf.Tensor:
+            A_inv_probes = _conjugate_gradient(
+                A, probes, max_cg_iterations, cg_tolerance
+            )  # [..., M, R]
+            weighted = A_inv_probes * d_estimates[..., None, :]  # [..., M, R]
+            outer = tf.matmul(weighted, probes, transpose_b=True)  # [..., M, M]
+            return 0.5 * (outer + tf.linalg.matrix_transpose(outer))
+
+        return estimates, grad
+
+    return _logdet(A)
+
+
+def unique_rows(inputs: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Find the distinct rows of *inputs*, so that a function of each row can be
+    evaluated once per distinct row and gathered back with
+    ``tf.gather(outputs, indices)``.
+
+    Unlike the distinct rows returned by `tf.raw_ops.UniqueV2`, the
+    *unique_inputs* are gathered from *inputs* (at the first occurrence of each
+    row), so that gradients flow through them.
+
+    :param inputs: Tensor with shape ``[..., D]``, whose leading dimensions are
+        flattened into ``N`` rows.
+    :returns: The distinct rows ``[U, D]``, in the order of their first
+        occurrence, and the index ``[N]`` of the distinct row of each row.
+    """
+    rows = tf.reshape(inputs, [-1, tf.shape(inputs)[-1]])  # [N, D]
+    distinct, indices = tf.raw_ops.UniqueV2(x=rows, axis=tf.constant([0], dtype=tf.int64))
+    first_indices = tf.math.unsorted_segment_min(
+        tf.range(tf.shape(rows)[0]), indices, tf.shape(distinct)[0]
+    )  # [U]
+    return tf.gather(rows, first_indices), indices
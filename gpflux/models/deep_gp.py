@@ -24,7 +24,9 @@ import gpflow
 from gpflow.base import Module, TensorType
 
 import gpflux
-from gpflux.layers import LayerWithObservations, LikelihoodLayer
+from gpflux.layers import LatentVariableLayer, LayerWithObservations, LikelihoodLayer
+from gpflux.layers.gp_layer import GPLayerOutputs
+from gpflux.math import unique_rows
 from gpflux.sampling.sample import Sample
 
 
@@ -68,6 +70,43 @@ class DeepGP(Module):
     lower bound (:meth:`elbo`).
     """
 
+    num_samples: Optional[int]
+    """
+    The number of Monte Carlo samples ``S`` propagated through the layers for
+    each data point when training. If not `None`, the inputs are broadcast to
+    the shape ``[S, N, D]`` before the first layer, so that each layer
+    evaluates all samples in one batched call (sharing, for example, the
+    Cholesky factorisation of ``Kuu`` in a :class:`~gpflux.layers.GPLayer`;
+    subclasses whose predictions only support ``[N, D]`` inputs flatten the
+    samples into ``[S N, D]``), and the data-fit term of the ELBO is averaged
+    over the samples. The layers themselves should then not set their own
+    ``num_samples``. Predictions are not affected.
+    """
+
+    importance_weighted: bool
+    r"""
+    If `True`, train with the importance-weighted bound of
+    :cite:t:`salimbeni2019iwvi` instead of the ELBO: the :attr:`num_samples`
+    samples of each data point are importance samples of the latent variables
+    of the :class:`~gpflux.layers.LatentVariableLayer`\ s, weighted by ``p(w) /
+    q(w)`` and combined with a log-mean-exp in the :attr:`likelihood_layer`.
+    The GP layers are still treated variationally (their KL divergences are
+    added to the losses as before).
+    """
+
+    deduplicate_inputs: bool
+    r"""
+    If `True`, :meth:`predict_mean` propagates only the distinct rows of its
+    inputs through the :class:`~gpflux.layers.GPLayer`\ s up to the first
+    layer of another type, and gathers the outputs back to all rows before
+    that layer. This is exact, as the means of the GP layers are
+    deterministic, whereas other layers may be stochastic (for example, a
+    :class:`~gpflux.layers.LatentVariableLayer` samples from its prior for
+    each row). To deduplicate the inputs of a :class:`~gpflux.layers.GPLayer`
+    when propagating samples, set its own
+    :attr:`~gpflux.layers.GPLayer.deduplicate_inputs` instead.
+    """
+
     def __init__(
         self,
         f_layers: List[tf.keras.layers.Layer],
@@ -79,6 +118,9 @@ class DeepGP(Module):
         target_dim: Optional[int] = None,
         default_model_class: Type[tf.keras.Model] = tf.keras.Model,
         num_data: Optional[int] = None,
+        num_samples: Optional[int] = None,
+        importance_weighted: bool = False,
+        deduplicate_inputs: bool = False,
     ):
         """
         :param f_layers: The layers ``[f₁, f₂, …, fₙ]`` describing the latent
@@ -95,6 +137,13 @@ class DeepGP(Module):
             :attr:`num_data` attribute.
             If you do not specify a value for this parameter explicitly, it is automatically
             detected from the :attr:`~gpflux.layers.GPLayer.num_data` attribute in the GP layers.
+        :param num_samples: The number of Monte Carlo samples propagated for
+            each data point when training; see the :attr:`num_samples` attribute.
+        :param importance_weighted: Whether to train with the importance-weighted
+            bound; see the :attr:`importance_weighted` attribute. This requires
+            *num_samples* and at least one :class:`~gpflux.layers.LatentVariableLayer`.
+        :param deduplicate_inputs: Whether :meth:`predict_mean` only evaluates
+            the distinct input rows; see the :attr:`deduplicate_inputs` attribute.
         """
         self.inputs = tf.keras.Input((input_dim,), name="inputs")
         self.targets = tf.keras.Input((target_dim,), name="targets")
@@ -105,6 +154,16 @@ class DeepGP(Module):
             self.likelihood_layer = likelihood
         self.default_model_class = default_model_class
         self.num_data = self._validate_num_data(f_layers, num_data)
+        self.num_samples = num_samples
+        if importance_weighted:
+            if num_samples is None:
+                raise ValueError("The importance-weighted bound requires `num_samples`")
+            if not any(isinstance(layer, LatentVariableLayer) for layer in f_layers):
+                raise ValueError(
+                    "The importance-weighted bound requires at least one `LatentVariableLayer`"
+                )
+        self.importance_weighted = importance_weighted
+        self.deduplicate_inputs = deduplicate_inputs
 
     @staticmethod
     def _validate_num_data(
@@ -143,8 +202,30 @@ class DeepGP(Module):
         are passed the additional keyword argument ``observations=[inputs,
         targets]`` if *targets* contains a value, or ``observations=None`` when
         *targets* is `None`.
+
+        If *targets* contains a value and :attr:`num_samples` is set, the
+        *inputs* are broadcast to ``[S, N, D]`` and the outputs have the same
+        leading sample dimension.
+        """
+        features, _ = self._evaluate_deep_gp_and_log_weights(inputs, targets, training)
+        return features
+
+    def _evaluate_deep_gp_and_log_weights(
+        self,
+        inputs: TensorType,
+        targets: Optional[TensorType],
+        training: Optional[bool] = None,
+    ) -> Tuple[tf.Tensor, Optional[tf.Tensor]]:
+        r"""
+        Evaluate ``f(x)`` as in :meth:`_evaluate_deep_gp`. If *targets*
+        contains a value and this model is :attr:`importance_weighted`, also
+        return the sum of the log importance weights ``[S, N]`` of all
+        :class:`~gpflux.layers.LatentVariableLayer`\ s; otherwise, `None`.
         """
         features = inputs
+        if targets is not None and self.num_samples is not None:
+            sample_shape = tf.concat([[self.num_samples], tf.shape(inputs)], axis=0)
+            features = tf.broadcast_to(inputs, sample_shape)  # [S, N, D]
 
         # NOTE: we cannot rely on the `training` flag here, as the correct
         # symbolic graph needs to be constructed at "build" time (before either
@@ -155,24 +236,39 @@ class DeepGP(Module):
             # TODO would it be better to simply pass [inputs, None] in this case?
             observations = None
 
+        importance_weighted = targets is not None and self.importance_weighted
+        log_weights = None
         for layer in self.f_layers:
-            if isinstance(layer, LayerWithObservations):
+            if importance_weighted and isinstance(layer, LatentVariableLayer):
+                features, layer_log_weights = layer(
+                    features, observations=observations, training=training, importance_weighted=True
+                )
+                log_weights = (
+                    layer_log_weights if log_weights is None else log_weights + layer_log_weights
+                )
+            elif isinstance(layer, LayerWithObservations):
                 features = layer(features, observations=observations, training=training)
             else:
                 features = layer(features, training=training)
-        return features
+        return features, log_weights
 
     def _evaluate_likelihood(
         self,
         f_outputs: TensorType,
         targets: Optional[TensorType],
         training: Optional[bool] = None,
+        log_weights: Optional[TensorType] = None,
     ) -> tf.Tensor:
         """
         Call the `likelihood_layer` on *f_outputs*, which adds the
-        corresponding layer loss when training.
+        corresponding layer loss when training. If *log_weights* are given,
+        this is the importance-weighted bound (see :attr:`importance_weighted`).
         """
-        return self.likelihood_layer(f_outputs, targets=targets, training=training)
+        if log_weights is None:
+            return self.likelihood_layer(f_outputs, targets=targets, training=training)
+        return self.likelihood_layer(
+            f_outputs, targets=targets, training=training, log_weights=log_weights
+        )
 
     def call(
         self,
@@ -180,20 +276,97 @@ class DeepGP(Module):
         targets: Optional[TensorType] = None,
         training: Optional[bool] = None,
     ) -> tf.Tensor:
-        f_outputs = self._evaluate_deep_gp(inputs, targets=targets, training=training)
-        y_outputs = self._evaluate_likelihood(f_outputs, targets=targets, training=training)
+        f_outputs, log_weights = self._evaluate_deep_gp_and_log_weights(
+            inputs, targets=targets, training=training
+        )
+        y_outputs = self._evaluate_likelihood(
+            f_outputs, targets=targets, training=training, log_weights=log_weights
+        )
         return y_outputs
 
-    def predict_f(self, inputs: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
-        """
+    def predict_f(
+        self, inputs: TensorType, *, moment_matching: bool = False
+    ) -> Tuple[tf.Tensor, tf.Tensor]:
+        r"""
+        :param inputs: The inputs to predict at, with the shape ``[N, D]``.
+        :param moment_matching: If `False` (the default), propagate a single
+            sample through all but the last layer, so that the prediction is
+            stochastic. If `True`, propagate the means and variances through
+            all layers deterministically instead, approximating the outputs of
+            each layer by a Gaussian with their exact moments (see
+            :meth:`~gpflux.layers.GPLayer.predict_moment_matched`). This
+            requires all :attr:`f_layers` to be :class:`~gpflux.layers.GPLayer`\ s
+            with squared exponential kernels.
         :returns: The mean and variance (not the scale!) of ``f``, for compatibility with GPflow
            models.
 
         .. note:: This method does **not** support ``full_cov`` or ``full_output_cov``.
         """
+        if moment_matching:
+            return self._predict_f_moment_matched(inputs)
         f_distribution = self._evaluate_deep_gp(inputs, targets=None)
+        if isinstance(f_distribution, GPLayerOutputs):
+            return f_distribution.mean, f_distribution.var
         return f_distribution.loc, f_distribution.scale.diag ** 2
 
+    def _predict_f_moment_matched(self, inputs: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Propagate the means and variances of ``f`` through the :attr:`f_layers`.
+        """
+        mean = tf.convert_to_tensor(inputs, dtype=gpflow.default_float())
+        var = tf.zeros_like(mean)
+        for layer in self.f_layers:
+            if not isinstance(layer, gpflux.layers.GPLayer):
+                raise NotImplementedError(
+                    f"Moment matching is not implemented for {type(layer).__name__}"
+                )
+            mean, var = layer.predict_moment_matched(mean, var)
+        return mean, var
+
+    def predict_mean(self, inputs: TensorType) -> tf.Tensor:
+        """
+        Propagate only the predictive means through the :attr:`f_layers`: each
+        :class:`~gpflux.layers.GPLayer` is evaluated with
+        :meth:`~gpflux.layers.GPLayer.predict_mean` at the mean output of the
+        previous layer, skipping all variance computations. Other layers are
+        called as in prediction mode.
+
+        .. note:: For more than one GP layer, this is the mean of the last
+           layer at the means of the previous layers, not the (intractable)
+           predictive mean of ``f``.
+
+        :param inputs: The inputs to predict at, with the shape ``[N, D]``.
+        :returns: The mean of ``f``, with the shape ``[N, Q]``.
+        """
+        features, indices = inputs, None
+        if self.deduplicate_inputs:
+            features, indices = unique_rows(inputs)  # [U, D], [N]
+        for layer in self.f_layers:
+            if isinstance(layer, gpflux.layers.GPLayer):
+                features = layer.predict_mean(features)
+            else:
+                if indices is not None:
+                    # other layers may be stochastic, so each row is evaluated separately
+                    features, indices = tf.gather(features, indices), None  # [N, ...]
+                features = tf.convert_to_tensor(layer(features))
+        if indices is not None:
+            features = tf.gather(features, indices)  # [N, Q]
+        return features
+
+    def export(self, path: str, *, input_dim: Optional[int] = None) -> None:
+        """
+        Write a SavedModel for serving to *path*, with the signatures
+        ``predict_f``, ``predict_y``, ``predict_mean`` and ``sample_f``; see
+        :func:`~gpflux.prediction.export_deep_gp`.
+
+        :param path: The directory to write the SavedModel to.
+        :param input_dim: The input dimensionality, if this model was
+            constructed without *input_dim*.
+        """
+        from gpflux.prediction import export_deep_gp
+
+        export_deep_gp(self, path, input_dim=input_dim)
+
     def elbo(self, data: Tuple[TensorType, TensorType]) -> tf.Tensor:
         """
         :returns: The ELBO (not the per-datapoint loss!), for compatibility with GPflow models.
@@ -207,6 +380,9 @@ class DeepGP(Module):
         ]
         return -tf.reduce_sum(all_losses) * self.num_data
 
+    def _has_tensor_outputs(self) -> bool:
+        return any(getattr(layer, "tensor_outputs", False) for layer in self.f_layers)
+
     def _get_model_class(self, model_class: Optional[Type[tf.keras.Model]]) -> Type[tf.keras.Model]:
         if model_class is not None:
             return model_class
@@ -243,11 +419,14 @@ class DeepGP(Module):
         :param model_class: The model class to use; overrides `default_model_class`.
         """
         model_class = self._get_model_class(model_class)
-        outputs = self.call(self.inputs, self.targets)
+        if self._has_tensor_outputs():
+            outputs = _DeepGPLayer(self)(self.inputs, self.targets)
+        else:
+            outputs = self.call(self.inputs, self.targets)
         return model_class([self.inputs, self.targets], outputs)
 
     def as_prediction_model(
-        self, model_class: Optional[Type[tf.keras.Model]] = None
+        self, model_class: Optional[Type[tf.keras.Model]] = None, *, mean_only: bool = False
     ) -> tf.keras.Model:
         """
         Construct a `tf.keras.Model` instance that requires only ``inputs``,
@@ -263,18 +442,51 @@ class DeepGP(Module):
         .. note:: The returned model will not support training; for that, use `as_training_model`.
 
         :param model_class: The model class to use; overrides `default_model_class`.
+        :param mean_only: If `True`, the model outputs only the mean of ``f``
+            computed by :meth:`predict_mean` instead of the outputs of the
+            :attr:`likelihood_layer`.
         """
         model_class = self._get_model_class(model_class)
-        outputs = self.call(self.inputs)
+        if mean_only or self._has_tensor_outputs():
+            outputs = _DeepGPLayer(self, mean_only=mean_only)(self.inputs)
+        else:
+            outputs = self.call(self.inputs)
         return model_class(self.inputs, outputs)
 
 
+class _DeepGPLayer(tf.keras.layers.Layer):
+    """
+    Wraps a :class:`DeepGP` in a single Keras layer, so that it can be called
+    on symbolic inputs when constructing a `tf.keras.Model` even when its
+    layers pass structures other than distributions or tensors between them
+    (see :meth:`DeepGP.predict_mean` and :attr:`~gpflux.layers.GPLayer.tensor_outputs`).
+    """
+
+    def __init__(self, deep_gp: DeepGP, *, mean_only: bool = False):
+        super().__init__(dtype=gpflow.default_float())
+        self.deep_gp = deep_gp
+        self.mean_only = mean_only
+        # track the layers so that their losses and metrics are collected
+        self.f_layers = deep_gp.f_layers
+        self.likelihood_layer = deep_gp.likelihood_layer
+
+    def call(
+        self,
+        inputs: TensorType,
+        targets: Optional[TensorType] = None,
+        training: Optional[bool] = None,
+    ) -> tf.Tensor:
+        if self.mean_only:
+            return self.deep_gp.predict_mean(inputs)
+        return self.deep_gp.call(inputs, targets=targets, training=training)
+
+
 def sample_dgp(model: DeepGP) -> Sample:  # TODO: should this be part of a [Vanilla]DeepGP class?
     function_draws = [layer.sample() for layer in model.f_layers]
     # TODO: error check that all layers implement .sample()?
 
     class ChainedSample(Sample):
-        """ This class chains samples from consecutive layers. """
+        """This class chains samples from consecutive layers."""
 
         def __call__(self, X: TensorType) -> tf.Tensor:
             for f in function_draws:
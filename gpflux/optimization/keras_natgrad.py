@@ -17,7 +17,7 @@
 Support for the `gpflow.optimizers.NaturalGradient` optimizer within Keras models.
 """
 
-from typing import Any, List, Mapping, Optional, Tuple, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type, Union
 
 import tensorflow as tf
 from tensorflow.python.util.object_identity import ObjectIdentitySet
@@ -25,8 +25,15 @@ from tensorflow.python.util.object_identity import ObjectIdentitySet
 import gpflow
 from gpflow import Parameter
 from gpflow.models.model import MeanAndVariance
-from gpflow.optimizers import NaturalGradient
-
+from gpflow.optimizers import NaturalGradient, XiNat, XiTransform
+from gpflow.optimizers.natgrad import (
+    _to_constrained,
+    expectation_to_meanvarsqrt,
+    meanvarsqrt_to_expectation,
+    meanvarsqrt_to_natural,
+)
+
+from gpflux.layers.collapsed_gp_layer import CollapsedGPLayer
 from gpflux.layers.gp_layer import GPLayer
 
 __all__ = [
@@ -50,11 +57,20 @@ class NatGradModel(tf.keras.Model):
     :class:`~gpflux.layers.GPLayer`, followed by a regular optimizer (e.g.
     `tf.keras.optimizers.Adam`) as the last element to handle all other
     parameters (hyperparameters, inducing point locations).
+
+    The natural gradient steps of all layers with the same number of inducing
+    points (and the same type of ξ transform) are applied as one batched update,
+    each latent GP with the step size of its layer's optimizer. Set
+    :attr:`jit_compile_natgrad` to compile these updates with XLA.
+
+    To train with effective batches that do not fit in memory, set
+    :attr:`gradient_accumulation_steps` to accumulate the gradients over several
+    batches before each step.
     """
 
     @property
     def natgrad_layers(self) -> List[GPLayer]:
-        """
+        r"""
         The list of layers in this model that should be optimized using
         `~gpflow.optimizers.NaturalGradient`.
 
@@ -62,7 +78,9 @@ class NatGradModel(tf.keras.Model):
             `~gpflow.optimizers.NaturalGradient`.
         :setter: Sets the layers that should be trained using
             `~gpflow.optimizers.NaturalGradient`. Can be an explicit list or a `bool`:
-            If set to `True`, it will select all `GPLayer` instances in the model layers.
+            If set to `True`, it will select all `GPLayer` instances in the model layers,
+            except for :class:`~gpflux.layers.CollapsedGPLayer`\ s, whose ``q(u)``
+            is not trained.
         """
         if not hasattr(self, "_natgrad_layers"):
             raise AttributeError(
@@ -75,13 +93,62 @@ class NatGradModel(tf.keras.Model):
         if isinstance(layers, bool):
             if layers:  # all (GP) layers
                 self._natgrad_layers = [
-                    layer for layer in self.layers if isinstance(layer, GPLayer)
+                    layer
+                    for layer in self.layers
+                    if isinstance(layer, GPLayer) and not isinstance(layer, CollapsedGPLayer)
                 ]
             else:  # no layers
                 self._natgrad_layers = []
         else:
+            if any(isinstance(layer, CollapsedGPLayer) for layer in layers):
+                raise ValueError("The q(u) of a `CollapsedGPLayer` cannot be trained")
             self._natgrad_layers = layers
 
+    @property
+    def gradient_accumulation_steps(self) -> int:
+        """
+        The number of micro-batches (calls of :meth:`train_step`) over which the
+        gradients are accumulated before each natural gradient and optimizer step.
+
+        Each micro-batch loss is an estimate of the full-data objective (the
+        KL divergences are scaled by ``num_data``), so the accumulated gradient
+        is the average over the micro-batches: one step on ``k`` micro-batches
+        of size ``B`` is the same as one step on a batch of size ``k * B``.
+        Micro-batches left over at the end of an epoch carry over to the next one.
+
+        :getter: Returns the number of micro-batches per step (1 by default, i.e.
+            one step per batch).
+        :setter: Sets the number of micro-batches per step; must be set before
+            the model is first trained.
+        """
+        return getattr(self, "_gradient_accumulation_steps", 1)
+
+    @gradient_accumulation_steps.setter
+    def gradient_accumulation_steps(self, steps: int) -> None:
+        if steps < 1:
+            raise ValueError(f"gradient_accumulation_steps must be at least 1, but was {steps}")
+        self._gradient_accumulation_steps = steps
+
+    @property
+    def jit_compile_natgrad(self) -> bool:
+        """
+        Whether the batched natural gradient update of each group of layers
+        (see :meth:`_natgrad_apply_gradients`) is compiled with XLA into a
+        single computation of its triangular inversions and ξ transforms. Only
+        the update is compiled, so that this does not require the layers
+        themselves to support XLA (e.g. GPflow's separate independent
+        conditionals use a `tf.map_fn` whose gradient does not compile).
+
+        :getter: Returns whether the update is compiled with XLA (`False` by default).
+        :setter: Sets whether the update is compiled with XLA; must be set
+            before the model is first trained.
+        """
+        return getattr(self, "_jit_compile_natgrad", False)
+
+    @jit_compile_natgrad.setter
+    def jit_compile_natgrad(self, jit_compile: bool) -> None:
+        self._jit_compile_natgrad = jit_compile
+
     @property
     def natgrad_optimizers(self) -> List[gpflow.optimizers.NaturalGradient]:
         if not hasattr(self, "_all_optimizers"):
@@ -157,12 +224,6 @@ class NatGradModel(tf.keras.Model):
         return variational_params, other_vars
 
     def _apply_backwards_pass(self, loss: tf.Tensor, tape: tf.GradientTape) -> None:
-        print("Executing NatGradModel backwards pass")
-        # TODO(Ti) This is to check tf.function() compilation works and this
-        # won't be called repeatedly. Surprisingly, it gets called *twice*...
-        # Leaving the print here until we've established why twice, or whether
-        # it's irrelevant, and that it all works correctly in practice.
-
         num_natgrad_layers = len(self.natgrad_layers)
         num_natgrad_opt = len(self.natgrad_optimizers)
         if num_natgrad_opt != num_natgrad_layers:
@@ -182,13 +243,147 @@ class NatGradModel(tf.keras.Model):
             loss, (variational_params_vars, other_vars)
         )
 
-        for (natgrad_optimizer, (q_mu_grad, q_sqrt_grad), (q_mu, q_sqrt)) in zip(
-            self.natgrad_optimizers, variational_params_grads, variational_params
-        ):
-            natgrad_optimizer._natgrad_apply_gradients(q_mu_grad, q_sqrt_grad, q_mu, q_sqrt)
+        if self.gradient_accumulation_steps == 1:
+            self._apply_gradients(
+                variational_params_grads, other_grads, variational_params, other_vars
+            )
+            return
+
+        variables = tf.nest.flatten((variational_params_vars, other_vars))
+        grads = tf.nest.flatten((variational_params_grads, other_grads))
+        accumulators = self._gradient_accumulators(variables)
+        for accumulator, grad in zip(accumulators, grads):
+            if grad is not None:
+                accumulator.assign_add(grad / self.gradient_accumulation_steps)
+        self._accumulated_micro_batches.assign_add(1)
+
+        def apply_accumulated_gradients() -> None:
+            accumulated_grads = [
+                None if grad is None else accumulator.read_value()
+                for accumulator, grad in zip(accumulators, grads)
+            ]
+            self._apply_gradients(
+                *tf.nest.pack_sequence_as(
+                    (variational_params_grads, other_grads), accumulated_grads
+                ),
+                variational_params,
+                other_vars,
+            )
+            for accumulator in accumulators:
+                accumulator.assign(tf.zeros_like(accumulator))
+
+        tf.cond(
+            self._accumulated_micro_batches % self.gradient_accumulation_steps == 0,
+            apply_accumulated_gradients,
+            lambda: None,
+        )
+
+    def _gradient_accumulators(self, variables: List[tf.Variable]) -> List[tf.Variable]:
+        """
+        Return the variables in which the gradients with respect to *variables* are
+        accumulated, creating them (and the micro-batch counter) on first use.
+        """
+        if not hasattr(self, "_accumulated_gradients"):
+            with tf.init_scope():
+                self._accumulated_micro_batches = tf.Variable(
+                    0, dtype=tf.int64, trainable=False, name="accumulated_micro_batches"
+                )
+                self._accumulated_gradients = [
+                    tf.Variable(
+                        tf.zeros(variable.shape, variable.dtype),
+                        trainable=False,
+                        name="accumulated_gradient",
+                    )
+                    for variable in variables
+                ]
+        return self._accumulated_gradients
 
+    def _apply_gradients(
+        self,
+        variational_params_grads: List[Tuple[tf.Tensor, tf.Tensor]],
+        other_grads: List[tf.Tensor],
+        variational_params: List[Tuple[Parameter, Parameter]],
+        other_vars: List[tf.Variable],
+    ) -> None:
+        self._natgrad_apply_gradients(variational_params_grads, variational_params)
         self.optimizer.apply_gradients(zip(other_grads, other_vars))
 
+    def _natgrad_apply_gradients(
+        self,
+        variational_params_grads: List[Tuple[tf.Tensor, tf.Tensor]],
+        variational_params: List[Tuple[Parameter, Parameter]],
+    ) -> None:
+        """
+        Apply the natural gradient steps of all :attr:`natgrad_layers`.
+
+        Rather than running one `~gpflow.optimizers.NaturalGradient` step per
+        layer, the layers are grouped by their number of inducing points and the
+        type of ξ transform of their optimizer, and the ``q_mu`` and ``q_sqrt``
+        of each group are stacked along the latent GP dimension, so that the
+        triangular inversions and the ξ transform of each group run as one
+        batched computation. Each latent GP is still updated with the
+        :attr:`~gpflow.optimizers.NaturalGradient.gamma` of its layer's optimizer.
+
+        :param variational_params_grads: the gradients of the loss with respect to
+            the unconstrained variables of the ``(q_mu, q_sqrt)`` of each layer
+        :param variational_params: the ``(q_mu, q_sqrt)`` parameters of each layer
+        """
+        groups: Dict[Tuple[int, Type[XiTransform]], List[int]] = {}
+        for i, ((q_mu, _), natgrad_optimizer) in enumerate(
+            zip(variational_params, self.natgrad_optimizers)
+        ):
+            key = (q_mu.shape[0], type(natgrad_optimizer.xi_transform))
+            groups.setdefault(key, []).append(i)
+
+        natgrad_step = (
+            _jit_compiled_batched_natgrad_step
+            if self.jit_compile_natgrad
+            else _batched_natgrad_step
+        )
+        for indices in groups.values():
+            q_mus = [variational_params[i][0] for i in indices]
+            q_sqrts = [variational_params[i][1] for i in indices]
+            num_latent_gps = [q_mu.shape[-1] for q_mu in q_mus]
+            dL_dmean = tf.concat(
+                [
+                    _to_constrained(variational_params_grads[i][0], q_mu.transform)
+                    for i, q_mu in zip(indices, q_mus)
+                ],
+                axis=-1,
+            )  # [M, L]
+            dL_dvarsqrt = tf.concat(
+                [
+                    _to_constrained(variational_params_grads[i][1], q_sqrt.transform)
+                    for i, q_sqrt in zip(indices, q_sqrts)
+                ],
+                axis=0,
+            )  # [L, M, M]
+            gamma = tf.concat(
+                [
+                    tf.fill([num], tf.cast(self.natgrad_optimizers[i].gamma, dL_dmean.dtype))
+                    for i, num in zip(indices, num_latent_gps)
+                ],
+                axis=0,
+            )  # [L]
+
+            mean_new, varsqrt_new = natgrad_step(
+                tf.concat([tf.convert_to_tensor(q_mu) for q_mu in q_mus], axis=-1),
+                tf.concat([tf.convert_to_tensor(q_sqrt) for q_sqrt in q_sqrts], axis=0),
+                dL_dmean,
+                dL_dvarsqrt,
+                gamma,
+                self.natgrad_optimizers[indices[0]].xi_transform,
+            )
+
+            for q_mu, q_sqrt, layer_mean, layer_varsqrt in zip(
+                q_mus,
+                q_sqrts,
+                tf.split(mean_new, num_latent_gps, axis=-1),
+                tf.split(varsqrt_new, num_latent_gps, axis=0),
+            ):
+                q_mu.assign(layer_mean)
+                q_sqrt.assign(layer_varsqrt)
+
     def train_step(self, data: Any) -> Mapping[str, Any]:
         """
         The logic for one training step. For more details of the
@@ -248,3 +443,63 @@ class NatGradWrapper(NatGradModel):
         Calls the model on new inputs. Simply passes through to the ``base_model``.
         """
         return self.base_model.call(data, training=training)
+
+
+def _batched_natgrad_step(
+    q_mu: tf.Tensor,
+    q_sqrt: tf.Tensor,
+    dL_dmean: tf.Tensor,
+    dL_dvarsqrt: tf.Tensor,
+    gamma: tf.Tensor,
+    xi_transform: XiTransform,
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    The natural gradient step of
+    `gpflow.optimizers.NaturalGradient._natgrad_apply_gradients`, on tensors
+    rather than parameters and with a separate step size for each latent GP.
+
+    :param q_mu: the mean of q(u), with shape [M, L]
+    :param q_sqrt: the square root of the covariance of q(u), with shape [L, M, M]
+    :param dL_dmean: the gradient of the loss with respect to *q_mu*, with shape [M, L]
+    :param dL_dvarsqrt: the gradient of the loss with respect to *q_sqrt*, with shape [L, M, M]
+    :param gamma: the step size of each latent GP, with shape [L]
+    :param xi_transform: the ξ transform in which to take the step
+    :return: the new *q_mu* and *q_sqrt*
+    """
+    with tf.GradientTape(persistent=True, watch_accessed_variables=False) as tape:
+        tape.watch([q_mu, q_sqrt])
+
+        eta1, eta2 = meanvarsqrt_to_expectation(q_mu, q_sqrt)
+        meanvarsqrt = expectation_to_meanvarsqrt(eta1, eta2)
+
+        if not isinstance(xi_transform, XiNat):
+            nat1, nat2 = meanvarsqrt_to_natural(q_mu, q_sqrt)
+            xi1_nat, xi2_nat = xi_transform.naturals_to_xi(nat1, nat2)
+            dummy_tensors = tf.ones_like(xi1_nat), tf.ones_like(xi2_nat)
+            with tf.GradientTape(watch_accessed_variables=False) as forward_tape:
+                forward_tape.watch(dummy_tensors)
+                dummy_gradients = tape.gradient(
+                    [xi1_nat, xi2_nat], [nat1, nat2], output_gradients=dummy_tensors
+                )
+
+    dL_deta1, dL_deta2 = tape.gradient(
+        meanvarsqrt, [eta1, eta2], output_gradients=[dL_dmean, dL_dvarsqrt]
+    )
+
+    if not isinstance(xi_transform, XiNat):
+        nat_dL_xi1, nat_dL_xi2 = forward_tape.gradient(
+            dummy_gradients, dummy_tensors, output_gradients=[dL_deta1, dL_deta2]
+        )
+    else:
+        nat_dL_xi1, nat_dL_xi2 = dL_deta1, dL_deta2
+
+    del tape
+
+    xi1, xi2 = xi_transform.meanvarsqrt_to_xi(q_mu, q_sqrt)
+    xi1_new = xi1 - gamma * nat_dL_xi1  # [M, L]
+    xi2_new = xi2 - gamma[:, None, None] * nat_dL_xi2  # [L, M, M]
+    return xi_transform.xi_to_meanvarsqrt(xi1_new, xi2_new)
+
+
+# see NatGradModel.jit_compile_natgrad
+_jit_compiled_batched_natgrad_step = tf.function(_batched_natgrad_step, jit_compile=True)
@@ -0,0 +1,32 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Utilities for making predictions with trained models at scale.
+"""
+from gpflux.prediction.batching import MicroBatcher
+from gpflux.prediction.bucketed import BucketedPredictor
+from gpflux.prediction.cache import PredictionCache, WarmStartCache, model_signature
+from gpflux.prediction.compression import (
+    compress_deep_gp,
+    compress_gp_layer,
+    compression_report,
+    deep_gp_compression_report,
+)
+from gpflux.prediction.distillation import WeightSpaceSurrogate, distil_deep_gp, distillation_report
+from gpflux.prediction.export import ExportedDeepGP, export_deep_gp, export_deep_gp_npz
+from gpflux.prediction.numpy_runtime import NumpyDeepGP, NumpyWeightSpaceModel
+from gpflux.prediction.parallel import ParallelPredictor
+from gpflux.prediction.streaming import StreamingInputs, StreamingPredictor, deep_gp_predict_fn
@@ -0,0 +1,258 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`MicroBatcher`, which serves predictions to many
+concurrent asyncio callers by coalescing their requests into micro-batches.
+"""
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow.base import TensorType
+
+from gpflux.models import DeepGP
+
+_Request = Tuple[np.ndarray, "asyncio.Future[Tuple[np.ndarray, ...]]", float]
+""" The inputs of a request, the future for its outputs, and the time at which it was queued. """
+
+
+class MicroBatcher:
+    """
+    Serves predictions to many concurrent asyncio callers, each sending a few
+    rows of inputs, by coalescing their requests into micro-batches::
+
+        batcher = MicroBatcher.for_deep_gp(deep_gp)
+        async with batcher:
+            f_mean, f_var, y_mean, y_var = await batcher.predict(X)  # from any number of tasks
+
+    Requests are queued and collected into a batch until it has
+    *max_batch_size* rows or the oldest request has waited for *max_wait*
+    seconds. Each batch is evaluated with one call of *predict_fn* on a worker
+    thread, so that the event loop keeps accepting requests meanwhile (the
+    next batch fills up while the current one is evaluated), and the outputs
+    are split back into the results of the individual requests.
+
+    Batches of varying size make a `tf.function` retrace; to avoid that, use
+    e.g. :meth:`BucketedPredictor.predict <gpflux.prediction.BucketedPredictor.predict>`
+    as *predict_fn*.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Sequence[TensorType]],
+        *,
+        max_batch_size: int = 256,
+        max_wait: float = 0.002,
+        latency_window: int = 10000,
+    ):
+        """
+        :param predict_fn: The function that makes predictions for a batch of
+            inputs ``[n, D]``, returning a tuple of arrays or tensors with the
+            leading dimension ``n``. The outputs for each row must not depend
+            on the other rows.
+        :param max_batch_size: The maximum number of rows in a batch. A single
+            request with more rows is evaluated as a batch of its own.
+        :param max_wait: The maximum time (in seconds) to wait for more
+            requests to fill up a batch, counted from the first request of the batch.
+        :param latency_window: The number of most recent requests that the
+            latency metrics are computed from.
+        """
+        if max_batch_size < 1:
+            raise ValueError("`max_batch_size` must be positive")
+        if max_wait < 0:
+            raise ValueError("`max_wait` must be non-negative")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue: Optional["asyncio.Queue[_Request]"] = None
+        self._carry: Optional[_Request] = None  # the request that did not fit in the last batch
+        self._in_flight: List[_Request] = []  # the batch that is being evaluated
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.num_requests = 0
+        """ The number of requests that have been answered. """
+        self.num_batches = 0
+        """ The number of batches that have been evaluated. """
+        self.num_rows = 0
+        """ The number of rows that have been evaluated. """
+        self._latencies: Deque[float] = collections.deque(maxlen=latency_window)
+
+    @classmethod
+    def for_deep_gp(cls, model: DeepGP, **kwargs: Any) -> "MicroBatcher":
+        """
+        Return a :class:`MicroBatcher` for the prediction model of *model* (see
+        :meth:`~gpflux.models.DeepGP.as_prediction_model`), whose results are
+        the ``f_mean``, ``f_var``, ``y_mean`` and ``y_var`` of its outputs.
+        The prediction model is wrapped in a `tf.function` whose input
+        signature allows any batch size, so that it is traced only once.
+
+        :param kwargs: The keyword arguments of :class:`MicroBatcher`.
+        """
+        prediction_model = model.as_prediction_model()
+        input_spec = tf.TensorSpec(model.inputs.shape, model.inputs.dtype)
+
+        @tf.function(input_signature=[input_spec])
+        def compiled_predict_fn(inputs: tf.Tensor) -> Tuple[tf.Tensor, ...]:
+            outputs = prediction_model(inputs)
+            return outputs.f_mean, outputs.f_var, outputs.y_mean, outputs.y_var
+
+        def predict_fn(inputs: np.ndarray) -> Tuple[tf.Tensor, ...]:
+            return compiled_predict_fn(np.asarray(inputs, input_spec.dtype.as_numpy_dtype))
+
+        return cls(predict_fn, **kwargs)
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of requests waiting for a batch."""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + (self._carry is not None)
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Return the current :attr:`queue_depth`, the number of requests,
+        batches and rows evaluated so far, the mean batch size, and the 50th
+        and 99th percentiles of the latency (in seconds, from queueing a
+        request to its result) of the most recent requests.
+        """
+        latencies = np.array(self._latencies)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (np.nan, np.nan)
+        return {
+            "queue_depth": self.queue_depth,
+            "num_requests": self.num_requests,
+            "num_batches": self.num_batches,
+            "num_rows": self.num_rows,
+            "mean_batch_size": self.num_rows / self.num_batches if self.num_batches else np.nan,
+            "latency_p50": float(p50),
+            "latency_p99": float(p99),
+        }
+
+    def start(self) -> None:
+        """
+        Start collecting and evaluating batches in the running event loop.
+        This is called by :meth:`predict` if needed.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._task = asyncio.get_event_loop().create_task(self._batch_loop())
+
+    async def stop(self) -> None:
+        """Stop evaluating batches, and fail all requests that are still waiting."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        waiting = self._in_flight + ([self._carry] if self._carry is not None else [])
+        while not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future, _ in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("The MicroBatcher has been stopped"))
+        self._executor.shutdown(wait=False)
+        self._queue, self._carry, self._task, self._executor = None, None, None, None
+        self._in_flight = []
+
+    async def __aenter__(self) -> "MicroBatcher":
+        self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+
+    async def predict(self, inputs: TensorType) -> Tuple[np.ndarray, ...]:
+        """
+        Queue a request, and return its results when its batch has been evaluated.
+
+        :param inputs: The inputs, with the shape ``[n, D]``.
+        :returns: The outputs of *predict_fn* for *inputs*, as NumPy arrays.
+        """
+        inputs = np.asarray(inputs)
+        if inputs.ndim != 2:
+            raise ValueError(f"`inputs` must have the shape [n, D], not {inputs.shape}")
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        self._queue.put_nowait((inputs, future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self) -> List[_Request]:
+        """Wait for the next batch of requests, until it is full or *max_wait* has passed."""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = await self._queue.get()
+        batch, num_rows = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while num_rows < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                request = self._queue.get_nowait()
+            if num_rows + len(request[0]) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            num_rows += len(request[0])
+        return batch
+
+    def _predict(self, inputs: np.ndarray) -> Tuple[np.ndarray, ...]:
+        return tuple(np.asarray(output) for output in self.predict_fn(inputs))
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            batch = [request for request in batch if not request[1].cancelled()]
+            if not batch:
+                continue
+            inputs = np.concatenate([request[0] for request in batch], axis=0)
+            self._in_flight = batch
+            # if this is cancelled (by `stop`), `_in_flight` keeps the batch to fail its requests
+            try:
+                outputs = await loop.run_in_executor(self._executor, self._predict, inputs)
+            except Exception as error:  # pylint: disable=broad-except
+                self._in_flight = []
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self._in_flight = []
+
+            self.num_batches += 1
+            self.num_rows += len(inputs)
+            offsets = np.cumsum([len(request[0]) for request in batch])[:-1]
+            results = zip(*[np.split(output, offsets) for output in outputs])
+            now = time.perf_counter()
+            for (_, future, queued), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+                self.num_requests += 1
+                self._latencies.append(now - queued)
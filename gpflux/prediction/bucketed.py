@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`BucketedPredictor`, which makes predictions for
+batches of varying size with a fixed set of precompiled functions.
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Sequence, Set, Tuple
+
+import tensorflow as tf
+
+from gpflow import default_float
+from gpflow.base import TensorType
+
+from gpflux.models import DeepGP
+from gpflux.prediction.streaming import deep_gp_predict_fn
+
+DEFAULT_BUCKETS = (1, 8, 64, 512, 4096)
+""" The default batch sizes of :class:`BucketedPredictor`. """
+
+_METADATA_FILE = "bucketed_predictor.json"
+
+
+class BucketedPredictor:
+    """
+    Makes predictions for batches of any size with a fixed set of compiled
+    functions, one for each of the batch sizes in :attr:`buckets`.
+
+    Calling a `tf.function` on batches of many different sizes makes it
+    retrace (and, with XLA, recompile), which causes latency spikes when
+    serving requests of varying size. Instead, this class pads each batch to
+    the smallest bucket that fits it (by repeating its last row), runs the
+    compiled function for that bucket, and strips the padding from the
+    outputs. Batches larger than the largest bucket are split into chunks of
+    that size. After :meth:`precompile`, no further tracing (and thus no
+    further compilation) happens, which can be checked with :attr:`trace_count`.
+    :attr:`num_buckets_used` counts the buckets whose function has been run.
+
+    .. note:: With ``jit_compile=True``, the prediction function must be
+        supported by XLA. For example, GPflow's conditional for separate
+        (non-shared) inducing variables is not, so such layers need
+        ``jit_compile=False``.
+    """
+
+    trace_count: int
+    """ The number of times that the prediction function has been traced, over all buckets. """
+
+    def __init__(
+        self,
+        predict_fn: Optional[Callable[[tf.Tensor], Sequence[tf.Tensor]]],
+        input_dim: int,
+        *,
+        buckets: Sequence[int] = DEFAULT_BUCKETS,
+        jit_compile: bool = True,
+    ):
+        """
+        :param predict_fn: The function that makes predictions for a batch of
+            inputs ``[n, D]``, returning a tuple of tensors with the leading
+            dimension ``n``, e.g. :meth:`DeepGP.predict_f <gpflux.models.DeepGP.predict_f>`.
+            The outputs for each row must not depend on the other rows.
+        :param input_dim: The input dimensionality ``D``.
+        :param buckets: The batch sizes to compile *predict_fn* for.
+        :param jit_compile: Whether to compile *predict_fn* with XLA.
+        """
+        if not buckets or min(buckets) < 1:
+            raise ValueError("`buckets` must be a non-empty sequence of positive batch sizes")
+        self.predict_fn = predict_fn
+        self.input_dim = input_dim
+        self.buckets = tuple(sorted(set(buckets)))
+        self.jit_compile = jit_compile
+        self.trace_count = 0
+        self._used_buckets: Set[int] = set()
+        self._bucket_fns: Dict[int, Callable[[tf.Tensor], Sequence[tf.Tensor]]] = {
+            bucket: tf.function(
+                self._traced_predict_fn,
+                input_signature=[tf.TensorSpec([bucket, input_dim], default_float())],
+                jit_compile=jit_compile,
+            )
+            for bucket in self.buckets
+        }
+
+    @classmethod
+    def for_deep_gp(
+        cls, model: DeepGP, input_dim: int, *, predict_y: bool = False, **kwargs: Any
+    ) -> "BucketedPredictor":
+        """
+        Create a predictor for the mean and variance of ``f`` or ``y`` of
+        *model*, see :func:`~gpflux.prediction.streaming.deep_gp_predict_fn`.
+
+        :param kwargs: Passed to :class:`BucketedPredictor`.
+        """
+        return cls(deep_gp_predict_fn(model, predict_y=predict_y), input_dim, **kwargs)
+
+    @property
+    def num_buckets_used(self) -> int:
+        """The number of buckets whose function has been executed at least once."""
+        return len(self._used_buckets)
+
+    def _traced_predict_fn(self, inputs: tf.Tensor) -> Sequence[tf.Tensor]:
+        assert self.predict_fn is not None
+        self.trace_count += 1  # a Python side effect, so this only runs when tracing
+        return self.predict_fn(inputs)
+
+    def save(self, path: str) -> None:
+        """
+        Save the functions of all buckets, with the values of the variables
+        that they use, as a SavedModel at *path*, so that they can be restored
+        with :meth:`load` without tracing them again. This traces the
+        functions of any buckets that have not been traced yet.
+        """
+        module = tf.Module()
+        variables = {}
+        for bucket, fn in self._bucket_fns.items():
+            setattr(module, f"predict_{bucket}", fn)
+            for variable in fn.get_concrete_function().variables:
+                variables[id(variable)] = variable
+        module.captured_variables = list(variables.values())
+        tf.saved_model.save(module, path)
+        metadata = dict(
+            input_dim=self.input_dim, buckets=self.buckets, jit_compile=self.jit_compile
+        )
+        with open(os.path.join(path, _METADATA_FILE), "w") as fp:
+            json.dump(metadata, fp)
+
+    @classmethod
+    def load(cls, path: str) -> "BucketedPredictor":
+        """
+        Restore a predictor saved with :meth:`save`. Its :attr:`predict_fn` is
+        `None`, and its functions are not traced again (the :attr:`trace_count`
+        stays 0).
+        """
+        with open(os.path.join(path, _METADATA_FILE)) as fp:
+            metadata = json.load(fp)
+        module = tf.saved_model.load(path)
+        predictor = cls(None, **metadata)
+        predictor._bucket_fns = {
+            bucket: getattr(module, f"predict_{bucket}") for bucket in predictor.buckets
+        }
+        predictor._module = module  # keeps the restored variables alive
+        return predictor
+
+    def bucket_for(self, batch_size: int) -> int:
+        """Return the bucket that a batch of *batch_size* rows is padded to."""
+        for bucket in self.buckets:
+            if bucket >= batch_size:
+                return bucket
+        return self.buckets[-1]
+
+    def precompile(self) -> None:
+        """Trace and compile the functions for all buckets."""
+        for bucket in self.buckets:
+            self._predict_bucket(tf.zeros([bucket, self.input_dim], dtype=default_float()))
+
+    def predict(self, inputs: TensorType) -> Tuple[tf.Tensor, ...]:
+        """
+        Make predictions for *inputs*.
+
+        :param inputs: The inputs, with the shape ``[N, D]``.
+        :returns: The outputs of ``predict_fn``, each with the leading dimension ``N``.
+        """
+        inputs = tf.convert_to_tensor(inputs, dtype=default_float())
+        num_rows = inputs.shape[0]
+        if num_rows == 0:
+            raise ValueError("`inputs` must not be empty")
+        largest = self.buckets[-1]
+        if num_rows <= largest:
+            return self._predict_bucket(inputs)
+
+        num_full, remainder = divmod(num_rows, largest)
+        sizes = [largest] * num_full + ([remainder] if remainder else [])
+        chunks = [self._predict_bucket(chunk) for chunk in tf.split(inputs, sizes)]
+        return tuple(tf.concat(parts, axis=0) for parts in zip(*chunks))
+
+    def _predict_bucket(self, inputs: tf.Tensor) -> Tuple[tf.Tensor, ...]:
+        num_rows = inputs.shape[0]
+        bucket = self.bucket_for(num_rows)
+        padding = tf.repeat(inputs[-1:], bucket - num_rows, axis=0)  # [bucket - n, D]
+        outputs = self._bucket_fns[bucket](tf.concat([inputs, padding], axis=0))
+        self._used_buckets.add(bucket)
+        return tuple(output[:num_rows] for output in outputs)
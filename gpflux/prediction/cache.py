@@ -0,0 +1,278 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`WarmStartCache`, an on-disk cache of the traced
+prediction functions of trained models, and :class:`PredictionCache`, an
+in-memory cache of the predictions for repeated inputs.
+"""
+import collections
+import hashlib
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow.base import TensorType
+
+from gpflux.models import DeepGP
+from gpflux.prediction.bucketed import DEFAULT_BUCKETS, BucketedPredictor
+from gpflux.prediction.streaming import deep_gp_predict_fn
+
+
+def model_signature(model: tf.Module) -> str:
+    """
+    Return a hash of the structure of *model* (the class, names, shapes and
+    dtypes of its variables) and of the current values of its variables, which
+    changes whenever the model is retrained. The state of Keras metrics (such
+    as the diagnostics logged by :class:`~gpflux.layers.GPLayer`) is ignored.
+    """
+    metric_variables = {
+        id(variable)
+        for module in model.submodules
+        if isinstance(module, tf.keras.metrics.Metric)
+        for variable in module.variables
+    }
+    digest = hashlib.sha256(type(model).__name__.encode())
+    for variable in model.variables:
+        if id(variable) in metric_variables:
+            continue
+        digest.update(f"{variable.name}:{variable.shape}:{variable.dtype.name}".encode())
+        digest.update(variable.numpy().tobytes())
+    return digest.hexdigest()
+
+
+class WarmStartCache:
+    r"""
+    A local, on-disk cache of :class:`~gpflux.prediction.BucketedPredictor`\ s,
+    which lets a new serving process restore the traced prediction functions
+    of a trained :class:`~gpflux.models.DeepGP` instead of tracing them again::
+
+        cache = WarmStartCache("/var/cache/gpflux")
+        predictor = cache.get_predictor(deep_gp, input_dim)  # traces only on a cache miss
+
+    Each entry is a SavedModel (see :meth:`BucketedPredictor.save`), keyed by
+    the :func:`model_signature` of the model, the TensorFlow version, the
+    buckets and the other options of the predictor.
+
+    .. note:: This caches the traced functions, not the XLA executables, so
+        with ``jit_compile=True`` each bucket is still compiled by XLA the
+        first time that it is called in a new process.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: The directory to store the cache entries in. It is
+            created if it does not exist.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(
+        self,
+        model: DeepGP,
+        input_dim: int,
+        *,
+        predict_y: bool = False,
+        buckets: Sequence[int] = DEFAULT_BUCKETS,
+        jit_compile: bool = True,
+    ) -> str:
+        """Return the key of the cache entry for the given model and predictor options."""
+        options = f"{tf.__version__}:{input_dim}:{predict_y}:{sorted(set(buckets))}:{jit_compile}"
+        digest = hashlib.sha256(model_signature(model).encode())
+        digest.update(options.encode())
+        return digest.hexdigest()
+
+    def get_predictor(self, model: DeepGP, input_dim: int, **kwargs: Any) -> BucketedPredictor:
+        """
+        Return a :class:`BucketedPredictor` for *model*, restored from the
+        cache if there is an entry for its :meth:`key`, or otherwise created
+        with :meth:`BucketedPredictor.for_deep_gp`, precompiled, and saved to
+        the cache.
+
+        :param kwargs: The options of :meth:`BucketedPredictor.for_deep_gp`.
+        """
+        path = os.path.join(self.directory, self.key(model, input_dim, **kwargs))
+        if os.path.isdir(path):
+            return BucketedPredictor.load(path)
+
+        predictor = BucketedPredictor.for_deep_gp(model, input_dim, **kwargs)
+        predictor.precompile()
+        # write to a temporary directory first, so that concurrent processes never see
+        # incomplete entries
+        temporary_path = f"{path}.tmp-{os.getpid()}"
+        predictor.save(temporary_path)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:  # another process has written the same entry in the meantime
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        return predictor
+
+
+class PredictionCache:
+    """
+    An in-memory cache of the predictions for individual input rows, for
+    query traffic in which the same inputs come back many times::
+
+        cache = PredictionCache.for_deep_gp(deep_gp)
+        mean, var = cache.predict(X)  # only the rows of X that are not cached are predicted
+
+    Each row of the outputs is cached under the bytes of its input row and a
+    version stamp of the model (see :func:`model_signature`), so that the
+    predictions of an updated model are never mixed with stale ones after
+    calling :meth:`refresh_version`. The least recently used rows are evicted
+    when the cached inputs and outputs exceed *max_bytes*.
+
+    .. note:: For a :class:`~gpflux.models.DeepGP` with more than one layer,
+        :meth:`~gpflux.models.DeepGP.predict_f` propagates a random sample
+        through the layers, and the cache returns the same prediction for an
+        input row until it is evicted.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Sequence[TensorType]],
+        *,
+        max_bytes: int = 64 * 2 ** 20,
+        version_fn: Optional[Callable[[], str]] = None,
+    ):
+        """
+        :param predict_fn: The function that makes predictions for a batch of
+            inputs ``[n, D]``, returning a tuple of arrays or tensors with the
+            leading dimension ``n``. The outputs for each row must not depend
+            on the other rows.
+        :param max_bytes: The maximum number of bytes of the cached input and
+            output rows (not counting the constant overhead of each entry).
+        :param version_fn: A function that returns the current version stamp
+            of the model that *predict_fn* evaluates; see :meth:`refresh_version`.
+        """
+        if max_bytes < 0:
+            raise ValueError("`max_bytes` must be non-negative")
+        self.predict_fn = predict_fn
+        self.max_bytes = max_bytes
+        self.version_fn = version_fn
+        self.version = b""
+        """ The version stamp that is part of the key of all new entries. """
+        self.refresh_version()
+
+        self._entries: "collections.OrderedDict[bytes, Tuple[np.ndarray, ...]]" = (
+            collections.OrderedDict()
+        )
+        self.num_bytes = 0
+        """ The number of bytes of the cached input and output rows. """
+        self.hits = 0
+        """ The number of input rows whose predictions were found in the cache. """
+        self.misses = 0
+        """ The number of input rows whose predictions were not found in the cache. """
+        self.evictions = 0
+        """ The number of entries that have been evicted. """
+
+    @classmethod
+    def for_deep_gp(
+        cls, model: DeepGP, *, predict_y: bool = False, **kwargs: Any
+    ) -> "PredictionCache":
+        """
+        Return a :class:`PredictionCache` for the predictions of *model* (see
+        :func:`~gpflux.prediction.deep_gp_predict_fn`), versioned by its
+        :func:`model_signature`.
+
+        :param kwargs: The keyword arguments of :class:`PredictionCache`.
+        """
+        predict_fn = deep_gp_predict_fn(model, predict_y=predict_y)
+        return cls(predict_fn, version_fn=lambda: model_signature(model), **kwargs)
+
+    def refresh_version(self) -> None:
+        """
+        Update :attr:`version` from *version_fn*, e.g. after the model has
+        been trained further. The entries of previous versions are never hit
+        again, and are evicted first.
+        """
+        if self.version_fn is not None:
+            self.version = self.version_fn().encode()
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        self.num_bytes = 0
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Return the numbers of hits, misses and evictions, the hit rate, and
+        the current number of entries and bytes.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else np.nan,
+            "evictions": self.evictions,
+            "num_entries": len(self._entries),
+            "num_bytes": self.num_bytes,
+        }
+
+    def _keys(self, inputs: np.ndarray) -> List[bytes]:
+        # view each row as a single opaque element, to get its bytes without a Python loop
+        rows = inputs.view(np.dtype((np.void, inputs.dtype.itemsize * inputs.shape[1])))
+        return [self.version + row.tobytes() for row in rows.ravel()]
+
+    def _insert(self, key: bytes, entry: Tuple[np.ndarray, ...]) -> None:
+        self._entries[key] = entry
+        self.num_bytes += len(key) + sum(row.nbytes for row in entry)
+        while self.num_bytes > self.max_bytes and self._entries:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.num_bytes -= len(evicted_key) + sum(row.nbytes for row in evicted)
+            self.evictions += 1
+
+    def predict(self, inputs: TensorType) -> Tuple[np.ndarray, ...]:
+        """
+        Return the predictions for *inputs*, computing only those for the rows
+        that are not cached (each distinct row once) with a single call of
+        *predict_fn*, and caching them.
+
+        :param inputs: The inputs, with the shape ``[N, D]``.
+        :returns: The outputs of *predict_fn* for *inputs*, as NumPy arrays.
+        """
+        inputs = np.ascontiguousarray(inputs)
+        if inputs.ndim != 2:
+            raise ValueError(f"`inputs` must have the shape [N, D], not {inputs.shape}")
+        if len(inputs) == 0:
+            return tuple(np.asarray(output) for output in self.predict_fn(inputs))
+
+        rows: List[Optional[Tuple[np.ndarray, ...]]] = []
+        missing: Dict[bytes, List[int]] = {}  # the indices of the rows of each missing key
+        for i, key in enumerate(self._keys(inputs)):
+            entry = self._entries.get(key)
+            if entry is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                self._entries.move_to_end(key)
+            rows.append(entry)
+        num_missing = sum(len(indices) for indices in missing.values())
+        self.hits += len(rows) - num_missing
+        self.misses += num_missing
+
+        if missing:
+            first_indices = [indices[0] for indices in missing.values()]
+            outputs = [np.asarray(output) for output in self.predict_fn(inputs[first_indices])]
+            for j, (key, indices) in enumerate(missing.items()):
+                # copy the rows, so that the cache does not keep the whole batch alive
+                entry = tuple(output[j].copy() for output in outputs)
+                self._insert(key, entry)
+                for i in indices:
+                    rows[i] = entry
+
+        return tuple(np.stack([row[k] for row in rows]) for k in range(len(rows[0])))
@@ -0,0 +1,303 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :func:`compress_gp_layer` and :func:`compress_deep_gp`,
+which reduce the number of inducing points of trained models for faster
+serving, and :func:`compression_report` and
+:func:`deep_gp_compression_report`, which measure the accuracy and latency
+of the compressed models.
+"""
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import tensorflow as tf
+
+import gpflow
+from gpflow import default_jitter
+from gpflow.base import TensorType
+from gpflow.covariances import Kuu
+from gpflow.inducing_variables import (
+    InducingPoints,
+    SeparateIndependentInducingVariables,
+    SharedIndependentInducingVariables,
+)
+from gpflow.kernels import LinearCoregionalization, SeparateIndependent, SharedIndependent
+from gpflow.utilities import deepcopy
+
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+
+
+def _pivoted_cholesky_indices(K: np.ndarray, num_inducing: int) -> np.ndarray:
+    """
+    Greedily select *num_inducing* pivots of the positive-definite matrix
+    *K* ``[M, M]`` by a pivoted Cholesky factorisation: each pivot is the
+    point with the largest prior variance conditioned on the points selected
+    so far, which greedily minimises the trace of the Nyström residual.
+
+    :returns: The selected indices ``[M']``, in increasing order.
+    """
+    residual = np.diag(K).copy()  # [M]
+    rows = np.zeros((num_inducing, len(K)))  # [M', M]
+    indices = []
+    for i in range(num_inducing):
+        j = int(np.argmax(residual))
+        indices.append(j)
+        rows[i] = (K[j] - rows[:i, j] @ rows[:i]) / np.sqrt(residual[j])
+        residual -= rows[i] ** 2
+        residual[indices] = -np.inf
+    return np.sort(indices)
+
+
+def _inducing_points(layer: GPLayer) -> List[InducingPoints]:
+    """
+    Return the inducing points shared by all latent GPs of *layer* (as a
+    single-element list) or those of each latent GP, checking that *layer* is
+    supported by :func:`compress_gp_layer`.
+    """
+    if isinstance(layer.inducing_variable, SharedIndependentInducingVariables):
+        inducing_points = [layer.inducing_variable.inducing_variable]
+    elif isinstance(layer.inducing_variable, SeparateIndependentInducingVariables):
+        inducing_points = list(layer.inducing_variable.inducing_variable_list)
+    else:
+        inducing_points = []
+    if not (
+        type(layer) is GPLayer
+        and isinstance(
+            layer.kernel, (SharedIndependent, SeparateIndependent, LinearCoregionalization)
+        )
+        and inducing_points
+        and all(type(iv) is InducingPoints for iv in inducing_points)
+    ):
+        raise NotImplementedError(
+            "Compression is only implemented for `GPLayer`s with `SharedIndependent`, "
+            "`SeparateIndependent` or `LinearCoregionalization` kernels and inducing points"
+        )
+    return inducing_points
+
+
+def _marginal_q_u(
+    layer: GPLayer, Kuu_: np.ndarray, indices: Sequence[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the parameters ``q_mu`` ``[M', L]`` and ``q_sqrt`` ``[L, M', M']``
+    of the marginal of ``q(u)`` of *layer* at the *indices* ``[L, M']`` of the
+    inducing points of each latent GP, in the parameterisation of *layer*.
+
+    :param Kuu_: The covariance of the inducing variables of each latent GP, ``[L, M, M]``.
+    """
+    q_mu = layer.q_mu.numpy()  # [M, L]
+    q_sqrt = np.tril(layer.q_sqrt.numpy())  # [L, M, M]
+    new_q_mu, new_q_sqrt = [], []
+    for K, q_mu_l, q_sqrt_l, indices_l in zip(Kuu_, q_mu.T, q_sqrt, indices):
+        # q(u) = N(mean, scale scaleᵀ), marginalised to the selected points
+        if layer.whiten:
+            Lu = np.linalg.cholesky(K)
+            mean, scale = Lu @ q_mu_l, Lu @ q_sqrt_l
+        else:
+            mean, scale = q_mu_l, q_sqrt_l
+        mean, scale = mean[indices_l], scale[indices_l]  # [M'], [M', M]
+        if layer.whiten:
+            Lu = np.linalg.cholesky(K[np.ix_(indices_l, indices_l)])
+            mean, scale = np.linalg.solve(Lu, mean), np.linalg.solve(Lu, scale)
+        cov = scale @ scale.T + default_jitter() * np.eye(len(indices_l))
+        new_q_mu.append(mean)
+        new_q_sqrt.append(np.linalg.cholesky(cov))
+    return np.stack(new_q_mu, axis=-1), np.stack(new_q_sqrt)
+
+
+def compress_gp_layer(layer: GPLayer, num_inducing: int) -> GPLayer:
+    r"""
+    Return a copy of the trained *layer* with only *num_inducing* of its
+    inducing points, for faster predictions (whose variances cost
+    :math:`O(M^2)` per input for M inducing points).
+
+    The inducing points are selected from those of *layer* by a greedy
+    pivoted Cholesky factorisation of ``Kuu``, which keeps the points that
+    are least well explained by the points kept so far (for inducing points
+    shared by all latent GPs, of the sum of their ``Kuu``). As the selected
+    inducing variables ``u'`` are a subset of ``u``, the ``q(u')`` that
+    minimises ``KL[q(f) ∥ q'(f)]`` from the posterior of *layer* to the
+    compressed one is the marginal of ``q(u)`` at ``u'``, which the
+    compressed layer is refitted to (in the :attr:`~gpflux.layers.GPLayer.whiten`\ ed
+    parameterisation if *layer* uses it).
+
+    The kernel and mean function are copied, so that the compressed layer
+    does not share any variables with *layer*. This is only implemented for
+    :class:`~gpflux.layers.GPLayer` itself (not its subclasses), with
+    :class:`~gpflow.kernels.SharedIndependent`,
+    :class:`~gpflow.kernels.SeparateIndependent` or
+    :class:`~gpflow.kernels.LinearCoregionalization` kernels and shared or
+    separate :class:`~gpflow.inducing_variables.InducingPoints`.
+
+    :param layer: The trained layer.
+    :param num_inducing: The number of inducing points ``M'`` of the
+        compressed layer, at most the number ``M`` of *layer*.
+    """
+    inducing_points = _inducing_points(layer)
+    M = inducing_points[0].num_inducing
+    if not 1 <= num_inducing <= M:
+        raise ValueError(f"`num_inducing` must be between 1 and {M}, not {num_inducing}")
+
+    L = layer.num_latent_gps
+    Kuu_ = Kuu(layer.inducing_variable, layer.kernel, jitter=default_jitter()).numpy()
+    shared = len(inducing_points) == 1
+    if shared:
+        # one selection for all latent GPs, from the sum of their Kuu if they differ
+        K = Kuu_ if Kuu_.ndim == 2 else Kuu_.sum(axis=0)
+        indices = [_pivoted_cholesky_indices(K, num_inducing)] * L
+    else:
+        indices = [_pivoted_cholesky_indices(K, num_inducing) for K in Kuu_]  # [L, M']
+    q_mu, q_sqrt = _marginal_q_u(layer, np.broadcast_to(Kuu_, (L, M, M)), indices)
+
+    new_inducing_points = []
+    for iv, iv_indices in zip(inducing_points, indices):
+        new_iv = InducingPoints(iv.Z.numpy()[iv_indices])
+        gpflow.set_trainable(new_iv, iv.Z.trainable)
+        new_inducing_points.append(new_iv)
+    if shared:
+        new_inducing_variable = SharedIndependentInducingVariables(new_inducing_points[0])
+    else:
+        new_inducing_variable = SeparateIndependentInducingVariables(new_inducing_points)
+
+    compressed = GPLayer(
+        deepcopy(layer.kernel),
+        new_inducing_variable,
+        layer.num_data,
+        mean_function=deepcopy(layer.mean_function),
+        num_samples=layer.num_samples,
+        full_cov=layer.full_cov,
+        full_output_cov=layer.full_output_cov,
+        low_rank_cov=layer.low_rank_cov,
+        tensor_outputs=layer.tensor_outputs,
+        deduplicate_inputs=layer.deduplicate_inputs,
+        num_latent_gps=L,
+        whiten=layer.whiten,
+        num_kl_probes=layer.num_kl_probes,
+        name=layer.name,
+        verbose=False,
+    )
+    compressed.q_mu.assign(q_mu)  # [M', L]
+    compressed.q_sqrt.assign(q_sqrt)  # [L, M', M']
+    return compressed
+
+
+def compress_deep_gp(model: DeepGP, num_inducing: Union[int, Sequence[Optional[int]]]) -> DeepGP:
+    """
+    Return a copy of the trained *model* in which each
+    :class:`~gpflux.layers.GPLayer` is compressed with
+    :func:`compress_gp_layer`. The other layers and the likelihood layer are
+    shared with *model*.
+
+    :param model: The trained model.
+    :param num_inducing: The number of inducing points of all compressed GP
+        layers, or a sequence with the number for each of the
+        :attr:`~gpflux.models.DeepGP.f_layers` (`None` to keep a layer as it is).
+    """
+    if isinstance(num_inducing, int):
+        num_inducing = [num_inducing] * len(model.f_layers)
+    if len(num_inducing) != len(model.f_layers):
+        raise ValueError("`num_inducing` must have one entry for each of the `f_layers`")
+
+    f_layers = []
+    for layer, layer_num_inducing in zip(model.f_layers, num_inducing):
+        if isinstance(layer, GPLayer) and layer_num_inducing is not None:
+            layer = compress_gp_layer(layer, layer_num_inducing)
+        f_layers.append(layer)
+    return DeepGP(
+        f_layers,
+        model.likelihood_layer,
+        input_dim=model.inputs.shape[-1],
+        target_dim=model.targets.shape[-1],
+        default_model_class=model.default_model_class,
+        num_data=model.num_data,
+        num_samples=model.num_samples,
+        importance_weighted=model.importance_weighted,
+        deduplicate_inputs=model.deduplicate_inputs,
+    )
+
+
+def _median_latency(layer: GPLayer, inputs: tf.Tensor, num_repeats: int) -> float:
+    """Return the median time (in seconds) of a compiled ``layer.predict`` at *inputs*."""
+    predict = tf.function(
+        layer.predict, input_signature=[tf.TensorSpec([None, inputs.shape[-1]], inputs.dtype)]
+    )
+    predict(inputs)  # trace
+    seconds = []
+    for _ in range(num_repeats):
+        start = time.perf_counter()
+        _ = [output.numpy() for output in predict(inputs)]
+        seconds.append(time.perf_counter() - start)
+    return float(np.median(seconds))
+
+
+def compression_report(
+    original: GPLayer, compressed: GPLayer, inputs: TensorType, *, num_repeats: int = 10
+) -> Dict[str, float]:
+    """
+    Compare the marginal predictions of the *compressed* layer (see
+    :func:`compress_gp_layer`) with those of the *original* layer.
+
+    :param inputs: The inputs to compare the predictions at, with the shape ``[N, D]``.
+    :param num_repeats: The number of predictions to take the median latency of.
+    :returns: The number of inducing points of *compressed*; the KL
+        divergence ``KL[q(f(x)) ∥ q'(f(x))]`` from the marginal prediction of
+        *original* to that of *compressed*, averaged over the inputs and
+        outputs; the largest absolute difference of the means; and the median
+        latency (in seconds) of :meth:`~gpflux.layers.GPLayer.predict` of
+        *compressed* at *inputs*. Passing *original* as *compressed* gives
+        its own latency.
+    """
+    inputs = tf.convert_to_tensor(inputs)
+    mean, var = [output.numpy() for output in original.predict(inputs)]  # [N, Q], [N, Q]
+    compressed_mean, compressed_var = [output.numpy() for output in compressed.predict(inputs)]
+    kl = 0.5 * (
+        np.log(compressed_var / var) + (var + (mean - compressed_mean) ** 2) / compressed_var - 1.0
+    )
+    return {
+        "num_inducing": int(compressed.q_mu.shape[0]),
+        "kl": float(np.mean(kl)),
+        "max_mean_error": float(np.max(np.abs(mean - compressed_mean))),
+        "latency": _median_latency(compressed, inputs, num_repeats),
+    }
+
+
+def deep_gp_compression_report(
+    original: DeepGP, compressed: DeepGP, inputs: TensorType, *, num_repeats: int = 10
+) -> List[Dict[str, float]]:
+    """
+    Compare each :class:`~gpflux.layers.GPLayer` of the *compressed* model
+    (see :func:`compress_deep_gp`) with the corresponding layer of the
+    *original* model, using :func:`compression_report` at the inputs of that
+    layer: the *inputs* propagated through the previous layers of *original*
+    as in :meth:`~gpflux.models.DeepGP.predict_mean`.
+
+    :returns: The :func:`compression_report` of each GP layer, in order.
+    """
+    features = tf.convert_to_tensor(inputs)
+    reports = []
+    for original_layer, compressed_layer in zip(original.f_layers, compressed.f_layers):
+        if isinstance(original_layer, GPLayer):
+            reports.append(
+                compression_report(
+                    original_layer, compressed_layer, features, num_repeats=num_repeats
+                )
+            )
+            features = original_layer.predict_mean(features)
+        else:
+            features = tf.convert_to_tensor(original_layer(features))
+    return reports
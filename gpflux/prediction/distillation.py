@@ -0,0 +1,253 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :func:`distil_deep_gp`, which fits a
+:class:`WeightSpaceSurrogate` to the predictions of a trained
+:class:`~gpflux.models.DeepGP` for low-latency scoring, and
+:func:`distillation_report`, which measures its fidelity.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.optimize
+import tensorflow as tf
+
+import gpflow
+from gpflow import default_float
+from gpflow.base import TensorType
+
+from gpflux.layers.basis_functions.fourier_features import RandomFourierFeatures
+from gpflux.models import DeepGP
+from gpflux.prediction.numpy_runtime import FORMAT_VERSION
+from gpflux.sampling import KernelWithFeatureDecomposition
+
+
+class WeightSpaceSurrogate(tf.Module):
+    r"""
+    A Bayesian linear model ``f(x) = φ(x)ᵀ w`` over the features ``φ`` ``[L]``
+    of a :class:`~gpflux.sampling.KernelWithFeatureDecomposition`, with a
+    Gaussian distribution ``w ~ N(μ, R Rᵀ)`` of the weights of each of the Q
+    outputs, where ``R`` has the shape ``[L, K]``. The mean and variance of
+    each output are ``φ(x)ᵀ μ`` and ``‖Rᵀ φ(x)‖²``, so that both are computed
+    from a single matrix multiplication of the features with the
+    :attr:`weights` ``[μ, R₁, …, R_Q]``, at a cost of :math:`O(L Q K)` per
+    input (on top of the features, e.g. :math:`O(L D)` for Fourier features).
+
+    Use :func:`distil_deep_gp` to fit a surrogate to a :class:`~gpflux.models.DeepGP`.
+    """
+
+    def __init__(
+        self, kernel: KernelWithFeatureDecomposition, weights: TensorType, num_outputs: int
+    ):
+        """
+        :param kernel: The kernel whose features (see
+            :attr:`~gpflux.sampling.KernelWithFeatureDecomposition.feature_functions`)
+            are the features ``φ`` of this model.
+        :param weights: The means ``μ`` ``[L, Q]`` and the factors ``R`` of the
+            covariances of the weights of all Q outputs, concatenated to the shape ``[L, Q + Q K]``.
+        :param num_outputs: The number of outputs ``Q``.
+        """
+        super().__init__()
+        self.kernel = kernel
+        self.weights = tf.Variable(weights, trainable=False, name="weights")  # [L, Q + Q K]
+        self.num_outputs = num_outputs
+
+    def predict_f(self, inputs: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        :param inputs: The inputs to predict at, with the shape ``[N, D]``.
+        :returns: The mean and variance of ``f``, with the shape ``[N, Q]``.
+        """
+        scores = tf.matmul(self.kernel.feature_functions(inputs), self.weights)  # [N, Q + Q K]
+        Q = self.num_outputs
+        mean = scores[:, :Q]
+        var = tf.reduce_sum(tf.square(tf.reshape(scores[:, Q:], [-1, Q, self.rank])), axis=-1)
+        return mean, var
+
+    @property
+    def rank(self) -> int:
+        """The rank ``K`` of the covariance of the weights of each output."""
+        return (self.weights.shape[-1] - self.num_outputs) // self.num_outputs
+
+    def export_npz(self, path: str) -> None:
+        """
+        Write this surrogate to the ``.npz`` file at *path*, for making
+        predictions with :class:`~gpflux.prediction.NumpyWeightSpaceModel`
+        using only NumPy. This is only implemented for
+        :class:`~gpflux.layers.basis_functions.fourier_features.RandomFourierFeatures`
+        (and its subclasses).
+        """
+        features = self.kernel.feature_functions
+        if not isinstance(features, RandomFourierFeatures):
+            raise NotImplementedError("Only `RandomFourierFeatures` can be exported")
+        frequencies = features.W.numpy()  # [L / 2, D]
+        arrays = {
+            "format_version": np.array(FORMAT_VERSION),
+            "frequencies": frequencies,
+            "lengthscales": np.broadcast_to(
+                features.kernel.lengthscales.numpy(), frequencies.shape[-1:]
+            ),
+            "feature_constant": features.rff_constant(
+                features.kernel.variance, output_dim=2 * features.n_components
+            ).numpy(),
+            "weights": self.weights.numpy(),
+            "num_outputs": np.array(self.num_outputs),
+        }
+        with open(path, "wb") as fp:
+            np.savez(fp, **arrays)
+
+
+def _deep_gp_moments(
+    model: DeepGP, inputs: TensorType, num_samples: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the mean and variance ``[N, Q]`` of the mixture of *num_samples*
+    (stochastic) predictions of :meth:`~gpflux.models.DeepGP.predict_f`.
+    """
+    inputs = tf.convert_to_tensor(inputs, dtype=default_float())
+    means, variances = zip(
+        *[[output.numpy() for output in model.predict_f(inputs)] for _ in range(num_samples)]
+    )
+    return np.mean(means, axis=0), np.mean(variances, axis=0) + np.var(means, axis=0)
+
+
+def _fit_variance_factors(Phi: np.ndarray, var: np.ndarray, rank: int) -> np.ndarray:
+    """
+    Return the factor ``R`` ``[L, K]`` for which ``‖Rᵀ φ‖²`` fits the variances
+    *var* ``[N]`` at the features *Phi* ``[N, L]`` in the least-squares sense.
+    """
+    N, L = Phi.shape
+    # Initialise with the (ridge-regularised, eigenvalue-clipped) least-squares fit of a
+    # covariance P C Pᵀ, with P the principal directions of the features, scaled such that
+    # z = Pᵀ φ has unit mean square: φᵀ P C Pᵀ φ = Σᵢⱼ Cᵢⱼ zᵢ zⱼ is linear in C.
+    eigenvalues, eigenvectors = np.linalg.eigh(Phi.T @ Phi / N)
+    P = eigenvectors[:, -rank:] / np.sqrt(np.maximum(eigenvalues[-rank:], 1e-12))  # [L, K]
+    projected = Phi @ P  # [N, K]
+    i, j = np.triu_indices(rank)
+    design = projected[:, i] * projected[:, j] * np.where(i == j, 1.0, 2.0)  # [N, K (K + 1) / 2]
+    coefficients = np.linalg.solve(
+        design.T @ design + 0.1 * N * np.eye(len(i)), design.T @ var
+    )  # [K (K + 1) / 2]
+    C = np.zeros((rank, rank))
+    C[i, j] = C[j, i] = coefficients
+    eigenvalues, eigenvectors = np.linalg.eigh(C)
+    initial_factor = P @ eigenvectors * np.sqrt(np.maximum(eigenvalues, 0.0))  # [L, K]
+
+    # Clipping the eigenvalues loses accuracy, so refine R directly.
+    def loss_and_gradient(flat_factor: np.ndarray) -> Tuple[float, np.ndarray]:
+        scores = Phi @ flat_factor.reshape(L, rank)  # [N, K]
+        residuals = np.sum(scores ** 2, axis=-1) - var  # [N]
+        gradient = 4.0 / N * Phi.T @ (residuals[:, None] * scores)  # [L, K]
+        return np.mean(residuals ** 2), gradient.ravel()
+
+    result = scipy.optimize.minimize(
+        loss_and_gradient,
+        initial_factor.ravel(),
+        jac=True,
+        method="L-BFGS-B",
+        options=dict(maxiter=500),
+    )
+    return result.x.reshape(L, rank)
+
+
+def distil_deep_gp(
+    model: DeepGP,
+    reference_inputs: TensorType,
+    *,
+    kernel: Optional[gpflow.kernels.Kernel] = None,
+    num_features: int = 512,
+    rank: int = 16,
+    num_samples: int = 1,
+    regularisation: float = 1e-6,
+) -> WeightSpaceSurrogate:
+    """
+    Fit a :class:`WeightSpaceSurrogate` with random Fourier features to the
+    mean and variance of :meth:`~gpflux.models.DeepGP.predict_f` of the
+    trained *model* at *reference_inputs*, which should be drawn from the
+    distribution of the inputs that the surrogate will be used for.
+
+    The mean weights ``μ`` are the posterior mean of the Bayesian linear
+    regression of the predicted means on the features, with the prior ``w ~
+    N(0, diag(λ))`` of the feature coefficients ``λ`` of the kernel and the
+    noise variance *regularisation*. The covariance ``Σ`` of the weights of
+    each output has the rank *rank*, ``Σ = R Rᵀ``, and ``R`` is fitted to the
+    predicted variances by minimising the squared error of ``‖Rᵀ φ(x)‖²``
+    with L-BFGS, starting from the least-squares fit of ``Σ`` in the span of
+    the principal directions of the features at *reference_inputs*.
+
+    :param model: The trained model.
+    :param reference_inputs: The inputs to fit the surrogate at, with the
+        shape ``[N, D]``, where N should be much larger than ``L``.
+    :param kernel: The kernel whose features to use, which must be supported
+        by :class:`~gpflux.layers.basis_functions.fourier_features.RandomFourierFeatures`.
+        Its lengthscales determine how smooth the surrogate can be. By default,
+        this is a :class:`~gpflow.kernels.SquaredExponential` with the median
+        distance between the *reference_inputs* as the lengthscale.
+    :param num_features: The number of features ``L``.
+    :param rank: The rank ``K`` of the covariance of the weights of each output.
+    :param num_samples: The number of predictions of *model* whose mixture is
+        fitted. For more than one layer, each prediction propagates a random
+        sample through the layers, and several samples are needed to
+        approximate the predictive distribution.
+    :param regularisation: The noise variance of the regression of the means.
+    """
+    reference_inputs = tf.convert_to_tensor(reference_inputs, dtype=default_float())
+    mean, var = _deep_gp_moments(model, reference_inputs, num_samples)  # [N, Q], [N, Q]
+    if kernel is None:
+        X = reference_inputs.numpy()[:1000]
+        distances = np.sqrt(np.sum((X[:, None, :] - X[None, :, :]) ** 2, axis=-1))
+        kernel = gpflow.kernels.SquaredExponential(lengthscales=np.median(distances))
+    features = RandomFourierFeatures(kernel, num_features // 2, dtype=default_float())
+    feature_kernel = KernelWithFeatureDecomposition(
+        kernel, features, np.ones((2 * (num_features // 2), 1), dtype=default_float())
+    )
+
+    Phi = features(reference_inputs).numpy()  # [N, L]
+    prior_precision = 1.0 / np.asarray(feature_kernel.feature_coefficients)[:, 0]  # [L]
+    PhiT_Phi = Phi.T @ Phi  # [L, L]
+    mu = np.linalg.solve(PhiT_Phi + regularisation * np.diag(prior_precision), Phi.T @ mean)
+
+    factors = [_fit_variance_factors(Phi, var[:, q], rank) for q in range(var.shape[-1])]
+    weights = np.concatenate([mu] + factors, axis=-1)  # [L, Q + Q K]
+    return WeightSpaceSurrogate(feature_kernel, weights, num_outputs=mean.shape[-1])
+
+
+def distillation_report(
+    model: DeepGP, surrogate: WeightSpaceSurrogate, inputs: TensorType, *, num_samples: int = 1
+) -> Dict[str, float]:
+    """
+    Compare the predictions of the *surrogate* (see :func:`distil_deep_gp`)
+    with those of *model*, at *inputs* that were not used for fitting it.
+
+    :param inputs: The inputs to compare the predictions at, with the shape ``[N, D]``.
+    :param num_samples: The number of predictions of *model* whose mixture is
+        compared (see :func:`distil_deep_gp`).
+    :returns: The root-mean-square errors of the means and of the variances,
+        and the same divided by the standard deviation of the means and the
+        root-mean-square of the variances of *model*, respectively.
+    """
+    mean, var = _deep_gp_moments(model, inputs, num_samples)
+    surrogate_mean, surrogate_var = [
+        output.numpy()
+        for output in surrogate.predict_f(tf.convert_to_tensor(inputs, dtype=default_float()))
+    ]
+    mean_rmse = np.sqrt(np.mean((surrogate_mean - mean) ** 2))
+    var_rmse = np.sqrt(np.mean((surrogate_var - var) ** 2))
+    return {
+        "mean_rmse": float(mean_rmse),
+        "mean_relative_rmse": float(mean_rmse / np.std(mean)),
+        "var_rmse": float(var_rmse),
+        "var_relative_rmse": float(var_rmse / np.sqrt(np.mean(var ** 2))),
+    }
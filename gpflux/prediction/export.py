@@ -0,0 +1,397 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :func:`export_deep_gp`, which writes a trained
+:class:`~gpflux.models.DeepGP` to a SavedModel for serving, and
+:func:`export_deep_gp_npz`, which writes it to a ``.npz`` file for the
+NumPy-only :class:`~gpflux.prediction.NumpyDeepGP`.
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import default_float, default_jitter
+from gpflow.base import TensorType
+from gpflow.covariances import Kuf, Kuu
+from gpflow.inducing_variables import (
+    InducingPoints,
+    SeparateIndependentInducingVariables,
+    SharedIndependentInducingVariables,
+)
+from gpflow.kernels import (
+    LinearCoregionalization,
+    Matern12,
+    Matern32,
+    Matern52,
+    SeparateIndependent,
+    SharedIndependent,
+    SquaredExponential,
+)
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Constant, Identity, Linear, MeanFunction, Zero
+
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction.numpy_runtime import FORMAT_VERSION
+
+
+def _has_frozen_statistics(layer: GPLayer) -> bool:
+    # subclasses with their own `predict` (e.g. structured inducing variables) fall back to it
+    return (
+        type(layer).predict is GPLayer.predict
+        and isinstance(
+            layer.kernel, (SharedIndependent, SeparateIndependent, LinearCoregionalization)
+        )
+        and isinstance(
+            layer.inducing_variable,
+            (SharedIndependentInducingVariables, SeparateIndependentInducingVariables),
+        )
+    )
+
+
+def _posterior_statistics(layer: GPLayer) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Return the posterior statistics ``α`` ``[L, M]`` and ``B`` ``[L, M, M]``
+    of *layer*, which must be supported by :func:`_has_frozen_statistics`
+    (see :class:`_ExportedGPLayer`).
+    """
+    Lu = tf.linalg.cholesky(Kuu(layer.inducing_variable, layer.kernel, jitter=default_jitter()))
+    # Kuu is either shared by all latent GPs ([M, M]) or batched over them ([L, M, M])
+    q_mu = tf.linalg.adjoint(layer.q_mu)[..., None]  # [L, M, 1]
+    q_sqrt = tf.linalg.band_part(layer.q_sqrt, -1, 0)  # [L, M, M]
+    S = tf.matmul(q_sqrt, q_sqrt, transpose_b=True)  # [L, M, M]
+    identity = tf.eye(tf.shape(Lu)[-1], dtype=Lu.dtype)
+    if layer.whiten:
+        alpha = tf.linalg.triangular_solve(Lu, q_mu, adjoint=True)
+        Lu_inv = tf.linalg.triangular_solve(Lu, identity)
+        B = tf.matmul(Lu_inv, tf.matmul(identity - S, Lu_inv), transpose_a=True)
+    else:
+        alpha = tf.linalg.cholesky_solve(Lu, q_mu)
+        Kuu_inv = tf.linalg.cholesky_solve(Lu, identity)
+        B = Kuu_inv - tf.matmul(Kuu_inv, tf.matmul(S, Kuu_inv))
+    return alpha[..., 0], B
+
+
+class _ExportedGPLayer(tf.Module):
+    """
+    The marginal predictions of a :class:`~gpflux.layers.GPLayer`, with all
+    statistics of the posterior that do not depend on the inputs precomputed.
+
+    The marginal posterior of each latent GP is ``mean = Kfu α + m(x)`` and
+    ``var = Kff - Kfu B Kuf``, where ``α = Kuu⁻¹ q_mu`` and ``B = Kuu⁻¹ -
+    Kuu⁻¹ S Kuu⁻¹`` with ``S = q_sqrt q_sqrtᵀ`` (or ``α = Lu⁻ᵀ q_mu`` and
+    ``B = Lu⁻ᵀ (I - S) Lu⁻¹`` if whitened). Storing ``α`` and ``B`` removes
+    the Cholesky factorisation of ``Kuu`` and all triangular solves from the
+    prediction. For kernels and inducing variables other than those supported
+    by :meth:`GPLayer.predict_mean <gpflux.layers.GPLayer.predict_mean>`, and
+    for subclasses that override :meth:`~gpflux.layers.GPLayer.predict`, this
+    falls back to calling the layer's ``predict`` method.
+    """
+
+    def __init__(self, layer: GPLayer):
+        super().__init__(name=layer.name)
+        self.frozen = _has_frozen_statistics(layer)
+        if self.frozen:
+            # the prior is still needed to compute Kuf and Kff, but not the posterior
+            self.kernel = layer.kernel
+            self.inducing_variable = layer.inducing_variable
+            self.mean_function = layer.mean_function
+            alpha, B = _posterior_statistics(layer)
+            self.alpha = tf.Variable(alpha, trainable=False, name="alpha")  # [L, M]
+            self.B = tf.Variable(B, trainable=False, name="B")  # [L, M, M]
+        else:
+            # track the variables only, not the Keras layer itself
+            self.layer_variables = list(layer.variables)
+            self._predict = layer.predict
+
+    def _latent_Kuf(self, inputs: TensorType) -> tf.Tensor:
+        Kuf_ = Kuf(self.inducing_variable, self.kernel, inputs)
+        return Kuf_ if Kuf_.shape.rank == 3 else Kuf_[None]  # [L, M, N] or [1, M, N]
+
+    def _mix(self, latent: tf.Tensor, inputs: TensorType, *, squared: bool) -> tf.Tensor:
+        if isinstance(self.kernel, LinearCoregionalization):
+            W = self.kernel.W
+            latent = tf.matmul(latent, W ** 2 if squared else W, transpose_b=True)  # [N, Q]
+        return latent
+
+    def predict_mean(self, inputs: TensorType) -> tf.Tensor:
+        if not self.frozen:
+            mean, _ = self._predict(inputs)
+            return mean
+        Kuf_ = self._latent_Kuf(inputs)
+        mean = tf.linalg.adjoint(tf.matmul(Kuf_, self.alpha[..., None], transpose_a=True)[..., 0])
+        return self._mix(mean, inputs, squared=False) + self.mean_function(inputs)
+
+    def predict(self, inputs: TensorType) -> Tuple[tf.Tensor, tf.Tensor]:
+        if not self.frozen:
+            return self._predict(inputs)
+        Kuf_ = self._latent_Kuf(inputs)
+        mean = tf.linalg.adjoint(tf.matmul(Kuf_, self.alpha[..., None], transpose_a=True)[..., 0])
+        Kff = tf.stack([k.K_diag(inputs) for k in self.kernel.latent_kernels], axis=-1)
+        var = Kff - tf.linalg.adjoint(tf.reduce_sum(Kuf_ * tf.matmul(self.B, Kuf_), axis=-2))
+        mean = self._mix(mean, inputs, squared=False) + self.mean_function(inputs)
+        return mean, self._mix(var, inputs, squared=True)
+
+    def sample(self, inputs: TensorType) -> tf.Tensor:
+        mean, var = self.predict(inputs)
+        return mean + tf.sqrt(var) * tf.random.normal(tf.shape(mean), dtype=mean.dtype)
+
+
+class _ExportedLayer(tf.Module):
+    """Any other layer, called as in prediction mode."""
+
+    def __init__(self, layer: tf.keras.layers.Layer):
+        super().__init__(name=layer.name)
+        if not layer.built:
+            raise ValueError(f"Layer {layer.name} must be built (e.g. trained) before exporting")
+        # track the variables only, not the Keras layer itself
+        self.layer_variables = list(layer.variables)
+        self._call = layer.__call__
+
+    def predict_mean(self, inputs: TensorType) -> tf.Tensor:
+        return tf.convert_to_tensor(self._call(inputs))
+
+    def sample(self, inputs: TensorType) -> tf.Tensor:
+        return tf.convert_to_tensor(self._call(inputs))
+
+
+class ExportedDeepGP(tf.Module):
+    """
+    The prediction functions of a :class:`~gpflux.models.DeepGP`, as saved by
+    :func:`export_deep_gp`. All functions take inputs with the shape ``[N, D]``
+    and return a dictionary of tensors:
+
+    - ``predict_f``: ``f_mean`` and ``f_var``, as :meth:`DeepGP.predict_f
+      <gpflux.models.DeepGP.predict_f>`, propagating one sample through all
+      but the last layer.
+    - ``predict_y``: ``y_mean`` and ``y_var``, the predictive moments of the
+      likelihood at ``predict_f``.
+    - ``predict_mean``: ``f_mean``, as :meth:`DeepGP.predict_mean
+      <gpflux.models.DeepGP.predict_mean>`.
+    - ``sample_f``: ``f_samples`` with the shape ``[num_samples, N, Q]``,
+      drawn by propagating *num_samples* samples through all layers.
+
+    The GP layers predict and sample from their marginals (as with
+    ``full_cov=False`` and ``full_output_cov=False``).
+    """
+
+    def __init__(self, model: DeepGP, input_dim: int):
+        """
+        :param model: The model to export.
+        :param input_dim: The input dimensionality ``D``.
+        """
+        super().__init__(name="exported_deep_gp")
+        if not isinstance(model.f_layers[-1], GPLayer):
+            raise NotImplementedError(
+                f"Exporting is not implemented for a last layer of type "
+                f"{type(model.f_layers[-1]).__name__}"
+            )
+        self.layers = [
+            _ExportedGPLayer(layer) if isinstance(layer, GPLayer) else _ExportedLayer(layer)
+            for layer in model.f_layers
+        ]
+        self.likelihood = model.likelihood_layer.likelihood
+
+        inputs_spec = tf.TensorSpec([None, input_dim], default_float(), name="inputs")
+        num_samples_spec = tf.TensorSpec([], tf.int32, name="num_samples")
+        self.predict_f = tf.function(self._predict_f, input_signature=[inputs_spec])
+        self.predict_y = tf.function(self._predict_y, input_signature=[inputs_spec])
+        self.predict_mean = tf.function(self._predict_mean, input_signature=[inputs_spec])
+        self.sample_f = tf.function(self._sample_f, input_signature=[inputs_spec, num_samples_spec])
+
+    def signatures(self) -> Dict[str, tf.types.experimental.ConcreteFunction]:
+        """Return the serving signatures, by name."""
+        return {
+            "predict_f": self.predict_f.get_concrete_function(),
+            "predict_y": self.predict_y.get_concrete_function(),
+            "predict_mean": self.predict_mean.get_concrete_function(),
+            "sample_f": self.sample_f.get_concrete_function(),
+        }
+
+    def _predict_f(self, inputs: tf.Tensor) -> Dict[str, tf.Tensor]:
+        features = inputs
+        for layer in self.layers[:-1]:
+            features = layer.sample(features)
+        f_mean, f_var = self.layers[-1].predict(features)
+        return {"f_mean": f_mean, "f_var": f_var}
+
+    def _predict_y(self, inputs: tf.Tensor) -> Dict[str, tf.Tensor]:
+        f_outputs = self._predict_f(inputs)
+        y_mean, y_var = self.likelihood.predict_mean_and_var(
+            f_outputs["f_mean"], f_outputs["f_var"]
+        )
+        return {"y_mean": y_mean, "y_var": y_var}
+
+    def _predict_mean(self, inputs: tf.Tensor) -> Dict[str, tf.Tensor]:
+        features = inputs
+        for layer in self.layers:
+            features = layer.predict_mean(features)
+        return {"f_mean": features}
+
+    def _sample_f(self, inputs: tf.Tensor, num_samples: tf.Tensor) -> Dict[str, tf.Tensor]:
+        # propagate all samples together as one batch of [S * N, D] inputs
+        num_data = tf.shape(inputs)[0]
+        features = tf.tile(inputs, [num_samples, 1])  # [S * N, D]
+        for layer in self.layers:
+            features = layer.sample(features)
+        shape = tf.concat([[num_samples, num_data], tf.shape(features)[1:]], axis=0)
+        return {"f_samples": tf.reshape(features, shape)}  # [S, N, Q]
+
+
+def export_deep_gp(model: DeepGP, path: str, input_dim: Optional[int] = None) -> None:
+    """
+    Write the prediction functions of *model* to a SavedModel at *path*, with
+    the signatures ``predict_f``, ``predict_y``, ``predict_mean`` and
+    ``sample_f`` described in :class:`ExportedDeepGP`. The exported functions
+    only contain the prediction: no losses, metrics or other training-only
+    ops. They can be loaded and called without GPflux::
+
+        loaded = tf.saved_model.load(path)
+        outputs = loaded.signatures["predict_f"](inputs=X)  # {"f_mean": ..., "f_var": ...}
+        samples = loaded.signatures["sample_f"](inputs=X, num_samples=tf.constant(10))
+
+    The posterior statistics of the GP layers are computed once, at export
+    time (see :class:`ExportedDeepGP`), so later changes to *model* are not
+    reflected in the SavedModel.
+
+    :param model: The trained model to export.
+    :param path: The directory to write the SavedModel to.
+    :param input_dim: The input dimensionality ``D``. If `None`, it is taken
+        from the *input_dim* that *model* was constructed with.
+    """
+    if input_dim is None:
+        input_dim = model.inputs.shape[-1]
+    if input_dim is None:
+        raise ValueError("Could not determine input_dim; please provide explicitly")
+    exported = ExportedDeepGP(model, input_dim)
+    tf.saved_model.save(exported, path, signatures=exported.signatures())
+
+
+_NUMPY_KERNELS = {
+    SquaredExponential: "SquaredExponential",
+    Matern12: "Matern12",
+    Matern32: "Matern32",
+    Matern52: "Matern52",
+}
+
+
+def _numpy_kernel_arrays(layer: GPLayer, input_dim: int) -> Dict[str, np.ndarray]:
+    kernels = layer.kernel.latent_kernels
+    for kernel in kernels:
+        if type(kernel) not in _NUMPY_KERNELS:
+            raise NotImplementedError(
+                f"Exporting to NumPy is not implemented for {type(kernel).__name__} kernels"
+            )
+        if not (isinstance(kernel.active_dims, slice) and kernel.active_dims == slice(None)):
+            raise NotImplementedError("Exporting to NumPy is not implemented for active_dims")
+    return {
+        "kernels": np.array([_NUMPY_KERNELS[type(kernel)] for kernel in kernels]),  # [K]
+        "variance": np.array([kernel.variance.numpy() for kernel in kernels]),  # [K]
+        "lengthscales": np.stack(
+            [np.broadcast_to(kernel.lengthscales.numpy(), [input_dim]) for kernel in kernels]
+        ),  # [K, D]
+    }
+
+
+def _numpy_mean_function_arrays(mean_function: MeanFunction) -> Dict[str, np.ndarray]:
+    # check the exact types, as e.g. Zero is a subclass of Constant
+    if type(mean_function) is Zero:
+        output_dim = np.array(mean_function.output_dim)
+        return {"mean_function": np.array("Zero"), "mean_function/output_dim": output_dim}
+    elif type(mean_function) is Identity:
+        return {"mean_function": np.array("Identity")}
+    elif type(mean_function) is Constant:
+        return {"mean_function": np.array("Constant"), "mean_function/c": mean_function.c.numpy()}
+    elif type(mean_function) is Linear:
+        return {
+            "mean_function": np.array("Linear"),
+            "mean_function/A": mean_function.A.numpy(),
+            "mean_function/b": mean_function.b.numpy(),
+        }
+    raise NotImplementedError(
+        f"Exporting to NumPy is not implemented for {type(mean_function).__name__} mean functions"
+    )
+
+
+def _numpy_gp_layer_arrays(layer: GPLayer) -> Dict[str, np.ndarray]:
+    if not _has_frozen_statistics(layer):
+        raise NotImplementedError(
+            f"Exporting to NumPy is not implemented for {type(layer).__name__} with "
+            f"{type(layer.kernel).__name__} and {type(layer.inducing_variable).__name__}"
+        )
+    if isinstance(layer.inducing_variable, SeparateIndependentInducingVariables):
+        inducing_variables = layer.inducing_variable.inducing_variable_list
+    else:
+        inducing_variables = [layer.inducing_variable.inducing_variable]
+    if not all(type(iv) is InducingPoints for iv in inducing_variables):
+        raise NotImplementedError("Exporting to NumPy is only implemented for InducingPoints")
+    Z = np.stack([iv.Z.numpy() for iv in inducing_variables])  # [K', M, D]
+
+    alpha, B = _posterior_statistics(layer)
+    arrays = dict(Z=Z, alpha=alpha.numpy(), B=B.numpy())
+    arrays.update(_numpy_kernel_arrays(layer, input_dim=Z.shape[-1]))
+    arrays.update(_numpy_mean_function_arrays(layer.mean_function))
+    if isinstance(layer.kernel, LinearCoregionalization):
+        arrays["W"] = layer.kernel.W.numpy()  # [Q, L]
+    return arrays
+
+
+def export_deep_gp_npz(model: DeepGP, path: str) -> None:
+    r"""
+    Write the frozen posterior of *model* to a ``.npz`` file at *path*, for
+    making predictions with :class:`~gpflux.prediction.NumpyDeepGP` in
+    processes that do not import TensorFlow.
+
+    For each layer, this stores the inducing points ``Z``, the kernel
+    hyperparameters, the mean function parameters and the posterior
+    statistics ``α`` and ``B`` described in :class:`ExportedDeepGP` (which
+    contain the factorisation of ``Kuu`` and the projected ``q_mu`` and
+    ``q_sqrt``), and for a :class:`~gpflow.likelihoods.Gaussian` likelihood,
+    its variance.
+
+    This is implemented for models whose :attr:`~gpflux.models.DeepGP.f_layers`
+    are all :class:`~gpflux.layers.GPLayer`\ s with
+    :class:`~gpflow.kernels.SharedIndependent`,
+    :class:`~gpflow.kernels.SeparateIndependent` or
+    :class:`~gpflow.kernels.LinearCoregionalization` kernels of
+    :class:`~gpflow.kernels.SquaredExponential` or Matérn kernels, inducing
+    points, and :class:`~gpflow.mean_functions.Zero`,
+    :class:`~gpflow.mean_functions.Identity`,
+    :class:`~gpflow.mean_functions.Constant` or
+    :class:`~gpflow.mean_functions.Linear` mean functions.
+
+    :param model: The trained model to export.
+    :param path: The path of the ``.npz`` file to write.
+    :raises NotImplementedError: If *model* contains unsupported layers,
+        kernels, inducing variables or mean functions.
+    """
+    arrays = dict(format_version=np.array(FORMAT_VERSION), num_layers=np.array(len(model.f_layers)))
+    for i, layer in enumerate(model.f_layers):
+        if not isinstance(layer, GPLayer):
+            raise NotImplementedError(
+                f"Exporting to NumPy is not implemented for {type(layer).__name__} layers"
+            )
+        for key, value in _numpy_gp_layer_arrays(layer).items():
+            arrays[f"layer_{i}/{key}"] = value
+
+    likelihood = model.likelihood_layer.likelihood
+    arrays["likelihood"] = np.array(type(likelihood).__name__)
+    if type(likelihood) is Gaussian:
+        arrays["likelihood/variance"] = likelihood.variance.numpy()
+
+    with open(path, "wb") as fp:  # np.savez would append ".npz" to other paths
+        np.savez(fp, **arrays)
@@ -0,0 +1,304 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`NumpyDeepGP`, which makes predictions with a
+trained :class:`~gpflux.models.DeepGP` exported by
+:func:`~gpflux.prediction.export_deep_gp_npz`, and
+:class:`NumpyWeightSpaceModel`, which makes predictions with a
+:class:`~gpflux.prediction.WeightSpaceSurrogate`, using only NumPy.
+
+This module does not depend on TensorFlow, GPflow or the rest of GPflux.
+Importing it through ``gpflux.prediction`` imports all of those, so to avoid
+that cost in a serving process, copy this file or load it directly::
+
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location("numpy_runtime", path_to_this_file)
+    numpy_runtime = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(numpy_runtime)
+
+    model = numpy_runtime.NumpyDeepGP.load("model.npz")
+    f_mean, f_var = model.predict_f(X)
+"""
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+""" The version of the ``.npz`` format written by :func:`~gpflux.prediction.export_deep_gp_npz`. """
+
+
+def _squared_exponential(r2: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * r2)
+
+
+def _matern12(r2: np.ndarray) -> np.ndarray:
+    r = np.sqrt(np.maximum(r2, 1e-36))
+    return np.exp(-r)
+
+
+def _matern32(r2: np.ndarray) -> np.ndarray:
+    sqrt3_r = np.sqrt(3.0) * np.sqrt(np.maximum(r2, 1e-36))
+    return (1.0 + sqrt3_r) * np.exp(-sqrt3_r)
+
+
+def _matern52(r2: np.ndarray) -> np.ndarray:
+    sqrt5_r = np.sqrt(5.0) * np.sqrt(np.maximum(r2, 1e-36))
+    return (1.0 + sqrt5_r + sqrt5_r ** 2 / 3.0) * np.exp(-sqrt5_r)
+
+
+KERNELS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "SquaredExponential": _squared_exponential,
+    "Matern12": _matern12,
+    "Matern32": _matern32,
+    "Matern52": _matern52,
+}
+"""
+The supported (stationary) kernels, by name, as functions of the squared
+scaled distance ``r²``; the kernel is ``variance * k(r²)``.
+"""
+
+
+def _scaled_square_distance(X: np.ndarray, Z: np.ndarray, lengthscales: np.ndarray) -> np.ndarray:
+    """Return ``r²`` between *X* ``[N, D]`` and *Z* ``[M, D]``, with the shape ``[M, N]``."""
+    X = X / lengthscales
+    Z = Z / lengthscales
+    r2 = np.sum(Z ** 2, axis=-1)[:, None] + np.sum(X ** 2, axis=-1)[None, :] - 2 * Z @ X.T
+    return np.maximum(r2, 0.0)
+
+
+class NumpyGPLayer:
+    """
+    The marginal predictions of an exported :class:`~gpflux.layers.GPLayer`.
+
+    The marginal posterior of each latent GP ``l`` is ``mean = Kfu α[l] + m(x)``
+    and ``var = Kff - Kfu B[l] Kuf``, where ``α`` and ``B`` are the frozen
+    posterior statistics computed at export time (see
+    :func:`~gpflux.prediction.export_deep_gp_npz`). With a
+    :class:`~gpflow.kernels.LinearCoregionalization` kernel, the latent GPs are
+    mixed by ``W``.
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        """
+        :param arrays: The arrays of this layer, without the ``layer_<i>/`` prefix.
+        """
+        self.kernels = [str(name) for name in arrays["kernels"]]  # [K]
+        unsupported = set(self.kernels) - set(KERNELS)
+        if unsupported:
+            raise NotImplementedError(f"Unsupported kernels: {sorted(unsupported)}")
+        self.variance = arrays["variance"]  # [K]
+        self.lengthscales = arrays["lengthscales"]  # [K, D]
+        self.Z = arrays["Z"]  # [K', M, D], where K' is 1 for shared inducing points
+        self.alpha = arrays["alpha"]  # [L, M]
+        self.B = arrays["B"]  # [L, M, M]
+        self.W = arrays.get("W")  # [Q, L] or None
+        self.mean_function = str(arrays["mean_function"])
+        self.mean_function_arrays = {
+            key.split("/", 1)[1]: value
+            for key, value in arrays.items()
+            if key.startswith("mean_function/")
+        }
+
+    def _Kuf(self, X: np.ndarray) -> np.ndarray:
+        """Return ``Kuf``, either shared by all latent GPs ``[1, M, N]`` or not ``[L, M, N]``."""
+        num_Kuf = max(len(self.kernels), len(self.Z))
+        Kuf = []
+        for i in range(num_Kuf):
+            k = i if len(self.kernels) > 1 else 0
+            Z = self.Z[i if len(self.Z) > 1 else 0]
+            r2 = _scaled_square_distance(X, Z, self.lengthscales[k])
+            Kuf.append(self.variance[k] * KERNELS[self.kernels[k]](r2))
+        return np.stack(Kuf)
+
+    def _mix(self, latent: np.ndarray, *, squared: bool) -> np.ndarray:
+        if self.W is None:
+            return latent
+        return latent @ (self.W ** 2 if squared else self.W).T  # [N, Q]
+
+    def _mean_function(self, X: np.ndarray) -> np.ndarray:
+        arrays = self.mean_function_arrays
+        if self.mean_function == "Zero":
+            return np.zeros((X.shape[0], int(arrays["output_dim"])), dtype=X.dtype)
+        elif self.mean_function == "Identity":
+            return X
+        elif self.mean_function == "Constant":
+            c = np.reshape(arrays["c"], (1, -1))
+            return np.broadcast_to(c, (X.shape[0], c.shape[1]))
+        elif self.mean_function == "Linear":
+            return X @ arrays["A"] + arrays["b"]
+        raise NotImplementedError(f"Unsupported mean function: {self.mean_function}")
+
+    def _latent_mean(self, Kuf: np.ndarray) -> np.ndarray:
+        return (self.alpha[:, None, :] @ Kuf)[:, 0, :].T  # [N, L]
+
+    def predict_mean(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The posterior mean, with the shape ``[N, Q]``.
+        """
+        mean = self._latent_mean(self._Kuf(X))
+        return self._mix(mean, squared=False) + self._mean_function(X)
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The posterior mean and marginal variance, both with the shape ``[N, Q]``.
+        """
+        Kuf = self._Kuf(X)
+        mean = self._latent_mean(Kuf)
+        var = self.variance - np.sum(Kuf * (self.B @ Kuf), axis=-2).T  # [N, L]
+        mean = self._mix(mean, squared=False) + self._mean_function(X)
+        return mean, self._mix(var, squared=True)
+
+    def sample(self, X: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Return a sample of the outputs at *X* from the marginals, with the shape ``[N, Q]``."""
+        mean, var = self.predict(X)
+        return mean + np.sqrt(np.maximum(var, 0.0)) * rng.standard_normal(mean.shape)
+
+
+class NumpyDeepGP:
+    """
+    Makes predictions with a :class:`~gpflux.models.DeepGP` exported by
+    :func:`~gpflux.prediction.export_deep_gp_npz`, using only NumPy. The
+    methods mirror :meth:`DeepGP.predict_f <gpflux.models.DeepGP.predict_f>`,
+    :meth:`DeepGP.predict_mean <gpflux.models.DeepGP.predict_mean>` and
+    :meth:`LikelihoodLayer.predict_mean_and_var
+    <gpflux.layers.LikelihoodLayer>`. As in the TensorFlow model, all but the
+    last layer are sampled from their marginals, using the random number
+    generator *rng* (or a new one, if it is `None`).
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        """
+        :param arrays: The arrays written by :func:`~gpflux.prediction.export_deep_gp_npz`.
+        """
+        if int(arrays["format_version"]) != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported format version {int(arrays['format_version'])}, "
+                f"expected {FORMAT_VERSION}"
+            )
+        self.layers = []
+        for i in range(int(arrays["num_layers"])):
+            layer_arrays = {
+                key.split("/", 1)[1]: value
+                for key, value in arrays.items()
+                if key.startswith(f"layer_{i}/")
+            }
+            self.layers.append(NumpyGPLayer(layer_arrays))
+        self.likelihood = str(arrays["likelihood"])
+        self.likelihood_variance = arrays.get("likelihood/variance")
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyDeepGP":
+        """Load a model from the ``.npz`` file at *path*."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(dict(arrays))
+
+    def predict_mean(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The mean of ``f`` at the means of the previous layers, with the shape ``[N, Q]``.
+        """
+        features = np.asarray(X)
+        for layer in self.layers:
+            features = layer.predict_mean(features)
+        return features
+
+    def predict_f(
+        self, X: np.ndarray, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The mean and variance of ``f``, with the shape ``[N, Q]``.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        features = np.asarray(X)
+        for layer in self.layers[:-1]:
+            features = layer.sample(features, rng)
+        return self.layers[-1].predict(features)
+
+    def predict_y(
+        self, X: np.ndarray, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The mean and variance of ``y``, with the shape ``[N, Q]``.
+        """
+        if self.likelihood != "Gaussian":
+            raise NotImplementedError(f"Unsupported likelihood: {self.likelihood}")
+        f_mean, f_var = self.predict_f(X, rng)
+        return f_mean, f_var + self.likelihood_variance
+
+    def sample_f(
+        self, X: np.ndarray, num_samples: int, rng: Optional[np.random.Generator] = None
+    ) -> np.ndarray:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :param num_samples: The number of samples ``S`` to propagate through all layers.
+        :returns: The samples of ``f``, with the shape ``[S, N, Q]``.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        X = np.asarray(X)
+        features = np.tile(X, (num_samples, 1))  # [S * N, D]
+        for layer in self.layers:
+            features = layer.sample(features, rng)
+        return features.reshape((num_samples, X.shape[0], -1))
+
+
+class NumpyWeightSpaceModel:
+    """
+    Makes predictions with a :class:`~gpflux.prediction.WeightSpaceSurrogate`
+    exported by :meth:`~gpflux.prediction.WeightSpaceSurrogate.export_npz`,
+    using only NumPy: the random Fourier features of the inputs are multiplied
+    with the weights of the surrogate in a single matrix multiplication.
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        """
+        :param arrays: The arrays written by
+            :meth:`~gpflux.prediction.WeightSpaceSurrogate.export_npz`.
+        """
+        if int(arrays["format_version"]) != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported format version {int(arrays['format_version'])}, "
+                f"expected {FORMAT_VERSION}"
+            )
+        # scale the frequencies by the lengthscales once, instead of the inputs in every call
+        self.frequencies = arrays["frequencies"] / arrays["lengthscales"]  # [L / 2, D]
+        self.feature_constant = float(arrays["feature_constant"])
+        self.weights = arrays["weights"]  # [L, Q + Q K]
+        self.num_outputs = int(arrays["num_outputs"])
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyWeightSpaceModel":
+        """Load a model from the ``.npz`` file at *path*."""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(dict(arrays))
+
+    def predict_f(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param X: The inputs, with the shape ``[N, D]``.
+        :returns: The mean and variance of ``f``, with the shape ``[N, Q]``.
+        """
+        projection = np.asarray(X) @ self.frequencies.T  # [N, L / 2]
+        features = self.feature_constant * np.concatenate(
+            [np.sin(projection), np.cos(projection)], axis=-1
+        )  # [N, L]
+        scores = features @ self.weights  # [N, Q + Q K]
+        Q = self.num_outputs
+        var = np.sum(np.square(scores[:, Q:].reshape(len(scores), Q, -1)), axis=-1)
+        return scores[:, :Q], var
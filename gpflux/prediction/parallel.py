@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`ParallelPredictor`, which makes predictions with
+a trained :class:`~gpflux.models.DeepGP` in a pool of worker processes.
+"""
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import default_float
+
+from gpflux.models import DeepGP
+from gpflux.prediction.streaming import StreamingPredictor
+
+_ArraySpec = Tuple[str, Tuple[int, ...], str]
+""" The name of a shared memory block, and the shape and dtype of the array it holds. """
+
+_worker_predictor: Optional[StreamingPredictor] = None
+""" The predictor of the current worker process, set by :func:`_init_worker`. """
+
+
+class ParallelPredictor:
+    """
+    Makes predictions with a trained :class:`~gpflux.models.DeepGP` in a pool
+    of worker processes, to use all the cores of a CPU-only machine when a
+    single TensorFlow process does not saturate them.
+
+    Each worker builds the model with *model_fn* and restores its variables
+    from the same checkpoint, written with `tf.train.Checkpoint`::
+
+        tf.train.Checkpoint(model=deep_gp).write("model/ckpt")
+        with ParallelPredictor(build_deep_gp, "model/ckpt", num_workers=8) as predictor:
+            mean, var = predictor.predict(X)
+
+    The inputs and outputs are exchanged through shared memory. The inputs are
+    sharded into chunks of *chunk_size* rows that are distributed over the
+    workers. Each worker writes its outputs directly into the rows of the
+    shared output arrays that correspond to its inputs, so the outputs are in
+    the order of the inputs.
+
+    .. note:: This requires Python 3.8 or later. As TensorFlow is not
+        fork-safe, the workers are started with the ``spawn`` method, so
+        *model_fn* must be picklable (e.g. a function defined at the top
+        level of a module).
+    """
+
+    def __init__(
+        self,
+        model_fn: Callable[[], DeepGP],
+        checkpoint_path: str,
+        *,
+        num_workers: Optional[int] = None,
+        intra_op_threads: int = 1,
+        inter_op_threads: int = 1,
+        predict_y: bool = False,
+        chunk_size: int = 4096,
+    ):
+        """
+        :param model_fn: A function that builds the (untrained) model, with
+            the same architecture as the model saved at *checkpoint_path*.
+        :param checkpoint_path: The path of a checkpoint of the trained model,
+            written with ``tf.train.Checkpoint(model=deep_gp).write(checkpoint_path)``.
+        :param num_workers: The number of worker processes. Defaults to the
+            number of CPUs.
+        :param intra_op_threads: The number of threads that each worker uses
+            within an operation, see
+            `tf.config.threading.set_intra_op_parallelism_threads`.
+        :param inter_op_threads: The number of threads that each worker uses
+            to run independent operations, see
+            `tf.config.threading.set_inter_op_parallelism_threads`.
+        :param predict_y: Whether to predict the mean and variance of ``y``
+            instead of ``f`` (see :meth:`StreamingPredictor.for_deep_gp`).
+        :param chunk_size: The number of rows sent to a worker at once.
+        :raises NotImplementedError: On Python versions before 3.8, which lack
+            `multiprocessing.shared_memory`.
+        """
+        if sys.version_info < (3, 8):
+            raise NotImplementedError(
+                "`ParallelPredictor` requires Python 3.8 or later, "
+                "for `multiprocessing.shared_memory`"
+            )
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                model_fn,
+                checkpoint_path,
+                intra_op_threads,
+                inter_op_threads,
+                predict_y,
+                chunk_size,
+            ),
+        )
+        self._output_specs: Optional[List[Tuple[Tuple[int, ...], str]]] = None
+
+    def predict(self, inputs: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """
+        Make predictions for *inputs* in parallel.
+
+        :param inputs: The inputs, with the shape ``[N, D]``.
+        :returns: The mean and variance of ``f`` (or ``y``), each with the
+            leading dimension ``N``.
+        """
+        from multiprocessing import shared_memory
+
+        inputs = np.asarray(inputs, dtype=default_float())
+        num_rows, input_dim = inputs.shape
+        if self._output_specs is None:
+            self._output_specs = self._pool.submit(_output_specs, input_dim).result()
+
+        blocks = []
+        try:
+            input_block = shared_memory.SharedMemory(create=True, size=max(inputs.nbytes, 1))
+            blocks.append(input_block)
+            _as_array(input_block, inputs.shape, inputs.dtype)[...] = inputs
+            output_specs: List[_ArraySpec] = []
+            for shape, dtype in self._output_specs:
+                shape = (num_rows,) + shape
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+                blocks.append(block)
+                output_specs.append((block.name, shape, dtype))
+
+            input_spec = (input_block.name, inputs.shape, inputs.dtype.str)
+            futures = [
+                self._pool.submit(_predict_rows, input_spec, output_specs, start, start + n)
+                for start, n in _shards(num_rows, self.chunk_size)
+            ]
+            for future in futures:
+                future.result()  # re-raises any exception from the workers
+
+            return tuple(
+                _as_array(block, shape, dtype).copy()
+                for block, (_, shape, dtype) in zip(blocks[1:], output_specs)
+            )
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._pool.shutdown()
+
+    def __enter__(self) -> "ParallelPredictor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def _shards(num_rows: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """Return the first row and number of rows of each shard."""
+    return [(start, min(chunk_size, num_rows - start)) for start in range(0, num_rows, chunk_size)]
+
+
+def _as_array(block: Any, shape: Sequence[int], dtype: Any) -> np.ndarray:
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _init_worker(
+    model_fn: Callable[[], DeepGP],
+    checkpoint_path: str,
+    intra_op_threads: int,
+    inter_op_threads: int,
+    predict_y: bool,
+    chunk_size: int,
+) -> None:
+    global _worker_predictor
+    # the thread pools must be configured before TensorFlow runs any operation
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    model = model_fn()
+    tf.train.Checkpoint(model=model).read(checkpoint_path).expect_partial()
+    _worker_predictor = StreamingPredictor.for_deep_gp(
+        model, predict_y=predict_y, chunk_size=chunk_size
+    )
+
+
+def _output_specs(input_dim: int) -> List[Tuple[Tuple[int, ...], str]]:
+    """Return the trailing shape and dtype of each output of the worker's predictor."""
+    assert _worker_predictor is not None
+    results = _worker_predictor.predict(np.zeros((1, input_dim), dtype=default_float()))
+    return [(result.shape[1:], result.dtype.str) for result in results]
+
+
+def _predict_rows(
+    input_spec: _ArraySpec, output_specs: Sequence[_ArraySpec], start: int, end: int
+) -> None:
+    """Predict at the rows ``[start, end)`` of the shared inputs and write to the shared outputs."""
+    from multiprocessing import shared_memory
+
+    specs = (input_spec, *output_specs)
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    try:
+        arrays = [_as_array(b, shape, dtype) for b, (_, shape, dtype) in zip(blocks, specs)]
+        _predict_into(*arrays, start=start, end=end)
+        del arrays  # release the views before closing the blocks
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _predict_into(inputs: np.ndarray, *outputs: np.ndarray, start: int, end: int) -> None:
+    assert _worker_predictor is not None
+    # copy the inputs so that no view of the shared memory outlives this call
+    _worker_predictor.predict(np.array(inputs[start:end]), outputs=[o[start:end] for o in outputs])
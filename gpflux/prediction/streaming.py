@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+This module provides :class:`StreamingPredictor`, which makes predictions on
+test sets that are too large to be held in memory at once.
+"""
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import tensorflow as tf
+
+from gpflow import default_float
+from gpflow.base import TensorType
+
+from gpflux.models import DeepGP
+
+StreamingInputs = Union[tf.data.Dataset, np.ndarray, Iterable[TensorType]]
+"""
+The inputs accepted by :class:`StreamingPredictor`: a `tf.data.Dataset` of
+rows ``[D]`` or of batches ``[n, D]``, an array-like object of the shape
+``[N, D]`` that supports slicing (e.g. a `numpy.memmap`), or any other iterable
+(e.g. a generator) of rows or batches.
+"""
+
+
+class StreamingPredictor:
+    """
+    Makes predictions on a stream of inputs in fixed-size chunks, so that the
+    peak memory does not depend on the total number of inputs.
+
+    The chunks are read through a prefetching `tf.data.Dataset`, so that
+    reading the next chunk (e.g. from a memory-mapped file) overlaps with the
+    prediction for the current one, and each chunk is passed through a single
+    compiled `tf.function`. The outputs of each chunk are written to
+    preallocated arrays, which may be memory-mapped::
+
+        predictor = StreamingPredictor.for_deep_gp(deep_gp, chunk_size=10_000)
+        X = np.load("inputs.npy", mmap_mode="r")
+        mean = np.lib.format.open_memmap("mean.npy", "w+", np.float64, (len(X), 1))
+        var = np.lib.format.open_memmap("var.npy", "w+", np.float64, (len(X), 1))
+        predictor.predict(X, outputs=(mean, var))
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[tf.Tensor], Sequence[tf.Tensor]],
+        *,
+        chunk_size: int = 4096,
+        prefetch: int = 2,
+        jit_compile: bool = False,
+    ):
+        """
+        :param predict_fn: The function that makes predictions for a chunk of
+            inputs ``[n, D]``, returning a tuple of tensors with the leading
+            dimension ``n``, e.g. :meth:`DeepGP.predict_f <gpflux.models.DeepGP.predict_f>`.
+        :param chunk_size: The (maximum) number of inputs in each chunk.
+        :param prefetch: The number of chunks of inputs to read ahead.
+        :param jit_compile: Whether to compile *predict_fn* with XLA.
+        """
+        if chunk_size < 1:
+            raise ValueError("`chunk_size` must be positive")
+        self.predict_fn = predict_fn
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.jit_compile = jit_compile
+        self._compiled_fns: Dict[Tuple[Any, ...], Callable[[tf.Tensor], Sequence[tf.Tensor]]] = {}
+
+    @classmethod
+    def for_deep_gp(
+        cls, model: DeepGP, *, predict_y: bool = False, **kwargs: Any
+    ) -> "StreamingPredictor":
+        """
+        Create a predictor for the mean and variance of ``f`` or ``y`` of
+        *model*, see :func:`deep_gp_predict_fn`.
+
+        :param kwargs: Passed to :class:`StreamingPredictor`.
+        """
+        return cls(deep_gp_predict_fn(model, predict_y=predict_y), **kwargs)
+
+    def as_dataset(self, inputs: StreamingInputs) -> tf.data.Dataset:
+        """
+        Return a prefetching `tf.data.Dataset` of chunks of *inputs*, with the
+        shape ``[chunk_size, D]`` except for the last chunk, which may be smaller.
+        """
+        if isinstance(inputs, tf.data.Dataset):
+            dataset = inputs
+            if dataset.element_spec.shape.rank != 1:
+                dataset = dataset.unbatch()
+            dataset = dataset.map(lambda row: tf.cast(row, default_float()))
+            dataset = dataset.batch(self.chunk_size)
+        elif hasattr(inputs, "shape") and hasattr(inputs, "__getitem__"):
+            dataset = self._array_dataset(inputs)
+        else:
+            dataset = self._iterable_dataset(inputs)
+        return dataset.prefetch(self.prefetch)
+
+    def _array_dataset(self, inputs: Any) -> tf.data.Dataset:
+        num_rows, input_dim = inputs.shape
+
+        def chunks() -> Iterator[np.ndarray]:
+            for start in range(0, num_rows, self.chunk_size):
+                end = min(start + self.chunk_size, num_rows)
+                yield np.asarray(inputs[start:end], dtype=default_float())
+
+        return tf.data.Dataset.from_generator(
+            chunks, output_signature=tf.TensorSpec([None, input_dim], default_float())
+        )
+
+    def _iterable_dataset(self, inputs: Iterable[TensorType]) -> tf.data.Dataset:
+        blocks = (np.atleast_2d(np.asarray(block, dtype=default_float())) for block in inputs)
+        first = next(blocks, None)
+        if first is None:
+            raise ValueError("`inputs` must not be empty")
+        blocks = itertools.chain([first], blocks)
+
+        def chunks() -> Iterator[np.ndarray]:
+            buffer, num_buffered = [], 0
+            for block in blocks:
+                buffer.append(block)
+                num_buffered += len(block)
+                while num_buffered >= self.chunk_size:
+                    chunk, rest = np.split(np.concatenate(buffer), [self.chunk_size])
+                    yield chunk
+                    buffer, num_buffered = [rest], len(rest)
+            if num_buffered > 0:
+                yield np.concatenate(buffer)
+
+        return tf.data.Dataset.from_generator(
+            chunks, output_signature=tf.TensorSpec([None, first.shape[-1]], default_float())
+        )
+
+    def _compiled_fn(self, spec: tf.TensorSpec) -> Callable[[tf.Tensor], Sequence[tf.Tensor]]:
+        key = (tuple(spec.shape.as_list()), spec.dtype)
+        if key not in self._compiled_fns:
+            self._compiled_fns[key] = tf.function(
+                self.predict_fn, input_signature=[spec], jit_compile=self.jit_compile
+            )
+        return self._compiled_fns[key]
+
+    def iter_predictions(
+        self, inputs: StreamingInputs
+    ) -> Iterator[Tuple[int, Tuple[np.ndarray, ...]]]:
+        """
+        Make predictions for *inputs* one chunk at a time.
+
+        :returns: An iterator over pairs of the index of the first row of each
+            chunk and the (NumPy) outputs of ``predict_fn`` for that chunk.
+        """
+        dataset = self.as_dataset(inputs)
+        predict = self._compiled_fn(dataset.element_spec)  # [None, D]
+        start = 0
+        for chunk in dataset:
+            results = tuple(result.numpy() for result in predict(chunk))
+            yield start, results
+            start += chunk.shape[0]
+
+    def predict(
+        self, inputs: StreamingInputs, *, outputs: Optional[Sequence[np.ndarray]] = None
+    ) -> Tuple[np.ndarray, ...]:
+        """
+        Make predictions for all *inputs*, one chunk at a time.
+
+        :param inputs: The inputs, see :data:`StreamingInputs`.
+        :param outputs: The (preallocated, possibly memory-mapped) arrays to
+            write the outputs of ``predict_fn`` to, each with the leading
+            dimension ``N``. If `None`, they are allocated after the first
+            chunk if the number of inputs ``N`` is known in advance (i.e. for
+            array-like *inputs* or datasets of known cardinality), or otherwise
+            concatenated from all chunks at the end.
+        :returns: The outputs of ``predict_fn`` for all inputs.
+        """
+        num_rows = _num_rows(inputs)
+        if outputs is not None and num_rows is not None:
+            for output in outputs:
+                if len(output) < num_rows:
+                    raise ValueError(
+                        f"`outputs` must have room for all {num_rows} rows, got {len(output)}"
+                    )
+
+        collected = []
+        for start, results in self.iter_predictions(inputs):
+            if outputs is None and num_rows is not None:
+                outputs = [np.empty((num_rows,) + r.shape[1:], dtype=r.dtype) for r in results]
+            if outputs is None:
+                collected.append(results)
+                continue
+            for output, result in zip(outputs, results):
+                end = start + len(result)
+                output[start:end] = result
+
+        if outputs is None:
+            return tuple(np.concatenate(parts) for parts in zip(*collected))
+        return tuple(outputs)
+
+
+def deep_gp_predict_fn(
+    model: DeepGP, *, predict_y: bool = False
+) -> Callable[[tf.Tensor], Tuple[tf.Tensor, tf.Tensor]]:
+    """
+    Return a function that predicts the mean and variance of ``f`` (see
+    :meth:`~gpflux.models.DeepGP.predict_f`) or, if *predict_y* is `True`, of
+    ``y`` (see :class:`~gpflux.layers.LikelihoodLayer`) of *model*.
+    """
+    if not predict_y:
+        return model.predict_f
+
+    def predict_y_fn(inputs: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor]:
+        outputs = model.call(inputs)
+        return outputs.y_mean, outputs.y_var
+
+    return predict_y_fn
+
+
+def _num_rows(inputs: StreamingInputs) -> Optional[int]:
+    """Return the number of rows in *inputs*, or `None` if it is not known in advance."""
+    if isinstance(inputs, tf.data.Dataset):
+        if inputs.element_spec.shape.rank != 1:
+            return None
+        cardinality = int(inputs.cardinality())
+        return cardinality if cardinality >= 0 else None
+    if hasattr(inputs, "shape") and hasattr(inputs, "__getitem__"):
+        return int(inputs.shape[0])
+    return None
@@ -16,7 +16,7 @@
 """ This module enables you to sample from (Deep) GPs using different approaches. """
 
 import abc
-from typing import Callable, Optional, Union
+from typing import Callable, Optional, Sequence, Union
 
 import tensorflow as tf
 
@@ -24,10 +24,12 @@ from gpflow.base import TensorType
 from gpflow.conditionals import conditional
 from gpflow.config import default_float, default_jitter
 from gpflow.covariances import Kuf, Kuu
-from gpflow.inducing_variables import InducingVariables
-from gpflow.kernels import Kernel
+from gpflow.inducing_variables import InducingPoints, InducingVariables
+from gpflow.kernels import Kernel, Sum
 from gpflow.utilities import Dispatcher
 
+from gpflux.inducing_variables.additive import AdditiveInducingPoints
+from gpflux.inducing_variables.grid import GridInducingPoints, grid_kuu_factors, interpolate
 from gpflux.math import compute_A_inv_b
 from gpflux.sampling.kernel_with_feature_decomposition import KernelWithFeatureDecomposition
 from gpflux.sampling.utils import draw_conditional_sample
@@ -198,3 +200,113 @@ def _efficient_sample_matheron_rule(
             return weight_space_prior_X + function_space_update_X  # [N, P]
 
     return WilsonSample()
+
+
+@efficient_sample.register(GridInducingPoints, Kernel, object)
+@efficient_sample.register(GridInducingPoints, KernelWithFeatureDecomposition, object)
+def _efficient_sample_grid_interpolation(
+    inducing_variable: GridInducingPoints,
+    kernel: Kernel,
+    q_mu: tf.Tensor,
+    *,
+    q_sqrt: Optional[Sequence[TensorType]] = None,
+    whiten: bool = False,
+) -> Sample:
+    """
+    Draws a sample of the inducing variables on the grid once, using the
+    Kronecker structure of ``Kuu`` and of the variational covariance, and
+    evaluates it at new inputs by local cubic interpolation, ``f(X) = W(X) u``
+    :cite:p:`wilson2015kernel`. This is consistent and costs :math:`O(4^D)` per
+    evaluation point, but ignores the (small) interpolation residual of the prior.
+
+    :param q_mu: A tensor with the shape ``[M, P]``.
+    :param q_sqrt: The Cholesky factors of the per-dimension factors of the
+        covariance, with the shapes ``[P, m_d, m_d]``.
+    :param whiten: Determines the parameterisation of the inducing variables.
+    """
+    M, P = tf.shape(q_mu)[0], tf.shape(q_mu)[1]  # num inducing, num output heads
+    q_sqrt = tf.linalg.LinearOperatorKronecker(
+        [tf.linalg.LinearOperatorLowerTriangular(factor) for factor in q_sqrt]
+    )  # [P, M, M]
+    u_sample_noise = q_sqrt.matmul(tf.random.normal((P, M, 1), dtype=default_float()))
+    u_sample = q_mu + tf.linalg.matrix_transpose(u_sample_noise[..., 0])  # [M, P]
+
+    if whiten:
+        Luu = tf.linalg.LinearOperatorKronecker(
+            [
+                tf.linalg.LinearOperatorLowerTriangular(tf.linalg.cholesky(K))
+                for K in grid_kuu_factors(inducing_variable, kernel, jitter=default_jitter())
+            ]
+        )  # [M, M]
+        u_sample = Luu.matmul(u_sample)  # [M, P]
+
+    class GridSample(Sample):
+        def __call__(self, X: TensorType) -> tf.Tensor:
+            """
+            :param X: evaluation points [N, D]
+            :return: function value of sample [N, P]
+            """
+            return interpolate(inducing_variable, X, u_sample)  # [N, P]
+
+    return GridSample()
+
+
+class _UnslicedKernel(Kernel):
+    """
+    Evaluates *kernel* on its inputs as given, without first selecting its
+    ``active_dims``, for inputs that have already been sliced.
+    """
+
+    def __init__(self, kernel: Kernel):
+        super().__init__()
+        self.kernel = kernel
+
+    def K(self, X: TensorType, X2: Optional[TensorType] = None) -> tf.Tensor:
+        return self.kernel.K(X, X2)
+
+    def K_diag(self, X: TensorType) -> tf.Tensor:
+        return self.kernel.K_diag(X)
+
+
+@efficient_sample.register(AdditiveInducingPoints, Sum, object)
+def _efficient_sample_additive(
+    inducing_variable: AdditiveInducingPoints,
+    kernel: Sum,
+    q_mu: tf.Tensor,
+    *,
+    q_sqrt: Optional[TensorType] = None,
+    whiten: bool = False,
+) -> Sample:
+    """
+    Draws an independent consistent sample for each component of an additive
+    kernel, each evaluated on the input dimensions of its component, and sums them.
+
+    :param q_mu: A tensor with the shape ``[G, m, P]``.
+    :param q_sqrt: A tensor with the shape ``[G, P, m, m]``.
+    :param whiten: Determines the parameterisation of the inducing variables.
+    """
+    component_samples = [
+        efficient_sample(
+            InducingPoints(inducing_variable.Z[g]),
+            _UnslicedKernel(component),
+            q_mu[g],
+            q_sqrt=q_sqrt[g],
+            whiten=whiten,
+        )
+        for g, component in enumerate(kernel.kernels)
+    ]
+
+    class AdditiveSample(Sample):
+        def __call__(self, X: TensorType) -> tf.Tensor:
+            """
+            :param X: evaluation points [N, D]
+            :return: function value of sample [N, P]
+            """
+            return tf.add_n(
+                [
+                    sample(component.slice(X, None)[0])
+                    for component, sample in zip(kernel.kernels, component_samples)
+                ]
+            )  # [N, P]
+
+    return AdditiveSample()
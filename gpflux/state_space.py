@@ -0,0 +1,181 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+r"""
+This module provides the state-space (stochastic differential equation)
+representation of stationary kernels on a one-dimensional (temporal) input
+:cite:p:`hartikainen2010kalman`. A GP ``f(t)`` with such a kernel is the
+output ``f(t) = H s(t)`` of a linear time-invariant SDE ``ds/dt = F s + L w``,
+whose state ``s(t)`` of dimension ``S`` is a Gauss–Markov process: its
+transition over a time step ``Δ`` is ``s(t + Δ) | s(t) ~ N(A s(t), Q)`` with
+``A = exp(F Δ)`` and ``Q = P∞ - A P∞ Aᵀ``, where ``P∞`` is the stationary
+state covariance.
+
+Sequential computations on such chains are implemented as parallel scans over
+affine Gaussian maps (see :func:`affine_gaussian_scan`).
+"""
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+from gpflow.base import TensorType
+from gpflow.kernels import Kernel, Matern12, Matern32, Matern52
+from gpflow.utilities import Dispatcher
+
+state_space_model = Dispatcher("state_space_model")
+"""
+A function that returns the :class:`StateSpaceModel` of a kernel. Implemented
+for :class:`~gpflow.kernels.Matern12`, :class:`~gpflow.kernels.Matern32` and
+:class:`~gpflow.kernels.Matern52`.
+"""
+
+
+class StateSpaceModel(NamedTuple):
+    """The state-space representation of a stationary kernel."""
+
+    F: tf.Tensor
+    """ The feedback matrix, with the shape ``[S, S]``. """
+
+    P_inf: tf.Tensor
+    """ The stationary covariance of the state, with the shape ``[S, S]``. """
+
+    H: tf.Tensor
+    """ The measurement matrix that extracts ``f`` from the state, with the shape ``[1, S]``. """
+
+
+def _measurement_matrix(state_dim: int, dtype: tf.DType) -> tf.Tensor:
+    return tf.one_hot([0], state_dim, dtype=dtype)  # [1, S]
+
+
+@state_space_model.register(Matern12)
+def _state_space_model_matern12(kernel: Matern12) -> StateSpaceModel:
+    variance = tf.convert_to_tensor(kernel.variance)
+    lam = 1.0 / tf.convert_to_tensor(kernel.lengthscales)
+    F = tf.reshape(-lam, [1, 1])
+    P_inf = tf.reshape(variance, [1, 1])
+    return StateSpaceModel(F, P_inf, _measurement_matrix(1, variance.dtype))
+
+
+@state_space_model.register(Matern32)
+def _state_space_model_matern32(kernel: Matern32) -> StateSpaceModel:
+    variance = tf.convert_to_tensor(kernel.variance)
+    lam = np.sqrt(3.0) / tf.convert_to_tensor(kernel.lengthscales)
+    zero, one = tf.zeros_like(lam), tf.ones_like(lam)
+    F = tf.reshape(tf.stack([zero, one, -(lam ** 2), -2 * lam]), [2, 2])
+    P_inf = tf.reshape(tf.stack([variance, zero, zero, lam ** 2 * variance]), [2, 2])
+    return StateSpaceModel(F, P_inf, _measurement_matrix(2, variance.dtype))
+
+
+@state_space_model.register(Matern52)
+def _state_space_model_matern52(kernel: Matern52) -> StateSpaceModel:
+    variance = tf.convert_to_tensor(kernel.variance)
+    lam = np.sqrt(5.0) / tf.convert_to_tensor(kernel.lengthscales)
+    zero, one = tf.zeros_like(lam), tf.ones_like(lam)
+    F = tf.reshape(
+        tf.stack([zero, one, zero, zero, zero, one, -(lam ** 3), -3 * lam ** 2, -3 * lam]),
+        [3, 3],
+    )
+    kappa = lam ** 2 * variance / 3.0
+    P_inf = tf.reshape(
+        tf.stack([variance, zero, -kappa, zero, kappa, zero, -kappa, zero, lam ** 4 * variance]),
+        [3, 3],
+    )
+    return StateSpaceModel(F, P_inf, _measurement_matrix(3, variance.dtype))
+
+
+def transitions(
+    model: StateSpaceModel, dt: TensorType, *, from_stationary: Optional[TensorType] = None
+) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Compute the transition matrices ``A = exp(F Δ)`` and the process noise
+    covariances ``Q = P∞ - A P∞ Aᵀ`` for the time steps *dt*.
+
+    :param model: The state-space model.
+    :param dt: The (non-negative) time steps, with the shape ``[...]``.
+    :param from_stationary: An optional boolean mask with the same shape as
+        *dt*. Where it is `True`, the step starts from the stationary
+        distribution, i.e. ``A = 0`` and ``Q = P∞``, and *dt* is ignored.
+    :returns: ``A`` and ``Q``, with the shapes ``[..., S, S]``.
+    """
+    dt = tf.convert_to_tensor(dt, dtype=model.F.dtype)
+    if from_stationary is not None:
+        from_stationary = tf.convert_to_tensor(from_stationary, dtype=tf.bool)
+        dt = tf.where(from_stationary, tf.zeros_like(dt), dt)
+    A = tf.linalg.expm(dt[..., None, None] * model.F)  # [..., S, S]
+    if from_stationary is not None:
+        A = tf.where(from_stationary[..., None, None], tf.zeros_like(A), A)
+    Q = model.P_inf - tf.matmul(A, tf.matmul(model.P_inf, A, transpose_b=True))
+    Q = 0.5 * (Q + tf.linalg.adjoint(Q))  # symmetrise against round-off
+    return A, Q
+
+
+def affine_gaussian_scan(
+    B: TensorType, b: TensorType, S: Optional[TensorType] = None
+) -> Tuple[tf.Tensor, Optional[tf.Tensor]]:
+    """
+    Compute the marginals of the Gauss–Markov chain ``s₀ = b₀ + e₀``,
+    ``s_k = B_k s_{k-1} + b_k + e_k`` with ``e_k ~ N(0, S_k)``, using a parallel
+    scan over the (associative) composition of affine Gaussian maps, which has
+    logarithmic depth in the length of the chain. ``B₀`` is ignored.
+
+    :param B: The transition matrices, with the shape ``[K, ..., S, S]``.
+    :param b: The offsets, with the shape ``[K, ..., S]``.
+    :param S: The optional noise covariances, with the shape ``[K, ..., S, S]``.
+    :returns: The marginal means ``[K, ..., S]`` and, if *S* is given, the
+        marginal covariances ``[K, ..., S, S]``.
+    """
+    B = tf.concat([tf.zeros_like(B[:1]), B[1:]], axis=0)
+
+    def compose(earlier, later):  # type: ignore
+        B_e, b_e = earlier[:2]
+        B_l, b_l = later[:2]
+        composed = (tf.matmul(B_l, B_e), tf.linalg.matvec(B_l, b_e) + b_l)
+        if S is None:
+            return composed
+        S_e, S_l = earlier[2], later[2]
+        return composed + (tf.matmul(B_l, tf.matmul(S_e, B_l, transpose_b=True)) + S_l,)
+
+    elems = (B, b) if S is None else (B, b, S)
+    scanned = tfp.math.scan_associative(compose, elems)
+    return scanned[1], (scanned[2] if S is not None else None)
+
+
+def bridge(
+    A1: TensorType, Q1: TensorType, A2: TensorType, Q2: TensorType, *, jitter: float = 0.0
+) -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+    """
+    Compute the Gauss–Markov bridge ``s | s_L, s_R ~ N(P s_L + R s_R, T)`` for a
+    state ``s`` between a left neighbour ``s_L`` and a right neighbour ``s_R``,
+    where ``s | s_L ~ N(A1 s_L, Q1)`` and ``s_R | s ~ N(A2 s, Q2)``.
+
+    A missing left neighbour is represented by ``A1 = 0, Q1 = P∞``; a missing
+    right neighbour by ``A2 = 0`` and any positive-definite ``Q2``.
+
+    :returns: ``P``, ``R`` and ``T``, each with the shape ``[..., S, S]``.
+    """
+    A2_Q1 = tf.matmul(A2, Q1)  # [..., S, S]
+    innovation = tf.matmul(A2_Q1, A2, transpose_b=True) + Q2
+    innovation += jitter * tf.eye(tf.shape(Q2)[-1], dtype=Q2.dtype)
+    gain = tf.linalg.adjoint(tf.linalg.cholesky_solve(tf.linalg.cholesky(innovation), A2_Q1))
+    P = A1 - tf.matmul(gain, tf.matmul(A2, A1))
+    T = Q1 - tf.matmul(gain, A2_Q1)
+    return P, gain, 0.5 * (T + tf.linalg.adjoint(T))
+
+
+def is_state_space_kernel(kernel: Kernel) -> bool:
+    """Return `True` if :func:`state_space_model` is implemented for *kernel*."""
+    return isinstance(kernel, (Matern12, Matern32, Matern52))
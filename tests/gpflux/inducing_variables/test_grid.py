@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import Matern32, Product, SquaredExponential
+
+from gpflux.helpers import construct_grid_inducing_points
+from gpflux.inducing_variables.grid import (
+    GridInducingPoints,
+    cubic_interpolation_weights,
+    grid_kuu_factors,
+    interpolate,
+    is_separable,
+)
+
+
+def test_grid_inducing_points_shapes():
+    inducing_variable = GridInducingPoints([0.0, -1.0], [1.0, 1.0], [5, 7])
+    assert inducing_variable.num_inducing == len(inducing_variable) == 35
+    assert inducing_variable.Z.shape == (35, 2)
+
+
+def test_grid_inducing_points_requires_four_points():
+    with pytest.raises(ValueError):
+        GridInducingPoints([0.0], [1.0], [3])
+
+
+def test_construct_grid_inducing_points_covers_data_with_margin():
+    X = np.random.rand(20, 2)
+    inducing_variable = construct_grid_inducing_points(X, 10)
+    margin = 2 * inducing_variable.spacing
+    np.testing.assert_allclose(inducing_variable.lower, X.min(axis=0) - margin)
+    np.testing.assert_allclose(inducing_variable.upper, X.max(axis=0) + margin)
+
+
+@pytest.mark.parametrize("num_points_per_dim", [4, 5, [10, 5]])
+def test_construct_grid_inducing_points_requires_six_points(num_points_per_dim):
+    with pytest.raises(ValueError):
+        construct_grid_inducing_points(np.random.rand(20, 2), num_points_per_dim)
+
+
+def test_construct_grid_inducing_points_handles_constant_column():
+    X = np.random.rand(20, 2)
+    X[:, 1] = 3.0
+    inducing_variable = construct_grid_inducing_points(X, 10)
+    assert np.all(inducing_variable.spacing > 0)
+    assert np.all(np.isfinite(inducing_variable.Z))
+    assert inducing_variable.lower[1] < 3.0 < inducing_variable.upper[1]
+
+
+def test_is_separable():
+    assert is_separable(SquaredExponential(lengthscales=[1.0, 2.0]))
+    assert is_separable(Product([Matern32(active_dims=[0]), Matern32(active_dims=[1])]))
+    assert not is_separable(Matern32())
+
+
+@pytest.mark.parametrize(
+    "kernel",
+    [
+        SquaredExponential(variance=2.0, lengthscales=[0.5, 1.0]),
+        Product([Matern32(variance=2.0, active_dims=[0]), Matern32(active_dims=[1])]),
+    ],
+)
+def test_grid_kuu_factors_kronecker_product_equals_kuu(kernel):
+    inducing_variable = GridInducingPoints([0.0, -1.0], [1.0, 1.0], [5, 6])
+    factors = [factor.numpy() for factor in grid_kuu_factors(inducing_variable, kernel)]
+    np.testing.assert_allclose(
+        np.kron(*factors), kernel(inducing_variable.Z).numpy(), rtol=1e-10, atol=1e-12
+    )
+
+
+def test_interpolation_weights_sum_to_one():
+    inducing_variable = GridInducingPoints([0.0, -1.0], [1.0, 1.0], [10, 12])
+    X = np.random.rand(30, 2) * 3 - 1  # includes inputs outside of the grid
+    _, weights = cubic_interpolation_weights(inducing_variable, X)
+    np.testing.assert_allclose(tf.reduce_sum(weights, axis=-1), 1.0)
+
+
+@pytest.mark.parametrize("input_dim", [1, 2, 3])
+def test_interpolate_smooth_function(input_dim):
+    def f(X):
+        return np.prod(np.sin(2 * X), axis=-1, keepdims=True)
+
+    X = np.random.rand(50, input_dim)
+    inducing_variable = construct_grid_inducing_points(X, 30)
+    interpolated = interpolate(inducing_variable, X, f(inducing_variable.Z.numpy()))
+    np.testing.assert_allclose(interpolated, f(X), atol=1e-4)
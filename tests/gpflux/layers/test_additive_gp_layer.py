@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+import gpflow
+from gpflow.conditionals import conditional
+from gpflow.kernels import Linear, Matern32, SquaredExponential, Sum
+from gpflow.kullback_leiblers import gauss_kl
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.inducing_variables import AdditiveInducingPoints
+from gpflux.layers import AdditiveGPLayer
+from gpflux.models import DeepGP
+
+INPUT_DIM = 3
+NUM_INDUCING = 6
+NUM_LATENT_GPS = 2
+
+
+def _lengthscale(group):
+    return 0.5 + group
+
+
+def setup_additive_gp_layer_and_data(whiten=True):
+    X = np.random.randn(20, INPUT_DIM)
+    kernel = Sum(
+        [
+            SquaredExponential(lengthscales=_lengthscale(i), active_dims=[i])
+            for i in range(INPUT_DIM)
+        ]
+    )
+    inducing_variable = AdditiveInducingPoints(np.random.randn(INPUT_DIM, NUM_INDUCING, 1))
+    layer = AdditiveGPLayer(
+        kernel, inducing_variable, len(X), Zero(), num_latent_gps=NUM_LATENT_GPS, whiten=whiten
+    )
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    layer.q_sqrt.assign(
+        np.tril(0.3 * np.random.randn(*layer.q_sqrt.shape)) + 0.5 * np.eye(NUM_INDUCING)
+    )
+    return layer, X
+
+
+def test_incompatible_kernel():
+    inducing_variable = AdditiveInducingPoints(np.random.randn(2, NUM_INDUCING, 1))
+    with pytest.raises(GPLayerIncompatibilityException):
+        AdditiveGPLayer(SquaredExponential(), inducing_variable, 10, Zero())
+    with pytest.raises(GPLayerIncompatibilityException):
+        kernel = Sum([SquaredExponential(active_dims=[i]) for i in range(3)])
+        AdditiveGPLayer(kernel, inducing_variable, 10, Zero())
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+def test_predict_and_prior_kl_match_sum_of_components(whiten):
+    layer, X = setup_additive_gp_layer_and_data(whiten)
+
+    expected_mean, expected_var, expected_kl = 0.0, 0.0, 0.0
+    for g in range(INPUT_DIM):
+        kernel = SquaredExponential(lengthscales=_lengthscale(g))
+        inducing_variable = gpflow.inducing_variables.InducingPoints(layer.inducing_variable.Z[g])
+        mean, var = conditional(
+            X[:, [g]],
+            inducing_variable,
+            kernel,
+            layer.q_mu[g],
+            q_sqrt=layer.q_sqrt[g],
+            white=whiten,
+        )
+        expected_mean += mean
+        expected_var += var
+        Kuu = (
+            None
+            if whiten
+            else gpflow.covariances.Kuu(inducing_variable, kernel, jitter=gpflow.default_jitter())
+        )
+        expected_kl += gauss_kl(layer.q_mu[g], layer.q_sqrt[g], Kuu)
+
+    mean, var = layer.predict(X)
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+    np.testing.assert_allclose(layer.prior_kl(), expected_kl)
+
+
+@pytest.mark.parametrize(
+    "kernels",
+    [
+        [
+            Matern32(variance=1.0 + g, lengthscales=[0.5, 1.5 + g], active_dims=[g, g + 1])
+            for g in range(2)
+        ],
+        [Matern32(active_dims=[0, 1]), Linear(active_dims=[1, 2])],
+    ],
+)
+def test_batched_component_covariances_match_each_component(kernels):
+    inducing_variable = AdditiveInducingPoints(np.random.randn(2, NUM_INDUCING, 2))
+    layer = AdditiveGPLayer(Sum(kernels), inducing_variable, 10, Zero())
+    inputs = np.random.randn(10, INPUT_DIM)
+    X = layer._group_inputs(inputs)
+    Z = inducing_variable.Z
+
+    expected_Kuf = [k.K(Z[g], inputs[:, k.active_dims]) for g, k in enumerate(kernels)]
+    np.testing.assert_allclose(layer._components_K(Z, X), expected_Kuf)
+    np.testing.assert_allclose(layer._components_K(X), [k(inputs) for k in kernels])
+    np.testing.assert_allclose(
+        layer._components_K(X, full_cov=False), [k(inputs, full_cov=False) for k in kernels]
+    )
+
+
+def test_predict_shapes():
+    layer, X = setup_additive_gp_layer_and_data()
+    num_data = len(X)
+
+    _, var = layer.predict(X)
+    _, cov = layer.predict(X, full_cov=True)
+    assert cov.shape == (NUM_LATENT_GPS, num_data, num_data)
+    np.testing.assert_allclose(tf.linalg.adjoint(tf.linalg.diag_part(cov)), var)
+
+    _, cov = layer.predict(X, full_output_cov=True)
+    assert cov.shape == (num_data, NUM_LATENT_GPS, NUM_LATENT_GPS)
+
+    distribution = layer(X, training=False)
+    assert isinstance(distribution, tfp.distributions.MultivariateNormalDiag)
+
+
+def test_sample_shapes():
+    layer, X = setup_additive_gp_layer_and_data()
+    sample = layer.sample()
+    assert sample(X).shape == (len(X), NUM_LATENT_GPS)
+
+
+def test_composes_with_deep_gp():
+    layer, X = setup_additive_gp_layer_and_data()
+    Y = np.random.randn(len(X), NUM_LATENT_GPS)
+    deep_gp = DeepGP([layer], Gaussian(0.1))
+
+    with tf.GradientTape() as tape:
+        elbo = deep_gp.elbo((X, Y))
+    gradients = tape.gradient(elbo, deep_gp.trainable_variables)
+    assert np.isfinite(elbo)
+    assert all(g is not None for g in gradients)
@@ -0,0 +1,190 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+import gpflow
+from gpflow import default_jitter
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Bernoulli, Gaussian
+from gpflow.mean_functions import Constant, Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import CollapsedGPLayer, GPLayer
+from gpflux.models import DeepGP
+from gpflux.optimization import NatGradModel
+
+NUM_DATA, NUM_INDUCING, INPUT_DIM, OUTPUT_DIM, NOISE_VARIANCE = 30, 8, 2, 2, 0.1
+
+
+def build_collapsed_gp_layer(*, share_variables=True, output_dim=OUTPUT_DIM, **kwargs):
+    Z = np.random.randn(NUM_INDUCING, INPUT_DIM)
+    return CollapsedGPLayer(
+        construct_basic_kernel(RBF(lengthscales=0.8), output_dim=output_dim),
+        construct_basic_inducing_variables(
+            NUM_INDUCING,
+            INPUT_DIM,
+            output_dim,
+            share_variables=share_variables,
+            z_init=Z if share_variables else np.stack([Z] * output_dim),
+        ),
+        NUM_DATA,
+        Gaussian(NOISE_VARIANCE),
+        **kwargs,
+    )
+
+
+def optimal_q_u(layer, X, Y):
+    """The optimal mean [M, Q] and covariance [M, M] of q(u) of the first latent GP."""
+    Z = layer.inducing_variable.inducing_variables[0].Z.numpy()
+    kernel = layer.kernel.kernels[0]
+    Kuu = kernel(Z).numpy() + default_jitter() * np.eye(NUM_INDUCING)
+    Kuf = kernel(Z, X).numpy()
+    Sigma = np.linalg.inv(Kuu + Kuf @ Kuf.T / NOISE_VARIANCE)
+    residuals = Y - layer.mean_function(X).numpy()
+    return Kuu @ Sigma @ Kuf @ residuals / NOISE_VARIANCE, Kuu @ Sigma @ Kuu
+
+
+def layer_q_u(layer):
+    """The mean [M, Q] and covariances [Q, M, M] of q(u) of *layer*."""
+    q_mu, q_sqrt = layer.q_mu.numpy(), layer.q_sqrt.numpy()
+    S = q_sqrt @ np.swapaxes(q_sqrt, -1, -2)
+    if layer.whiten:
+        Z = layer.inducing_variable.inducing_variables[0].Z.numpy()
+        Kuu = layer.kernel.kernels[0](Z).numpy() + default_jitter() * np.eye(NUM_INDUCING)
+        Lu = np.linalg.cholesky(Kuu)
+        return Lu @ q_mu, Lu @ S @ Lu.T
+    return q_mu, S
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+@pytest.mark.parametrize("share_variables", [True, False])
+def test_training_call_assigns_optimal_q_u(whiten, share_variables):
+    layer = build_collapsed_gp_layer(
+        share_variables=share_variables, mean_function=Constant(0.5), whiten=whiten
+    )
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, OUTPUT_DIM)
+    layer(X, observations=[X, Y], training=True)
+
+    expected_mean, expected_cov = optimal_q_u(layer, X, Y)
+    mean, covs = layer_q_u(layer)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-6, atol=1e-8)
+    for cov in covs:
+        np.testing.assert_allclose(cov, expected_cov, rtol=1e-6, atol=1e-8)
+
+
+def test_samples_and_minibatches_are_scaled_to_num_data():
+    layer = build_collapsed_gp_layer(mean_function=Zero())
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, OUTPUT_DIM)
+    layer.assign_optimal_q_u(X, Y)
+    expected_q_mu, expected_q_sqrt = layer.q_mu.numpy(), layer.q_sqrt.numpy()
+
+    # three samples of a minibatch with two copies of each point
+    X_batch, Y_batch = X[: NUM_DATA // 2], Y[: NUM_DATA // 2]
+    X_batch, Y_batch = np.concatenate([X_batch] * 2), np.concatenate([Y_batch] * 2)
+    layer.assign_optimal_q_u(np.stack([X_batch] * 3), Y_batch)
+    assert not np.allclose(layer.q_mu.numpy(), expected_q_mu)
+
+    layer.assign_optimal_q_u(np.stack([np.concatenate([X] * 2)] * 3), np.concatenate([Y] * 2))
+    np.testing.assert_allclose(layer.q_mu.numpy(), expected_q_mu)
+    np.testing.assert_allclose(layer.q_sqrt.numpy(), expected_q_sqrt)
+
+
+def test_moving_averages_of_constant_statistics_are_unbiased():
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, OUTPUT_DIM)
+    layer = build_collapsed_gp_layer(mean_function=Zero(), statistics_decay=0.9)
+    for _ in range(3):
+        layer(X, observations=[X, Y], training=True)
+    mean, _ = layer_q_u(layer)
+    np.testing.assert_allclose(mean, optimal_q_u(layer, X, Y)[0], rtol=1e-6)
+
+
+def test_prediction_call_does_not_change_q_u():
+    layer = build_collapsed_gp_layer(mean_function=Zero())
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    layer(X)
+    np.testing.assert_equal(layer.q_mu.numpy(), 0.0)
+
+
+def test_q_u_is_not_trainable():
+    layer = build_collapsed_gp_layer(mean_function=Zero())
+    deep_gp = DeepGP([layer], layer.likelihood)
+    for variables in [layer.trainable_variables, deep_gp.trainable_variables]:
+        trainable = {id(variable) for variable in variables}
+        assert id(layer.q_mu.unconstrained_variable) not in trainable
+        assert id(layer.q_sqrt.unconstrained_variable) not in trainable
+    non_trainable = {id(variable) for variable in layer.non_trainable_weights}
+    assert id(layer.q_mu.unconstrained_variable) in non_trainable
+    assert id(layer.q_sqrt.unconstrained_variable) in non_trainable
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        build_collapsed_gp_layer(statistics_decay=1.0)
+    with pytest.raises(ValueError):
+        CollapsedGPLayer(
+            construct_basic_kernel(RBF(), output_dim=1),
+            construct_basic_inducing_variables(NUM_INDUCING, INPUT_DIM, 1),
+            NUM_DATA,
+            Bernoulli(),
+        )
+
+
+def test_natgrad_model_excludes_collapsed_layers():
+    first_layer = GPLayer(
+        construct_basic_kernel(RBF(), output_dim=INPUT_DIM),
+        construct_basic_inducing_variables(NUM_INDUCING, INPUT_DIM, INPUT_DIM),
+        NUM_DATA,
+        mean_function=Zero(),
+    )
+    last_layer = build_collapsed_gp_layer(output_dim=1, mean_function=Zero())
+    inputs = tf.keras.Input((INPUT_DIM,))
+    model = NatGradModel(inputs, last_layer(first_layer(inputs)))
+
+    model.natgrad_layers = True
+    assert model.natgrad_layers == [first_layer]
+    with pytest.raises(ValueError):
+        model.natgrad_layers = [last_layer]
+
+
+def test_elbo_and_gradients_match_collapsed_bound():
+    layer = build_collapsed_gp_layer(output_dim=1, mean_function=Zero(), tensor_outputs=True)
+    deep_gp = DeepGP([layer], layer.likelihood)
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, 1)
+    kernel = layer.kernel.kernels[0]
+    sgpr = gpflow.models.SGPR(
+        (X, Y),
+        kernel,
+        layer.inducing_variable.inducing_variables[0],
+        noise_variance=NOISE_VARIANCE,
+    )
+    variables = kernel.trainable_variables
+
+    with tf.GradientTape() as tape:
+        elbo = deep_gp.elbo((X, Y))
+    gradients = tape.gradient(elbo, variables)
+    with tf.GradientTape() as tape:
+        expected_elbo = sgpr.elbo()
+    expected_gradients = tape.gradient(expected_elbo, variables)
+
+    np.testing.assert_allclose(elbo, expected_elbo, rtol=1e-6)
+    for gradient, expected_gradient in zip(gradients, expected_gradients):
+        np.testing.assert_allclose(gradient, expected_gradient, rtol=1e-5)
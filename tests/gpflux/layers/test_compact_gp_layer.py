@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflow.conditionals import conditional
+from gpflow.covariances import Kuu
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kernels import SquaredExponential
+from gpflow.kullback_leiblers import gauss_kl
+from gpflow.mean_functions import Zero
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.kernels import Wendland
+from gpflux.layers import CompactGPLayer
+
+INPUT_DIM = 2
+NUM_INDUCING = 30
+NUM_LATENT_GPS = 2
+
+
+def setup_compact_gp_layer_and_data(whiten=True):
+    X = np.random.uniform(-1.0, 5.0, size=(40, INPUT_DIM))
+    kernel = Wendland(INPUT_DIM, lengthscales=[1.0, 1.5])
+    inducing_variable = InducingPoints(np.random.uniform(0.0, 4.0, size=(NUM_INDUCING, INPUT_DIM)))
+    layer = CompactGPLayer(
+        kernel, inducing_variable, len(X), Zero(), num_latent_gps=NUM_LATENT_GPS, whiten=whiten
+    )
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    layer.q_sqrt.assign(
+        np.tril(0.3 * np.random.randn(*layer.q_sqrt.shape)) + 0.5 * np.eye(NUM_INDUCING)
+    )
+    return layer, X
+
+
+def test_incompatible_kernel():
+    with pytest.raises(GPLayerIncompatibilityException):
+        CompactGPLayer(SquaredExponential(), InducingPoints(np.zeros((3, 1))), 10, Zero())
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+def test_predict_and_prior_kl_match_dense_computation(whiten):
+    layer, X = setup_compact_gp_layer_and_data(whiten)
+    expected_mean, expected_var = conditional(
+        X, layer.inducing_variable, layer.kernel, layer.q_mu, q_sqrt=layer.q_sqrt, white=whiten
+    )
+    K = None if whiten else Kuu(layer.inducing_variable, layer.kernel, jitter=1e-6)
+    expected_kl = gauss_kl(layer.q_mu, layer.q_sqrt, K)
+
+    mean, var = layer.predict(X)
+    np.testing.assert_allclose(mean, expected_mean, atol=1e-10)
+    np.testing.assert_allclose(var, expected_var, atol=1e-10)
+    np.testing.assert_allclose(layer.prior_kl(), expected_kl)
+
+    with pytest.raises(NotImplementedError):
+        layer.predict(X, full_cov=True)
+
+
+def test_sample_shapes():
+    layer, X = setup_compact_gp_layer_and_data()
+    assert layer.sample()(X).shape == (len(X), NUM_LATENT_GPS)
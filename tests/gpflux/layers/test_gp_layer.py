@@ -18,11 +18,14 @@ import pytest
 import tensorflow as tf
 import tensorflow_probability as tfp
 
-from gpflow.kernels import RBF
-from gpflow.mean_functions import Zero
+from gpflow import default_jitter
+from gpflow.covariances import Kuf, Kuu
+from gpflow.kernels import RBF, LinearCoregionalization, Matern32
+from gpflow.mean_functions import Identity, Linear, Zero
 
 from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
 from gpflux.layers import GPLayer
+from gpflux.layers.gp_layer import GPLayerOutputs
 
 
 def setup_gp_layer_and_data(num_inducing: int, **gp_layer_kwargs):
@@ -179,5 +182,250 @@ def test_losses_are_added():
     assert gp_layer.losses == [gp_layer.prior_kl() / gp_layer.num_data]
 
 
+def test_stochastic_kl_requires_non_whitened():
+    with pytest.raises(ValueError):
+        setup_gp_layer_and_data(num_inducing=5, whiten=True, num_kl_probes=10)
+
+
+def test_stochastic_kl_losses_are_added():
+    gp_layer, (X, Y) = setup_gp_layer_and_data(num_inducing=5, whiten=False, num_kl_probes=10)
+    gp_layer.build(X.shape)
+
+    _ = gp_layer(X, training=True)
+    assert len(gp_layer.losses) == 1
+    assert np.isfinite(gp_layer.losses[0].numpy())
+
+
 if __name__ == "__main__":
     test_call_shapes()
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+@pytest.mark.parametrize("share", [True, False])
+def test_predict_mean_matches_predict(whiten, share):
+    input_dim, output_dim, num_inducing = 3, 3, 7
+    kernel = construct_basic_kernel(
+        [Matern32() for _ in range(output_dim)], output_dim, share_hyperparams=share
+    )
+    inducing_vars = construct_basic_inducing_variables(
+        num_inducing, input_dim, output_dim, share_variables=share
+    )
+    gp_layer = GPLayer(kernel, inducing_vars, 100, whiten=whiten)
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    X = np.random.randn(20, input_dim)
+
+    expected_mean, _ = gp_layer.predict(X)
+    np.testing.assert_allclose(gp_layer.predict_mean(X), expected_mean)
+
+
+def test_predict_mean_linear_coregionalization():
+    input_dim, output_dim, num_latent_gps, num_inducing = 3, 4, 2, 7
+    kernel = LinearCoregionalization(
+        [RBF() for _ in range(num_latent_gps)], W=np.random.randn(output_dim, num_latent_gps)
+    )
+    inducing_vars = construct_basic_inducing_variables(
+        num_inducing, input_dim, num_latent_gps, share_variables=True
+    )
+    gp_layer = GPLayer(
+        kernel, inducing_vars, 100, num_latent_gps=num_latent_gps, mean_function=Zero()
+    )
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    X = np.random.randn(20, input_dim)
+
+    expected_mean, _ = gp_layer.predict(X)
+    np.testing.assert_allclose(gp_layer.predict_mean(X), expected_mean)
+
+
+def test_predict_mean_caches_weights_until_variables_change():
+    kernel = construct_basic_kernel(Matern32(), output_dim=2, share_hyperparams=True)
+    inducing_vars = construct_basic_inducing_variables(7, 3, 2, share_variables=True)
+    gp_layer = GPLayer(kernel, inducing_vars, 100, mean_function=Zero(), whiten=False)
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    X = np.random.randn(20, 3)
+
+    gp_layer.predict_mean(X)
+    cache = gp_layer._mean_weights_cache
+    gp_layer.predict_mean(X)
+    assert gp_layer._mean_weights_cache is cache
+
+    for variable in [gp_layer.q_mu, kernel.kernel.lengthscales]:
+        variable.assign(variable + 0.5)
+        expected_mean, _ = gp_layer.predict(X)
+        np.testing.assert_allclose(gp_layer.predict_mean(X), expected_mean)
+        assert gp_layer._mean_weights_cache is not cache
+        cache = gp_layer._mean_weights_cache
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+@pytest.mark.parametrize("share", [True, False])
+def test_predict_low_rank_cov_matches_predict_up_to_fitc_residual(whiten, share):
+    input_dim, output_dim, num_inducing, num_data = 2, 2, 6, 30
+    kernel = construct_basic_kernel(
+        [Matern32() for _ in range(output_dim)], output_dim, share_hyperparams=share
+    )
+    inducing_vars = construct_basic_inducing_variables(
+        num_inducing, input_dim, output_dim, share_variables=share
+    )
+    gp_layer = GPLayer(kernel, inducing_vars, 100, whiten=whiten)
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    gp_layer.q_sqrt.assign(np.tril(0.5 * np.random.randn(*gp_layer.q_sqrt.shape)))
+    X = np.random.randn(num_data, input_dim)
+
+    mean, cov = gp_layer.predict_low_rank_cov(X)
+    expected_mean, expected_cov = gp_layer.predict(X, full_cov=True)  # [N, Q], [Q, N, N]
+    np.testing.assert_allclose(mean, expected_mean)
+
+    # the prior residual Kff - Qff is replaced by its diagonal
+    Kmm = Kuu(inducing_vars, kernel, jitter=default_jitter())
+    Kmn = Kuf(inducing_vars, kernel, X)
+    Kff = kernel(X, full_cov=True, full_output_cov=False)  # [Q, N, N]
+    residual = Kff - tf.matmul(Kmn, tf.linalg.solve(Kmm, Kmn), transpose_a=True)
+    residual_diag = tf.linalg.diag(tf.linalg.diag_part(residual))
+    expected_cov = expected_cov - residual + residual_diag
+    np.testing.assert_allclose(cov.to_dense(), expected_cov, atol=1e-5)
+
+
+def test_low_rank_cov_samples():
+    num_samples = 20000
+    gp_layer, (X, _) = setup_gp_layer_and_data(
+        num_inducing=5, full_cov=True, low_rank_cov=True, num_samples=num_samples
+    )
+    X = X[:10]
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+
+    samples = tf.convert_to_tensor(gp_layer(X))
+    assert samples.shape == (num_samples, 10, gp_layer.num_latent_gps)
+
+    mean, cov = gp_layer.predict_low_rank_cov(X)
+    distribution = gp_layer(X)
+    np.testing.assert_allclose(distribution.covariance(), cov.to_dense(), atol=1e-10)
+    np.testing.assert_allclose(np.mean(samples, axis=0), mean, atol=0.05)
+    empirical_cov = np.cov(samples[..., 0], rowvar=False)
+    np.testing.assert_allclose(empirical_cov, cov.to_dense()[0], atol=0.05)
+
+
+@pytest.mark.parametrize("full_cov, full_output_cov", [(False, False), (False, True), (True, True)])
+def test_low_rank_cov_requires_full_cov_only(full_cov, full_output_cov):
+    with pytest.raises(ValueError):
+        setup_gp_layer_and_data(
+            num_inducing=5,
+            full_cov=full_cov,
+            full_output_cov=full_output_cov,
+            low_rank_cov=True,
+        )
+
+
+@pytest.mark.parametrize("num_samples", [None, 3])
+def test_tensor_outputs_match_distribution_outputs(num_samples):
+    gp_layer, (X, _) = setup_gp_layer_and_data(num_inducing=5, num_samples=num_samples)
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    gp_layer.tensor_outputs = True
+    outputs = gp_layer(X, training=True)
+
+    assert isinstance(outputs, GPLayerOutputs)
+    mean, var = gp_layer.predict(X)
+    np.testing.assert_array_equal(outputs.mean, mean)
+    np.testing.assert_array_equal(outputs.var, var)
+    expected_shape = (len(X), gp_layer.num_latent_gps)
+    if num_samples is not None:
+        expected_shape = (num_samples,) + expected_shape
+    assert outputs.shape == expected_shape
+    assert tf.convert_to_tensor(outputs).shape == expected_shape
+    assert gp_layer.losses == [gp_layer.prior_kl() / gp_layer.num_data]
+
+
+@pytest.mark.parametrize("full_cov, full_output_cov", [(True, False), (False, True)])
+def test_tensor_outputs_require_marginals(full_cov, full_output_cov):
+    with pytest.raises(ValueError):
+        setup_gp_layer_and_data(
+            num_inducing=5,
+            full_cov=full_cov,
+            full_output_cov=full_output_cov,
+            tensor_outputs=True,
+        )
+
+
+@pytest.mark.parametrize("tensor_outputs", [False, True])
+def test_deduplicate_inputs_matches_predict(tensor_outputs):
+    gp_layer, (X, _) = setup_gp_layer_and_data(
+        num_inducing=5, deduplicate_inputs=True, tensor_outputs=tensor_outputs
+    )
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    X = X[np.random.randint(0, 10, size=50)]  # 50 rows, at most 10 distinct
+    outputs = gp_layer(X)
+
+    expected_mean, expected_var = gp_layer.predict(X)
+    if tensor_outputs:
+        mean, var = outputs.mean, outputs.var
+    else:
+        mean, var = outputs.loc, outputs.scale.diag ** 2
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+    # the samples of duplicate rows are drawn independently
+    samples = tf.convert_to_tensor(outputs).numpy()
+    assert len(np.unique(samples, axis=0)) == len(X)
+
+
+def test_deduplicate_inputs_requires_marginals():
+    with pytest.raises(ValueError):
+        setup_gp_layer_and_data(num_inducing=5, full_cov=True, deduplicate_inputs=True)
+
+
+def setup_moment_matching_layer(mean_function, whiten, share):
+    input_dim, output_dim, num_inducing = 3, 3, 7
+    if share:
+        kernel = construct_basic_kernel(RBF(lengthscales=[0.5, 1.0, 2.0]), output_dim)
+    else:
+        kernels = [
+            RBF(lengthscales=np.random.uniform(0.5, 2.0, input_dim)) for _ in range(output_dim)
+        ]
+        kernel = construct_basic_kernel(kernels, output_dim, share_hyperparams=False)
+    z_shape = (num_inducing, input_dim) if share else (output_dim, num_inducing, input_dim)
+    inducing_vars = construct_basic_inducing_variables(
+        num_inducing, input_dim, output_dim, share_variables=share, z_init=np.random.randn(*z_shape)
+    )
+    gp_layer = GPLayer(kernel, inducing_vars, 100, mean_function=mean_function, whiten=whiten)
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+    gp_layer.q_sqrt.assign(np.tril(0.3 * np.random.randn(*gp_layer.q_sqrt.shape)))
+    return gp_layer
+
+
+@pytest.mark.parametrize("mean_function", [Zero(), Identity(), Linear(np.random.randn(3, 3))])
+@pytest.mark.parametrize("whiten", [True, False])
+@pytest.mark.parametrize("share", [True, False])
+def test_predict_moment_matched_matches_monte_carlo(mean_function, whiten, share):
+    gp_layer = setup_moment_matching_layer(mean_function, whiten, share)
+    num_data, input_dim, num_samples = 4, 3, 20000
+    inputs_mean = np.random.randn(num_data, input_dim)
+    inputs_var = np.random.uniform(0.05, 0.5, (num_data, input_dim))
+
+    mean, var = gp_layer.predict_moment_matched(inputs_mean, inputs_var)
+
+    X = inputs_mean + np.sqrt(inputs_var) * np.random.randn(num_samples, num_data, input_dim)
+    f_mean, f_var = gp_layer.predict(X.reshape(-1, input_dim))
+    f_mean = np.reshape(f_mean, (num_samples, num_data, -1))
+    f_var = np.reshape(f_var, (num_samples, num_data, -1))
+    # law of total variance
+    expected_mean = np.mean(f_mean, axis=0)
+    expected_var = np.mean(f_var, axis=0) + np.var(f_mean, axis=0)
+    np.testing.assert_allclose(mean, expected_mean, atol=0.05)
+    np.testing.assert_allclose(var, expected_var, atol=0.1, rtol=0.05)
+
+
+def test_predict_moment_matched_with_certain_inputs_matches_predict():
+    gp_layer = setup_moment_matching_layer(Identity(), whiten=True, share=True)
+    inputs = np.random.randn(4, 3)
+
+    mean, var = gp_layer.predict_moment_matched(inputs, np.zeros_like(inputs))
+    expected_mean, expected_var = gp_layer.predict(inputs)
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+
+
+def test_predict_moment_matched_requires_squared_exponential():
+    kernel = construct_basic_kernel(Matern32(), output_dim=1)
+    inducing_vars = construct_basic_inducing_variables(5, 2, output_dim=1)
+    gp_layer = GPLayer(kernel, inducing_vars, 100, mean_function=Zero())
+
+    with pytest.raises(NotImplementedError):
+        gp_layer.predict_moment_matched(np.zeros((4, 2)), np.ones((4, 2)))
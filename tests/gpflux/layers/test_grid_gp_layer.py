@@ -0,0 +1,137 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+import gpflow
+from gpflow.conditionals import conditional
+from gpflow.kernels import SquaredExponential
+from gpflow.kullback_leiblers import gauss_kl
+from gpflow.mean_functions import Zero
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.helpers import construct_grid_inducing_points
+from gpflux.inducing_variables.grid import grid_kuu_factors
+from gpflux.layers import GridGPLayer
+
+
+def _kron(factors):
+    return tf.linalg.LinearOperatorKronecker(
+        [tf.linalg.LinearOperatorFullMatrix(factor) for factor in factors]
+    ).to_dense()
+
+
+def setup_grid_gp_layer_and_data(whiten=True, num_latent_gps=2):
+    X = np.random.rand(40, 2)
+    inducing_variable = construct_grid_inducing_points(X, [20, 15])
+    kernel = SquaredExponential(variance=1.3, lengthscales=[0.3, 0.5])
+    layer = GridGPLayer(
+        kernel, inducing_variable, len(X), Zero(), num_latent_gps=num_latent_gps, whiten=whiten
+    )
+    return layer, X
+
+
+def test_incompatible_kernel():
+    inducing_variable = construct_grid_inducing_points(np.random.rand(10, 2), 8)
+    with pytest.raises(GPLayerIncompatibilityException):
+        GridGPLayer(gpflow.kernels.Matern32(), inducing_variable, 10, Zero())
+
+
+def test_predict_shapes():
+    layer, X = setup_grid_gp_layer_and_data()
+
+    mean, cov = layer.predict(X)
+    assert mean.shape == (40, 2)
+    assert cov.shape == (40, 2)
+
+    mean, cov = layer.predict(X, full_cov=True)
+    assert cov.shape == (2, 40, 40)
+
+    mean, cov = layer.predict(X, full_output_cov=True)
+    assert cov.shape == (40, 2, 2)
+
+    samples = tf.convert_to_tensor(layer(X, training=False))
+    assert samples.shape == (40, 2)
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+def test_prior_kl_matches_dense(whiten):
+    layer, _ = setup_grid_gp_layer_and_data(whiten=whiten)
+    Kuu_factors = grid_kuu_factors(
+        layer.inducing_variable, layer.kernel, jitter=gpflow.default_jitter()
+    )
+    for q_sqrt, K in zip(layer.q_sqrt, Kuu_factors):
+        scale = np.eye(K.shape[-1]) if whiten else np.linalg.cholesky(K)
+        q_sqrt.assign(scale @ (0.5 * q_sqrt + np.tril(0.05 * np.random.randn(*q_sqrt.shape))))
+    q_sqrt = _kron([tf.linalg.band_part(q_sqrt, -1, 0) for q_sqrt in layer.q_sqrt])
+    layer.q_mu.assign(q_sqrt[0] @ np.random.randn(*layer.q_mu.shape))
+
+    Kuu = None if whiten else _kron(Kuu_factors)
+    np.testing.assert_allclose(layer.prior_kl(), gauss_kl(layer.q_mu, q_sqrt, Kuu), rtol=1e-4)
+
+
+def test_predict_matches_dense_conditional_for_smooth_posterior():
+    layer, X = setup_grid_gp_layer_and_data(whiten=False, num_latent_gps=1)
+    Z = layer.inducing_variable.Z.numpy()
+    layer.q_mu.assign(np.sin(3 * Z[:, :1]) * np.cos(2 * Z[:, 1:]))
+    # q(u) = N(q_mu, Kuu / 2) is as smooth as the prior
+    Kuu_factors = grid_kuu_factors(
+        layer.inducing_variable, layer.kernel, jitter=gpflow.default_jitter()
+    )
+    for q_sqrt, K in zip(layer.q_sqrt, Kuu_factors):
+        q_sqrt.assign(np.linalg.cholesky(K)[None] * 0.5 ** 0.25)
+
+    mean, var = layer.predict(X)
+    expected_mean, expected_var = conditional(
+        X,
+        gpflow.inducing_variables.InducingPoints(Z),
+        layer.kernel,
+        layer.q_mu,
+        q_sqrt=_kron([q_sqrt[0] for q_sqrt in layer.q_sqrt])[None],
+        white=False,
+    )
+    np.testing.assert_allclose(mean, expected_mean, atol=1e-3)
+    np.testing.assert_allclose(var, expected_var, atol=1e-3)
+
+
+def test_full_cov_diagonal_matches_marginals():
+    layer, X = setup_grid_gp_layer_and_data()
+    _, var = layer.predict(X)
+    _, cov = layer.predict(X, full_cov=True)
+    np.testing.assert_allclose(tf.linalg.adjoint(tf.linalg.diag_part(cov)), var, rtol=1e-5)
+
+
+def test_sample_is_consistent():
+    layer, X = setup_grid_gp_layer_and_data()
+    sample = layer.sample()
+    np.testing.assert_array_equal(sample(X), sample(X))
+    assert sample(X).shape == (40, 2)
+
+
+def test_losses_and_gradients():
+    layer, X = setup_grid_gp_layer_and_data()
+    layer.q_mu.assign(tf.ones_like(layer.q_mu))
+
+    with tf.GradientTape() as tape:
+        outputs = layer(X, training=True)
+        kl_loss = tf.add_n(layer.losses)
+        loss = kl_loss + tf.reduce_sum(outputs.variance())
+    np.testing.assert_allclose(kl_loss, layer.prior_kl() / layer.num_data)
+
+    gradients = tape.gradient(loss, layer.trainable_variables)
+    assert len(gradients) == 1 + 2 + len(layer.q_sqrt)  # q_mu, kernel, q_sqrt factors
+    assert all(g is not None for g in gradients)
@@ -34,7 +34,7 @@ tf.keras.backend.set_floatx("float64")
 
 
 def _zero_one_normal_prior(w_dim):
-    """ N(0, I) prior """
+    """N(0, I) prior"""
     return tfp.distributions.MultivariateNormalDiag(loc=np.zeros(w_dim), scale_diag=np.ones(w_dim))
 
 
@@ -147,6 +147,37 @@ def test_latent_variable_layer_losses(mocker, w_dim):
     np.testing.assert_equal(lv.losses, expected_loss)  # also checks shapes match
 
 
+@pytest.mark.parametrize("w_dim", [1, 5])
+def test_latent_variable_layer_importance_weights(mocker, w_dim):
+    num_samples, num_data, x_dim, y_dim = 7, 43, 3, 1
+
+    prior = _zero_one_normal_prior(w_dim)
+    posteriors = tfp.distributions.MultivariateNormalDiag(
+        loc=np.random.randn(num_data, w_dim),
+        scale_diag=np.random.randn(num_data, w_dim) ** 2,
+    )
+    encoder = mocker.Mock(return_value=(posteriors.loc, posteriors.scale.diag))
+
+    lv = LatentVariableLayer(encoder=encoder, prior=prior)
+
+    inputs = np.random.randn(num_samples, num_data, x_dim)
+    targets = np.random.randn(num_data, y_dim)
+    outputs, log_weights = lv(
+        inputs, observations=[inputs[0], targets], training=True, importance_weighted=True
+    )
+
+    assert outputs.shape == (num_samples, num_data, x_dim + w_dim)
+    assert log_weights.shape == (num_samples, num_data)
+    samples = outputs[..., x_dim:]
+    expected_log_weights = prior.log_prob(samples) - posteriors.log_prob(samples)
+    np.testing.assert_allclose(log_weights, expected_log_weights)
+    # the KL divergence is accounted for by the log weights instead
+    assert lv.losses == [0.0]
+
+    _, log_weights = lv(inputs, importance_weighted=True)
+    np.testing.assert_array_equal(log_weights, np.zeros((num_samples, num_data)))
+
+
 @pytest.mark.parametrize("w_dim", [1, 5])
 @pytest.mark.parametrize("seed2", [None, 42])
 def test_latent_variable_layer_samples(mocker, test_data, w_dim, seed2):
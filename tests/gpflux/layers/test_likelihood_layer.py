@@ -16,6 +16,7 @@
 import numpy as np
 import pytest
 import tensorflow as tf
+import tensorflow_probability as tfp
 
 from gpflow.kernels import Matern52
 from gpflow.likelihoods import Bernoulli, Beta, Gaussian, Poisson
@@ -128,3 +129,44 @@ def test_tensor_coercible():
     tensor_coercible = LikelihoodOutputs(f_mean, f_var, y_mean, y_var)
 
     np.testing.assert_array_equal(f_mean, tf.convert_to_tensor(tensor_coercible))
+
+
+@pytest.mark.parametrize("GPflowLikelihood", TEST_GPFLOW_LIKELIHOODS)
+def test_likelihood_layer_losses_averages_over_samples(GPflowLikelihood):
+    gp_layer, (X, Y) = setup_gp_layer_and_data(num_inducing=5)
+    likelihood = GPflowLikelihood()
+    likelihood_layer = LikelihoodLayer(likelihood)
+
+    num_samples = 4
+    f_mean, f_var = gp_layer.predict(np.random.randn(num_samples, *X.shape))  # [S, N, Q]
+    f_distribution = tfp.distributions.MultivariateNormalDiag(f_mean, tf.sqrt(f_var))
+
+    _ = likelihood_layer(f_distribution, targets=Y, training=True)
+    [keras_loss] = likelihood_layer.losses
+
+    expected_loss = np.mean(
+        [-likelihood.variational_expectations(f_mean[s], f_var[s], Y) for s in range(num_samples)]
+    )
+    np.testing.assert_almost_equal(keras_loss, expected_loss, decimal=5)
+
+
+def test_likelihood_layer_losses_importance_weighted():
+    gp_layer, (X, Y) = setup_gp_layer_and_data(num_inducing=5)
+    likelihood = Gaussian()
+    likelihood_layer = LikelihoodLayer(likelihood)
+
+    num_samples = 4
+    f_mean, f_var = gp_layer.predict(np.random.randn(num_samples, *X.shape))  # [S, N, Q]
+    f_distribution = tfp.distributions.MultivariateNormalDiag(f_mean, tf.sqrt(f_var))
+    log_weights = np.random.randn(num_samples, len(X))  # [S, N]
+
+    _ = likelihood_layer(f_distribution, targets=Y, training=True, log_weights=log_weights)
+    [keras_loss] = likelihood_layer.losses
+
+    variational_expectations = np.stack(
+        [likelihood.variational_expectations(f_mean[s], f_var[s], Y) for s in range(num_samples)]
+    )  # [S, N]
+    expected_loss = -np.mean(
+        np.log(np.mean(np.exp(variational_expectations + log_weights), axis=0))
+    )
+    np.testing.assert_almost_equal(keras_loss, expected_loss, decimal=5)
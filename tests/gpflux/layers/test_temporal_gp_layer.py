@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+from scipy.linalg import expm
+
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kernels import Matern32, SquaredExponential
+from gpflow.mean_functions import Zero
+
+from gpflux.exceptions import GPLayerIncompatibilityException
+from gpflux.layers import TemporalGPLayer
+from gpflux.state_space import state_space_model
+
+NUM_INDUCING = 8
+NUM_LATENT_GPS = 2
+
+
+def setup_temporal_gp_layer_and_data(randomize=True):
+    X = np.random.uniform(-1.0, 6.0, size=(15, 1))
+    Z = np.linspace(0.0, 5.0, NUM_INDUCING)[:, None]
+    layer = TemporalGPLayer(
+        Matern32(lengthscales=0.8), InducingPoints(Z), len(X), Zero(), num_latent_gps=NUM_LATENT_GPS
+    )
+    if randomize:
+        layer.q_offset.assign(np.random.randn(*layer.q_offset.shape))
+        layer.q_gain.assign(0.3 * np.random.randn(*layer.q_gain.shape))
+        layer.q_sqrt.assign(np.tril(0.3 * np.random.randn(*layer.q_sqrt.shape)) + 0.7 * np.eye(2))
+    return layer, X
+
+
+def _dense_state_covariance(model, times):
+    """The prior covariance of the states at *times*, with the shape [N S, N S]."""
+    F, P_inf = model.F.numpy(), model.P_inf.numpy()
+    blocks = [
+        [expm(F * (t1 - t2)) @ P_inf if t1 >= t2 else P_inf @ expm(F * (t2 - t1)).T for t2 in times]
+        for t1 in times
+    ]
+    return np.block(blocks)
+
+
+def _dense_variational_distributions(layer, model):
+    """The dense means [L, M S] and covariances [L, M S, M S] of q over the inducing states."""
+    B, b, C = [x.numpy() for x in layer._variational_transitions(model)]
+    M, L, S = b.shape
+    means, covs = [], []
+    for latent in range(L):
+        shift = np.zeros((M * S, M * S))
+        for k in range(1, M):
+            start, stop, previous = k * S, (k + 1) * S, (k - 1) * S
+            shift[start:stop, previous:start] = B[k, latent]
+        chain = np.linalg.inv(np.eye(M * S) - shift)
+        noise_sqrt = np.zeros((M * S, M * S))
+        for k in range(M):
+            start, stop = k * S, (k + 1) * S
+            noise_sqrt[start:stop, start:stop] = C[k, latent]
+        means.append(chain @ b[:, latent].reshape(-1))
+        covs.append(chain @ noise_sqrt @ noise_sqrt.T @ chain.T)
+    return np.stack(means), np.stack(covs)
+
+
+def test_incompatible_arguments():
+    Z = np.linspace(0.0, 1.0, 5)[:, None]
+    with pytest.raises(GPLayerIncompatibilityException):
+        TemporalGPLayer(SquaredExponential(), InducingPoints(Z), 10, Zero())
+    with pytest.raises(GPLayerIncompatibilityException):
+        TemporalGPLayer(Matern32(), InducingPoints(Z[::-1]), 10, Zero())
+    with pytest.raises(GPLayerIncompatibilityException):
+        TemporalGPLayer(Matern32(), InducingPoints(np.random.randn(5, 2)), 10, Zero())
+
+
+def test_prior_at_initialization():
+    layer, X = setup_temporal_gp_layer_and_data(randomize=False)
+    mean, var = layer.predict(X)
+    np.testing.assert_allclose(mean, 0.0, atol=1e-8)
+    np.testing.assert_allclose(var, layer.kernel.variance.numpy(), rtol=1e-5)
+    np.testing.assert_allclose(layer.prior_kl(), 0.0, atol=1e-8)
+
+
+def test_predict_and_prior_kl_match_dense_computation():
+    layer, X = setup_temporal_gp_layer_and_data()
+    model = state_space_model(layer.kernel)
+    S = model.F.shape[0]
+    H = model.H.numpy()
+    Z = layer.inducing_variable.Z.numpy()[:, 0]
+    Kzz = _dense_state_covariance(model, Z)
+    q_means, q_covs = _dense_variational_distributions(layer, model)
+
+    expected_mean, expected_var = [], []
+    for x in X[:, 0]:
+        K = _dense_state_covariance(model, np.append(Z, x))
+        Kxz, Kxx = K[-S:, :-S], K[-S:, -S:]
+        W = np.linalg.solve(Kzz, Kxz.T).T
+        expected_mean.append((H @ W @ q_means.T)[0])
+        expected_var.append([(H @ (Kxx - W @ Kxz.T + W @ cov @ W.T) @ H.T)[0, 0] for cov in q_covs])
+
+    mean, var = layer.predict(X)
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(var, expected_var, rtol=1e-4, atol=1e-5)
+
+    Kzz_inv = np.linalg.inv(Kzz)
+    expected_kl = sum(
+        0.5
+        * (
+            np.trace(Kzz_inv @ cov)
+            + m @ Kzz_inv @ m
+            - len(m)
+            + np.linalg.slogdet(Kzz)[1]
+            - np.linalg.slogdet(cov)[1]
+        )
+        for m, cov in zip(q_means, q_covs)
+    )
+    np.testing.assert_allclose(layer.prior_kl(), expected_kl, rtol=1e-4)
+
+
+def test_sample_is_consistent():
+    layer, X = setup_temporal_gp_layer_and_data()
+    sample = layer.sample()
+    f = sample(X)
+    assert f.shape == (len(X), NUM_LATENT_GPS)
+    np.testing.assert_allclose(sample(X[::-1]), f[::-1], atol=1e-4)
@@ -14,15 +14,33 @@
 # limitations under the License.
 #
 import numpy as np
+import pytest
 import tensorflow as tf
+import tensorflow_probability as tfp
 import tqdm
 
-from gpflow.kernels import RBF, Matern12
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kernels import RBF, Matern12, Matern32, Sum
 from gpflow.likelihoods import Gaussian
 from gpflow.mean_functions import Zero
 
-from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
-from gpflux.layers import GPLayer, LikelihoodLayer
+from gpflux.encoders import DirectlyParameterizedNormalDiag
+from gpflux.helpers import (
+    construct_basic_inducing_variables,
+    construct_basic_kernel,
+    construct_grid_inducing_points,
+)
+from gpflux.inducing_variables import AdditiveInducingPoints
+from gpflux.kernels import Wendland
+from gpflux.layers import (
+    AdditiveGPLayer,
+    CompactGPLayer,
+    GPLayer,
+    GridGPLayer,
+    LatentVariableLayer,
+    LikelihoodLayer,
+    TemporalGPLayer,
+)
 from gpflux.models import DeepGP
 
 MAXITER = int(80e3)
@@ -148,6 +166,231 @@ def run_demo(maxiter=int(80e3), plotter_interval=60):
     )
 
 
+def test_num_samples_propagates_samples_when_training():
+    input_dim, num_data, num_samples = 2, 20, 5
+    X, Y = setup_dataset(input_dim, num_data)
+    deep_gp = build_deep_gp(input_dim, num_data)
+    deep_gp.num_samples = num_samples
+
+    f_distribution = deep_gp._evaluate_deep_gp(X, Y)
+    assert f_distribution.loc.shape == (num_samples, num_data, 1)
+    f_distribution = deep_gp._evaluate_deep_gp(X, None)
+    assert f_distribution.loc.shape == (num_data, 1)
+
+    with tf.GradientTape() as tape:
+        elbo = deep_gp.elbo((X, Y))
+    gradients = tape.gradient(elbo, deep_gp.trainable_variables)
+    assert np.isfinite(elbo)
+    assert all(g is not None for g in gradients)
+
+
+def test_num_samples_does_not_change_elbo_of_single_layer():
+    input_dim, num_data = 2, 20
+    X, Y = setup_dataset(input_dim, num_data)
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(10, input_dim, output_dim=1)
+    layer = GPLayer(kernel, inducing_variable, num_data, mean_function=Zero())
+
+    # the output of a single layer is analytic, so it is the same for all samples
+    elbo = DeepGP([layer], Gaussian(0.1)).elbo((X, Y))
+    elbo_with_samples = DeepGP([layer], Gaussian(0.1), num_samples=3).elbo((X, Y))
+    np.testing.assert_allclose(elbo_with_samples, elbo)
+
+
+def build_temporal_gp_layer(X):
+    Z = np.linspace(0.0, 1.0, 8)[:, None]
+    return TemporalGPLayer(Matern32(lengthscales=0.3), InducingPoints(Z), len(X), Zero())
+
+
+def build_additive_gp_layer(X):
+    kernel = Sum([RBF(lengthscales=0.3, active_dims=[i]) for i in range(X.shape[1])])
+    inducing_variable = AdditiveInducingPoints(np.random.rand(X.shape[1], 6, 1))
+    return AdditiveGPLayer(kernel, inducing_variable, len(X), Zero())
+
+
+def build_grid_gp_layer(X):
+    inducing_variable = construct_grid_inducing_points(X, 8)
+    return GridGPLayer(RBF(lengthscales=[0.3, 0.3]), inducing_variable, len(X), Zero())
+
+
+def build_compact_gp_layer(X):
+    inducing_variable = InducingPoints(np.random.rand(15, X.shape[1]))
+    return CompactGPLayer(Wendland(X.shape[1], lengthscales=0.5), inducing_variable, len(X), Zero())
+
+
+@pytest.mark.parametrize(
+    "build_layer, input_dim",
+    [
+        (build_temporal_gp_layer, 1),
+        (build_additive_gp_layer, 2),
+        (build_grid_gp_layer, 2),
+        (build_compact_gp_layer, 2),
+    ],
+)
+def test_num_samples_propagates_samples_through_rank_two_layers(build_layer, input_dim):
+    num_data, num_samples = 20, 3
+    X = np.random.rand(num_data, input_dim)
+    Y = np.random.randn(num_data, 1)
+    layer = build_layer(X)
+    deep_gp = DeepGP([layer], Gaussian(0.1), num_samples=num_samples)
+
+    # these layers flatten the [S, N, D] inputs, and a single layer is the same for all samples
+    with tf.GradientTape() as tape:
+        f_distribution = deep_gp._evaluate_deep_gp(X, Y, training=True)
+        samples = tf.convert_to_tensor(f_distribution)
+    assert samples.shape == (num_samples, num_data, 1)
+    gradients = tape.gradient(samples, layer.trainable_variables)
+    assert all(g is not None for g in gradients)
+
+    expected_mean, expected_var = layer.predict(X)
+    np.testing.assert_allclose(f_distribution.loc, np.broadcast_to(expected_mean, samples.shape))
+    np.testing.assert_allclose(
+        f_distribution.scale.diag ** 2, np.broadcast_to(expected_var, samples.shape)
+    )
+
+
+def test_predict_mean_chains_layer_means():
+    input_dim, num_data = 2, 20
+    X, _ = setup_dataset(input_dim, num_data)
+    deep_gp = build_deep_gp(input_dim, num_data)
+    for layer in deep_gp.f_layers:
+        layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+
+    expected_mean = X
+    for layer in deep_gp.f_layers:
+        expected_mean, _ = layer.predict(expected_mean)
+    np.testing.assert_allclose(deep_gp.predict_mean(X), expected_mean)
+
+    model = deep_gp.as_prediction_model(mean_only=True)
+    assert len(model.trainable_variables) == len(deep_gp.trainable_variables)
+    np.testing.assert_allclose(model.predict(X), expected_mean)
+
+
+def test_deduplicate_inputs_does_not_change_elbo_of_single_layer():
+    input_dim, num_data = 2, 20
+    X, Y = setup_dataset(input_dim, num_data)
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(10, input_dim, output_dim=1)
+    layer = GPLayer(kernel, inducing_variable, num_data, mean_function=Zero(), tensor_outputs=True)
+    deep_gp = DeepGP([layer], Gaussian(0.1), num_samples=3)
+
+    elbo = deep_gp.elbo((X, Y))
+    # the inputs are broadcast to [S, N, D], so only N of the rows are distinct
+    layer.deduplicate_inputs = True
+    with tf.GradientTape() as tape:
+        deduplicated_elbo = deep_gp.elbo((X, Y))
+    gradients = tape.gradient(deduplicated_elbo, deep_gp.trainable_variables)
+    np.testing.assert_allclose(deduplicated_elbo, elbo)
+    assert all(g is not None for g in gradients)
+
+
+def test_deduplicate_inputs_does_not_change_predict_mean():
+    input_dim, num_data = 2, 20
+    X, _ = setup_dataset(input_dim, num_data)
+    X = X[np.random.randint(0, 5, size=num_data)]
+    deep_gp = build_deep_gp(input_dim, num_data)
+    for layer in deep_gp.f_layers:
+        layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+
+    expected_mean = deep_gp.predict_mean(X)
+    deep_gp.deduplicate_inputs = True
+    np.testing.assert_allclose(deep_gp.predict_mean(X), expected_mean)
+
+
+def test_deduplicate_inputs_samples_latent_variables_of_each_row():
+    input_dim, num_data = 2, 20
+    X = np.repeat(np.random.randn(1, input_dim), num_data, axis=0)
+    deep_gp = build_latent_variable_deep_gp(input_dim, num_data, deduplicate_inputs=True)
+    gp_layer = deep_gp.f_layers[-1]
+    gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+
+    # the latent variables of duplicate rows are sampled independently
+    mean = deep_gp.predict_mean(X).numpy()
+    assert len(np.unique(mean, axis=0)) == num_data
+
+
+def test_tensor_outputs_do_not_change_predict_f_of_single_layer():
+    input_dim, num_data = 2, 20
+    X, _ = setup_dataset(input_dim, num_data)
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(10, input_dim, output_dim=1)
+    layer = GPLayer(kernel, inducing_variable, num_data, mean_function=Zero())
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    deep_gp = DeepGP([layer], Gaussian(0.1))
+
+    expected_mean, expected_var = deep_gp.predict_f(X)
+    layer.tensor_outputs = True
+    mean, var = deep_gp.predict_f(X)
+    np.testing.assert_array_equal(mean, expected_mean)
+    np.testing.assert_array_equal(var, expected_var)
+
+
+def test_predict_f_moment_matched_is_deterministic():
+    input_dim, num_data = 2, 20
+    X, _ = setup_dataset(input_dim, num_data)
+    gp_layers = []
+    for layer_input_dim, mean_function in [(input_dim, None), (input_dim, Zero())]:
+        kernel = construct_basic_kernel(RBF(), output_dim=1 if mean_function else input_dim)
+        inducing_variable = construct_basic_inducing_variables(
+            10, layer_input_dim, output_dim=1 if mean_function else input_dim
+        )
+        gp_layer = GPLayer(kernel, inducing_variable, num_data, mean_function=mean_function)
+        gp_layer.q_mu.assign(np.random.randn(*gp_layer.q_mu.shape))
+        gp_layers.append(gp_layer)
+    deep_gp = DeepGP(gp_layers, Gaussian(0.1))
+
+    mean, var = deep_gp.predict_f(X, moment_matching=True)
+    mean2, var2 = deep_gp.predict_f(X, moment_matching=True)
+    assert mean.shape == var.shape == (num_data, 1)
+    np.testing.assert_array_equal(mean, mean2)
+    np.testing.assert_array_equal(var, var2)
+    assert np.all(var > 0)
+
+    # with a single layer, the inputs are certain and the prediction is exact
+    single_layer = DeepGP(gp_layers[:1], Gaussian(0.1))
+    expected_mean, expected_var = gp_layers[0].predict(X)
+    mean, var = single_layer.predict_f(X, moment_matching=True)
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+
+
+def build_latent_variable_deep_gp(input_dim, num_data, **kwargs):
+    prior = tfp.distributions.MultivariateNormalDiag(np.zeros(1), np.ones(1))
+    latent_variable_layer = LatentVariableLayer(prior, DirectlyParameterizedNormalDiag(num_data, 1))
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(10, input_dim + 1, output_dim=1)
+    gp_layer = GPLayer(kernel, inducing_variable, num_data, mean_function=Zero())
+    return DeepGP([latent_variable_layer, gp_layer], Gaussian(0.1), **kwargs)
+
+
+def test_importance_weighted_requires_num_samples_and_latent_variables():
+    input_dim, num_data = 2, 20
+    with pytest.raises(ValueError):
+        build_latent_variable_deep_gp(input_dim, num_data, importance_weighted=True)
+    with pytest.raises(ValueError):
+        DeepGP(
+            build_deep_gp(input_dim, num_data).f_layers,
+            Gaussian(),
+            num_samples=5,
+            importance_weighted=True,
+        )
+
+
+def test_importance_weighted_bound_is_tighter_than_elbo():
+    input_dim, num_data = 2, 20
+    X, Y = setup_dataset(input_dim, num_data)
+    deep_gp = build_latent_variable_deep_gp(input_dim, num_data, num_samples=1000)
+    iw_deep_gp = DeepGP(
+        deep_gp.f_layers, deep_gp.likelihood_layer, num_samples=1000, importance_weighted=True
+    )
+
+    with tf.GradientTape() as tape:
+        iw_elbo = iw_deep_gp.elbo((X, Y))
+    gradients = tape.gradient(iw_elbo, iw_deep_gp.trainable_variables)
+    assert all(g is not None for g in gradients)
+    assert iw_elbo > deep_gp.elbo((X, Y))
+
+
 def test_smoke():
     import matplotlib
 
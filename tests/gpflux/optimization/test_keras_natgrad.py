@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import RBF
+from gpflow.mean_functions import Zero
+from gpflow.optimizers import NaturalGradient, XiSqrtMeanVar
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.optimization import NatGradModel
+
+NUM_DATA, INPUT_DIM = 20, 2
+
+# (number of inducing points, output dimension) of each layer
+LAYER_SHAPES = [(5, 2), (5, 3), (7, 2), (5, 1)]
+
+
+def build_natgrad_model():
+    layers = []
+    input_dim = INPUT_DIM
+    for num_inducing, output_dim in LAYER_SHAPES:
+        layers.append(
+            GPLayer(
+                construct_basic_kernel(RBF(), output_dim=output_dim, share_hyperparams=True),
+                construct_basic_inducing_variables(
+                    num_inducing, input_dim, output_dim, share_variables=True
+                ),
+                NUM_DATA,
+                mean_function=Zero(),
+            )
+        )
+        input_dim = output_dim
+
+    inputs = tf.keras.Input((INPUT_DIM,))
+    outputs = inputs
+    for layer in layers:
+        outputs = layer(outputs)
+    model = NatGradModel(inputs, outputs)
+    model.natgrad_layers = True
+    return model
+
+
+def randomize_q_u(layer):
+    num_inducing, num_latent_gps = layer.q_mu.shape
+    layer.q_mu.assign(np.random.randn(num_inducing, num_latent_gps))
+    q_sqrt = np.tril(0.1 * np.random.randn(num_latent_gps, num_inducing, num_inducing))
+    q_sqrt += np.eye(num_inducing)
+    layer.q_sqrt.assign(q_sqrt)
+
+
+def random_gradients(layer):
+    return (
+        tf.constant(0.01 * np.random.randn(*layer.q_mu.unconstrained_variable.shape)),
+        tf.constant(0.01 * np.random.randn(*layer.q_sqrt.unconstrained_variable.shape)),
+    )
+
+
+@pytest.mark.parametrize("jit_compile_natgrad", [False, True])
+@pytest.mark.parametrize("mixed_xi_transforms", [False, True])
+def test_batched_natgrad_step_matches_per_layer_steps(mixed_xi_transforms, jit_compile_natgrad):
+    model = build_natgrad_model()
+    model.jit_compile_natgrad = jit_compile_natgrad
+    optimizers = [NaturalGradient(gamma) for gamma in [0.1, 0.5, 0.2, 1.0]]
+    if mixed_xi_transforms:
+        optimizers[1] = NaturalGradient(0.5, xi_transform=XiSqrtMeanVar())
+    model.optimizer = optimizers + [tf.optimizers.Adam()]
+
+    for layer in model.natgrad_layers:
+        randomize_q_u(layer)
+    gradients = [random_gradients(layer) for layer in model.natgrad_layers]
+    variational_params = [(layer.q_mu, layer.q_sqrt) for layer in model.natgrad_layers]
+    initial_values = [(q_mu.numpy(), q_sqrt.numpy()) for q_mu, q_sqrt in variational_params]
+
+    for optimizer, (q_mu_grad, q_sqrt_grad), (q_mu, q_sqrt) in zip(
+        optimizers, gradients, variational_params
+    ):
+        optimizer._natgrad_apply_gradients(q_mu_grad, q_sqrt_grad, q_mu, q_sqrt)
+    expected_values = [(q_mu.numpy(), q_sqrt.numpy()) for q_mu, q_sqrt in variational_params]
+
+    for (q_mu, q_sqrt), (q_mu_value, q_sqrt_value) in zip(variational_params, initial_values):
+        q_mu.assign(q_mu_value)
+        q_sqrt.assign(q_sqrt_value)
+    model._natgrad_apply_gradients(gradients, variational_params)
+
+    for (q_mu, q_sqrt), (expected_q_mu, expected_q_sqrt) in zip(
+        variational_params, expected_values
+    ):
+        np.testing.assert_allclose(q_mu.numpy(), expected_q_mu, rtol=1e-6, atol=1e-10)
+        np.testing.assert_allclose(q_sqrt.numpy(), expected_q_sqrt, rtol=1e-6, atol=1e-10)
+
+
+def test_natgrad_model_trains_with_jit_compiled_natgrad_step():
+    model = build_natgrad_model()
+    model.jit_compile_natgrad = True
+    model.compile(
+        optimizer=[NaturalGradient(0.1) for _ in LAYER_SHAPES] + [tf.optimizers.Adam()],
+        loss="mse",
+    )
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, 1)
+    for layer in model.natgrad_layers:
+        randomize_q_u(layer)
+    initial_q_sqrt = model.natgrad_layers[0].q_sqrt.numpy()
+
+    history = model.fit(X, Y, epochs=2, batch_size=NUM_DATA, verbose=0)
+
+    assert np.all(np.isfinite(history.history["loss"]))
+    assert not np.allclose(model.natgrad_layers[0].q_sqrt.numpy(), initial_q_sqrt)
+
+
+def test_gradient_accumulation_matches_full_batch_step():
+    def apply_step(model, X, Y):
+        first_layer, second_layer = model.natgrad_layers
+        with tf.GradientTape() as tape:
+            hidden, _ = first_layer.predict(X)
+            mean, _ = second_layer.predict(hidden)
+            kl = first_layer.prior_kl() + second_layer.prior_kl()
+            loss = tf.reduce_mean((Y - mean) ** 2) + kl / NUM_DATA
+        model._apply_backwards_pass(loss, tape=tape)
+
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, LAYER_SHAPES[1][1])
+    models = []
+    for steps in [1, 2]:
+        np.random.seed(0)
+        model = build_natgrad_model()
+        model.natgrad_layers = model.natgrad_layers[:2]
+        model.optimizer = [NaturalGradient(0.1), NaturalGradient(0.5), tf.optimizers.Adam(0.1)]
+        model.gradient_accumulation_steps = steps
+        models.append(model)
+    full_batch_model, accumulating_model = models
+    initial_values = [variable.numpy() for variable in accumulating_model.trainable_variables]
+    half = NUM_DATA // 2
+
+    apply_step(full_batch_model, X, Y)
+    apply_step(accumulating_model, X[:half], Y[:half])
+    for variable, initial_value in zip(accumulating_model.trainable_variables, initial_values):
+        np.testing.assert_equal(variable.numpy(), initial_value)
+    apply_step(accumulating_model, X[half:], Y[half:])
+
+    for variable, expected_variable in zip(
+        accumulating_model.trainable_variables, full_batch_model.trainable_variables
+    ):
+        np.testing.assert_allclose(variable.numpy(), expected_variable.numpy(), rtol=1e-6)
+
+
+def test_natgrad_model_fit_with_gradient_accumulation():
+    model = build_natgrad_model()
+    model.compile(
+        optimizer=[NaturalGradient(0.1) for _ in LAYER_SHAPES] + [tf.optimizers.Adam()],
+        loss="mse",
+    )
+    model.gradient_accumulation_steps = 2
+    for layer in model.natgrad_layers:
+        randomize_q_u(layer)
+    initial_values = [variable.numpy() for variable in model.trainable_variables]
+    initial_q_sqrt = model.natgrad_layers[0].q_sqrt.numpy()
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    Y = np.random.randn(NUM_DATA, 1)
+
+    model.fit(X, Y, epochs=1, batch_size=NUM_DATA, verbose=0)
+    for variable, initial_value in zip(model.trainable_variables, initial_values):
+        np.testing.assert_equal(variable.numpy(), initial_value)
+
+    model.fit(X, Y, epochs=1, batch_size=NUM_DATA, verbose=0)
+    assert not np.allclose(model.natgrad_layers[0].q_sqrt.numpy(), initial_q_sqrt)
+
+
+def test_gradient_accumulation_steps_must_be_positive():
+    with pytest.raises(ValueError):
+        build_natgrad_model().gradient_accumulation_steps = 0
@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import MicroBatcher
+
+INPUT_DIM = 2
+
+
+class RecordingPredictFn:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batch_sizes = []
+
+    def __call__(self, inputs):
+        self.batch_sizes.append(len(inputs))
+        time.sleep(self.delay)
+        return inputs.sum(axis=1, keepdims=True), 2 * inputs
+
+
+def run_until_complete(coroutine):
+    """Run *coroutine* in a new event loop (`asyncio.run` requires Python 3.7)."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def predict_concurrently(batcher, requests):
+    async def run():
+        async with batcher:
+            return await asyncio.gather(*[batcher.predict(X) for X in requests])
+
+    return run_until_complete(run())
+
+
+def test_micro_batcher_coalesces_requests():
+    predict_fn = RecordingPredictFn(delay=0.001)
+    batcher = MicroBatcher(predict_fn, max_batch_size=16, max_wait=0.01)
+    requests = [np.random.randn(np.random.randint(1, 5), INPUT_DIM) for _ in range(100)]
+
+    results = predict_concurrently(batcher, requests)
+
+    for X, (sums, doubled) in zip(requests, results):
+        np.testing.assert_allclose(sums, X.sum(axis=1, keepdims=True))
+        np.testing.assert_allclose(doubled, 2 * X)
+    assert max(predict_fn.batch_sizes) <= 16
+    assert sum(predict_fn.batch_sizes) == sum(len(X) for X in requests)
+    metrics = batcher.metrics()
+    assert metrics["num_requests"] == 100 and metrics["num_batches"] < 100
+    assert metrics["queue_depth"] == 0
+    assert metrics["latency_p50"] <= metrics["latency_p99"]
+
+
+def test_micro_batcher_evaluates_large_requests_alone():
+    predict_fn = RecordingPredictFn()
+    batcher = MicroBatcher(predict_fn, max_batch_size=4)
+    requests = [np.ones((10, INPUT_DIM)), np.ones((1, INPUT_DIM))]
+
+    results = predict_concurrently(batcher, requests)
+
+    assert [len(sums) for sums, _ in results] == [10, 1]
+    assert sorted(predict_fn.batch_sizes) == [1, 10]
+
+
+def test_micro_batcher_propagates_errors():
+    def predict_fn(inputs):
+        raise ValueError("invalid inputs")
+
+    with pytest.raises(ValueError, match="invalid inputs"):
+        predict_concurrently(MicroBatcher(predict_fn), [np.ones((1, INPUT_DIM))] * 3)
+
+
+def test_micro_batcher_stop_fails_waiting_requests():
+    async def run():
+        batcher = MicroBatcher(RecordingPredictFn(delay=0.2), max_batch_size=1)
+        requests = [asyncio.ensure_future(batcher.predict(np.ones((1, 1)))) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    results = run_until_complete(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_micro_batcher_for_deep_gp():
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(
+        5, INPUT_DIM, output_dim=1, share_variables=True, z_init=np.random.randn(5, INPUT_DIM)
+    )
+    layer = GPLayer(kernel, inducing_variable, 100, mean_function=Zero())
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    deep_gp = DeepGP([layer], Gaussian(0.1), input_dim=INPUT_DIM)
+    requests = [np.random.randn(3, INPUT_DIM) for _ in range(5)]
+
+    results = predict_concurrently(MicroBatcher.for_deep_gp(deep_gp), requests)
+
+    for X, (f_mean, f_var, y_mean, y_var) in zip(requests, results):
+        # the inputs of the Keras prediction model are cast to floatx
+        expected_mean, expected_var = deep_gp.predict_f(X)
+        np.testing.assert_allclose(f_mean, expected_mean, rtol=1e-5)
+        np.testing.assert_allclose(f_var, expected_var, rtol=1e-5)
+        np.testing.assert_allclose(y_var, expected_var + 0.1, rtol=1e-5)
@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import BucketedPredictor
+
+INPUT_DIM, BUCKETS = 2, (1, 4, 16)
+
+
+@pytest.fixture(name="deep_gp")
+def _deep_gp_fixture():
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(
+        5, INPUT_DIM, output_dim=1, share_variables=True, z_init=np.random.randn(5, INPUT_DIM)
+    )
+    layer = GPLayer(kernel, inducing_variable, 100, mean_function=Zero())
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    return DeepGP([layer], Gaussian(0.1))
+
+
+@pytest.mark.parametrize("jit_compile", [False, True])
+@pytest.mark.parametrize("num_rows", [1, 3, 16, 40])
+def test_bucketed_predict_matches_predict_f(deep_gp, jit_compile, num_rows):
+    predictor = BucketedPredictor.for_deep_gp(
+        deep_gp, INPUT_DIM, buckets=BUCKETS, jit_compile=jit_compile
+    )
+    X = np.random.randn(num_rows, INPUT_DIM)
+
+    mean, var = predictor.predict(X)
+
+    expected_mean, expected_var = deep_gp.predict_f(X)
+    np.testing.assert_allclose(mean, expected_mean, atol=1e-12)
+    np.testing.assert_allclose(var, expected_var, atol=1e-12)
+
+
+def test_bucketed_predict_does_not_retrace_after_precompile(deep_gp):
+    predictor = BucketedPredictor.for_deep_gp(
+        deep_gp, INPUT_DIM, buckets=BUCKETS, jit_compile=False
+    )
+    predictor.precompile()
+    trace_count = predictor.trace_count
+    assert predictor.num_buckets_used == len(BUCKETS)
+
+    for num_rows in [1, 2, 5, 16, 17, 33]:
+        predictor.predict(np.random.randn(num_rows, INPUT_DIM))
+
+    assert predictor.trace_count == trace_count
+    assert predictor.num_buckets_used == len(BUCKETS)
+
+
+def test_bucket_for():
+    predictor = BucketedPredictor(lambda X: (X,), INPUT_DIM, buckets=[16, 1, 4])
+    assert predictor.buckets == BUCKETS
+    assert [predictor.bucket_for(n) for n in [1, 2, 4, 5, 16, 17]] == [1, 4, 4, 16, 16, 16]
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import BucketedPredictor, PredictionCache, WarmStartCache, model_signature
+
+INPUT_DIM, BUCKETS = 2, (1, 4)
+
+
+@pytest.fixture(name="deep_gp")
+def _deep_gp_fixture():
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(
+        5, INPUT_DIM, output_dim=1, share_variables=True, z_init=np.random.randn(5, INPUT_DIM)
+    )
+    layer = GPLayer(kernel, inducing_variable, 100, mean_function=Zero())
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    return DeepGP([layer], Gaussian(0.1))
+
+
+def test_bucketed_predictor_save_and_load(deep_gp, tmp_path):
+    predictor = BucketedPredictor.for_deep_gp(
+        deep_gp, INPUT_DIM, buckets=BUCKETS, jit_compile=False
+    )
+    predictor.save(str(tmp_path / "predictor"))
+
+    loaded = BucketedPredictor.load(str(tmp_path / "predictor"))
+    X = np.random.randn(3, INPUT_DIM)
+    mean, var = loaded.predict(X)
+
+    assert loaded.buckets == BUCKETS and loaded.input_dim == INPUT_DIM
+    assert loaded.trace_count == 0
+    expected_mean, expected_var = deep_gp.predict_f(X)
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+
+
+def test_warm_start_cache_restores_predictor(deep_gp, tmp_path):
+    cache = WarmStartCache(str(tmp_path))
+    options = dict(buckets=BUCKETS, jit_compile=False)
+
+    cold = cache.get_predictor(deep_gp, INPUT_DIM, **options)
+    warm = cache.get_predictor(deep_gp, INPUT_DIM, **options)
+
+    assert cold.trace_count > 0
+    assert warm.trace_count == 0
+    X = np.random.randn(3, INPUT_DIM)
+    np.testing.assert_allclose(warm.predict(X)[0], cold.predict(X)[0])
+
+
+def test_warm_start_cache_key_depends_on_model_and_options(deep_gp, tmp_path):
+    cache = WarmStartCache(str(tmp_path))
+    signature = model_signature(deep_gp)
+    key = cache.key(deep_gp, INPUT_DIM, buckets=BUCKETS)
+
+    assert cache.key(deep_gp, INPUT_DIM, buckets=BUCKETS + (16,)) != key
+    assert cache.key(deep_gp, INPUT_DIM, buckets=BUCKETS, predict_y=True) != key
+
+    deep_gp.f_layers[0].q_mu.assign(deep_gp.f_layers[0].q_mu + 1.0)
+    assert model_signature(deep_gp) != signature
+    assert cache.key(deep_gp, INPUT_DIM, buckets=BUCKETS) != key
+
+
+class CountingPredictFn:
+    def __init__(self):
+        self.num_rows = []
+
+    def __call__(self, inputs):
+        self.num_rows.append(len(inputs))
+        return inputs.sum(axis=1, keepdims=True), 2 * inputs
+
+
+def test_prediction_cache_only_computes_misses():
+    predict_fn = CountingPredictFn()
+    cache = PredictionCache(predict_fn)
+    X = np.random.randn(5, INPUT_DIM)
+
+    cache.predict(X[:3])
+    sums, doubled = cache.predict(np.concatenate([X, X[:1]]))
+
+    assert predict_fn.num_rows == [3, 2]
+    np.testing.assert_allclose(sums, np.concatenate([X, X[:1]]).sum(axis=1, keepdims=True))
+    np.testing.assert_allclose(doubled, 2 * np.concatenate([X, X[:1]]))
+    metrics = cache.metrics()
+    assert (metrics["hits"], metrics["misses"], metrics["num_entries"]) == (4, 5, 5)
+    assert metrics["hit_rate"] == 4 / 9
+
+
+def test_prediction_cache_evicts_least_recently_used():
+    row_bytes = INPUT_DIM * 8 + (1 + INPUT_DIM) * 8  # the key, and the two output rows
+    cache = PredictionCache(CountingPredictFn(), max_bytes=2 * row_bytes)
+    X = np.random.randn(3, INPUT_DIM)
+
+    cache.predict(X[:2])
+    cache.predict(X[:1])  # makes X[1] the least recently used row
+    cache.predict(X[2:])
+
+    assert cache.metrics()["evictions"] == 1
+    assert cache.num_bytes == 2 * row_bytes
+    cache.predict(X[[0, 2]])
+    assert cache.metrics()["misses"] == 3
+
+
+def test_prediction_cache_is_versioned_by_model(deep_gp):
+    cache = PredictionCache.for_deep_gp(deep_gp)
+    X = np.random.randn(3, INPUT_DIM)
+    mean, _ = cache.predict(X)
+    np.testing.assert_allclose(mean, deep_gp.predict_f(X)[0])
+
+    deep_gp.f_layers[0].q_mu.assign(deep_gp.f_layers[0].q_mu + 1.0)
+    cached_mean, _ = cache.predict(X)
+    cache.refresh_version()
+    new_mean, _ = cache.predict(X)
+
+    np.testing.assert_allclose(cached_mean, mean)
+    np.testing.assert_allclose(new_mean, deep_gp.predict_f(X)[0])
+    assert cache.metrics()["misses"] == 6
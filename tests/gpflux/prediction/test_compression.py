@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflow import default_jitter
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import (
+    compress_deep_gp,
+    compress_gp_layer,
+    compression_report,
+    deep_gp_compression_report,
+)
+from gpflux.prediction.compression import _pivoted_cholesky_indices
+
+NUM_INDUCING, OUTPUT_DIM, NOISE_VARIANCE = 40, 2, 0.01
+
+
+def build_trained_gp_layer(*, share_variables=True, whiten=True):
+    """
+    Return a layer on 1D inputs with many redundant inducing points, whose
+    ``q(u)`` is the optimal one for noisy observations of smooth functions.
+    """
+    X = np.linspace(0, 1, 100)[:, None]
+    Y = np.hstack([np.sin(6 * X), np.cos(4 * X)])  # [N, Q]
+    Z = np.linspace(0, 1, NUM_INDUCING)[:, None]
+    kernel = RBF(lengthscales=0.3)
+    z_init = Z if share_variables else np.stack([Z] * OUTPUT_DIM)
+    layer = GPLayer(
+        construct_basic_kernel(kernel, output_dim=OUTPUT_DIM, share_hyperparams=True),
+        construct_basic_inducing_variables(
+            NUM_INDUCING, 1, OUTPUT_DIM, share_variables=share_variables, z_init=z_init
+        ),
+        len(X),
+        mean_function=Zero(),
+        whiten=whiten,
+    )
+
+    # q(u) = N(Kuu Σ Kuf Y / σ², Kuu Σ Kuu), where Σ = (Kuu + Kuf Kfu / σ²)⁻¹
+    Kuu = kernel(Z).numpy() + default_jitter() * np.eye(NUM_INDUCING)
+    Kuf = kernel(Z, X).numpy()
+    Sigma = np.linalg.inv(Kuu + Kuf @ Kuf.T / NOISE_VARIANCE)
+    q_mu = Kuu @ Sigma @ Kuf @ Y / NOISE_VARIANCE  # [M, Q]
+    S = Kuu @ Sigma @ Kuu
+    if whiten:
+        Lu = np.linalg.cholesky(Kuu)
+        q_mu = np.linalg.solve(Lu, q_mu)
+        S = np.linalg.solve(Lu, np.linalg.solve(Lu, S).T)
+    q_sqrt = np.linalg.cholesky(S + default_jitter() * np.eye(NUM_INDUCING))
+    layer.q_mu.assign(q_mu)
+    layer.q_sqrt.assign(np.stack([q_sqrt] * OUTPUT_DIM))
+    return layer
+
+
+def test_pivoted_cholesky_indices_skip_duplicates():
+    Z = np.random.randn(5, 1)[[0, 1, 1, 2, 3, 3, 3, 4]]
+    K = RBF()(Z).numpy() + 1e-6 * np.eye(len(Z))
+    indices = _pivoted_cholesky_indices(K, 5)
+    assert len(np.unique(Z[indices])) == 5
+
+
+@pytest.mark.parametrize("share_variables", [True, False])
+@pytest.mark.parametrize("whiten", [True, False])
+def test_compression_without_removing_points_keeps_predictions(share_variables, whiten):
+    layer = build_trained_gp_layer(share_variables=share_variables, whiten=whiten)
+    compressed = compress_gp_layer(layer, NUM_INDUCING)
+    X = np.random.rand(20, 1)
+
+    mean, var = layer.predict(X)
+    compressed_mean, compressed_var = compressed.predict(X)
+    np.testing.assert_allclose(compressed_mean, mean, atol=1e-6)
+    np.testing.assert_allclose(compressed_var, var, atol=1e-6)
+    assert compressed.kernel is not layer.kernel
+
+
+@pytest.mark.parametrize("share_variables", [True, False])
+@pytest.mark.parametrize("whiten", [True, False])
+def test_compression_removes_redundant_inducing_points(share_variables, whiten):
+    layer = build_trained_gp_layer(share_variables=share_variables, whiten=whiten)
+    X = np.random.rand(20, 1)
+
+    reports = [
+        compression_report(layer, compress_gp_layer(layer, num_inducing), X, num_repeats=2)
+        for num_inducing in [4, 12]
+    ]
+    assert [report["num_inducing"] for report in reports] == [4, 12]
+    assert reports[1]["kl"] < reports[0]["kl"]
+    assert reports[1]["kl"] < 1e-3
+    assert reports[1]["max_mean_error"] < 1e-2
+    assert all(report["latency"] > 0 for report in reports)
+
+
+def test_compression_requires_fewer_inducing_points():
+    with pytest.raises(ValueError):
+        compress_gp_layer(build_trained_gp_layer(), NUM_INDUCING + 1)
+
+
+def test_compress_deep_gp_layer_by_layer():
+    last_layer = GPLayer(
+        construct_basic_kernel(RBF(), output_dim=1),
+        construct_basic_inducing_variables(
+            NUM_INDUCING,
+            OUTPUT_DIM,
+            1,
+            share_variables=True,
+            z_init=np.random.randn(NUM_INDUCING, OUTPUT_DIM),
+        ),
+        100,
+        mean_function=Zero(),
+    )
+    layers = [build_trained_gp_layer(), last_layer]
+    deep_gp = DeepGP(layers, Gaussian(NOISE_VARIANCE), input_dim=1)
+
+    compressed = compress_deep_gp(deep_gp, [12, None])
+    assert compressed.f_layers[0].q_mu.shape == (12, OUTPUT_DIM)
+    assert compressed.f_layers[1] is layers[1]
+    assert compressed.likelihood_layer is deep_gp.likelihood_layer
+
+    reports = deep_gp_compression_report(deep_gp, compressed, np.random.rand(20, 1), num_repeats=2)
+    assert [report["num_inducing"] for report in reports] == [12, NUM_INDUCING]
+    assert reports[1]["kl"] == 0.0
@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import NumpyWeightSpaceModel, distil_deep_gp, distillation_report
+
+INPUT_DIM, OUTPUT_DIM, NUM_INDUCING = 2, 2, 20
+
+
+@pytest.fixture(name="deep_gp")
+def _deep_gp_fixture():
+    rng = np.random.default_rng(0)
+    layer = GPLayer(
+        construct_basic_kernel(RBF(lengthscales=0.5), output_dim=OUTPUT_DIM),
+        construct_basic_inducing_variables(
+            NUM_INDUCING,
+            INPUT_DIM,
+            OUTPUT_DIM,
+            share_variables=True,
+            z_init=rng.uniform(-1, 1, (NUM_INDUCING, INPUT_DIM)),
+        ),
+        100,
+        mean_function=Zero(),
+    )
+    layer.q_mu.assign(rng.standard_normal(layer.q_mu.shape))
+    layer.q_sqrt.assign(0.3 * np.stack([np.eye(NUM_INDUCING)] * OUTPUT_DIM))
+    return DeepGP([layer], Gaussian(0.1), input_dim=INPUT_DIM)
+
+
+def test_surrogate_shapes(deep_gp):
+    surrogate = distil_deep_gp(deep_gp, np.random.uniform(-1, 1, (200, INPUT_DIM)), rank=4)
+    assert surrogate.rank == 4
+    assert surrogate.weights.shape == (512, OUTPUT_DIM + OUTPUT_DIM * 4)
+
+    mean, var = surrogate.predict_f(np.random.rand(7, INPUT_DIM))
+    assert mean.shape == var.shape == (7, OUTPUT_DIM)
+    assert np.all(var.numpy() >= 0.0)
+
+
+def test_surrogate_matches_deep_gp(deep_gp):
+    surrogate = distil_deep_gp(
+        deep_gp, np.random.uniform(-1, 1, (2000, INPUT_DIM)), kernel=RBF(lengthscales=0.5)
+    )
+    report = distillation_report(deep_gp, surrogate, np.random.uniform(-1, 1, (300, INPUT_DIM)))
+    assert report["mean_relative_rmse"] < 0.05
+    assert report["var_relative_rmse"] < 0.1
+
+
+def test_numpy_weight_space_model_matches_surrogate(deep_gp, tmp_path):
+    surrogate = distil_deep_gp(deep_gp, np.random.uniform(-1, 1, (200, INPUT_DIM)), rank=4)
+    surrogate.export_npz(tmp_path / "surrogate.npz")
+    model = NumpyWeightSpaceModel.load(tmp_path / "surrogate.npz")
+
+    X = np.random.rand(7, INPUT_DIM)
+    for actual, expected in zip(model.predict_f(X), surrogate.predict_f(X)):
+        np.testing.assert_allclose(actual, expected, atol=1e-10)
@@ -0,0 +1,137 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import export_deep_gp
+
+INPUT_DIM = 2
+
+
+def build_gp_layer(output_dim, *, share_variables=True, whiten=True, last=False):
+    kernel = construct_basic_kernel(RBF(), output_dim=output_dim)
+    z_shape = (5, INPUT_DIM) if share_variables else (output_dim, 5, INPUT_DIM)
+    inducing_variable = construct_basic_inducing_variables(
+        5,
+        INPUT_DIM,
+        output_dim=output_dim,
+        share_variables=share_variables,
+        z_init=np.random.randn(*z_shape),
+    )
+    layer = GPLayer(
+        kernel,
+        inducing_variable,
+        100,
+        mean_function=Zero() if last else None,
+        whiten=whiten,
+    )
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    layer.q_sqrt.assign(0.5 * np.tril(np.random.rand(*layer.q_sqrt.shape)))
+    return layer
+
+
+@pytest.mark.parametrize("share_variables", [True, False])
+@pytest.mark.parametrize("whiten", [True, False])
+def test_exported_predictions_match_deep_gp(share_variables, whiten, tmp_path):
+    options = dict(share_variables=share_variables, whiten=whiten)
+    single = DeepGP([build_gp_layer(1, last=True, **options)], Gaussian(0.1), input_dim=INPUT_DIM)
+    deep = DeepGP(
+        [build_gp_layer(INPUT_DIM, **options), build_gp_layer(1, last=True, **options)],
+        Gaussian(0.1),
+        input_dim=INPUT_DIM,
+    )
+    single.export(str(tmp_path / "single"))
+    deep.export(str(tmp_path / "deep"))
+    loaded_single = tf.saved_model.load(str(tmp_path / "single"))
+    loaded_deep = tf.saved_model.load(str(tmp_path / "deep"))
+    X = np.random.randn(7, INPUT_DIM)
+
+    # a single layer is deterministic
+    f_outputs = loaded_single.signatures["predict_f"](inputs=X)
+    expected_mean, expected_var = single.predict_f(X)
+    np.testing.assert_allclose(f_outputs["f_mean"], expected_mean, atol=1e-10)
+    np.testing.assert_allclose(f_outputs["f_var"], expected_var, atol=1e-10)
+
+    f_mean = loaded_deep.signatures["predict_mean"](inputs=X)["f_mean"]
+    np.testing.assert_allclose(f_mean, deep.predict_mean(X), atol=1e-10)
+
+
+def test_exported_sample_f(tmp_path):
+    model = DeepGP(
+        [build_gp_layer(INPUT_DIM), build_gp_layer(1, last=True)],
+        Gaussian(0.1),
+        input_dim=INPUT_DIM,
+    )
+    export_deep_gp(model, str(tmp_path))
+    loaded = tf.saved_model.load(str(tmp_path))
+    X = np.random.randn(7, INPUT_DIM)
+
+    samples = loaded.signatures["sample_f"](inputs=X, num_samples=tf.constant(3))["f_samples"]
+
+    assert samples.shape == (3, 7, 1)
+    assert not np.allclose(samples[0], samples[1])
+    assert sorted(loaded.signatures) == ["predict_f", "predict_mean", "predict_y", "sample_f"]
+
+
+def test_exported_predict_y(tmp_path):
+    model = DeepGP([build_gp_layer(1, last=True)], Gaussian(0.1), input_dim=INPUT_DIM)
+    model.export(str(tmp_path))
+    loaded = tf.saved_model.load(str(tmp_path))
+    X = np.random.randn(7, INPUT_DIM)
+
+    y_outputs = loaded.signatures["predict_y"](inputs=X)
+
+    f_mean, f_var = model.predict_f(X)
+    np.testing.assert_allclose(y_outputs["y_mean"], f_mean, atol=1e-10)
+    np.testing.assert_allclose(y_outputs["y_var"], f_var + 0.1, atol=1e-10)
+
+
+def test_export_calls_other_layers(tmp_path):
+    dense = tf.keras.layers.Dense(INPUT_DIM, dtype="float64")
+    model = DeepGP([dense, build_gp_layer(1, last=True)], Gaussian(0.1), num_data=100)
+    X = np.random.randn(7, INPUT_DIM)
+    expected_mean, expected_var = model.predict_f(X)  # builds the dense layer
+    model.export(str(tmp_path), input_dim=INPUT_DIM)
+    loaded = tf.saved_model.load(str(tmp_path))
+
+    f_outputs = loaded.signatures["predict_f"](inputs=X)
+
+    np.testing.assert_allclose(f_outputs["f_mean"], expected_mean, atol=1e-10)
+    np.testing.assert_allclose(f_outputs["f_var"], expected_var, atol=1e-10)
+
+
+def test_export_requires_input_dim_built_layers_and_gp_last_layer(tmp_path):
+    model = DeepGP([build_gp_layer(1, last=True)], Gaussian(0.1))
+    with pytest.raises(ValueError):
+        model.export(str(tmp_path))
+
+    dense = tf.keras.layers.Dense(1, dtype="float64")
+    model = DeepGP([build_gp_layer(INPUT_DIM), dense], Gaussian(0.1), input_dim=INPUT_DIM)
+    with pytest.raises(NotImplementedError):
+        model.export(str(tmp_path))
+
+    dense = tf.keras.layers.Dense(INPUT_DIM, dtype="float64")
+    model = DeepGP([dense, build_gp_layer(1, last=True)], Gaussian(0.1), input_dim=INPUT_DIM)
+    with pytest.raises(ValueError):
+        model.export(str(tmp_path))  # the dense layer is not built
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import RBF, Linear, Matern12, Matern32, Matern52
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Constant, Zero
+
+import gpflux.prediction.numpy_runtime
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import NumpyDeepGP, export_deep_gp_npz
+
+INPUT_DIM = 2
+
+
+def build_gp_layer(output_dim, *, kernel=RBF, share_variables=True, mean_function=None):
+    kernel = construct_basic_kernel(
+        [kernel(lengthscales=[0.5, 2.0]) for _ in range(output_dim)], output_dim=output_dim
+    )
+    z_shape = (5, INPUT_DIM) if share_variables else (output_dim, 5, INPUT_DIM)
+    inducing_variable = construct_basic_inducing_variables(
+        5,
+        INPUT_DIM,
+        output_dim=output_dim,
+        share_variables=share_variables,
+        z_init=np.random.randn(*z_shape),
+    )
+    layer = GPLayer(kernel, inducing_variable, 100, mean_function=mean_function)
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    layer.q_sqrt.assign(0.5 * np.tril(np.random.rand(*layer.q_sqrt.shape)))
+    return layer
+
+
+def build_deep_gp(**options):
+    layers = [
+        build_gp_layer(INPUT_DIM, **options),
+        build_gp_layer(1, mean_function=Constant(np.array([0.5])), **options),
+    ]
+    return DeepGP(layers, Gaussian(0.1))
+
+
+@pytest.mark.parametrize("kernel", [RBF, Matern12, Matern32, Matern52])
+@pytest.mark.parametrize("share_variables", [True, False])
+def test_numpy_predictions_match_deep_gp(kernel, share_variables, tmp_path):
+    model = build_deep_gp(kernel=kernel, share_variables=share_variables)
+    export_deep_gp_npz(model, str(tmp_path / "model.npz"))
+    numpy_model = NumpyDeepGP.load(str(tmp_path / "model.npz"))
+    X = np.random.randn(7, INPUT_DIM)
+
+    np.testing.assert_allclose(numpy_model.predict_mean(X), model.predict_mean(X), atol=1e-10)
+    # the last layer is deterministic given its inputs
+    f_mean, f_var = numpy_model.layers[-1].predict(X)
+    expected_mean, expected_var = model.f_layers[-1].predict(X)
+    np.testing.assert_allclose(f_mean, expected_mean, atol=1e-10)
+    np.testing.assert_allclose(f_var, expected_var, atol=1e-10)
+
+
+def test_numpy_predict_f_and_predict_y_match_single_layer(tmp_path):
+    model = DeepGP([build_gp_layer(1, mean_function=Zero())], Gaussian(0.1))
+    export_deep_gp_npz(model, str(tmp_path / "model.npz"))
+    numpy_model = NumpyDeepGP.load(str(tmp_path / "model.npz"))
+    X = np.random.randn(7, INPUT_DIM)
+
+    f_mean, f_var = numpy_model.predict_f(X)
+    y_mean, y_var = numpy_model.predict_y(X)
+
+    expected_mean, expected_var = model.predict_f(X)
+    np.testing.assert_allclose(f_mean, expected_mean, atol=1e-10)
+    np.testing.assert_allclose(f_var, expected_var, atol=1e-10)
+    np.testing.assert_allclose(y_mean, expected_mean, atol=1e-10)
+    np.testing.assert_allclose(y_var, expected_var + 0.1, atol=1e-10)
+
+
+def test_numpy_sample_f(tmp_path):
+    export_deep_gp_npz(build_deep_gp(), str(tmp_path / "model.npz"))
+    numpy_model = NumpyDeepGP.load(str(tmp_path / "model.npz"))
+    X = np.random.randn(7, INPUT_DIM)
+
+    samples = numpy_model.sample_f(X, 3, rng=np.random.default_rng(0))
+
+    assert samples.shape == (3, 7, 1)
+    assert not np.allclose(samples[0], samples[1])
+    np.testing.assert_array_equal(samples, numpy_model.sample_f(X, 3, np.random.default_rng(0)))
+
+
+def test_numpy_runtime_does_not_import_tensorflow(tmp_path):
+    export_deep_gp_npz(build_deep_gp(), str(tmp_path / "model.npz"))
+    runtime_path = gpflux.prediction.numpy_runtime.__file__
+    script = f"""
+import importlib.util, sys
+import numpy as np
+spec = importlib.util.spec_from_file_location("numpy_runtime", {runtime_path!r})
+numpy_runtime = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(numpy_runtime)
+model = numpy_runtime.NumpyDeepGP.load({str(tmp_path / "model.npz")!r})
+print(model.predict_mean(np.zeros((3, {INPUT_DIM}))).shape)
+assert "tensorflow" not in sys.modules
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    ).stdout
+    assert output.strip() == "(3, 1)"
+
+
+def test_numpy_export_raises_for_unsupported_models(tmp_path):
+    layer = GPLayer(
+        construct_basic_kernel(Linear(), output_dim=1),
+        construct_basic_inducing_variables(5, INPUT_DIM, output_dim=1, share_variables=True),
+        100,
+        mean_function=Zero(),
+    )
+    with pytest.raises(NotImplementedError):
+        export_deep_gp_npz(DeepGP([layer], Gaussian(0.1)), str(tmp_path / "model.npz"))
+
+    dense = tf.keras.layers.Dense(INPUT_DIM, dtype="float64")
+    model = DeepGP([dense, build_gp_layer(1, mean_function=Zero())], Gaussian(0.1))
+    with pytest.raises(NotImplementedError):
+        export_deep_gp_npz(model, str(tmp_path / "model.npz"))
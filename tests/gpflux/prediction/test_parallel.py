@@ -0,0 +1,65 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import sys
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import ParallelPredictor
+
+INPUT_DIM, NUM_INDUCING = 2, 5
+
+
+def build_deep_gp():
+    """Build the model; this must be importable by the worker processes."""
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(
+        NUM_INDUCING,
+        INPUT_DIM,
+        output_dim=1,
+        share_variables=True,
+        z_init=np.zeros((NUM_INDUCING, INPUT_DIM)),
+    )
+    layer = GPLayer(kernel, inducing_variable, 100, mean_function=Zero())
+    return DeepGP([layer], Gaussian(0.1))
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 8), reason="multiprocessing.shared_memory requires Python 3.8"
+)
+def test_parallel_predict_matches_predict_f(tmp_path):
+    deep_gp = build_deep_gp()
+    for variable in deep_gp.trainable_variables:
+        variable.assign(variable + 0.3 * np.random.randn(*variable.shape))
+    checkpoint_path = tf.train.Checkpoint(model=deep_gp).write(str(tmp_path / "ckpt"))
+    X = np.random.randn(101, INPUT_DIM)
+    expected_mean, expected_var = deep_gp.predict_f(X)
+
+    with ParallelPredictor(
+        build_deep_gp, checkpoint_path, num_workers=2, chunk_size=16
+    ) as predictor:
+        mean, var = predictor.predict(X)
+
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.kernels import RBF
+from gpflow.likelihoods import Gaussian
+from gpflow.mean_functions import Zero
+
+from gpflux.helpers import construct_basic_inducing_variables, construct_basic_kernel
+from gpflux.layers import GPLayer
+from gpflux.models import DeepGP
+from gpflux.prediction import StreamingPredictor
+
+NUM_DATA, INPUT_DIM, CHUNK_SIZE = 103, 2, 10
+
+
+@pytest.fixture(name="deep_gp")
+def _deep_gp_fixture():
+    kernel = construct_basic_kernel(RBF(), output_dim=1)
+    inducing_variable = construct_basic_inducing_variables(5, INPUT_DIM, output_dim=1)
+    layer = GPLayer(kernel, inducing_variable, NUM_DATA, mean_function=Zero())
+    layer.q_mu.assign(np.random.randn(*layer.q_mu.shape))
+    return DeepGP([layer], Gaussian(0.1))
+
+
+@pytest.mark.parametrize(
+    "make_inputs",
+    [
+        lambda X: X,
+        lambda X: tf.data.Dataset.from_tensor_slices(X),
+        lambda X: tf.data.Dataset.from_tensor_slices(X).batch(7),
+        lambda X: iter(np.array_split(X, 13)),
+        lambda X: (row for row in X),
+    ],
+)
+def test_streaming_predict_matches_predict_f(deep_gp, make_inputs):
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    expected_mean, expected_var = deep_gp.predict_f(X)
+
+    predictor = StreamingPredictor.for_deep_gp(deep_gp, chunk_size=CHUNK_SIZE)
+    mean, var = predictor.predict(make_inputs(X))
+
+    np.testing.assert_allclose(mean, expected_mean)
+    np.testing.assert_allclose(var, expected_var)
+
+
+def test_streaming_predict_chunks_without_retracing(deep_gp):
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    predictor = StreamingPredictor.for_deep_gp(deep_gp, chunk_size=CHUNK_SIZE)
+
+    starts = [start for start, _ in predictor.iter_predictions(X)]
+    (compiled_fn,) = predictor._compiled_fns.values()
+    num_traces = compiled_fn.experimental_get_tracing_count()
+    predictor.predict(tf.data.Dataset.from_tensor_slices(X))
+
+    assert starts == list(range(0, NUM_DATA, CHUNK_SIZE))
+    assert len(predictor._compiled_fns) == 1
+    assert compiled_fn.experimental_get_tracing_count() == num_traces
+
+
+def test_streaming_predict_writes_to_memory_mapped_outputs(deep_gp, tmp_path):
+    X = np.random.randn(NUM_DATA, INPUT_DIM)
+    np.save(tmp_path / "inputs.npy", X)
+    inputs = np.load(tmp_path / "inputs.npy", mmap_mode="r")
+    outputs = [
+        np.lib.format.open_memmap(tmp_path / f"{name}.npy", "w+", np.float64, (NUM_DATA, 1))
+        for name in ["mean", "var"]
+    ]
+
+    predictor = StreamingPredictor.for_deep_gp(deep_gp, chunk_size=CHUNK_SIZE)
+    returned = predictor.predict(inputs, outputs=outputs)
+    for output in outputs:
+        output.flush()
+
+    assert all(r is o for r, o in zip(returned, outputs))
+    expected_mean, expected_var = deep_gp.predict_f(X)
+    np.testing.assert_allclose(np.load(tmp_path / "mean.npy"), expected_mean)
+    np.testing.assert_allclose(np.load(tmp_path / "var.npy"), expected_var)
+
+
+def test_streaming_predict_checks_outputs(deep_gp):
+    predictor = StreamingPredictor.for_deep_gp(deep_gp, chunk_size=CHUNK_SIZE)
+    outputs = [np.empty((NUM_DATA - 1, 1)), np.empty((NUM_DATA - 1, 1))]
+    with pytest.raises(ValueError):
+        predictor.predict(np.zeros((NUM_DATA, INPUT_DIM)), outputs=outputs)
@@ -0,0 +1,55 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.inducing_variables import InducingPoints
+
+from gpflux.covariances import neighbour_indices, neighbour_Kfu, sparse_Kuf, sparse_Kuu
+from gpflux.kernels import Wendland
+
+
+@pytest.mark.parametrize("input_dim", [1, 2, 3])
+def test_sparse_covariances_match_dense(input_dim):
+    kernel = Wendland(input_dim, lengthscales=np.linspace(0.5, 1.0, input_dim))
+    inducing_variable = InducingPoints(np.random.uniform(0.0, 4.0, size=(40, input_dim)))
+    X = np.random.uniform(-1.0, 5.0, size=(30, input_dim))
+    Z = inducing_variable.Z.numpy()
+
+    Kuf = sparse_Kuf(inducing_variable, kernel, X)
+    assert isinstance(Kuf, tf.SparseTensor)
+    np.testing.assert_allclose(tf.sparse.to_dense(Kuf), kernel(Z, X))
+
+    Kuu = sparse_Kuu(inducing_variable, kernel, jitter=1e-3)
+    np.testing.assert_allclose(tf.sparse.to_dense(Kuu), kernel(Z) + 1e-3 * np.eye(len(Z)))
+
+
+def test_neighbour_Kfu_only_stores_neighbours():
+    kernel = Wendland(1, lengthscales=0.5)
+    inducing_variable = InducingPoints(np.linspace(0.0, 100.0, 201)[:, None])
+    X = np.random.uniform(0.0, 100.0, size=(20, 1))
+
+    indices, values = neighbour_Kfu(inducing_variable, kernel, X)
+    # the (candidate) neighbours lie in the cells of width 0.5 around each input
+    assert indices.shape[1] <= 6
+    Kfu = kernel(X, inducing_variable.Z).numpy()
+    is_padding = neighbour_indices(inducing_variable, kernel, X).numpy() < 0
+    assert np.all(indices.numpy()[is_padding] == 0)
+    assert np.all(values.numpy()[is_padding] == 0)
+    expected_values = np.take_along_axis(Kfu, indices.numpy(), axis=1)
+    np.testing.assert_allclose(values.numpy()[~is_padding], expected_values[~is_padding])
+    np.testing.assert_allclose(np.sum(values, axis=1), np.sum(Kfu, axis=1))
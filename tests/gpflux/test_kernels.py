@@ -0,0 +1,39 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from gpflux.kernels import Wendland
+
+
+@pytest.mark.parametrize("input_dim", [1, 2, 3])
+@pytest.mark.parametrize("smoothness", [0, 1, 2, 3])
+def test_wendland_is_positive_definite_with_compact_support(input_dim, smoothness):
+    kernel = Wendland(input_dim, smoothness, lengthscales=0.7, variance=1.5)
+    X = np.random.uniform(0.0, 3.0, size=(50, input_dim))
+
+    K = kernel(X).numpy()
+    np.testing.assert_allclose(np.diag(K), 1.5)
+    assert np.linalg.eigvalsh(K).min() > -1e-10
+
+    distances = np.linalg.norm(X[:, None] - X[None], axis=-1)
+    np.testing.assert_array_equal(K[distances >= 0.7], 0.0)
+    assert np.all(K[distances < 0.7] > 0.0)
+
+
+def test_wendland_invalid_smoothness():
+    with pytest.raises(ValueError):
+        Wendland(1, smoothness=4)
@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from gpflow.inducing_variables import InducingPoints
+from gpflow.kernels import SquaredExponential
+from gpflow.kullback_leiblers import prior_kl
+
+from gpflux.kullback_leiblers import stochastic_prior_kl
+
+
+def _setup(num_inducing: int, num_latent_gps: int):
+    kernel = SquaredExponential(lengthscales=0.5)
+    Z = np.linspace(-1, 1, num_inducing).reshape(-1, 1)
+    inducing_variable = InducingPoints(Z)
+    q_mu = np.random.randn(num_inducing, num_latent_gps)
+    q_sqrt = np.tril(np.random.randn(num_latent_gps, num_inducing, num_inducing)) * 0.3
+    q_sqrt += np.eye(num_inducing) * 0.5
+    return inducing_variable, kernel, q_mu, q_sqrt
+
+
+@pytest.mark.parametrize("num_latent_gps", [1, 3])
+def test_stochastic_prior_kl_matches_exact(num_latent_gps):
+    tf.random.set_seed(0)
+    inducing_variable, kernel, q_mu, q_sqrt = _setup(10, num_latent_gps)
+
+    exact = prior_kl(inducing_variable, kernel, q_mu, q_sqrt, whiten=False)
+    estimate, variance = stochastic_prior_kl(
+        inducing_variable, kernel, q_mu, q_sqrt, num_probes=2000, num_lanczos_iterations=10
+    )
+
+    assert variance > 0.0
+    np.testing.assert_allclose(estimate, exact, rtol=0.05)
+
+
+def test_stochastic_prior_kl_gradients():
+    tf.random.set_seed(0)
+    inducing_variable, kernel, q_mu, q_sqrt = _setup(8, 1)
+    q_mu = tf.Variable(q_mu)
+
+    with tf.GradientTape(persistent=True) as tape:
+        exact = prior_kl(inducing_variable, kernel, q_mu, q_sqrt, whiten=False)
+        estimate = stochastic_prior_kl(
+            inducing_variable, kernel, q_mu, q_sqrt, num_probes=100, num_lanczos_iterations=8
+        ).kl
+
+    np.testing.assert_allclose(
+        tape.gradient(estimate, q_mu), tape.gradient(exact, q_mu), rtol=1e-3, atol=1e-6
+    )
@@ -14,8 +14,15 @@
 # limitations under the License.
 #
 import numpy as np
+import tensorflow as tf
 
-from gpflux.math import compute_A_inv_b
+from gpflux.math import (
+    compute_A_inv_b,
+    conjugate_gradient_solve,
+    rademacher_probes,
+    stochastic_logdet,
+    unique_rows,
+)
 
 
 def _get_psd_matrix(N):
@@ -36,3 +43,54 @@ def test_compute_A_inv_x():
         compute_A_inv_b(A, b).numpy(),
         decimal=3,
     )
+
+
+def test_conjugate_gradient_solve():
+    N = 20
+    A = _get_psd_matrix(N) + 1e-2 * np.eye(N)
+    b = np.random.randn(N, 3)
+    np.testing.assert_allclose(
+        np.linalg.solve(A, b),
+        conjugate_gradient_solve(A, b, max_iterations=500, tolerance=1e-10).numpy(),
+        rtol=1e-4,
+        atol=1e-6,
+    )
+
+
+def test_conjugate_gradient_solve_gradient():
+    N = 10
+    A = tf.constant(_get_psd_matrix(N) + 1e-1 * np.eye(N))
+    b = tf.constant(np.random.randn(N, 2))
+
+    with tf.GradientTape(persistent=True) as tape:
+        tape.watch([A, b])
+        cg_loss = tf.reduce_sum(conjugate_gradient_solve(A, b, max_iterations=500, tolerance=1e-12))
+        exact_loss = tf.reduce_sum(tf.linalg.solve(A, b))
+
+    cg_grads = tape.gradient(cg_loss, [A, b])
+    exact_grads = tape.gradient(exact_loss, [A, b])
+    for cg_grad, exact_grad in zip(cg_grads, exact_grads):
+        np.testing.assert_allclose(cg_grad.numpy(), exact_grad.numpy(), rtol=1e-4, atol=1e-6)
+
+
+def test_rademacher_probes():
+    probes = rademacher_probes([5, 1000], dtype=tf.float64).numpy()
+    assert probes.dtype == np.float64
+    np.testing.assert_array_equal(np.abs(probes), 1.0)
+
+
+def test_unique_rows():
+    distinct = np.random.randn(4, 3)
+    inputs = distinct[[[2, 0, 2], [1, 0, 3]]]  # [2, 3, 3]
+
+    unique_inputs, indices = unique_rows(inputs)
+    np.testing.assert_array_equal(unique_inputs, distinct[[2, 0, 1, 3]])
+    np.testing.assert_array_equal(tf.gather(unique_inputs, indices), inputs.reshape(-1, 3))
+
+
+def test_stochastic_logdet():
+    N = 10
+    A = _get_psd_matrix(N) + 1e-1 * np.eye(N)
+    probes = rademacher_probes([N, 2000], dtype=tf.float64)
+    estimates = stochastic_logdet(A, probes, num_iterations=N)
+    np.testing.assert_allclose(np.mean(estimates), np.linalg.slogdet(A)[1], rtol=0.05)
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2021 The GPflux Contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+import gpflow
+
+from gpflux.state_space import (
+    affine_gaussian_scan,
+    bridge,
+    is_state_space_kernel,
+    state_space_model,
+    transitions,
+)
+
+
+@pytest.mark.parametrize(
+    "kernel_class", [gpflow.kernels.Matern12, gpflow.kernels.Matern32, gpflow.kernels.Matern52]
+)
+def test_state_space_model_reproduces_kernel(kernel_class):
+    kernel = kernel_class(variance=1.3, lengthscales=0.7)
+    model = state_space_model(kernel)
+    dt = np.linspace(0.0, 3.0, 10)
+
+    A, _ = transitions(model, dt)
+    # Cov(f(t + Δ), f(t)) = H A(Δ) P∞ Hᵀ
+    covariances = (model.H @ A @ model.P_inf @ np.transpose(model.H))[:, 0, 0]
+    expected = kernel(np.zeros((1, 1)), dt[:, None])[0]
+    np.testing.assert_allclose(covariances, expected, rtol=1e-6)
+
+
+def test_transitions_from_stationary():
+    model = state_space_model(gpflow.kernels.Matern32())
+    A, Q = transitions(model, [0.5, 0.5], from_stationary=[True, False])
+    np.testing.assert_allclose(A[0], 0.0)
+    np.testing.assert_allclose(Q[0], model.P_inf)
+    assert not np.allclose(A[1], 0.0)
+
+
+def test_affine_gaussian_scan_matches_sequential_recursion():
+    rng = np.random.default_rng(0)
+    K, L, S = 9, 2, 3
+    B = 0.5 * rng.normal(size=(K, L, S, S))
+    b = rng.normal(size=(K, L, S))
+    C = rng.normal(size=(K, L, S, S))
+    noise_cov = C @ np.swapaxes(C, -1, -2)
+
+    means, covs = affine_gaussian_scan(B, b, noise_cov)
+
+    mean, cov = b[0], noise_cov[0]
+    np.testing.assert_allclose(means[0], mean)
+    for k in range(1, K):
+        mean = np.einsum("lij,lj->li", B[k], mean) + b[k]
+        cov = B[k] @ cov @ np.swapaxes(B[k], -1, -2) + noise_cov[k]
+        np.testing.assert_allclose(means[k], mean)
+        np.testing.assert_allclose(covs[k], cov)
+
+
+def test_bridge_matches_dense_conditioning():
+    model = state_space_model(gpflow.kernels.Matern52(lengthscales=0.6))
+    P_inf = model.P_inf.numpy()
+    S = P_inf.shape[0]
+    A1, Q1 = [x.numpy() for x in transitions(model, 0.3)]
+    A2, Q2 = [x.numpy() for x in transitions(model, 0.4)]
+
+    P, R, T = bridge(A1, Q1, A2, Q2)
+
+    # joint prior over (s_L, s, s_R) at times (0, 0.3, 0.7), conditioned densely on (s_L, s_R)
+    A12 = A2 @ A1
+    cov_s_ends = np.concatenate([A1 @ P_inf, P_inf @ A2.T], axis=1)  # [S, 2S]
+    cov_ends = np.block([[P_inf, P_inf @ A12.T], [A12 @ P_inf, P_inf]])  # [2S, 2S]
+    weights = np.linalg.solve(cov_ends, cov_s_ends.T).T
+    np.testing.assert_allclose(P, weights[:, :S], atol=1e-8)
+    np.testing.assert_allclose(R, weights[:, S:], atol=1e-8)
+    np.testing.assert_allclose(T, P_inf - weights @ cov_s_ends.T, atol=1e-8)
+
+
+def test_is_state_space_kernel():
+    assert is_state_space_kernel(gpflow.kernels.Matern32())
+    assert not is_state_space_kernel(gpflow.kernels.SquaredExponential())